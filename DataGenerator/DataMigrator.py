@@ -0,0 +1,600 @@
+import argparse
+import boto3
+import io
+import json
+import os
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+from dotenv import load_dotenv
+from botocore.exceptions import ClientError
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# Cargar variables de entorno desde .env en la raíz del proyecto
+env_path = os.path.join(os.path.dirname(__file__), '..', '.env')
+load_dotenv(dotenv_path=env_path)
+
+# Configuración de AWS DynamoDB
+AWS_REGION = os.getenv('AWS_REGION', 'us-east-1')
+
+dynamodb = boto3.resource('dynamodb', region_name=AWS_REGION)
+s3_client = boto3.client('s3', region_name=AWS_REGION)
+
+# Nombres de las tablas DynamoDB
+TABLE_USUARIOS = os.getenv('TABLE_USUARIOS')
+TABLE_PEDIDOS = os.getenv('TABLE_PEDIDOS')
+TABLE_EMPLEADOS = os.getenv('TABLE_EMPLEADOS')
+TABLE_PRODUCTOS = os.getenv('TABLE_PRODUCTOS', 'ChinaWok-Productos')
+TABLE_RESENAS = os.getenv('TABLE_RESENAS', 'ChinaWok-Resenas')
+TABLE_ROLLUP_DIARIO = os.getenv('TABLE_ROLLUP_DIARIO', 'ChinaWok-Rollup-Diario')
+TABLE_TOP_PRODUCTOS = os.getenv('TABLE_TOP_PRODUCTOS', 'ChinaWok-Top-Productos')
+TABLE_SCORECARD_PERSONAL = os.getenv('TABLE_SCORECARD_PERSONAL', 'ChinaWok-Scorecard-Personal')
+
+# Mismos valores que utils/top_productos.py (capacidad del sketch y retención por ventana)
+TOP_PRODUCTOS_CAPACIDAD = int(os.getenv('TOP_PRODUCTOS_CAPACIDAD', 100))
+RETENCION_VENTANAS = {'total': None, 'dia': 60 * 24 * 3600, 'semana': 370 * 24 * 3600, 'mes': None}
+
+# Snapshot de analítica en S3
+S3_BUCKET_NAME = os.getenv('S3_BUCKET_NAME')
+S3_INGESTION_PREFIX = os.getenv('S3_INGESTION_PREFIX', 'data-ingestion')
+S3_LAKE_PREFIX = os.getenv('S3_LAKE_PREFIX', 'data-lake')
+
+# Fecha usada cuando un pedido antiguo no tiene fecha_creacion (queda al final del historial)
+FECHA_DESCONOCIDA = '1970-01-01T00:00:00Z'
+
+MAX_WORKERS = 8
+
+
+def scan_completo(table, **kwargs):
+    """Recorre una tabla completa siguiendo la paginación del scan"""
+    while True:
+        response = table.scan(**kwargs)
+        for item in response.get('Items', []):
+            yield item
+        if 'LastEvaluatedKey' not in response:
+            return
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+# ============================================================
+# HISTORIAL DE PEDIDOS -> índice usuario-fecha-index
+# ============================================================
+
+def indexar_pedido(pedidos_table, correo, entrada):
+    """
+    Asegura que el pedido tenga los atributos del índice usuario-fecha-index.
+    Retorna True si el pedido existe (indexado), False si fue eliminado
+    """
+    try:
+        pedidos_table.update_item(
+            Key={'local_id': entrada['local_id'], 'pedido_id': entrada['pedido_id']},
+            UpdateExpression='SET usuario_correo = if_not_exists(usuario_correo, :correo), '
+                             'fecha_creacion = if_not_exists(fecha_creacion, :fecha)',
+            ConditionExpression='attribute_exists(pedido_id)',
+            ExpressionAttributeValues={
+                ':correo': correo,
+                ':fecha': FECHA_DESCONOCIDA
+            }
+        )
+        return True
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+            return False
+        raise
+
+
+def migrar_usuario(usuarios_table, pedidos_table, usuario, dry_run):
+    """Migra el historial de un usuario, elimina la lista de su item y lo marca como migrado"""
+    correo = usuario['correo']
+    historial = usuario.get('historial_pedidos', [])
+    resultado = {'indexados': 0, 'eliminados': 0, 'legados': 0, 'lista_eliminada': False}
+
+    for entrada in historial:
+        # Las entradas antiguas (solo pedido_id) no tienen local_id
+        if not isinstance(entrada, dict) or not entrada.get('local_id'):
+            resultado['legados'] += 1
+            continue
+
+        if dry_run:
+            resultado['indexados'] += 1
+        elif indexar_pedido(pedidos_table, correo, entrada):
+            resultado['indexados'] += 1
+        else:
+            resultado['eliminados'] += 1
+
+    # Con entradas legadas pendientes la lista se conserva para no perderlas
+    if resultado['legados'] or dry_run:
+        return resultado
+
+    try:
+        # Solo si la lista no cambió desde que se leyó. historial_migrado
+        # indica al historial que ya no combine la lista legada con el índice
+        usuarios_table.update_item(
+            Key={'correo': correo},
+            UpdateExpression='SET historial_migrado = :true REMOVE historial_pedidos',
+            ConditionExpression='size(historial_pedidos) = :n',
+            ExpressionAttributeValues={':n': len(historial), ':true': True}
+        )
+        resultado['lista_eliminada'] = True
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise
+        print(f"   ⚠️  El historial de {correo} cambió durante la migración, reintentar")
+
+    return resultado
+
+
+def migrar_historial_pedidos(args):
+    """
+    Traslada el historial de pedidos de los items de Usuarios al índice
+    usuario-fecha-index de Pedidos y elimina historial_pedidos de cada usuario
+    """
+    print("\n📦 Migrando historial_pedidos de Usuarios al índice usuario-fecha-index")
+    if args.dry_run:
+        print("   ℹ️  Modo simulación: no se escribirá nada")
+
+    usuarios_table = dynamodb.Table(TABLE_USUARIOS)
+    pedidos_table = dynamodb.Table(TABLE_PEDIDOS)
+
+    usuarios = scan_completo(
+        usuarios_table,
+        ProjectionExpression='correo, historial_pedidos',
+        FilterExpression='attribute_exists(historial_pedidos)'
+    )
+
+    totales = {'usuarios': 0, 'indexados': 0, 'eliminados': 0, 'legados': 0, 'listas_eliminadas': 0}
+
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        futures = {
+            executor.submit(migrar_usuario, usuarios_table, pedidos_table, usuario, args.dry_run): usuario['correo']
+            for usuario in usuarios
+        }
+
+        for future in as_completed(futures):
+            try:
+                resultado = future.result()
+            except Exception as e:
+                print(f"   ❌ Error migrando {futures[future]}: {str(e)}")
+                continue
+
+            totales['usuarios'] += 1
+            totales['indexados'] += resultado['indexados']
+            totales['eliminados'] += resultado['eliminados']
+            totales['legados'] += resultado['legados']
+            totales['listas_eliminadas'] += int(resultado['lista_eliminada'])
+
+    print(f"\n   👥 Usuarios procesados: {totales['usuarios']}")
+    print(f"   ✅ Pedidos indexados: {totales['indexados']}")
+    print(f"   🗑️  Pedidos ya eliminados: {totales['eliminados']}")
+    print(f"   🧹 Listas eliminadas de Usuarios: {totales['listas_eliminadas']}")
+    if totales['legados']:
+        print(f"   ⚠️  Entradas legadas sin local_id: {totales['legados']} (sus listas se conservaron,")
+        print("      ejecutar primero: python DataMigrator.py resolver-legados)")
+
+
+# ============================================================
+# ENTRADAS LEGADAS (solo pedido_id) -> {pedido_id, local_id}
+# ============================================================
+
+def resolver_entradas_legadas(args):
+    """
+    Reescribe las entradas antiguas de historial_pedidos (solo pedido_id como
+    string) al formato {pedido_id, local_id}. Pedidos se recorre una sola vez
+    para construir el mapa pedido_id -> local_id; las entradas cuyo pedido ya no
+    existe se descartan
+    """
+    print("\n🔎 Resolviendo entradas legadas de historial_pedidos")
+    if args.dry_run:
+        print("   ℹ️  Modo simulación: no se escribirá nada")
+
+    usuarios_table = dynamodb.Table(TABLE_USUARIOS)
+    pedidos_table = dynamodb.Table(TABLE_PEDIDOS)
+
+    print("   ⏳ Construyendo mapa pedido_id -> local_id...")
+    locales_por_pedido = {
+        pedido['pedido_id']: pedido['local_id']
+        for pedido in scan_completo(pedidos_table, ProjectionExpression='pedido_id, local_id')
+    }
+    print(f"   📊 Pedidos en la tabla: {len(locales_por_pedido)}")
+
+    totales = {'usuarios': 0, 'resueltas': 0, 'descartadas': 0}
+
+    usuarios = scan_completo(
+        usuarios_table,
+        ProjectionExpression='correo, historial_pedidos',
+        FilterExpression='attribute_exists(historial_pedidos)'
+    )
+
+    for usuario in usuarios:
+        historial = usuario.get('historial_pedidos', [])
+        if not any(isinstance(entrada, str) for entrada in historial):
+            continue
+
+        nuevo_historial = []
+        for entrada in historial:
+            if not isinstance(entrada, str):
+                nuevo_historial.append(entrada)
+            elif entrada in locales_por_pedido:
+                nuevo_historial.append({'pedido_id': entrada, 'local_id': locales_por_pedido[entrada]})
+                totales['resueltas'] += 1
+            else:
+                totales['descartadas'] += 1
+
+        totales['usuarios'] += 1
+        if args.dry_run:
+            continue
+
+        try:
+            usuarios_table.update_item(
+                Key={'correo': usuario['correo']},
+                UpdateExpression='SET historial_pedidos = :historial',
+                ConditionExpression='size(historial_pedidos) = :n',
+                ExpressionAttributeValues={
+                    ':historial': nuevo_historial,
+                    ':n': len(historial)
+                }
+            )
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                raise
+            print(f"   ⚠️  El historial de {usuario['correo']} cambió durante la migración, reintentar")
+
+    print(f"\n   👥 Usuarios con entradas legadas: {totales['usuarios']}")
+    print(f"   ✅ Entradas resueltas: {totales['resueltas']}")
+    print(f"   🗑️  Entradas de pedidos inexistentes descartadas: {totales['descartadas']}")
+
+
+# ============================================================
+# EMPLEADOS -> índice disperso disponibles-index
+# ============================================================
+
+def indexar_disponibilidad_empleados(args):
+    """
+    Agrega disponible_key (local_id#role) a los empleados libres que no la
+    tienen, para que aparezcan en el índice disponibles-index. La condición
+    evita marcar como disponible a un empleado que fue ocupado entretanto
+    """
+    print("\n👷 Indexando disponibilidad de empleados en disponibles-index")
+    if args.dry_run:
+        print("   ℹ️  Modo simulación: no se escribirá nada")
+
+    empleados_table = dynamodb.Table(TABLE_EMPLEADOS)
+
+    empleados = scan_completo(
+        empleados_table,
+        ProjectionExpression='local_id, dni, #role, ocupado',
+        FilterExpression='attribute_not_exists(disponible_key) AND (attribute_not_exists(ocupado) OR ocupado = :libre)',
+        ExpressionAttributeNames={'#role': 'role'},
+        ExpressionAttributeValues={':libre': False}
+    )
+
+    totales = {'indexados': 0, 'omitidos': 0}
+
+    for empleado in empleados:
+        if args.dry_run:
+            totales['indexados'] += 1
+            continue
+
+        try:
+            empleados_table.update_item(
+                Key={'local_id': empleado['local_id'], 'dni': empleado['dni']},
+                UpdateExpression='SET disponible_key = :disponible_key, ocupado = if_not_exists(ocupado, :libre)',
+                ConditionExpression='attribute_not_exists(ocupado) OR ocupado = :libre',
+                ExpressionAttributeValues={
+                    ':disponible_key': f"{empleado['local_id']}#{empleado['role']}",
+                    ':libre': False
+                }
+            )
+            totales['indexados'] += 1
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                raise
+            totales['omitidos'] += 1
+
+    print(f"\n   ✅ Empleados libres indexados: {totales['indexados']}")
+    print(f"   ⏭️  Omitidos (ocupados durante la migración): {totales['omitidos']}")
+
+
+# ============================================================
+# SNAPSHOT S3 DE PEDIDOS -> rollup diario
+# ============================================================
+
+def leer_pedidos_snapshot():
+    """
+    Recorre los pedidos del snapshot de analítica: el data lake Parquet si
+    existe (requiere pyarrow) o el data.jsonl heredado
+    """
+    paginator = s3_client.get_paginator('list_objects_v2')
+    archivos = [
+        obj['Key']
+        for page in paginator.paginate(Bucket=S3_BUCKET_NAME, Prefix=f'{S3_LAKE_PREFIX}/pedidos/')
+        for obj in page.get('Contents', [])
+        if obj['Key'].endswith('.parquet')
+    ]
+
+    if archivos:
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise SystemExit('❌ pyarrow es necesario para leer el data lake Parquet (pip install pyarrow)')
+
+        print(f"   📦 Leyendo {len(archivos)} particiones Parquet de s3://{S3_BUCKET_NAME}/{S3_LAKE_PREFIX}/pedidos/")
+        for s3_key in archivos:
+            # local_id viene en la ruta de la partición (local_id=.../mes=...)
+            local_id = next(p.split('=', 1)[1] for p in s3_key.split('/') if p.startswith('local_id='))
+            body = s3_client.get_object(Bucket=S3_BUCKET_NAME, Key=s3_key)['Body'].read()
+            for pedido in pq.read_table(io.BytesIO(body)).to_pylist():
+                yield {**pedido, 'local_id': local_id}
+        return
+
+    s3_key = f'{S3_INGESTION_PREFIX}/pedidos/data.jsonl'
+    print(f"   📄 Leyendo s3://{S3_BUCKET_NAME}/{s3_key}")
+    body = s3_client.get_object(Bucket=S3_BUCKET_NAME, Key=s3_key)['Body']
+    for linea in body.iter_lines():
+        if linea.strip():
+            yield json.loads(linea)
+
+
+def construir_rollup_diario(args):
+    """
+    Calcula pedidos y revenue por local y día de entrega desde el snapshot S3
+    y escribe la tabla de rollup (sobrescribe los días existentes). Conviene
+    ejecutarlo justo después de una compactación: los cambios posteriores
+    llegan por el stream como ADD
+    """
+    print("\n📅 Construyendo rollup diario de pedidos desde el snapshot S3")
+    if args.dry_run:
+        print("   ℹ️  Modo simulación: no se escribirá nada")
+
+    dias = {}
+    for pedido in leer_pedidos_snapshot():
+        fecha = pedido.get('fecha_entrega_aproximada')
+        if not pedido.get('local_id') or not fecha:
+            continue
+        contadores = dias.setdefault((pedido['local_id'], fecha[:10]), {'total_pedidos': 0, 'revenue_diario': Decimal(0)})
+        contadores['total_pedidos'] += 1
+        contadores['revenue_diario'] += Decimal(str(pedido.get('costo') or 0))
+
+    print(f"   📊 Días con pedidos: {len(dias)}")
+
+    if not args.dry_run:
+        with dynamodb.Table(TABLE_ROLLUP_DIARIO).batch_writer() as batch:
+            for (local_id, fecha), contadores in dias.items():
+                batch.put_item(Item={'local_id': local_id, 'fecha': fecha, **contadores})
+
+    print(f"\n   ✅ Días escritos: {0 if args.dry_run else len(dias)}")
+
+
+def _fecha_venta(pedido):
+    """Cierre del último estado del historial o, si falta, la entrega aproximada"""
+    historial = pedido.get('historial_estados') or []
+    for fecha in (historial[-1].get('hora_fin') if historial else None, pedido.get('fecha_entrega_aproximada')):
+        if fecha:
+            try:
+                return datetime.fromisoformat(fecha.replace('Z', '+00:00')).replace(tzinfo=None)
+            except ValueError:
+                continue
+    return None
+
+
+def _ventanas(fecha):
+    """(ventana, expira_en) de un pedido vendido en fecha"""
+    year, week, _ = fecha.isocalendar()
+    claves = {
+        'total': 'total',
+        'dia': f'dia#{fecha:%Y-%m-%d}',
+        'semana': f'semana#{year:04d}-W{week:02d}',
+        'mes': f'mes#{fecha:%Y-%m}',
+    }
+    for tipo, clave in claves.items():
+        retencion = RETENCION_VENTANAS[tipo]
+        yield clave, int((fecha + timedelta(seconds=retencion)).timestamp()) if retencion else None
+
+
+def construir_top_productos(args):
+    """
+    Cuenta de forma exacta unidades y revenue por producto de los pedidos
+    recibidos de la tabla Pedidos y escribe cada ventana con los
+    TOP_PRODUCTOS_CAPACIDAD primeros (error 0), sobrescribiendo los items
+    existentes. Se lee DynamoDB y no el snapshot S3 porque el esquema
+    Parquet no incluye detalle_precios, de donde sale el revenue; los
+    pedidos sin cotización usan el precio actual del producto. Los cambios
+    posteriores llegan por el stream
+    """
+    print("\n🏆 Construyendo top de productos vendidos desde la tabla Pedidos")
+    if args.dry_run:
+        print("   ℹ️  Modo simulación: no se escribirá nada")
+
+    precios = {
+        (p['local_id'], p['nombre']): Decimal(str(p.get('precio') or 0))
+        for p in scan_completo(dynamodb.Table(TABLE_PRODUCTOS), ProjectionExpression='local_id, nombre, precio')
+    }
+
+    ahora = int(time.time())
+    ventanas = {}
+    for pedido in scan_completo(dynamodb.Table(TABLE_PEDIDOS)):
+        local_id = pedido.get('local_id')
+        fecha = _fecha_venta(pedido)
+        if pedido.get('estado') != 'recibido' or not local_id or not fecha:
+            continue
+
+        subtotales = {}
+        for linea in (pedido.get('detalle_precios') or {}).get('lineas', []):
+            if linea.get('tipo') == 'producto':
+                subtotales[linea['id']] = subtotales.get(linea['id'], Decimal(0)) + Decimal(str(linea.get('subtotal') or 0))
+
+        vendidos = {}
+        for producto in pedido.get('productos') or []:
+            if producto.get('nombre'):
+                vendidos[producto['nombre']] = vendidos.get(producto['nombre'], Decimal(0)) + Decimal(str(producto.get('cantidad') or 0))
+        if not vendidos:
+            continue
+
+        for clave, expira_en in _ventanas(fecha):
+            if expira_en and expira_en <= ahora:
+                continue
+            ventana = ventanas.setdefault((local_id, clave), {
+                'contadores': {}, 'total_unidades': Decimal(0), 'total_pedidos': Decimal(0), 'expira_en': expira_en
+            })
+            ventana['total_pedidos'] += 1
+            for nombre, unidades in vendidos.items():
+                if nombre in subtotales:
+                    revenue = subtotales[nombre]
+                else:
+                    revenue = (unidades * precios.get((local_id, nombre), Decimal(0))).quantize(Decimal('0.01'))
+                contador = ventana['contadores'].setdefault(
+                    nombre, {'unidades': Decimal(0), 'error': Decimal(0), 'revenue': Decimal(0), 'pedidos': Decimal(0)}
+                )
+                contador['unidades'] += unidades
+                contador['revenue'] += revenue
+                contador['pedidos'] += 1
+                ventana['total_unidades'] += unidades
+
+    print(f"   📊 Ventanas con ventas: {len(ventanas)}")
+
+    if not args.dry_run:
+        with dynamodb.Table(TABLE_TOP_PRODUCTOS).batch_writer() as batch:
+            for (local_id, clave), ventana in ventanas.items():
+                primeros = sorted(ventana['contadores'].items(), key=lambda par: par[1]['unidades'], reverse=True)
+                item = {
+                    'local_id': local_id,
+                    'ventana': clave,
+                    'contadores': dict(primeros[:TOP_PRODUCTOS_CAPACIDAD]),
+                    'total_unidades': ventana['total_unidades'],
+                    'total_pedidos': ventana['total_pedidos'],
+                    'version': 1,
+                    'actualizado_en': ahora
+                }
+                if ventana['expira_en']:
+                    item['expira_en'] = ventana['expira_en']
+                batch.put_item(Item=item)
+
+    print(f"\n   ✅ Ventanas escritas: {0 if args.dry_run else len(ventanas)}")
+
+
+def _score_empleado(scorecard):
+    """Mismos pesos que utils/scorecard_personal.py"""
+    calificacion = scorecard['calificacion_prom']
+    pedidos = min(scorecard['pedidos_atendidos'] / 100, Decimal(1))
+    resenas = min(scorecard['total_resenas'] / 20, Decimal(1))
+    score = calificacion * Decimal('0.6') + pedidos * 5 * Decimal('0.3') + resenas * 5 * Decimal('0.1')
+    return score.quantize(Decimal('0.01'))
+
+
+def construir_scorecard_personal(args):
+    """
+    Calcula el scorecard de cada empleado (pedidos atendidos, revenue,
+    reseñas y suma de calificaciones) recorriendo Empleados, Pedidos y
+    Reseñas, y lo escribe con su score (sobrescribe los existentes). Los
+    cambios posteriores llegan por el stream
+    """
+    print("\n👥 Construyendo scorecard del personal")
+    if args.dry_run:
+        print("   ℹ️  Modo simulación: no se escribirá nada")
+
+    scorecards = {}
+    for empleado in scan_completo(dynamodb.Table(TABLE_EMPLEADOS)):
+        scorecards[(empleado['local_id'], empleado['dni'])] = {
+            'local_id': empleado['local_id'],
+            'dni': empleado['dni'],
+            'nombre_completo': f"{empleado.get('nombre', '')} {empleado.get('apellido', '')}".strip(),
+            'rol': empleado.get('role'),
+            'sueldo': Decimal(str(empleado.get('sueldo') or 0)),
+            'calificacion_prom': Decimal(str(empleado.get('calificacion_prom') or 0)),
+            'pedidos_atendidos': Decimal(0),
+            'revenue_generado': Decimal(0),
+            'total_resenas': Decimal(0),
+            'suma_calificacion_resenas': Decimal(0),
+        }
+    print(f"   📊 Empleados: {len(scorecards)}")
+
+    for pedido in scan_completo(dynamodb.Table(TABLE_PEDIDOS)):
+        dnis = {(estado.get('empleado') or {}).get('dni') for estado in pedido.get('historial_estados') or []}
+        for dni in dnis:
+            scorecard = scorecards.get((pedido['local_id'], dni))
+            if scorecard:
+                scorecard['pedidos_atendidos'] += 1
+                scorecard['revenue_generado'] += Decimal(str(pedido.get('costo') or 0))
+
+    for resena in scan_completo(dynamodb.Table(TABLE_RESENAS)):
+        for columna in ('cocinero_dni', 'despachador_dni', 'repartidor_dni'):
+            scorecard = scorecards.get((resena['local_id'], resena.get(columna)))
+            if scorecard:
+                scorecard['total_resenas'] += 1
+                scorecard['suma_calificacion_resenas'] += Decimal(str(resena.get('calificacion') or 0))
+
+    if not args.dry_run:
+        ahora = int(time.time())
+        with dynamodb.Table(TABLE_SCORECARD_PERSONAL).batch_writer() as batch:
+            for scorecard in scorecards.values():
+                batch.put_item(Item={
+                    **scorecard,
+                    'score': _score_empleado(scorecard),
+                    'revision': 1,
+                    'actualizado_en': ahora
+                })
+
+    print(f"\n   ✅ Scorecards escritos: {0 if args.dry_run else len(scorecards)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Migraciones de datos de ChinaWok en DynamoDB')
+    subparsers = parser.add_subparsers(dest='comando', required=True)
+
+    historial = subparsers.add_parser(
+        'historial-pedidos',
+        help='Mueve Usuarios.historial_pedidos al índice usuario-fecha-index de Pedidos'
+    )
+    historial.add_argument('--dry-run', action='store_true', help='Solo reporta, no escribe')
+    historial.set_defaults(func=migrar_historial_pedidos)
+
+    legados = subparsers.add_parser(
+        'resolver-legados',
+        help='Convierte entradas de historial_pedidos sin local_id a {pedido_id, local_id}'
+    )
+    legados.add_argument('--dry-run', action='store_true', help='Solo reporta, no escribe')
+    legados.set_defaults(func=resolver_entradas_legadas)
+
+    disponibilidad = subparsers.add_parser(
+        'disponibilidad-empleados',
+        help='Agrega disponible_key a los empleados libres (índice disponibles-index)'
+    )
+    disponibilidad.add_argument('--dry-run', action='store_true', help='Solo reporta, no escribe')
+    disponibilidad.set_defaults(func=indexar_disponibilidad_empleados)
+
+    rollup = subparsers.add_parser(
+        'rollup-diario',
+        help='Construye ChinaWok-Rollup-Diario desde el snapshot de pedidos en S3'
+    )
+    rollup.add_argument('--dry-run', action='store_true', help='Solo reporta, no escribe')
+    rollup.set_defaults(func=construir_rollup_diario)
+
+    top = subparsers.add_parser(
+        'top-productos',
+        help='Construye ChinaWok-Top-Productos desde la tabla Pedidos'
+    )
+    top.add_argument('--dry-run', action='store_true', help='Solo reporta, no escribe')
+    top.set_defaults(func=construir_top_productos)
+
+    scorecard = subparsers.add_parser(
+        'scorecard-personal',
+        help='Construye ChinaWok-Scorecard-Personal desde Empleados, Pedidos y Reseñas'
+    )
+    scorecard.add_argument('--dry-run', action='store_true', help='Solo reporta, no escribe')
+    scorecard.set_defaults(func=construir_scorecard_personal)
+
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("🚀 CHINA WOK - DATA MIGRATOR")
+    print("=" * 60)
+
+    args.func(args)
+
+    print("\n" + "=" * 60)
+    print("🎉 PROCESO COMPLETADO")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
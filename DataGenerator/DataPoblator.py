@@ -33,6 +33,16 @@ TABLE_CONEXIONES = os.getenv('TABLE_CONEXIONES')
 # Carpeta con los datos JSON
 DATA_DIR = "dynamodb_data"
 
+def preparar_empleado(item):
+    """
+    Agrega disponible_key (local_id#role) a los empleados libres para que
+    aparezcan en el índice disperso disponibles-index
+    """
+    if not item.get("ocupado"):
+        item["disponible_key"] = f"{item['local_id']}#{item['role']}"
+    return item
+
+
 # Mapeo de archivos JSON a tablas y sus claves
 TABLE_MAPPING = {
     "locales.json": {
@@ -53,7 +63,19 @@ TABLE_MAPPING = {
     "empleados.json": {
         "table_name": TABLE_EMPLEADOS,
         "pk": "local_id",
-        "sk": "dni"
+        "sk": "dni",
+        "gsis": [
+            # Índice disperso: solo empleados libres, por local y rol, ordenados por calificación
+            {
+                "name": "disponibles-index",
+                "pk": "disponible_key",
+                "sk": "calificacion_prom",
+                "sk_type": "N",
+                "projection": "INCLUDE",
+                "non_key_attributes": ["nombre", "apellido", "role", "ocupado"]
+            }
+        ],
+        "prepare_item": preparar_empleado
     },
     "combos.json": {
         "table_name": TABLE_COMBOS,
@@ -63,7 +85,16 @@ TABLE_MAPPING = {
     "pedidos.json": {
         "table_name": TABLE_PEDIDOS,
         "pk": "local_id",
-        "sk": "pedido_id"
+        "sk": "pedido_id",
+        "gsis": [
+            # Historial de pedidos por usuario (reemplaza Usuarios.historial_pedidos)
+            {
+                "name": "usuario-fecha-index",
+                "pk": "usuario_correo",
+                "sk": "fecha_creacion",
+                "projection": "KEYS_ONLY"
+            }
+        ]
     },
     "ofertas.json": {
         "table_name": TABLE_OFERTAS,
@@ -78,7 +109,11 @@ TABLE_MAPPING = {
     "conexiones.json": {
         "table_name": TABLE_CONEXIONES,
         "pk": "usuario_correo",
-        "sk": "pedido_id"
+        "sk": "pedido_id",
+        "gsis": [
+            # Índice inverso: el $disconnect encuentra las suscripciones de una conexión
+            {"name": "connection-index", "pk": "connection_id", "projection": "KEYS_ONLY"}
+        ]
     }
 }
 
@@ -176,19 +211,52 @@ def enable_streams_on_existing_table(table_name):
         return False
 
 
-def create_table(table_name, pk_name, sk_name=None):
+def build_key_schema(pk_name, sk_name=None, pk_type='S', sk_type='S'):
+    """Construye KeySchema y AttributeDefinitions para una tabla o índice"""
+    key_schema = [{'AttributeName': pk_name, 'KeyType': 'HASH'}]
+    attribute_definitions = [{'AttributeName': pk_name, 'AttributeType': pk_type}]
+    
+    if sk_name:
+        key_schema.append({'AttributeName': sk_name, 'KeyType': 'RANGE'})
+        attribute_definitions.append({'AttributeName': sk_name, 'AttributeType': sk_type})
+    
+    return key_schema, attribute_definitions
+
+
+def build_gsi_key_schema(gsi):
+    """KeySchema y AttributeDefinitions de un GSI configurado en TABLE_MAPPING"""
+    return build_key_schema(gsi["pk"], gsi.get("sk"), gsi.get("pk_type", "S"), gsi.get("sk_type", "S"))
+
+
+def build_gsi_definition(gsi):
+    """Construye la definición de un GSI a partir de su configuración en TABLE_MAPPING"""
+    key_schema, _ = build_gsi_key_schema(gsi)
+    projection = {'ProjectionType': gsi.get("projection", "ALL")}
+    if gsi.get("non_key_attributes"):
+        projection['NonKeyAttributes'] = gsi["non_key_attributes"]
+    
+    return {
+        'IndexName': gsi["name"],
+        'KeySchema': key_schema,
+        'Projection': projection
+    }
+
+
+def create_table(table_name, pk_name, sk_name=None, gsis=None):
     """
     Crea una tabla en DynamoDB con DynamoDB Streams habilitados
     """
     print(f"   📋 Tabla '{table_name}' no existe. Creándola con Streams habilitados...")
     
     # Configuración de claves
-    key_schema = [{'AttributeName': pk_name, 'KeyType': 'HASH'}]
-    attribute_definitions = [{'AttributeName': pk_name, 'AttributeType': 'S'}]
+    key_schema, attribute_definitions = build_key_schema(pk_name, sk_name)
     
-    if sk_name:
-        key_schema.append({'AttributeName': sk_name, 'KeyType': 'RANGE'})
-        attribute_definitions.append({'AttributeName': sk_name, 'AttributeType': 'S'})
+    # Los atributos de los GSIs también deben declararse
+    for gsi in gsis or []:
+        _, gsi_attributes = build_gsi_key_schema(gsi)
+        for attribute in gsi_attributes:
+            if attribute not in attribute_definitions:
+                attribute_definitions.append(attribute)
     
     try:
         table_config = {
@@ -203,6 +271,9 @@ def create_table(table_name, pk_name, sk_name=None):
             }
         }
         
+        if gsis:
+            table_config['GlobalSecondaryIndexes'] = [build_gsi_definition(gsi) for gsi in gsis]
+        
         table = dynamodb.create_table(**table_config)
         
         print(f"   ⏳ Esperando a que la tabla '{table_name}' esté activa...")
@@ -231,6 +302,53 @@ def create_table(table_name, pk_name, sk_name=None):
         return False
 
 
+def ensure_gsis_on_existing_table(table_name, gsis):
+    """
+    Crea en una tabla existente los GSIs configurados que aún no existan.
+    DynamoDB solo permite crear un GSI por llamada a update_table, por lo que
+    se crean de uno en uno esperando a que cada índice esté ACTIVE
+    """
+    if not gsis:
+        return True
+    
+    try:
+        description = dynamodb_client.describe_table(TableName=table_name)['Table']
+        existing = {gsi['IndexName'] for gsi in description.get('GlobalSecondaryIndexes', [])}
+        
+        for gsi in gsis:
+            if gsi["name"] in existing:
+                print(f"   ✅ Índice '{gsi['name']}' ya existe en '{table_name}'")
+                continue
+            
+            print(f"   🔄 Creando índice '{gsi['name']}' en '{table_name}'...")
+            _, attribute_definitions = build_gsi_key_schema(gsi)
+            dynamodb_client.update_table(
+                TableName=table_name,
+                AttributeDefinitions=attribute_definitions,
+                GlobalSecondaryIndexUpdates=[{'Create': build_gsi_definition(gsi)}]
+            )
+            
+            # Esperar a que el backfill del índice termine
+            while True:
+                time.sleep(10)
+                description = dynamodb_client.describe_table(TableName=table_name)['Table']
+                status = next(
+                    (i['IndexStatus'] for i in description.get('GlobalSecondaryIndexes', []) if i['IndexName'] == gsi["name"]),
+                    None
+                )
+                if status == 'ACTIVE':
+                    break
+                print(f"   ⏳ Índice '{gsi['name']}' en estado {status}...")
+            
+            print(f"   ✅ Índice '{gsi['name']}' creado exitosamente")
+        
+        return True
+        
+    except ClientError as e:
+        print(f"   ⚠️  Error creando índices: {e.response['Error']['Message']}")
+        return False
+
+
 def load_json_file(filename):
     """
     Carga un archivo JSON y retorna su contenido
@@ -418,7 +536,7 @@ def populate_table(dynamodb, filename, table_config, global_action=None):
     
     # Verificar si la tabla existe, si no, crearla
     if not table_exists(table_name):
-        if not create_table(table_name, pk_name, sk_name):
+        if not create_table(table_name, pk_name, sk_name, table_config.get("gsis")):
             print(f"   ❌ No se pudo crear la tabla '{table_name}'. Saltando...")
             return False
         time.sleep(2)
@@ -428,6 +546,9 @@ def populate_table(dynamodb, filename, table_config, global_action=None):
         # 🆕 HABILITAR STREAMS SI NO ESTÁN HABILITADOS
         enable_streams_on_existing_table(table_name)
         
+        # Crear los GSIs que falten (tablas creadas antes de declararlos)
+        ensure_gsis_on_existing_table(table_name, table_config.get("gsis"))
+        
         # Si hay una acción global definida y es "replace", limpiar la tabla
         if global_action == "replace":
             try:
@@ -460,6 +581,10 @@ def populate_table(dynamodb, filename, table_config, global_action=None):
         print(f"   ⚠️  El archivo está vacío, no hay datos para insertar")
         return True
     
+    # Atributos derivados (p. ej. claves de índices dispersos)
+    if table_config.get("prepare_item"):
+        items = [table_config["prepare_item"](item) for item in items]
+    
     print(f"   📊 Total de items a insertar: {len(items)}")
     
     try:
@@ -50,8 +50,7 @@ class UsuariosGenerator:
             "apellido": Config.ADMIN_APELLIDO,
             "correo": Config.ADMIN_EMAIL,
             "contrasena": Config.ADMIN_PASSWORD,
-            "role": "Admin",
-            "historial_pedidos": []
+            "role": "Admin"
         }
     
     @classmethod
@@ -63,8 +62,7 @@ class UsuariosGenerator:
             "correo": gerente_data["correo"],
             "contrasena": gerente_data["contrasena"],
             "role": "Gerente",
-            "local_id": local_id,  # Asociar gerente con su local
-            "historial_pedidos": []
+            "local_id": local_id  # Asociar gerente con su local
         }
     
     @classmethod
@@ -79,8 +77,7 @@ class UsuariosGenerator:
             "correo": f"{nombre.lower()}.{apellido.lower()}{index}@email.com",
             "telefono": f"+51{random.randint(900000000, 999999999)}",
             "contrasena": f"cliente{index:04d}",
-            "role": "Cliente",  # Primera letra mayúscula
-            "historial_pedidos": []  # Array vacío por defecto
+            "role": "Cliente"  # Primera letra mayúscula
         }
         
         # 70% de los clientes tienen información bancaria COMPLETA
@@ -5,7 +5,7 @@ Utilidades compartidas para todos los microservicios de ChinaWok
 # Importar los principales módulos para facilitar su uso
 from .logger import get_logger
 from .json_encoder import json_dumps, DecimalEncoder
-from .dynamodb_client import get_dynamodb_resource, get_table_data
+from .dynamodb_client import get_dynamodb_resource, get_table_data, batch_get_items
 from .s3_client import upload_to_s3, list_s3_files, delete_old_versions
 from .athena_client import AthenaQueryExecutor
 from .jwt_utils import generar_token, validar_token, verificar_rol
@@ -21,6 +21,10 @@ from .authentication_utils import (
 )
 from .cors_utils import get_cors_headers
 
+# Los módulos que crean clientes boto3 al importarse (caché de Athena, agregados
+# del stream, change-log, cola de trabajo, idempotencia) se importan directo
+# desde su módulo para no cargarlos en cada Lambda
+
 __all__ = [
     # Logger
     'get_logger',
@@ -30,6 +34,7 @@ __all__ = [
     # DynamoDB
     'get_dynamodb_resource',
     'get_table_data',
+    'batch_get_items',
     # S3
     'upload_to_s3',
     'list_s3_files',
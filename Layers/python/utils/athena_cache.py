@@ -0,0 +1,514 @@
+"""
+Caché de resultados de Athena
+La clave es el hash de la query normalizada más la versión de datos de cada
+tabla que lee; el compactador sube la versión de una tabla cuando reescribe
+su snapshot, así que un resultado cacheado vale mientras los datos no cambien
+
+También guarda los jobs asíncronos (JOB#QueryExecutionId) con sus
+parámetros, para que el cliente consulte estado y resultados después
+"""
+
+import boto3
+import hashlib
+import json
+import os
+import re
+import time
+import uuid
+from typing import Any, Dict, Iterable, List, Optional
+
+from .athena_client import AthenaQueryExecutor, RESULTS_PAGE_SIZE, string_parameter
+from .delta_log import TABLE_MAPPING
+from .dynamodb_client import batch_get_items
+
+dynamodb = boto3.resource('dynamodb')
+s3_client = boto3.client('s3')
+
+# Tabla con TTL sobre el atributo expira_en (PK cache_id)
+TABLE_ATHENA_CACHE = os.environ.get('TABLE_ATHENA_CACHE', 'ChinaWok-Athena-Cache')
+
+# Vigencia máxima de un resultado aunque los datos no cambien
+# (acota consultas que dependen de CURRENT_TIMESTAMP)
+ATHENA_CACHE_TTL_SEGUNDOS = int(os.environ.get('ATHENA_CACHE_TTL_SEGUNDOS', 60 * 60))
+
+# Resultados más grandes se guardan en S3 (límite de item de DynamoDB: 400 KB)
+ATHENA_CACHE_MAX_INLINE_BYTES = 300 * 1024
+S3_CACHE_PREFIX = os.environ.get('S3_ATHENA_CACHE_PREFIX', 'athena-cache')
+
+# Tiempo que un job asíncrono puede consultarse (Athena conserva los resultados en S3)
+ATHENA_JOB_TTL_SEGUNDOS = int(os.environ.get('ATHENA_JOB_TTL_SEGUNDOS', 24 * 60 * 60))
+
+ESTADOS_EN_CURSO = ['QUEUED', 'RUNNING']
+
+# Estados de una ejecución que no se reutiliza aunque Athena la devuelva por su token
+ESTADOS_FALLIDOS = ['FAILED', 'CANCELLED']
+
+# Locales por query agrupada (IN con un '?' por local en cada predicado)
+LOCALES_POR_CONSULTA = int(os.environ.get('ATHENA_LOCALES_POR_CONSULTA', 50))
+
+# Filtro de la query individual de un local: su clave de caché es la que
+# reutilizan las consultas agrupadas al repartir las filas
+FILTRO_LOCAL = '= ?'
+
+TABLAS_ANALITICA = set(TABLE_MAPPING.values())
+
+_PATRON_TABLAS = re.compile(r'\b(?:FROM|JOIN)\s+([A-Za-z_][A-Za-z0-9_]*)', re.IGNORECASE)
+
+
+def normalizar_query(query: str) -> str:
+    """Quita comentarios, espacios repetidos y el ';' final"""
+    sin_comentarios = re.sub(r'--[^\n]*', '', query)
+    return ' '.join(sin_comentarios.split()).rstrip(';').strip()
+
+
+def tablas_de_query(query: str) -> List[str]:
+    """Tablas de analítica que aparecen en FROM/JOIN"""
+    return sorted({t.lower() for t in _PATRON_TABLAS.findall(query)} & TABLAS_ANALITICA)
+
+
+def _clave_version(table_key: str) -> Dict[str, str]:
+    return {'cache_id': f'VERSION#{table_key}'}
+
+
+def obtener_versiones(tablas: Iterable[str]) -> Dict[str, int]:
+    """Versión de datos de cada tabla (0 si nunca se compactó) en un solo BatchGetItem"""
+    tablas = sorted(set(tablas))
+    if not tablas:
+        return {}
+
+    items = batch_get_items({
+        TABLE_ATHENA_CACHE: {'Keys': [_clave_version(t) for t in tablas]}
+    }).get(TABLE_ATHENA_CACHE, [])
+
+    versiones = {t: 0 for t in tablas}
+    for item in items:
+        versiones[item['cache_id'].split('#', 1)[1]] = int(item.get('version', 0))
+    return versiones
+
+
+def incrementar_version(table_key: str) -> int:
+    """Invalida los resultados cacheados que leen la tabla"""
+    response = dynamodb.Table(TABLE_ATHENA_CACHE).update_item(
+        Key=_clave_version(table_key),
+        UpdateExpression='ADD #version :uno SET actualizado_en = :ahora',
+        ExpressionAttributeNames={'#version': 'version'},
+        ExpressionAttributeValues={':uno': 1, ':ahora': int(time.time())},
+        ReturnValues='UPDATED_NEW'
+    )
+    return int(response['Attributes']['version'])
+
+
+def clave_cache(query: str, versiones: Dict[str, int], parametros_sql: Optional[List[str]] = None) -> str:
+    """Hash de la query normalizada, sus parámetros de ejecución y las versiones de sus tablas"""
+    material = normalizar_query(query) + '|' + json.dumps(versiones, sort_keys=True)
+    if parametros_sql:
+        material += '|' + json.dumps(parametros_sql)
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+
+def _leer_resultado(item: Dict[str, Any]) -> Optional[List[Dict[str, Any]]]:
+    if 'resultado' in item:
+        return json.loads(item['resultado'])
+    if 's3_key' in item:
+        response = s3_client.get_object(Bucket=os.environ.get('S3_BUCKET_NAME'), Key=item['s3_key'])
+        return json.loads(response['Body'].read())
+    return None
+
+
+def _guardar_resultado(clave: str, resultado: List[Dict[str, Any]], versiones: Dict[str, int], ttl: int):
+    contenido = json.dumps(resultado, ensure_ascii=False)
+    item = {
+        'cache_id': f'QUERY#{clave}',
+        'versiones': versiones,
+        'creado_en': int(time.time()),
+        'expira_en': int(time.time()) + ttl
+    }
+
+    if len(contenido.encode('utf-8')) <= ATHENA_CACHE_MAX_INLINE_BYTES:
+        item['resultado'] = contenido
+    else:
+        s3_key = f'{S3_CACHE_PREFIX}/{clave}.json'
+        s3_client.put_object(
+            Bucket=os.environ.get('S3_BUCKET_NAME'),
+            Key=s3_key,
+            Body=contenido.encode('utf-8'),
+            ContentType='application/json'
+        )
+        item['s3_key'] = s3_key
+
+    dynamodb.Table(TABLE_ATHENA_CACHE).put_item(Item=item)
+
+
+def _token(clave: str, ttl: int) -> str:
+    """Un ClientRequestToken por clave y ventana de TTL: al vencer se vuelve a ejecutar"""
+    return hashlib.sha256(f'{clave}|{int(time.time()) // ttl}'.encode('utf-8')).hexdigest()
+
+
+def _iniciar_query(
+    executor: AthenaQueryExecutor,
+    query: str,
+    token: str,
+    parametros_sql: Optional[List[str]] = None
+) -> str:
+    """
+    Inicia la query con el ClientRequestToken de su clave. Si Athena devuelve
+    una ejecución previa con ese token que falló o se canceló, la relanza con
+    un token nuevo: si no, todas las peticiones de la ventana de TTL
+    recibirían el mismo error
+    """
+    query_execution_id = executor.start_query(query, client_request_token=token, execution_parameters=parametros_sql)
+
+    estado = executor.get_query_execution(query_execution_id)['Status']['State']
+    if estado not in ESTADOS_FALLIDOS:
+        return query_execution_id
+
+    print(f'⚠️  Ejecución {query_execution_id} en estado {estado} para el token; se relanza')
+    reintento = hashlib.sha256(f'{token}|{uuid.uuid4()}'.encode('utf-8')).hexdigest()
+    return executor.start_query(query, client_request_token=reintento, execution_parameters=parametros_sql)
+
+
+def _preparar(
+    query: str,
+    tablas: Optional[Iterable[str]],
+    ttl_segundos: Optional[int],
+    parametros_sql: Optional[List[str]] = None
+):
+    """(ttl, versiones, clave de caché, ClientRequestToken) de una query"""
+    ttl = ttl_segundos or ATHENA_CACHE_TTL_SEGUNDOS
+    tablas = tablas_de_query(query) if tablas is None else tablas
+    versiones = obtener_versiones(tablas)
+    clave = clave_cache(query, versiones, parametros_sql)
+    return ttl, versiones, clave, _token(clave, ttl)
+
+
+def _buscar_en_cache(clave: str, versiones: Dict[str, int]) -> Optional[List[Dict[str, Any]]]:
+    """Resultado vigente de la clave, o None (los errores de la caché no se propagan)"""
+    try:
+        item = dynamodb.Table(TABLE_ATHENA_CACHE).get_item(Key={'cache_id': f'QUERY#{clave}'}).get('Item')
+        if item and int(item.get('expira_en', 0)) > int(time.time()):
+            resultado = _leer_resultado(item)
+            if resultado is not None:
+                print(f'⚡ Caché de Athena: hit {clave[:12]} (versiones {versiones})')
+                return resultado
+    except Exception as e:
+        print(f'⚠️  Error leyendo caché de Athena: {str(e)}')
+    return None
+
+
+def ejecutar_query_cacheada(
+    query: str,
+    tablas: Optional[Iterable[str]] = None,
+    ttl_segundos: Optional[int] = None,
+    executor: Optional[AthenaQueryExecutor] = None,
+    parametros_sql: Optional[List[str]] = None
+) -> List[Dict[str, Any]]:
+    """
+    Ejecuta una query de Athena devolviendo el resultado cacheado si los datos
+    de sus tablas no cambiaron
+
+    Las peticiones idénticas concurrentes comparten una sola ejecución: el
+    ClientRequestToken de Athena se deriva de la clave de caché, y Athena
+    devuelve la misma QueryExecutionId para el mismo token (salvo que haya
+    fallado, ver _iniciar_query)
+
+    Args:
+        query: SQL a ejecutar
+        tablas: Tablas que lee la query (por defecto se detectan en FROM/JOIN)
+        ttl_segundos: Vigencia del resultado (por defecto ATHENA_CACHE_TTL_SEGUNDOS)
+        executor: AthenaQueryExecutor a reutilizar
+        parametros_sql: Valores de los '?' de la query (ExecutionParameters)
+
+    Returns:
+        list: Filas como diccionarios (igual que AthenaQueryExecutor.execute_query)
+    """
+    ttl, versiones, clave, token = _preparar(query, tablas, ttl_segundos, parametros_sql)
+
+    resultado = _buscar_en_cache(clave, versiones)
+    if resultado is not None:
+        return resultado
+
+    executor = executor or AthenaQueryExecutor()
+    resultado = list(executor.iter_execution(_iniciar_query(executor, query, token, parametros_sql)))
+
+    try:
+        _guardar_resultado(clave, resultado, versiones, ttl)
+    except Exception as e:
+        print(f'⚠️  Error guardando caché de Athena: {str(e)}')
+
+    return resultado
+
+
+def enviar_query_cacheada(
+    query: str,
+    parametros: Optional[Dict[str, Any]] = None,
+    tablas: Optional[Iterable[str]] = None,
+    ttl_segundos: Optional[int] = None,
+    executor: Optional[AthenaQueryExecutor] = None,
+    parametros_sql: Optional[List[str]] = None
+) -> Dict[str, Any]:
+    """
+    Versión asíncrona de ejecutar_query_cacheada: con un hit de caché retorna
+    el resultado; si no, inicia la query sin esperarla y guarda el job
+    (JOB#QueryExecutionId) con sus parámetros para consultar_job
+
+    Returns:
+        dict: {'estado': 'SUCCEEDED', 'resultado': filas} o
+              {'estado': 'QUEUED', 'job_id': QueryExecutionId}
+    """
+    ttl, versiones, clave, token = _preparar(query, tablas, ttl_segundos, parametros_sql)
+
+    resultado = _buscar_en_cache(clave, versiones)
+    if resultado is not None:
+        return {'estado': 'SUCCEEDED', 'resultado': resultado}
+
+    executor = executor or AthenaQueryExecutor()
+    job_id = _iniciar_query(executor, query, token, parametros_sql)
+
+    ahora = int(time.time())
+    dynamodb.Table(TABLE_ATHENA_CACHE).put_item(Item={
+        'cache_id': f'JOB#{job_id}',
+        'clave': clave,
+        'versiones': versiones,
+        'ttl_resultado': ttl,
+        'parametros': parametros or {},
+        'creado_en': ahora,
+        'expira_en': ahora + ATHENA_JOB_TTL_SEGUNDOS
+    })
+
+    return {'estado': 'QUEUED', 'job_id': job_id}
+
+
+def consultar_job(
+    job_id: str,
+    next_token: Optional[str] = None,
+    max_resultados: int = RESULTS_PAGE_SIZE,
+    executor: Optional[AthenaQueryExecutor] = None
+) -> Optional[Dict[str, Any]]:
+    """
+    Estado de un job asíncrono y, si terminó, una página de resultados.
+    Un resultado que cabe en una sola página se guarda también en la caché
+    (repartido por local si es un job agrupado), así la siguiente petición
+    igual no vuelve a Athena
+
+    Returns:
+        dict: job_id, estado, parametros y, si terminó, resultados y
+              next_token (o error si falló). None si el job no existe o venció
+    """
+    job = dynamodb.Table(TABLE_ATHENA_CACHE).get_item(Key={'cache_id': f'JOB#{job_id}'}).get('Item')
+    if not job or int(job.get('expira_en', 0)) <= int(time.time()):
+        return None
+
+    executor = executor or AthenaQueryExecutor()
+    execution = executor.get_query_execution(job_id)
+    estado = execution['Status']['State']
+
+    respuesta = {'job_id': job_id, 'estado': estado, 'parametros': job.get('parametros', {})}
+
+    if estado in ESTADOS_EN_CURSO:
+        return respuesta
+
+    if estado != 'SUCCEEDED':
+        respuesta['error'] = execution['Status'].get('StateChangeReason', 'Unknown')
+        return respuesta
+
+    filas, siguiente = executor.get_results_page(job_id, next_token, max_resultados)
+    respuesta['resultados'] = filas
+    respuesta['next_token'] = siguiente
+
+    if not next_token and not siguiente:
+        versiones = job.get('versiones', {})
+        ttl = int(job['ttl_resultado'])
+        if 'claves_locales' in job:
+            # Job agrupado de enviar_query_por_local: caché por local
+            _repartir_por_local(filas, job['claves_locales'], versiones, ttl)
+        else:
+            try:
+                _guardar_resultado(job['clave'], filas, versiones, ttl)
+            except Exception as e:
+                print(f'⚠️  Error guardando caché de Athena: {str(e)}')
+
+    return respuesta
+
+
+def consulta_local(plantilla: str) -> str:
+    """Query individual de una plantilla con {filtro} en cada predicado de local_id"""
+    return plantilla.format(filtro=FILTRO_LOCAL)
+
+
+def parametros_local(plantilla: str, local_id: str) -> List[str]:
+    """Parámetros de ejecución de la query individual de un local"""
+    return [string_parameter(local_id)] * plantilla.count('{filtro}')
+
+
+def _locales_en_cache(plantilla: str, locales: List[str], versiones: Dict[str, int]):
+    """
+    Resultados vigentes de la query individual de cada local (un BatchGetItem)
+
+    Returns:
+        tuple: (local_id -> filas de los locales en caché, local_id -> clave individual)
+    """
+    individual = consulta_local(plantilla)
+    claves = {
+        local_id: clave_cache(individual, versiones, parametros_local(plantilla, local_id))
+        for local_id in locales
+    }
+
+    resultados = {}
+    try:
+        items = batch_get_items({
+            TABLE_ATHENA_CACHE: {'Keys': [{'cache_id': f'QUERY#{clave}'} for clave in claves.values()]}
+        }).get(TABLE_ATHENA_CACHE, []) if claves else []
+        vigentes = {
+            item['cache_id'].split('#', 1)[1]: item
+            for item in items if int(item.get('expira_en', 0)) > int(time.time())
+        }
+        for local_id, clave in claves.items():
+            if clave in vigentes:
+                resultado = _leer_resultado(vigentes[clave])
+                if resultado is not None:
+                    resultados[local_id] = resultado
+    except Exception as e:
+        print(f'⚠️  Error leyendo caché de Athena: {str(e)}')
+
+    print(f'⚡ Caché de Athena: {len(resultados)} de {len(locales)} locales (versiones {versiones})')
+    return resultados, claves
+
+
+def _iniciar_grupos(
+    plantilla: str,
+    locales: List[str],
+    versiones: Dict[str, int],
+    ttl: int,
+    executor: AthenaQueryExecutor
+) -> List[tuple]:
+    """
+    Inicia una query 'IN (?, ...)' por cada LOCALES_POR_CONSULTA locales
+
+    Returns:
+        list: [(QueryExecutionId, clave de la query agrupada, locales del grupo)]
+    """
+    predicados = plantilla.count('{filtro}')
+    grupos = []
+    for i in range(0, len(locales), LOCALES_POR_CONSULTA):
+        grupo = locales[i:i + LOCALES_POR_CONSULTA]
+        query = plantilla.format(filtro='IN (' + ', '.join('?' for _ in grupo) + ')')
+        parametros = [string_parameter(local_id) for local_id in grupo] * predicados
+        clave = clave_cache(query, versiones, parametros)
+        query_execution_id = _iniciar_query(executor, query, _token(clave, ttl), parametros)
+        grupos.append((query_execution_id, clave, grupo))
+    return grupos
+
+
+def _repartir_por_local(
+    filas: Iterable[Dict[str, Any]],
+    claves: Dict[str, str],
+    versiones: Dict[str, int],
+    ttl: int
+) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Reparte las filas de una query agrupada por local_id y guarda cada local
+    bajo la clave de su query individual (claves: local_id -> clave)
+    """
+    filas_por_local = {local_id: [] for local_id in claves}
+    for fila in filas:
+        filas_por_local.setdefault(fila['local_id'], []).append(fila)
+
+    for local_id, clave in claves.items():
+        try:
+            _guardar_resultado(clave, filas_por_local[local_id], versiones, ttl)
+        except Exception as e:
+            print(f'⚠️  Error guardando caché de Athena ({local_id}): {str(e)}')
+
+    return filas_por_local
+
+
+def ejecutar_query_por_local(
+    plantilla: str,
+    locales: List[str],
+    tablas: Optional[Iterable[str]] = None,
+    ttl_segundos: Optional[int] = None,
+    executor: Optional[AthenaQueryExecutor] = None
+) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Ejecuta una plantilla para varios locales con pocas queries agrupadas y
+    reparte las filas por local_id
+
+    - Los locales con resultado vigente en la caché de su query individual
+      (filtro '= ?') no vuelven a Athena (un BatchGetItem)
+    - Los demás se consultan en grupos de LOCALES_POR_CONSULTA con
+      'IN (?, ...)' y parámetros de ejecución; los grupos se inician a la vez
+    - El resultado de cada local se guarda bajo la clave de su query
+      individual, así las peticiones posteriores de un solo local lo reutilizan
+
+    Args:
+        plantilla: SQL con {filtro} en cada predicado sobre local_id
+        locales: Locales a consultar. local_id es una partición inyectada en
+            pedidos y resenas, así que siempre se filtra por valores concretos
+            (para todos, los de la tabla Locales)
+
+    Returns:
+        dict: local_id -> filas
+    """
+    ttl = ttl_segundos or ATHENA_CACHE_TTL_SEGUNDOS
+    tablas = tablas_de_query(plantilla) if tablas is None else tablas
+    versiones = obtener_versiones(tablas)
+    executor = executor or AthenaQueryExecutor()
+
+    locales = list(dict.fromkeys(locales))
+    resultados, claves = _locales_en_cache(plantilla, locales, versiones)
+    faltantes = [local_id for local_id in locales if local_id not in resultados]
+
+    for query_execution_id, _, grupo in _iniciar_grupos(plantilla, faltantes, versiones, ttl, executor):
+        resultados.update(_repartir_por_local(
+            executor.iter_execution(query_execution_id),
+            {local_id: claves[local_id] for local_id in grupo},
+            versiones,
+            ttl
+        ))
+
+    return resultados
+
+
+def enviar_query_por_local(
+    plantilla: str,
+    locales: List[str],
+    parametros: Optional[Dict[str, Any]] = None,
+    tablas: Optional[Iterable[str]] = None,
+    ttl_segundos: Optional[int] = None,
+    executor: Optional[AthenaQueryExecutor] = None
+) -> Dict[str, Any]:
+    """
+    Versión asíncrona de ejecutar_query_por_local: retorna los locales en
+    caché e inicia sin esperar las queries agrupadas de los demás, guardando
+    un job por grupo. Al terminar, consultar_job guarda el resultado de cada
+    local del grupo bajo la clave de su query individual
+
+    Returns:
+        dict: {'resultados': local_id -> filas,
+               'jobs': [{'job_id': QueryExecutionId, 'locales': [...]}]}
+    """
+    ttl = ttl_segundos or ATHENA_CACHE_TTL_SEGUNDOS
+    tablas = tablas_de_query(plantilla) if tablas is None else tablas
+    versiones = obtener_versiones(tablas)
+    executor = executor or AthenaQueryExecutor()
+
+    locales = list(dict.fromkeys(locales))
+    resultados, claves = _locales_en_cache(plantilla, locales, versiones)
+    faltantes = [local_id for local_id in locales if local_id not in resultados]
+
+    jobs = []
+    ahora = int(time.time())
+    for job_id, clave, grupo in _iniciar_grupos(plantilla, faltantes, versiones, ttl, executor):
+        dynamodb.Table(TABLE_ATHENA_CACHE).put_item(Item={
+            'cache_id': f'JOB#{job_id}',
+            'clave': clave,
+            'claves_locales': {local_id: claves[local_id] for local_id in grupo},
+            'versiones': versiones,
+            'ttl_resultado': ttl,
+            'parametros': {**(parametros or {}), 'locales': grupo},
+            'creado_en': ahora,
+            'expira_en': ahora + ATHENA_JOB_TTL_SEGUNDOS
+        })
+        jobs.append({'job_id': job_id, 'locales': grupo})
+
+    return {'resultados': resultados, 'jobs': jobs}
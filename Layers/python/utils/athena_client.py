@@ -1,20 +1,82 @@
 import boto3
+import csv
+import codecs
 import time
 import os
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Iterator, Tuple
+
+# Clientes reutilizados entre invocaciones del mismo contenedor Lambda
+_athena_client = None
+_s3_client = None
+
+# Polling con backoff exponencial: la mayoría de consultas pequeñas terminan
+# en menos de un segundo, las grandes no necesitan sondeos tan frecuentes
+POLL_INITIAL_DELAY = 0.1
+POLL_MAX_DELAY = 2.0
+POLL_BACKOFF = 1.5
+QUERY_TIMEOUT_SECONDS = int(os.environ.get('ATHENA_QUERY_TIMEOUT_SECONDS', 120))
+
+# Máximo de filas por página de GetQueryResults
+RESULTS_PAGE_SIZE = 1000
+
+INTEGER_TYPES = {'tinyint', 'smallint', 'integer', 'int', 'bigint'}
+FLOAT_TYPES = {'float', 'real', 'double', 'decimal'}
+
+
+def _get_region():
+    # Boto3 lee automáticamente de ~/.aws/config y ~/.aws/credentials
+    # Si no encuentra región, usa us-east-1 por defecto
+    return boto3.Session().region_name or os.environ.get('AWS_REGION', 'us-east-1')
+
+
+def get_athena_client():
+    """Retorna un cliente de Athena compartido"""
+    global _athena_client
+    if _athena_client is None:
+        _athena_client = boto3.client('athena', region_name=_get_region())
+    return _athena_client
+
+
+def get_s3_client():
+    """Retorna un cliente de S3 compartido (lectura de resultados CSV)"""
+    global _s3_client
+    if _s3_client is None:
+        _s3_client = boto3.client('s3', region_name=_get_region())
+    return _s3_client
+
+
+def convert_value(value: Optional[str], athena_type: str) -> Any:
+    """Convierte el VarCharValue de Athena al tipo Python de la columna"""
+    if value is None:
+        return None
+    athena_type = athena_type.lower()
+    try:
+        if athena_type in INTEGER_TYPES:
+            return int(value)
+        if athena_type in FLOAT_TYPES:
+            return float(value)
+    except ValueError:
+        return value
+    if athena_type == 'boolean':
+        return value.lower() == 'true'
+    return value
+
+
+def string_parameter(value: str) -> str:
+    """
+    Literal VARCHAR para ExecutionParameters: Athena sustituye cada '?' por el
+    literal tal cual, así que el valor va entre comillas con las internas escapadas
+    """
+    return "'" + str(value).replace("'", "''") + "'"
+
 
 class AthenaQueryExecutor:
     def __init__(self):
-        # Boto3 lee automáticamente de ~/.aws/config y ~/.aws/credentials
-        # Si no encuentra región, usa us-east-1 por defecto
-        session = boto3.Session()
-        region = session.region_name or os.environ.get('AWS_REGION', 'us-east-1')
-        
-        self.client = boto3.client('athena', region_name=region)
-        
+        self.client = get_athena_client()
+
         # Leer variables de entorno con valores por defecto seguros
         self.database = os.environ.get('ATHENA_DATABASE', 'chinawok_analytics')
-        
+
         # Construir la URI completa de S3 a partir del path
         output_path = os.environ.get('S3_BUCKET_NAME') + '/athena-results/'
         # Si ya comienza con s3://, usar tal cual; si no, agregar el prefijo
@@ -24,71 +86,175 @@ class AthenaQueryExecutor:
             # Remover posibles barras iniciales y asegurar barra final
             output_path = output_path.strip('/')
             self.output_location = f's3://{output_path}/'
-        
+
         self.workgroup = 'primary'
-        
-        print(f"Athena Client inicializado - Region: {region}, Database: {self.database}, Workgroup: {self.workgroup}")
-        print(f"Output Location: {self.output_location}")
-    
-    def execute_query(self, query_string: str) -> List[Dict[str, Any]]:
-        """Ejecuta una consulta en Athena y retorna los resultados"""
+
+    def start_query(
+        self,
+        query_string: str,
+        client_request_token: Optional[str] = None,
+        execution_parameters: Optional[List[str]] = None
+    ) -> str:
+        """
+        Inicia una consulta y retorna su QueryExecutionId
+
+        Con client_request_token, las llamadas repetidas con el mismo token
+        reciben la misma ejecución en lugar de lanzar otra. execution_parameters
+        reemplaza en orden los '?' de la consulta (ver string_parameter)
+        """
+        kwargs = {
+            'QueryString': query_string,
+            'QueryExecutionContext': {'Database': self.database},
+            'ResultConfiguration': {'OutputLocation': self.output_location},
+            'WorkGroup': self.workgroup
+        }
+        if client_request_token:
+            kwargs['ClientRequestToken'] = client_request_token
+        if execution_parameters:
+            kwargs['ExecutionParameters'] = execution_parameters
+
+        query_execution_id = self.client.start_query_execution(**kwargs)['QueryExecutionId']
+        print(f"Query iniciada: {query_execution_id}")
+        return query_execution_id
+
+    def execute_query(
+        self,
+        query_string: str,
+        client_request_token: Optional[str] = None,
+        from_s3: bool = False,
+        execution_parameters: Optional[List[str]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Ejecuta una consulta en Athena y retorna todas las filas
+
+        Args:
+            query_string: SQL a ejecutar
+            client_request_token: Token de idempotencia de Athena
+            from_s3: Leer el CSV de resultados directamente de S3 (conjuntos grandes)
+            execution_parameters: Valores de los '?' de la consulta, en orden
+        """
         try:
-            # Iniciar ejecución de consulta
-            response = self.client.start_query_execution(
-                QueryString=query_string,
-                QueryExecutionContext={'Database': self.database},
-                ResultConfiguration={'OutputLocation': self.output_location},
-                WorkGroup=self.workgroup
-            )
-            
-            query_execution_id = response['QueryExecutionId']
-            print(f"Query iniciada: {query_execution_id}")
-            
-            # Esperar a que termine la ejecución
-            self._wait_for_query_completion(query_execution_id)
-            
-            # Obtener resultados
-            results = self._get_query_results(query_execution_id)
-            return results
-            
+            return list(self.iter_query(query_string, client_request_token, from_s3, execution_parameters))
         except Exception as e:
             print(f"Error ejecutando query en Athena: {str(e)}")
             raise
-    
-    def _wait_for_query_completion(self, query_execution_id: str, max_attempts: int = 60):
-        """Espera a que la query termine de ejecutarse"""
-        for _ in range(max_attempts):
-            response = self.client.get_query_execution(QueryExecutionId=query_execution_id)
-            status = response['QueryExecution']['Status']['State']
-            
-            print(f"Estado de query {query_execution_id}: {status}")
-            
+
+    def iter_query(
+        self,
+        query_string: str,
+        client_request_token: Optional[str] = None,
+        from_s3: bool = False,
+        execution_parameters: Optional[List[str]] = None
+    ) -> Iterator[Dict[str, Any]]:
+        """Ejecuta una consulta y produce las filas a medida que se leen"""
+        query_execution_id = self.start_query(query_string, client_request_token, execution_parameters)
+        yield from self.iter_execution(query_execution_id, from_s3)
+
+    def iter_execution(self, query_execution_id: str, from_s3: bool = False) -> Iterator[Dict[str, Any]]:
+        """
+        Espera una consulta ya iniciada y produce sus filas; permite iniciar
+        varias con start_query y esperarlas después, en paralelo en Athena
+        """
+        execution = self._wait_for_query_completion(query_execution_id)
+
+        if from_s3:
+            yield from self.iter_results_from_s3(execution)
+        else:
+            yield from self.iter_query_results(query_execution_id)
+
+    def _wait_for_query_completion(self, query_execution_id: str, timeout: int = QUERY_TIMEOUT_SECONDS) -> Dict[str, Any]:
+        """Espera a que la query termine y retorna su QueryExecution"""
+        deadline = time.monotonic() + timeout
+        delay = POLL_INITIAL_DELAY
+
+        while True:
+            execution = self.get_query_execution(query_execution_id)
+            status = execution['Status']['State']
+
             if status == 'SUCCEEDED':
-                return True
+                stats = execution.get('Statistics', {})
+                print(
+                    f"Query {query_execution_id} completada: "
+                    f"{stats.get('TotalExecutionTimeInMillis')} ms, "
+                    f"{stats.get('DataScannedInBytes')} bytes escaneados"
+                )
+                return execution
             elif status in ['FAILED', 'CANCELLED']:
-                reason = response['QueryExecution']['Status'].get('StateChangeReason', 'Unknown')
+                reason = execution['Status'].get('StateChangeReason', 'Unknown')
                 raise Exception(f"Query falló con estado: {status}. Razón: {reason}")
-            
-            time.sleep(2)  # Esperar 2 segundos
-        
-        raise Exception('Timeout esperando resultado de query')
-    
-    def _get_query_results(self, query_execution_id: str) -> List[Dict[str, Any]]:
-        """Obtiene los resultados de la query y los convierte a JSON"""
-        response = self.client.get_query_results(QueryExecutionId=query_execution_id)
-        
-        # Extraer nombres de columnas
-        columns = [col['Name'] for col in response['ResultSet']['ResultSetMetadata']['ColumnInfo']]
-        
-        # Extraer filas (saltar la primera que es el header)
-        rows = response['ResultSet']['Rows'][1:]
-        
-        # Convertir a lista de diccionarios
-        results = []
-        for row in rows:
-            row_dict = {}
-            for i, col_name in enumerate(columns):
-                row_dict[col_name] = row['Data'][i].get('VarCharValue')
-            results.append(row_dict)
-        
-        return results
+
+            if time.monotonic() + delay > deadline:
+                raise Exception('Timeout esperando resultado de query')
+
+            time.sleep(delay)
+            delay = min(delay * POLL_BACKOFF, POLL_MAX_DELAY)
+
+    def get_query_execution(self, query_execution_id: str) -> Dict[str, Any]:
+        """Estado actual de una consulta, sin esperar a que termine"""
+        return self.client.get_query_execution(QueryExecutionId=query_execution_id)['QueryExecution']
+
+    def get_results_page(
+        self,
+        query_execution_id: str,
+        next_token: Optional[str] = None,
+        max_results: int = RESULTS_PAGE_SIZE
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        Una página de GetQueryResults con tipos convertidos
+
+        Returns:
+            tuple: (filas, NextToken de la página siguiente o None)
+        """
+        kwargs = {'QueryExecutionId': query_execution_id, 'MaxResults': max_results}
+        if next_token:
+            kwargs['NextToken'] = next_token
+
+        response = self.client.get_query_results(**kwargs)
+        rows = response['ResultSet']['Rows']
+        columns = [
+            (col['Name'], col['Type'])
+            for col in response['ResultSet']['ResultSetMetadata']['ColumnInfo']
+        ]
+        if not next_token:
+            # La primera fila de la primera página es el header
+            rows = rows[1:]
+
+        return [
+            {
+                name: convert_value(cell.get('VarCharValue'), col_type)
+                for (name, col_type), cell in zip(columns, row['Data'])
+            }
+            for row in rows
+        ], response.get('NextToken')
+
+    def iter_query_results(self, query_execution_id: str) -> Iterator[Dict[str, Any]]:
+        """Recorre todas las páginas de GetQueryResults (NextToken) con tipos convertidos"""
+        next_token = None
+        while True:
+            rows, next_token = self.get_results_page(query_execution_id, next_token)
+            yield from rows
+            if not next_token:
+                return
+
+    def iter_results_from_s3(self, execution: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        """
+        Lee el CSV de resultados directamente de S3 en streaming, sin el límite
+        de 1000 filas por llamada de GetQueryResults. En el CSV de Athena los
+        NULL y los strings vacíos no se distinguen: ambos se retornan como None
+        """
+        # Solo la metadata de columnas (tipos)
+        metadata = self.client.get_query_results(
+            QueryExecutionId=execution['QueryExecutionId'], MaxResults=1
+        )['ResultSet']['ResultSetMetadata']['ColumnInfo']
+        types = {col['Name']: col['Type'] for col in metadata}
+
+        bucket, key = execution['ResultConfiguration']['OutputLocation'][len('s3://'):].split('/', 1)
+        body = get_s3_client().get_object(Bucket=bucket, Key=key)['Body']
+
+        # Lectura por líneas sobre el stream (los campos entre comillas pueden tener saltos de línea)
+        reader = csv.DictReader(codecs.getreader('utf-8')(body))
+        for row in reader:
+            yield {
+                name: convert_value(value if value != '' else None, types.get(name, 'varchar'))
+                for name, value in row.items()
+            }
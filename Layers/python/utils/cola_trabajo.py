@@ -0,0 +1,183 @@
+"""
+Cola de trabajo por local y rol
+Los pedidos que no encuentran empleado libre esperan con un taskToken de Step
+Functions; cuando se libera un empleado se reanuda el pedido más antiguo de su
+cola en lugar de esperar un reintento periódico
+"""
+
+import boto3
+import json
+import os
+import time
+from datetime import datetime
+from typing import Dict, Optional
+from boto3.dynamodb.conditions import Key
+
+# Clientes AWS
+dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
+stepfunctions = boto3.client('stepfunctions', region_name='us-east-1')
+
+# Tabla con TTL sobre el atributo expira_en (PK cola = local_id#role, SK turno)
+TABLE_COLA_TRABAJO = os.environ.get('TABLE_COLA_TRABAJO', 'ChinaWok-Cola-Trabajo')
+
+# Las entradas cuyo taskToken ya expiró se eliminan solas
+COLA_TTL_SEGUNDOS = int(os.environ.get('COLA_TTL_SEGUNDOS', 60 * 60))
+
+# Entradas leídas por página al despertar (las de tokens vencidos se descartan)
+COLA_MAX_ENTRADAS = 10
+
+# Roles que esperan en cola un empleado libre
+ROLES_COLA = ('Cocinero', 'Despachador', 'Repartidor')
+
+
+def clave_cola(local_id: str, role: str) -> str:
+    """Partición de la cola de un rol en un local"""
+    return f'{local_id}#{role}'
+
+
+def encolar_pedido(local_id: str, role: str, pedido_id: str, fecha_creacion: str, task_token: str) -> Dict:
+    """
+    Registra un pedido en espera de un empleado del rol. El turno se ordena por
+    fecha de creación del pedido, así un pedido que se vuelve a encolar tras
+    perder un empleado conserva su posición
+
+    Args:
+        local_id: Local del pedido
+        role: Rol requerido (Cocinero, Despachador, Repartidor)
+        pedido_id: Pedido en espera
+        fecha_creacion: Fecha ISO de creación del pedido
+        task_token: Token de la tarea waitForTaskToken
+
+    Returns:
+        dict: Entrada guardada en la cola
+    """
+    table = dynamodb.Table(TABLE_COLA_TRABAJO)
+    ahora = int(time.time())
+
+    entrada = {
+        'cola': clave_cola(local_id, role),
+        'turno': f'{fecha_creacion}#{pedido_id}',
+        'local_id': local_id,
+        'pedido_id': pedido_id,
+        'task_token': task_token,
+        'encolado_en': datetime.utcnow().isoformat() + 'Z',
+        'expira_en': ahora + COLA_TTL_SEGUNDOS
+    }
+
+    table.put_item(Item=entrada)
+    print(f'Pedido {pedido_id} encolado esperando {role} en local {local_id}')
+    return entrada
+
+
+def restituir_entrada(entrada: Dict):
+    """
+    Vuelve a poner en la cola una entrada retirada cuyo pedido no se pudo
+    reanudar. Es condicional: si el pedido ya se volvió a encolar con otro
+    taskToken, esa entrada más reciente se conserva
+    """
+    try:
+        dynamodb.Table(TABLE_COLA_TRABAJO).put_item(
+            Item=entrada,
+            ConditionExpression='attribute_not_exists(turno)'
+        )
+    except dynamodb.meta.client.exceptions.ConditionalCheckFailedException:
+        print(f'Pedido {entrada["pedido_id"]} ya encolado de nuevo, no se restituye')
+
+
+def retirar_pedido_de_colas(local_id: str, pedido_id: str, fecha_creacion: str) -> None:
+    """
+    Elimina las entradas de un pedido en las colas de todos los roles. Se usa
+    al cancelar o reiniciar el pedido: su taskToken ya no sirve y la entrada
+    no debe consumir el turno de un empleado liberado
+
+    Args:
+        local_id: Local del pedido
+        pedido_id: Pedido cancelado o reiniciado
+        fecha_creacion: Fecha ISO de creación del pedido (parte del turno)
+    """
+    table = dynamodb.Table(TABLE_COLA_TRABAJO)
+    turno = f'{fecha_creacion}#{pedido_id}'
+
+    with table.batch_writer() as batch:
+        for role in ROLES_COLA:
+            batch.delete_item(Key={'cola': clave_cola(local_id, role), 'turno': turno})
+
+
+def despertar_siguiente_en_cola(local_id: str, role: str, dni: Optional[str] = None) -> Optional[str]:
+    """
+    Reanuda el pedido más antiguo que espera un empleado del rol. La entrada se
+    retira con un borrado condicional sobre su taskToken, de modo que dos
+    liberaciones simultáneas no reanudan el mismo pedido. Los tokens vencidos
+    (timeout de la espera) se descartan y se pasa a la siguiente entrada,
+    leyendo la cola por páginas hasta entregar un token o agotarla; si
+    send_task_success falla por otro motivo la entrada se restituye (conserva
+    su turno) y el error se propaga
+
+    Args:
+        local_id: Local del empleado liberado
+        role: Rol del empleado liberado
+        dni: DNI del empleado liberado (solo informativo)
+
+    Returns:
+        str: pedido_id reanudado, o None si la cola estaba vacía
+    """
+    table = dynamodb.Table(TABLE_COLA_TRABAJO)
+
+    params = {
+        'KeyConditionExpression': Key('cola').eq(clave_cola(local_id, role)),
+        'ScanIndexForward': True,
+        'Limit': COLA_MAX_ENTRADAS,
+        'ConsistentRead': True
+    }
+
+    while True:
+        response = table.query(**params)
+
+        pedido_id = _entregar_primer_token(table, response.get('Items', []), local_id, role, dni)
+        if pedido_id:
+            return pedido_id
+
+        if 'LastEvaluatedKey' not in response:
+            return None
+        params['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def _entregar_primer_token(table, entradas, local_id, role, dni):
+    """Reanuda el primer pedido de la página cuyo token siga vigente"""
+    for entrada in entradas:
+        try:
+            table.delete_item(
+                Key={'cola': entrada['cola'], 'turno': entrada['turno']},
+                ConditionExpression='task_token = :token',
+                ExpressionAttributeValues={':token': entrada['task_token']}
+            )
+        except dynamodb.meta.client.exceptions.ConditionalCheckFailedException:
+            # Otra liberación ya tomó esta entrada (o el pedido se volvió a encolar)
+            continue
+
+        try:
+            stepfunctions.send_task_success(
+                taskToken=entrada['task_token'],
+                output=json.dumps({
+                    'pedido_id': entrada['pedido_id'],
+                    'role': role,
+                    'empleado_liberado': dni
+                })
+            )
+        except (
+            stepfunctions.exceptions.TaskTimedOut,
+            stepfunctions.exceptions.TaskDoesNotExist,
+            stepfunctions.exceptions.InvalidToken
+        ):
+            print(f'Token vencido para pedido {entrada["pedido_id"]}, se descarta de la cola')
+            continue
+        except Exception as e:
+            # Throttling, errores de servicio o de red: el pedido sigue esperando
+            print(f'Error reanudando pedido {entrada["pedido_id"]}, se restituye en la cola: {str(e)}')
+            restituir_entrada(entrada)
+            raise
+
+        print(f'Pedido {entrada["pedido_id"]} reanudado: {role} liberado en local {local_id}')
+        return entrada['pedido_id']
+
+    return None
@@ -3,6 +3,6 @@ def get_cors_headers():
 	return {
 		'Content-Type': 'application/json',
 		'Access-Control-Allow-Origin': '*',
-		'Access-Control-Allow-Headers': 'Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token',
+		'Access-Control-Allow-Headers': 'Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token,Idempotency-Key',
 		'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS'
 	}
@@ -0,0 +1,207 @@
+"""
+Change-log de analítica en S3
+
+Los cambios de los streams se escriben como archivos delta inmutables
+particionados por tabla y fecha; un job programado los compacta sobre el
+snapshot data.jsonl que leen Glue y Athena.
+
+Layout:
+    {S3_DELTAS_PREFIX}/{tabla}/fecha=YYYY-MM-DD/{HHMMSSffffff}-{lote}.jsonl   (deltas)
+    {S3_INGESTION_PREFIX}/{tabla}/data.jsonl                                  (snapshot)
+"""
+import boto3
+import json
+import os
+from datetime import datetime
+from decimal import Decimal
+
+s3_client = boto3.client('s3')
+
+S3_BUCKET = os.environ.get('S3_BUCKET_NAME')
+S3_PREFIX = os.environ.get('S3_INGESTION_PREFIX', 'data-ingestion')
+# Prefijo separado para que el crawler de Glue no catalogue los deltas
+S3_DELTAS_PREFIX = os.environ.get('S3_DELTAS_PREFIX', 'data-deltas')
+
+# Mapeo de nombre de tabla DynamoDB a clave S3
+TABLE_MAPPING = {
+    'ChinaWok-Locales': 'locales',
+    'ChinaWok-Usuarios': 'usuarios',
+    'ChinaWok-Productos': 'productos',
+    'ChinaWok-Empleados': 'empleados',
+    'ChinaWok-Combos': 'combos',
+    'ChinaWok-Pedidos': 'pedidos',
+    'ChinaWok-Ofertas': 'ofertas',
+    'ChinaWok-Resenas': 'resenas',
+}
+
+# Mapeo inverso clave S3 -> nombre de tabla
+TABLE_NAME_BY_KEY = {table_key: table_name for table_name, table_key in TABLE_MAPPING.items()}
+
+# Mapeo de tabla a su clave primaria
+PRIMARY_KEYS = {
+    'ChinaWok-Locales': 'local_id',
+    'ChinaWok-Usuarios': 'correo',
+    'ChinaWok-Productos': ['local_id', 'nombre'],
+    'ChinaWok-Empleados': ['local_id', 'dni'],
+    'ChinaWok-Combos': ['local_id', 'combo_id'],
+    'ChinaWok-Pedidos': ['local_id', 'pedido_id'],
+    'ChinaWok-Ofertas': ['local_id', 'oferta_id'],
+    'ChinaWok-Resenas': ['local_id', 'resena_id'],
+}
+
+# Límite de DeleteObjects por llamada
+S3_DELETE_BATCH = 1000
+
+
+def decimal_to_float(obj):
+    """Convierte Decimal a float para JSON"""
+    if isinstance(obj, Decimal):
+        return float(obj)
+    raise TypeError
+
+
+def get_record_key(record, table_name):
+    """Genera una clave única para identificar el registro"""
+    pk = PRIMARY_KEYS.get(table_name)
+
+    if isinstance(pk, list):
+        # Composite key
+        return tuple(record.get(k) for k in pk)
+    else:
+        # Single key
+        return record.get(pk)
+
+
+def snapshot_key(table_key):
+    """Ruta del snapshot compactado de una tabla"""
+    return f'{S3_PREFIX}/{table_key}/data.jsonl'
+
+
+def delta_prefix(table_key):
+    """Prefijo bajo el que se escriben los deltas de una tabla"""
+    return f'{S3_DELTAS_PREFIX}/{table_key}/'
+
+
+def write_delta_file(table_key, changes, batch_id):
+    """
+    Escribe los cambios de un lote como un archivo delta nuevo (nunca sobrescribe)
+
+    Args:
+        table_key: Clave S3 de la tabla (ej: 'pedidos')
+        changes: Lista de dicts {'event_type', 'data'} en orden del stream
+        batch_id: Identificador único del lote (ej: aws_request_id)
+
+    Returns:
+        str: URI S3 del archivo delta
+    """
+    ahora = datetime.utcnow()
+    # El nombre empieza por fecha y hora: el orden lexicográfico es el orden de escritura
+    s3_key = (
+        f'{delta_prefix(table_key)}fecha={ahora:%Y-%m-%d}/'
+        f'{ahora:%H%M%S%f}-{batch_id}.jsonl'
+    )
+
+    jsonl_lines = [
+        json.dumps({'op': change['event_type'], 'data': change['data']}, default=decimal_to_float)
+        for change in changes
+    ]
+
+    s3_client.put_object(
+        Bucket=S3_BUCKET,
+        Key=s3_key,
+        Body='\n'.join(jsonl_lines).encode('utf-8'),
+        ContentType='application/x-ndjson'
+    )
+
+    return f's3://{S3_BUCKET}/{s3_key}'
+
+
+def list_delta_files(table_key, max_files=None):
+    """Lista los deltas pendientes de una tabla, del más antiguo al más reciente"""
+    keys = []
+    paginator = s3_client.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=S3_BUCKET, Prefix=delta_prefix(table_key)):
+        keys.extend(obj['Key'] for obj in page.get('Contents', []) if obj['Key'].endswith('.jsonl'))
+
+    # ListObjectsV2 ya devuelve orden lexicográfico; se ordena por claridad
+    keys.sort()
+    return keys[:max_files] if max_files else keys
+
+
+def read_jsonl(s3_key):
+    """Lee un objeto JSONL de S3 como lista de dicts (vacía si no existe)"""
+    try:
+        response = s3_client.get_object(Bucket=S3_BUCKET, Key=s3_key)
+    except s3_client.exceptions.NoSuchKey:
+        return []
+
+    content = response['Body'].read().decode('utf-8')
+    return [json.loads(line) for line in content.split('\n') if line.strip()]
+
+
+def delete_delta_files(delta_keys):
+    """Elimina deltas ya aplicados (DeleteObjects en lotes de 1000)"""
+    for i in range(0, len(delta_keys), S3_DELETE_BATCH):
+        s3_client.delete_objects(
+            Bucket=S3_BUCKET,
+            Delete={
+                'Objects': [{'Key': k} for k in delta_keys[i:i + S3_DELETE_BATCH]],
+                'Quiet': True
+            }
+        )
+
+
+def compact_table(table_key, max_files=None):
+    """
+    Aplica los deltas pendientes de una tabla sobre su snapshot, reescribe el
+    snapshot una sola vez y elimina los deltas aplicados. Aplicar de nuevo un
+    delta es idempotente (imagen completa o borrado), así que un fallo entre
+    la escritura del snapshot y el borrado no corrompe los datos
+
+    Returns:
+        dict: Resumen de la compactación
+    """
+    table_name = TABLE_NAME_BY_KEY[table_key]
+    delta_keys = list_delta_files(table_key, max_files)
+
+    if not delta_keys:
+        return {'table_key': table_key, 'deltas': 0, 'status': 'sin_cambios'}
+
+    records = {
+        get_record_key(record, table_name): record
+        for record in read_jsonl(snapshot_key(table_key))
+    }
+    total_inicial = len(records)
+
+    upserts = 0
+    deletes = 0
+    for delta_key in delta_keys:
+        for change in read_jsonl(delta_key):
+            key = get_record_key(change['data'], table_name)
+            if change['op'] == 'REMOVE':
+                if records.pop(key, None) is not None:
+                    deletes += 1
+            else:
+                records[key] = change['data']
+                upserts += 1
+
+    jsonl_lines = [json.dumps(record, default=decimal_to_float) for record in records.values()]
+    s3_client.put_object(
+        Bucket=S3_BUCKET,
+        Key=snapshot_key(table_key),
+        Body='\n'.join(jsonl_lines).encode('utf-8'),
+        ContentType='application/x-ndjson'
+    )
+
+    delete_delta_files(delta_keys)
+
+    return {
+        'table_key': table_key,
+        'deltas': len(delta_keys),
+        'upserts': upserts,
+        'deletes': deletes,
+        'total_inicial': total_inicial,
+        'total_records': len(records),
+        's3_location': f's3://{S3_BUCKET}/{snapshot_key(table_key)}',
+        'status': 'success'
+    }
@@ -2,14 +2,28 @@
 Cliente de DynamoDB para operaciones comunes
 """
 import boto3
+import json
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Any
 from decimal import Decimal
 
+# Límite de claves por llamada BatchGetItem impuesto por DynamoDB
+BATCH_GET_MAX_KEYS = 100
+
+# Recurso reutilizado entre invocaciones del mismo contenedor Lambda
+_dynamodb_resource = None
+
+
 def get_dynamodb_resource():
     """
     Retorna un recurso de DynamoDB
     """
-    return boto3.resource('dynamodb')
+    global _dynamodb_resource
+    if _dynamodb_resource is None:
+        _dynamodb_resource = boto3.resource('dynamodb')
+    return _dynamodb_resource
 
 
 def get_table_data(table_name: str) -> List[Dict[str, Any]]:
@@ -39,6 +53,99 @@ def get_table_data(table_name: str) -> List[Dict[str, Any]]:
     return items
 
 
+def _clave_canonica(table_name: str, key: Dict[str, Any]) -> str:
+    """Representación estable de una clave para deduplicar"""
+    return table_name + '|' + json.dumps(key, sort_keys=True, default=str)
+
+
+def _batch_get_con_reintentos(client, request_items: Dict[str, Any], max_retries: int) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Ejecuta un BatchGetItem reintentando las UnprocessedKeys con backoff exponencial
+    """
+    resultados = {table_name: [] for table_name in request_items}
+    pendientes = request_items
+    
+    for attempt in range(max_retries + 1):
+        response = client.batch_get_item(RequestItems=pendientes)
+        
+        for table_name, items in response.get('Responses', {}).items():
+            resultados[table_name].extend(items)
+        
+        pendientes = response.get('UnprocessedKeys') or {}
+        if not pendientes:
+            return resultados
+        
+        if attempt < max_retries:
+            # Backoff corto: este camino se usa dentro de requests síncronos
+            time.sleep(0.05 * (2 ** attempt) + random.uniform(0, 0.05))
+    
+    tablas = ', '.join(pendientes.keys())
+    raise Exception(f'BatchGetItem dejó claves sin procesar tras {max_retries} reintentos ({tablas})')
+
+
+def batch_get_items(requests: Dict[str, Dict[str, Any]], max_workers: int = 4, max_retries: int = 5) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Obtiene items de una o varias tablas usando BatchGetItem
+    
+    - Deduplica claves repetidas
+    - Divide en lotes de 100 claves (límite de DynamoDB) y los ejecuta en paralelo
+    - Reintenta UnprocessedKeys con backoff exponencial
+    
+    Args:
+        requests: Diccionario por tabla con el mismo formato de RequestItems de
+            DynamoDB, por ejemplo:
+            {'ChinaWok-Productos': {'Keys': [...], 'ProjectionExpression': 'nombre, stock'}}
+        max_workers: Máximo de lotes ejecutados en paralelo
+        max_retries: Reintentos para UnprocessedKeys
+        
+    Returns:
+        Dict[str, List[Dict]]: Items encontrados por tabla (las claves inexistentes se omiten)
+    """
+    # El cliente del recurso acepta y retorna tipos Python nativos y es thread-safe
+    client = get_dynamodb_resource().meta.client
+    
+    # Aplanar y deduplicar claves conservando la configuración de cada tabla
+    claves = []
+    vistas = set()
+    for table_name, config in requests.items():
+        for key in config.get('Keys', []):
+            canonica = _clave_canonica(table_name, key)
+            if canonica in vistas:
+                continue
+            vistas.add(canonica)
+            claves.append((table_name, key))
+    
+    resultados = {table_name: [] for table_name in requests}
+    if not claves:
+        return resultados
+    
+    # Armar lotes de máximo 100 claves (pueden mezclar tablas)
+    lotes = []
+    for i in range(0, len(claves), BATCH_GET_MAX_KEYS):
+        request_items = {}
+        for table_name, key in claves[i:i + BATCH_GET_MAX_KEYS]:
+            if table_name not in request_items:
+                config = {k: v for k, v in requests[table_name].items() if k != 'Keys'}
+                request_items[table_name] = dict(config, Keys=[])
+            request_items[table_name]['Keys'].append(key)
+        lotes.append(request_items)
+    
+    if len(lotes) == 1:
+        respuestas = [_batch_get_con_reintentos(client, lotes[0], max_retries)]
+    else:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(lotes))) as executor:
+            respuestas = list(executor.map(
+                lambda lote: _batch_get_con_reintentos(client, lote, max_retries),
+                lotes
+            ))
+    
+    for respuesta in respuestas:
+        for table_name, items in respuesta.items():
+            resultados[table_name].extend(items)
+    
+    return resultados
+
+
 def convert_decimal_to_float(obj):
     """
     Convierte recursivamente Decimal a float para serialización JSON
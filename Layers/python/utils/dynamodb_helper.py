@@ -1,9 +1,12 @@
 import boto3
 import os
 import json
+import time
 from datetime import datetime
-from boto3.dynamodb.conditions import Key, Attr
+from boto3.dynamodb.conditions import Key
 from decimal import Decimal
+from .cola_trabajo import despertar_siguiente_en_cola, retirar_pedido_de_colas
+from .dynamodb_client import batch_get_items
 
 dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
 
@@ -30,36 +33,106 @@ def obtener_pedido(local_id, pedido_id):
         print(f'Error obteniendo pedido: {str(e)}')
         raise
 
-def buscar_empleado_disponible(local_id, role):
-    """Busca un empleado disponible (ocupado=False) del tipo especificado"""
+def registrar_ejecucion_pedido(local_id, pedido_id, execution_arn, intento_anterior):
+    """
+    Guarda en el pedido el ARN de la ejecución que lo procesa y avanza el
+    contador workflow_intento. La escritura es condicional sobre el intento
+    leído, así dos reinicios simultáneos no pueden lanzar dos ejecuciones.
+    Retorna False si el pedido no existe u otro reinicio ganó
+    """
+    table = dynamodb.Table(os.environ['TABLE_PEDIDOS'])
+    
+    if intento_anterior:
+        condicion = 'attribute_exists(pedido_id) AND workflow_intento = :anterior'
+        valores = {':anterior': intento_anterior}
+    else:
+        condicion = 'attribute_exists(pedido_id) AND attribute_not_exists(workflow_intento)'
+        valores = {}
+    
+    try:
+        table.update_item(
+            Key={
+                'local_id': local_id,
+                'pedido_id': pedido_id
+            },
+            UpdateExpression='SET execution_arn = :arn, workflow_intento = :intento',
+            ConditionExpression=condicion,
+            ExpressionAttributeValues={
+                **valores,
+                ':arn': execution_arn,
+                ':intento': intento_anterior + 1
+            }
+        )
+        print(f'Ejecución registrada en pedido {pedido_id}: {execution_arn}')
+        return True
+    except dynamodb.meta.client.exceptions.ConditionalCheckFailedException:
+        print(f'Pedido {pedido_id} no existe o ya tiene otra ejecución registrada')
+        return False
+
+def revertir_ejecucion_pedido(local_id, pedido_id, execution_arn, ejecucion_anterior=None):
+    """
+    Deshace el execution_arn guardado por registrar_ejecucion_pedido cuando
+    start_execution falló: vuelve a la ejecución anterior (o lo elimina).
+    workflow_intento no se revierte, así el siguiente reinicio usa un nombre
+    de ejecución nuevo. Solo aplica si el pedido sigue apuntando a execution_arn
+    """
+    table = dynamodb.Table(os.environ['TABLE_PEDIDOS'])
+    valores = {':arn': execution_arn}
+    
+    if ejecucion_anterior:
+        expresion = 'SET execution_arn = :anterior'
+        valores[':anterior'] = ejecucion_anterior
+    else:
+        expresion = 'REMOVE execution_arn'
+    
+    try:
+        table.update_item(
+            Key={
+                'local_id': local_id,
+                'pedido_id': pedido_id
+            },
+            UpdateExpression=expresion,
+            ConditionExpression='execution_arn = :arn',
+            ExpressionAttributeValues=valores
+        )
+        print(f'Ejecución {execution_arn} revertida en pedido {pedido_id}')
+        return True
+    except dynamodb.meta.client.exceptions.ConditionalCheckFailedException:
+        print(f'Pedido {pedido_id} ya apunta a otra ejecución, no se revierte')
+        return False
+
+# Índice disperso de Empleados: solo los empleados libres tienen disponible_key
+# (local_id#role), ordenados por calificacion_prom
+EMPLEADOS_DISPONIBLES_INDEX = 'disponibles-index'
+
+# Candidatos que se leen del índice por intento de asignación
+DESPACHO_MAX_CANDIDATOS = 10
+
+def clave_disponibilidad(local_id, role):
+    """Valor de disponible_key para un empleado libre"""
+    return f'{local_id}#{role}'
+
+def buscar_empleado_disponible(local_id, role, limite=DESPACHO_MAX_CANDIDATOS):
+    """
+    Retorna los empleados libres del rol ordenados por calificación (mayor
+    primero) leyendo solo la partición local_id#role del índice disperso
+    """
     table = dynamodb.Table(os.environ['TABLE_EMPLEADOS'])
     
     try:
         print(f'Buscando {role} disponible en local {local_id}')
         
         response = table.query(
-            KeyConditionExpression=Key('local_id').eq(local_id),
-            FilterExpression=Attr('role').eq(role) & Attr('ocupado').eq(False)
+            IndexName=EMPLEADOS_DISPONIBLES_INDEX,
+            KeyConditionExpression=Key('disponible_key').eq(clave_disponibilidad(local_id, role)),
+            ScanIndexForward=False,
+            Limit=limite
         )
         
         empleados = response.get('Items', [])
+        print(f'Candidatos {role} disponibles: {len(empleados)}')
         
-        print(f'Empleados encontrados con role={role} y ocupado=False: {len(empleados)}')
-        
-        if not empleados:
-            print(f'No se encontraron {role}s disponibles en local {local_id}')
-            return None
-        
-        # Retornar el empleado con mejor calificación
-        empleado = sorted(
-            empleados, 
-            key=lambda x: float(x.get('calificacion_prom', 0)), 
-            reverse=True
-        )[0]
-        
-        print(f'Empleado {role} seleccionado: {empleado["dni"]} - {empleado["nombre"]} {empleado["apellido"]} (calificación: {empleado.get("calificacion_prom")})')
-        
-        return empleado
+        return empleados
         
     except Exception as e:
         print(f'Error buscando empleado: {str(e)}')
@@ -67,50 +140,115 @@ def buscar_empleado_disponible(local_id, role):
         print(f'Traceback: {traceback.format_exc()}')
         raise
 
-def marcar_empleado_ocupado(local_id, dni):
-    """Marca un empleado como ocupado (ocupado=True)"""
+def marcar_empleado_ocupado(local_id, dni, pedido_id=None):
+    """
+    Marca un empleado como ocupado solo si sigue libre (ocupado=False) y lo
+    saca del índice de disponibles. Lanza ConditionalCheckFailedException si
+    otra ejecución lo tomó primero
+    """
     table = dynamodb.Table(os.environ['TABLE_EMPLEADOS'])
     
-    try:
-        response = table.update_item(
-            Key={
-                'local_id': local_id,
-                'dni': dni
-            },
-            UpdateExpression='SET ocupado = :ocupado',
-            ExpressionAttributeValues={
-                ':ocupado': True
-            },
-            ReturnValues='ALL_NEW'
-        )
-        
-        print(f'Empleado {dni} marcado como ocupado')
-        return response.get('Attributes')
+    update_expr = 'SET ocupado = :ocupado, ocupado_desde = :ahora'
+    valores = {
+        ':ocupado': True,
+        ':libre': False,
+        ':ahora': datetime.now().isoformat()
+    }
+    if pedido_id:
+        update_expr += ', pedido_asignado = :pedido'
+        valores[':pedido'] = pedido_id
+    
+    response = table.update_item(
+        Key={
+            'local_id': local_id,
+            'dni': dni
+        },
+        UpdateExpression=update_expr + ' REMOVE disponible_key',
+        ConditionExpression='attribute_exists(dni) AND ocupado = :libre',
+        ExpressionAttributeValues=valores,
+        ReturnValues='ALL_NEW'
+    )
+    
+    print(f'Empleado {dni} marcado como ocupado')
+    return response.get('Attributes')
+
+def reclamar_empleado(local_id, role, pedido_id=None):
+    """
+    Asigna el mejor empleado libre del rol. Cada candidato se reclama con una
+    escritura condicional; si otra ejecución lo tomó primero se pasa al
+    siguiente. Retorna el empleado asignado o None si no hay disponibles
+    """
+    # Segunda ronda por si todos los candidatos leídos fueron tomados a la vez
+    for _ in range(2):
+        candidatos = buscar_empleado_disponible(local_id, role)
+        
+        if not candidatos:
+            print(f'No se encontraron {role}s disponibles en local {local_id}')
+            return None
         
-    except Exception as e:
-        print(f'Error marcando empleado como ocupado: {str(e)}')
-        raise
+        for candidato in candidatos:
+            try:
+                empleado = marcar_empleado_ocupado(local_id, candidato['dni'], pedido_id)
+                print(f'Empleado {role} asignado: {empleado["dni"]} - {empleado.get("nombre")} {empleado.get("apellido")} (calificación: {empleado.get("calificacion_prom")})')
+                return empleado
+            except dynamodb.meta.client.exceptions.ConditionalCheckFailedException:
+                print(f'{role} {candidato["dni"]} ya fue asignado, intentando con el siguiente...')
+    
+    return None
 
-def marcar_empleado_libre(local_id, dni):
-    """Marca un empleado como libre (ocupado=False)"""
+def marcar_empleado_libre(local_id, dni, role=None, pedido_id=None):
+    """
+    Marca un empleado como libre (ocupado=False) y lo vuelve a publicar en el
+    índice de disponibles. Si se indica pedido_id, solo se libera cuando sigue
+    asignado a ese pedido (evita liberar a alguien que ya tomó otro pedido)
+    """
     table = dynamodb.Table(os.environ['TABLE_EMPLEADOS'])
     
     try:
+        if not role:
+            item = table.get_item(
+                Key={'local_id': local_id, 'dni': dni},
+                ProjectionExpression='#role',
+                ExpressionAttributeNames={'#role': 'role'}
+            ).get('Item')
+            if not item:
+                print(f'Empleado {dni} no existe, no se libera')
+                return None
+            role = item['role']
+        
+        condicion = 'attribute_exists(dni)'
+        valores = {
+            ':ocupado': False,
+            ':disponible': clave_disponibilidad(local_id, role.capitalize())
+        }
+        if pedido_id:
+            condicion += ' AND (attribute_not_exists(pedido_asignado) OR pedido_asignado = :pedido)'
+            valores[':pedido'] = pedido_id
+        
         response = table.update_item(
             Key={
                 'local_id': local_id,
                 'dni': dni
             },
-            UpdateExpression='SET ocupado = :ocupado',
-            ExpressionAttributeValues={
-                ':ocupado': False
-            },
+            UpdateExpression='SET ocupado = :ocupado, disponible_key = :disponible REMOVE ocupado_desde, pedido_asignado',
+            ConditionExpression=condicion,
+            ExpressionAttributeValues=valores,
             ReturnValues='ALL_NEW'
         )
         
         print(f'Empleado {dni} marcado como libre')
+        
+        # Reanudar el pedido que lleva más tiempo esperando a este rol
+        try:
+            despertar_siguiente_en_cola(local_id, role.capitalize(), dni)
+        except Exception as e:
+            print(f'Error reanudando la cola de {role}: {str(e)}')
+        
         return response.get('Attributes')
         
+    except dynamodb.meta.client.exceptions.ConditionalCheckFailedException:
+        print(f'Empleado {dni} no se libera: no existe o ya está asignado a otro pedido')
+        return None
     except Exception as e:
         print(f'Error marcando empleado como libre: {str(e)}')
         raise
@@ -137,31 +275,54 @@ def validar_transicion_estado(estado_actual, estado_nuevo):
         print(f'Error en validación de estado: {str(e)}')
         raise
 
-def actualizar_estado_pedido_con_empleado(local_id, pedido_id, nuevo_estado, empleado):
-    """Actualiza el estado de un pedido agregando nuevo historial con empleado"""
+def cerrar_estados_activos(historial, ahora):
+    """
+    Construye las cláusulas SET que cierran por índice las entradas activas del
+    historial (normalmente solo la última), sin reescribir la lista completa.
+    Retorna (cláusulas, valores, entradas_cerradas)
+    """
+    clausulas = []
+    cerradas = []
+    for i, estado in enumerate(historial):
+        if estado.get('activo', False):
+            clausulas.append(f'historial_estados[{i}].activo = :inactivo')
+            clausulas.append(f'historial_estados[{i}].hora_fin = :ahora')
+            cerradas.append(estado)
+    
+    valores = {':inactivo': False, ':ahora': ahora} if clausulas else {}
+    return clausulas, valores, cerradas
+
+def actualizar_estado_pedido_con_empleado(local_id, pedido_id, nuevo_estado, empleado, pedido=None):
+    """
+    Avanza el estado de un pedido agregando la nueva entrada del historial con
+    su empleado en un solo UpdateItem condicional. La condición sobre el estado
+    esperado y el tamaño del historial reemplaza la relectura del pedido: si
+    otra ejecución lo modificó, la escritura falla en lugar de pisar cambios.
+    Si se pasa el pedido ya leído por el step no se vuelve a consultar
+    """
     table = dynamodb.Table(os.environ['TABLE_PEDIDOS'])
     
     try:
         ahora = datetime.now().isoformat()
         
-        # Obtener el pedido actual para validar y actualizar el historial
-        pedido = obtener_pedido(local_id, pedido_id)
+        if pedido is None:
+            pedido = obtener_pedido(local_id, pedido_id)
         estado_actual = pedido.get('estado')
         
         # Validar que la transición sea válida
         validar_transicion_estado(estado_actual, nuevo_estado)
         
         historial_actual = pedido.get('historial_estados', [])
+        total = len(historial_actual)
         
-        # Cerrar el estado activo anterior y extraer DNI del empleado anterior
+        # Cerrar el estado activo anterior y extraer DNI y rol del empleado anterior
+        clausulas, valores, cerradas = cerrar_estados_activos(historial_actual, ahora)
         empleado_anterior_dni = None
-        for estado in historial_actual:
-            if estado.get('activo', False):
-                estado['activo'] = False
-                estado['hora_fin'] = ahora
-                # Extraer DNI del empleado que estaba en el estado anterior
-                if estado.get('empleado'):
-                    empleado_anterior_dni = estado['empleado'].get('dni')
+        empleado_anterior_rol = None
+        for estado in cerradas:
+            if estado.get('empleado'):
+                empleado_anterior_dni = estado['empleado'].get('dni')
+                empleado_anterior_rol = estado['empleado'].get('rol')
         
         # Crear nuevo estado
         nuevo_historial = {
@@ -186,27 +347,39 @@ def actualizar_estado_pedido_con_empleado(local_id, pedido_id, nuevo_estado, emp
                 'calificacion_prom': calificacion
             }
         
-        historial_actual.append(nuevo_historial)
-        
-        # Actualizar pedido
-        response = table.update_item(
-            Key={
-                'local_id': local_id,
-                'pedido_id': pedido_id
-            },
-            UpdateExpression='SET estado = :estado, historial_estados = :historial',
-            ExpressionAttributeValues={
-                ':estado': nuevo_estado,
-                ':historial': historial_actual
-            },
-            ReturnValues='ALL_NEW'
-        )
+        # La nueva entrada se escribe en la posición siguiente al final (equivale
+        # a list_append, que no puede combinarse con rutas por índice de la misma lista)
+        clausulas = ['#estado = :estado'] + clausulas + [f'historial_estados[{total}] = :nuevo']
+        
+        try:
+            response = table.update_item(
+                Key={
+                    'local_id': local_id,
+                    'pedido_id': pedido_id
+                },
+                UpdateExpression='SET ' + ', '.join(clausulas),
+                ConditionExpression='#estado = :esperado AND size(historial_estados) = :total',
+                ExpressionAttributeNames={'#estado': 'estado'},
+                ExpressionAttributeValues={
+                    **valores,
+                    ':estado': nuevo_estado,
+                    ':esperado': estado_actual,
+                    ':total': total,
+                    ':nuevo': nuevo_historial
+                },
+                ReturnValues='ALL_NEW'
+            )
+        except dynamodb.meta.client.exceptions.ConditionalCheckFailedException:
+            raise ValueError(
+                f'El pedido {pedido_id} cambió mientras se actualizaba (se esperaba estado "{estado_actual}")'
+            )
         
         print(f'Pedido {pedido_id} actualizado de "{estado_actual}" a "{nuevo_estado}"')
         
         # Retornar también el DNI del empleado anterior para liberarlo
         result = response.get('Attributes')
         result['_empleado_anterior_dni'] = empleado_anterior_dni
+        result['_empleado_anterior_rol'] = empleado_anterior_rol
         
         return result
         
@@ -214,31 +387,35 @@ def actualizar_estado_pedido_con_empleado(local_id, pedido_id, nuevo_estado, emp
         print(f'Error actualizando estado del pedido: {str(e)}')
         raise
 
-def finalizar_pedido(local_id, pedido_id):
-    """Finaliza el pedido marcando el último estado como inactivo"""
+def finalizar_pedido(local_id, pedido_id, pedido=None):
+    """
+    Finaliza el pedido cerrando por índice el estado activo, con la misma
+    condición sobre el tamaño del historial que las transiciones
+    """
     table = dynamodb.Table(os.environ['TABLE_PEDIDOS'])
     
     try:
         ahora = datetime.now().isoformat()
         
-        pedido = obtener_pedido(local_id, pedido_id)
+        if pedido is None:
+            pedido = obtener_pedido(local_id, pedido_id)
         historial_actual = pedido.get('historial_estados', [])
         
         # Cerrar el último estado activo
-        for estado in historial_actual:
-            if estado.get('activo', False):
-                estado['activo'] = False
-                estado['hora_fin'] = ahora
+        clausulas, valores, _ = cerrar_estados_activos(historial_actual, ahora)
         
         response = table.update_item(
             Key={
                 'local_id': local_id,
                 'pedido_id': pedido_id
             },
-            UpdateExpression='SET estado = :estado, historial_estados = :historial',
+            UpdateExpression='SET ' + ', '.join(['#estado = :estado'] + clausulas),
+            ConditionExpression='size(historial_estados) = :total',
+            ExpressionAttributeNames={'#estado': 'estado'},
             ExpressionAttributeValues={
+                **valores,
                 ':estado': 'recibido',
-                ':historial': historial_actual
+                ':total': len(historial_actual)
             },
             ReturnValues='ALL_NEW'
         )
@@ -250,28 +427,6 @@ def finalizar_pedido(local_id, pedido_id):
         print(f'Error finalizando pedido: {str(e)}')
         raise
 
-def agregar_pedido_a_usuario(usuario_correo, pedido_id):
-    """Agrega un pedido al historial del usuario"""
-    table = dynamodb.Table(os.environ['TABLE_USUARIOS'])
-    
-    try:
-        response = table.update_item(
-            Key={'correo': usuario_correo},
-            UpdateExpression='SET historial_pedidos = list_append(if_not_exists(historial_pedidos, :empty_list), :pedido)',
-            ExpressionAttributeValues={
-                ':pedido': [pedido_id],
-                ':empty_list': []
-            },
-            ReturnValues='UPDATED_NEW'
-        )
-        
-        print(f'Pedido {pedido_id} agregado al historial del usuario {usuario_correo}')
-        return response.get('Attributes')
-        
-    except Exception as e:
-        print(f'Error agregando pedido al usuario: {str(e)}')
-        raise
-
 def resetear_pedido_a_inicial(local_id, pedido_id):
     """Resetea un pedido a su estado inicial para reintentar el workflow"""
     table = dynamodb.Table(os.environ['TABLE_PEDIDOS'])
@@ -307,3 +462,448 @@ def resetear_pedido_a_inicial(local_id, pedido_id):
     except Exception as e:
         print(f'Error reseteando pedido: {str(e)}')
         raise
+
+# Límite de operaciones por TransactWriteItems
+TRANSACCION_MAX_ITEMS = 100
+
+def agrupar_cantidades_productos(productos):
+    """Suma las cantidades por nombre de producto (un carrito puede repetir productos)"""
+    cantidades = {}
+    for producto in productos or []:
+        nombre = producto['nombre']
+        cantidades[nombre] = cantidades.get(nombre, 0) + producto['cantidad']
+    return cantidades
+
+def _ejecutar_transaccion(transact_items, max_reintentos=3):
+    """
+    Ejecuta un TransactWriteItems reintentando solo los conflictos entre
+    transacciones concurrentes (TransactionConflict) con backoff exponencial.
+    Devuelve None si se confirmó o la lista de CancellationReasons si se canceló.
+    """
+    client = dynamodb.meta.client
+    
+    for intento in range(max_reintentos + 1):
+        try:
+            client.transact_write_items(TransactItems=transact_items)
+            return None
+        except client.exceptions.TransactionCanceledException as e:
+            razones = e.response.get('CancellationReasons', [])
+            codigos = [r.get('Code') for r in razones]
+            
+            if 'ConditionalCheckFailed' not in codigos and 'TransactionConflict' in codigos and intento < max_reintentos:
+                print(f'Conflicto de transacción, reintento {intento + 1}')
+                time.sleep(0.05 * (2 ** intento))
+                continue
+            
+            return razones
+
+def crear_pedido_con_reserva_stock(pedido):
+    """
+    Guarda el pedido y descuenta el stock de cada producto (stock >= cantidad)
+    en un único TransactWriteItems. El historial del usuario se sirve desde el
+    índice usuario-fecha-index de Pedidos, por lo que no se toca Usuarios.
+    El pedido se guarda con stock_reservado: solo esos pedidos devuelven
+    stock al cancelarse o eliminarse (los anteriores o los del DataGenerator
+    nunca lo descontaron).
+    Retorna (True, None) o (False, mensaje) si la transacción fue cancelada.
+    """
+    local_id = pedido['local_id']
+    cantidades = agrupar_cantidades_productos(pedido.get('productos'))
+    
+    # Pedido + productos
+    if len(cantidades) + 1 > TRANSACCION_MAX_ITEMS:
+        return False, f'El pedido no puede tener más de {TRANSACCION_MAX_ITEMS - 1} productos distintos'
+    
+    if cantidades:
+        pedido['stock_reservado'] = True
+    
+    transact_items = [{
+        'Put': {
+            'TableName': os.environ['TABLE_PEDIDOS'],
+            'Item': pedido,
+            'ConditionExpression': 'attribute_not_exists(pedido_id)'
+        }
+    }]
+    
+    for nombre, cantidad in cantidades.items():
+        transact_items.append({
+            'Update': {
+                'TableName': os.environ['TABLE_PRODUCTOS'],
+                'Key': {'local_id': local_id, 'nombre': nombre},
+                'UpdateExpression': 'SET stock = stock - :cantidad',
+                'ConditionExpression': 'attribute_exists(nombre) AND stock >= :cantidad',
+                'ExpressionAttributeValues': {':cantidad': cantidad}
+            }
+        })
+    
+    razones = _ejecutar_transaccion(transact_items)
+    if razones is None:
+        print(f'Pedido {pedido["pedido_id"]} creado con stock reservado para {len(cantidades)} productos')
+        return True, None
+    
+    # Las razones llegan en el mismo orden que transact_items
+    nombres = list(cantidades.keys())
+    for i, razon in enumerate(razones):
+        if razon.get('Code') in (None, 'None'):
+            continue
+        if i == 0:
+            return False, f'El pedido {pedido["pedido_id"]} ya existe'
+        return False, f"Stock insuficiente para '{nombres[i - 1]}'"
+    
+    return False, 'No se pudo reservar el stock del pedido, intente nuevamente'
+
+def _operaciones_reponer_stock(local_id, cantidades):
+    """
+    Updates de TransactWriteItems que devuelven al inventario el stock
+    reservado por un pedido. Van en la misma transacción que cancela o
+    elimina el pedido (junto con stock_liberado), así la reposición ocurre
+    una sola vez y no se pierde si la Lambda falla a mitad de camino
+    """
+    return [
+        {
+            'Update': {
+                'TableName': os.environ['TABLE_PRODUCTOS'],
+                'Key': {'local_id': local_id, 'nombre': nombre},
+                'UpdateExpression': 'ADD stock :cantidad',
+                'ConditionExpression': 'attribute_exists(nombre)',
+                'ExpressionAttributeValues': {':cantidad': cantidad}
+            }
+        }
+        for nombre, cantidad in cantidades.items()
+    ]
+
+def _tiene_stock_reservado(pedido):
+    """El pedido descontó stock al crearse y aún no lo devolvió"""
+    return bool(pedido.get('stock_reservado')) and not pedido.get('stock_liberado')
+
+def _stock_por_reponer(pedido, omitidos):
+    """Cantidades a reponer de un pedido sin los productos eliminados del catálogo"""
+    cantidades = agrupar_cantidades_productos(pedido.get('productos'))
+    return {nombre: cantidad for nombre, cantidad in cantidades.items() if nombre not in omitidos}
+
+def _productos_inexistentes(razones, nombres, desde):
+    """Productos cuya reposición falló porque ya no existen (razones desde el índice desde)"""
+    return {
+        nombres[i - desde] for i, r in enumerate(razones)
+        if i >= desde and r.get('Code') == 'ConditionalCheckFailed'
+    }
+
+def eliminar_pedido(pedido):
+    """
+    Elimina un pedido. Si aún tenía stock reservado (stock_reservado, no fue
+    recibido ni se repuso al cancelarlo) lo devuelve al inventario en el mismo
+    TransactWriteItems. Retorna True si se repuso stock
+    """
+    local_id = pedido['local_id']
+    pedido_id = pedido['pedido_id']
+    omitidos = set()
+    
+    for _ in range(3):
+        reponer = pedido.get('estado') != 'recibido' and _tiene_stock_reservado(pedido)
+        cantidades = _stock_por_reponer(pedido, omitidos) if reponer else {}
+        
+        operacion_pedido = {
+            'TableName': os.environ['TABLE_PEDIDOS'],
+            'Key': {'local_id': local_id, 'pedido_id': pedido_id},
+            'ConditionExpression': 'attribute_exists(pedido_id)'
+        }
+        if reponer:
+            # Si el pedido cambió de estado o ya repuso su stock se vuelve a leer
+            operacion_pedido['ConditionExpression'] += ' AND #estado = :estado AND attribute_not_exists(stock_liberado)'
+            operacion_pedido['ExpressionAttributeNames'] = {'#estado': 'estado'}
+            operacion_pedido['ExpressionAttributeValues'] = {':estado': pedido.get('estado')}
+        
+        razones = _ejecutar_transaccion([{'Delete': operacion_pedido}] + _operaciones_reponer_stock(local_id, cantidades))
+        if razones is None:
+            print(f'Pedido {pedido_id} eliminado, stock repuesto para {len(cantidades)} productos')
+            _retirar_de_colas(pedido)
+            return reponer
+        
+        if razones and razones[0].get('Code') == 'ConditionalCheckFailed':
+            print(f'El pedido {pedido_id} cambió durante la eliminación, releyendo')
+            pedido = obtener_pedido(local_id, pedido_id)
+            if not pedido:
+                return False
+        
+        faltantes = _productos_inexistentes(razones, list(cantidades), 1)
+        if faltantes:
+            print(f'Productos inexistentes, se omiten de la reposición: {faltantes}')
+            omitidos |= faltantes
+    
+    raise Exception(f'No se pudo eliminar el pedido {pedido_id}')
+
+def _operacion_liberar_empleado(local_id, dni, role, pedido_id=None):
+    """
+    Update de TransactWriteItems que libera a un empleado ocupado y lo vuelve a
+    publicar en el índice de disponibles. Con pedido_id solo aplica si el
+    empleado sigue asignado a ese pedido
+    """
+    condicion = 'attribute_exists(dni) AND ocupado = :ocupado'
+    valores = {
+        ':ocupado': True,
+        ':libre': False,
+        ':disponible': clave_disponibilidad(local_id, role.capitalize())
+    }
+    if pedido_id:
+        condicion += ' AND (attribute_not_exists(pedido_asignado) OR pedido_asignado = :pedido)'
+        valores[':pedido'] = pedido_id
+    
+    return {
+        'Update': {
+            'TableName': os.environ['TABLE_EMPLEADOS'],
+            'Key': {'local_id': local_id, 'dni': dni},
+            'UpdateExpression': 'SET ocupado = :libre, disponible_key = :disponible REMOVE ocupado_desde, pedido_asignado',
+            'ConditionExpression': condicion,
+            'ExpressionAttributeValues': valores
+        }
+    }
+
+def _despertar_colas(local_id, empleados):
+    """Reanuda un pedido en cola por cada empleado liberado fuera de marcar_empleado_libre"""
+    for empleado in empleados:
+        try:
+            despertar_siguiente_en_cola(local_id, empleado['rol'].capitalize(), empleado['dni'])
+        except Exception as e:
+            print(f'Error reanudando la cola de {empleado["rol"]}: {str(e)}')
+
+def _retirar_de_colas(pedido):
+    """Quita el pedido de las colas de trabajo; su taskToken deja de ser válido"""
+    try:
+        retirar_pedido_de_colas(pedido['local_id'], pedido['pedido_id'], pedido.get('fecha_creacion', ''))
+    except Exception as e:
+        print(f'Error retirando el pedido {pedido["pedido_id"]} de las colas: {str(e)}')
+
+def empleados_del_historial(historial):
+    """Empleados distintos que aparecen en el historial de un pedido (dni, rol, activo)"""
+    empleados = {}
+    for estado in historial:
+        empleado = estado.get('empleado')
+        if empleado and empleado.get('dni') and empleado['dni'] not in empleados:
+            empleados[empleado['dni']] = {
+                'dni': empleado['dni'],
+                'rol': empleado.get('rol') or '',
+                'estaba_activo': estado.get('activo', False)
+            }
+    return list(empleados.values())
+
+def empleados_asignados(local_id, pedido_id, empleados):
+    """
+    Filtra los empleados del historial a los que siguen ocupados por este
+    pedido (un BatchGetItem). Los que ya se liberaron o pasaron a otro
+    pedido harían fallar la condición de la transacción de liberación
+    """
+    if not empleados:
+        return []
+    
+    tabla = os.environ['TABLE_EMPLEADOS']
+    items = batch_get_items({
+        tabla: {
+            'Keys': [{'local_id': local_id, 'dni': e['dni']} for e in empleados],
+            'ProjectionExpression': 'dni, ocupado, pedido_asignado'
+        }
+    }).get(tabla, [])
+    
+    ocupados = {
+        item['dni'] for item in items
+        if item.get('ocupado') and item.get('pedido_asignado', pedido_id) == pedido_id
+    }
+    return [e for e in empleados if e['dni'] in ocupados]
+
+def liberar_pedido_transaccional(pedido, motivo, resetear_estado):
+    """
+    Libera a todos los empleados del pedido y cierra, cancela o resetea el
+    pedido en un único TransactWriteItems: o se aplica todo o nada, así un
+    fallo a mitad de camino no deja empleados ocupados para siempre.
+    
+    - servicio_saturado: pedido cancelado con el historial cerrado
+    - resetear_estado: pedido de vuelta a "procesando" con historial nuevo
+    - reintento_workflow sin reseteo: pedido cancelado
+    - otro motivo: solo se cierra el historial
+    
+    Al cancelar, la misma transacción devuelve el stock reservado y marca
+    stock_liberado, así la reposición no se pierde ni se repite. El pedido
+    sale además de las colas de trabajo en las que esperaba.
+    Solo se liberan los empleados que siguen ocupados por este pedido (se
+    leen antes de cada intento); si el pedido cambió entre la lectura y la
+    transacción se vuelve a leer.
+    Retorna dict con liberados, estado_final, reseteado y stock_repuesto
+    """
+    local_id = pedido['local_id']
+    pedido_id = pedido['pedido_id']
+    resetear = resetear_estado and motivo != 'servicio_saturado'
+    cancelar = not resetear and motivo in ['servicio_saturado', 'reintento_workflow']
+    omitidos = set()
+    productos_omitidos = set()
+    
+    for intento in range(3):
+        ahora = datetime.now().isoformat()
+        historial = pedido.get('historial_estados', [])
+        reponer = cancelar and _tiene_stock_reservado(pedido)
+        cantidades = _stock_por_reponer(pedido, productos_omitidos) if reponer else {}
+        
+        clausulas = []
+        valores = {':total': len(historial)}
+        
+        if resetear:
+            estado_final = 'procesando'
+            clausulas += ['#estado = :estado', 'historial_estados = :historial']
+            valores[':historial'] = [{
+                'estado': 'procesando',
+                'hora_inicio': ahora,
+                'hora_fin': ahora,
+                'activo': True,
+                'empleado': None
+            }]
+        else:
+            estado_final = 'cancelado' if cancelar else pedido.get('estado', 'procesando')
+            cierre, valores_cierre, _ = cerrar_estados_activos(historial, ahora)
+            clausulas += (['#estado = :estado'] if cancelar else []) + cierre
+            valores.update(valores_cierre)
+        
+        if '#estado = :estado' in clausulas:
+            valores[':estado'] = estado_final
+        
+        condicion = 'attribute_exists(pedido_id) AND size(historial_estados) = :total'
+        if reponer:
+            clausulas.append('stock_liberado = :true')
+            valores[':true'] = True
+            condicion += ' AND attribute_not_exists(stock_liberado)'
+        
+        operacion_pedido = {
+            'TableName': os.environ['TABLE_PEDIDOS'],
+            'Key': {'local_id': local_id, 'pedido_id': pedido_id},
+            'UpdateExpression': ('SET ' + ', '.join(clausulas) + ' ' if clausulas else '') + 'REMOVE task_token, esperando_confirmacion',
+            'ConditionExpression': condicion,
+            'ExpressionAttributeValues': valores
+        }
+        if '#estado = :estado' in clausulas:
+            operacion_pedido['ExpressionAttributeNames'] = {'#estado': 'estado'}
+        
+        empleados = [e for e in empleados_del_historial(historial) if e['dni'] not in omitidos]
+        empleados = empleados_asignados(local_id, pedido_id, empleados)
+        
+        # Los empleados que no caben junto al pedido y sus productos se
+        # liberan en lotes después de confirmar la transacción
+        cupo = TRANSACCION_MAX_ITEMS - 1 - len(cantidades)
+        excedentes = empleados[cupo:]
+        empleados = empleados[:cupo]
+        
+        transact_items = [{'Update': operacion_pedido}] + [
+            _operacion_liberar_empleado(local_id, e['dni'], e['rol'], pedido_id)
+            for e in empleados
+        ] + _operaciones_reponer_stock(local_id, cantidades)
+        
+        razones = _ejecutar_transaccion(transact_items)
+        if razones is None:
+            print(f'Pedido {pedido_id} liberado ({motivo}): {len(empleados)} empleados, estado {estado_final}')
+            if reponer:
+                print(f'Stock repuesto para pedido {pedido_id}: {len(cantidades)} productos')
+            _retirar_de_colas(pedido)
+            _despertar_colas(local_id, empleados)
+            
+            if excedentes:
+                print(f'⚠️  {len(excedentes)} empleados no caben en la transacción del pedido {pedido_id}, se liberan en lote')
+                liberados = liberar_empleados_en_lote([
+                    {'local_id': local_id, 'dni': e['dni'], 'rol': e['rol'], 'pedido_asignado': pedido_id}
+                    for e in excedentes
+                ])
+                if len(liberados) < len(excedentes):
+                    # Ya liberados o reasignados entre la lectura y el lote
+                    print(f'❌ Pedido {pedido_id}: {len(excedentes) - len(liberados)} empleados excedentes no se liberaron')
+                dnis_liberados = {e['dni'] for e in liberados}
+                empleados = empleados + [e for e in excedentes if e['dni'] in dnis_liberados]
+            
+            return {
+                'liberados': empleados,
+                'estado_final': estado_final,
+                'reseteado': resetear,
+                'stock_repuesto': reponer
+            }
+        
+        # Las razones llegan en el mismo orden que transact_items
+        if razones and razones[0].get('Code') == 'ConditionalCheckFailed':
+            print(f'El pedido {pedido_id} cambió durante la liberación, releyendo')
+            pedido = obtener_pedido(local_id, pedido_id)
+        
+        ya_libres = {
+            empleados[i - 1]['dni'] for i, r in enumerate(razones)
+            if 0 < i <= len(empleados) and r.get('Code') == 'ConditionalCheckFailed'
+        }
+        if ya_libres:
+            print(f'Empleados ya liberados o asignados a otro pedido, se omiten: {ya_libres}')
+            omitidos |= ya_libres
+        
+        faltantes = _productos_inexistentes(razones, list(cantidades), len(empleados) + 1)
+        if faltantes:
+            print(f'Productos inexistentes, se omiten de la reposición: {faltantes}')
+            productos_omitidos |= faltantes
+    
+    raise Exception(f'No se pudo liberar el pedido {pedido_id}')
+
+def liberar_empleados_en_lote(empleados, tamano_lote=25):
+    """
+    Libera empleados ocupados en transacciones de hasta tamano_lote items. Cada
+    empleado se libera solo si sigue asignado al mismo pedido con el que fue
+    detectado (pedido_asignado); los que cambiaron se omiten.
+    
+    Args:
+        empleados: Lista de dicts con local_id, dni, rol y pedido_asignado
+    
+    Returns:
+        list: Empleados efectivamente liberados
+    """
+    liberados = []
+    
+    for inicio in range(0, len(empleados), tamano_lote):
+        lote = empleados[inicio:inicio + tamano_lote]
+        
+        for _ in range(2):
+            if not lote:
+                break
+            
+            transact_items = [
+                _operacion_liberar_empleado(e['local_id'], e['dni'], e['rol'], e.get('pedido_asignado'))
+                for e in lote
+            ]
+            
+            razones = _ejecutar_transaccion(transact_items)
+            if razones is None:
+                liberados.extend(lote)
+                break
+            
+            cambiaron = {i for i, r in enumerate(razones) if r.get('Code') == 'ConditionalCheckFailed'}
+            if not cambiaron:
+                print(f'Lote de {len(lote)} empleados no se pudo liberar: {[r.get("Code") for r in razones]}')
+                break
+            lote = [e for i, e in enumerate(lote) if i not in cambiaron]
+    
+    for empleado in liberados:
+        _despertar_colas(empleado['local_id'], [empleado])
+    
+    print(f'Empleados liberados en lote: {len(liberados)} de {len(empleados)}')
+    return liberados
+
+def incrementar_version_catalogo(local_id):
+    """
+    Incrementa precios_version del local para invalidar los índices de precios
+    cacheados en las Lambdas. Se llama después de cada cambio en productos,
+    combos u ofertas; un fallo no debe romper la escritura del catálogo.
+    """
+    table = dynamodb.Table(os.environ['TABLE_LOCALES'])
+    
+    try:
+        response = table.update_item(
+            Key={'local_id': local_id},
+            UpdateExpression='ADD precios_version :uno',
+            ConditionExpression='attribute_exists(local_id)',
+            ExpressionAttributeValues={':uno': 1},
+            ReturnValues='UPDATED_NEW'
+        )
+        
+        version = response['Attributes']['precios_version']
+        print(f'Catálogo del local {local_id} en versión {version}')
+        return version
+        
+    except Exception as e:
+        print(f'Error incrementando versión del catálogo: {str(e)}')
+        return None
@@ -0,0 +1,240 @@
+"""
+Utilidades de Idempotencia
+Permite que los reintentos de un cliente (timeouts de red, apps móviles) reciban
+la misma respuesta sin volver a ejecutar el handler
+"""
+
+import boto3
+import functools
+import hashlib
+import json
+import os
+import time
+from typing import Dict, Optional
+from botocore.exceptions import ClientError
+
+from .cors_utils import get_cors_headers
+
+# Cliente DynamoDB
+dynamodb = boto3.resource('dynamodb')
+
+# Tabla con TTL sobre el atributo expira_en
+TABLE_IDEMPOTENCIA = os.environ.get('TABLE_IDEMPOTENCIA', 'ChinaWok-Idempotencia')
+
+# Tiempo durante el cual se reproduce la respuesta guardada
+IDEMPOTENCIA_TTL_SEGUNDOS = int(os.environ.get('IDEMPOTENCIA_TTL_SEGUNDOS', 24 * 60 * 60))
+
+ESTADO_EN_PROCESO = 'EN_PROCESO'
+ESTADO_COMPLETADO = 'COMPLETADO'
+
+
+def obtener_idempotency_key(event: Dict) -> Optional[str]:
+    """
+    Obtiene la clave de idempotencia del header Idempotency-Key (sin distinguir
+    mayúsculas) o, en invocaciones directas, del campo idempotency_key
+
+    Args:
+        event: Evento de Lambda (API Gateway o invocación directa)
+
+    Returns:
+        str: Clave enviada por el cliente, o None si no se envió
+    """
+    headers = event.get('headers') or {}
+    for nombre, valor in headers.items():
+        if nombre.lower() == 'idempotency-key' and valor:
+            return str(valor)
+
+    if 'body' not in event and event.get('idempotency_key'):
+        return str(event['idempotency_key'])
+
+    return None
+
+
+def obtener_identidad(event: Dict) -> str:
+    """
+    Identidad del llamador según el Lambda Authorizer (correo o principalId).
+    Las invocaciones directas y los endpoints sin authorizer devuelven ''
+
+    Args:
+        event: Evento de Lambda (API Gateway o invocación directa)
+
+    Returns:
+        str: Identidad autenticada, o '' si no hay authorizer
+    """
+    authorizer = (event.get('requestContext') or {}).get('authorizer') or {}
+    return str(authorizer.get('correo') or authorizer.get('principalId') or '')
+
+
+def clave_idempotencia(event: Dict, operacion: str) -> Optional[str]:
+    """
+    Clave del registro de idempotencia: operación, identidad autenticada e
+    Idempotency-Key. Así dos usuarios que envían la misma clave no comparten
+    registro ni reciben la respuesta del otro
+
+    Args:
+        event: Evento de Lambda (API Gateway o invocación directa)
+        operacion: Nombre de la operación
+
+    Returns:
+        str: Clave del registro, o None si la petición no trae Idempotency-Key
+    """
+    idempotency_key = obtener_idempotency_key(event)
+    if not idempotency_key:
+        return None
+    return f'{operacion}#{obtener_identidad(event)}#{idempotency_key}'
+
+
+def calcular_hash_body(event: Dict) -> str:
+    """
+    Calcula un hash SHA-256 estable del cuerpo de la petición. El JSON se
+    normaliza (claves ordenadas) para que el orden de los campos no importe
+
+    Args:
+        event: Evento de Lambda (API Gateway o invocación directa)
+
+    Returns:
+        str: Hash hexadecimal del cuerpo
+    """
+    if 'body' in event:
+        body = event.get('body')
+        if isinstance(body, str):
+            try:
+                body = json.loads(body)
+            except ValueError:
+                return hashlib.sha256(body.encode('utf-8')).hexdigest()
+    else:
+        body = {k: v for k, v in event.items() if k != 'idempotency_key'}
+
+    normalizado = json.dumps(body, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(normalizado.encode('utf-8')).hexdigest()
+
+
+def _respuesta_error(status_code: int, error: str, mensaje: str) -> Dict:
+    return {
+        'statusCode': status_code,
+        'headers': get_cors_headers(),
+        'body': json.dumps({'error': error, 'message': mensaje})
+    }
+
+
+def _resolver_registro(registro: Dict, body_hash: str) -> Optional[Dict]:
+    """Devuelve la respuesta que corresponde a un registro vigente, o None si se puede ejecutar"""
+    ahora = int(time.time())
+
+    if int(registro.get('expira_en', 0)) <= ahora:
+        return None
+
+    if registro.get('body_hash') != body_hash:
+        return _respuesta_error(
+            422,
+            'Idempotency-Key reutilizada',
+            'La clave de idempotencia ya se usó con un cuerpo de petición distinto'
+        )
+
+    if registro.get('estado') == ESTADO_COMPLETADO:
+        return json.loads(registro['respuesta'])
+
+    if int(registro.get('bloqueo_hasta', 0)) > ahora:
+        return _respuesta_error(
+            409,
+            'Petición en proceso',
+            'Una petición con la misma clave de idempotencia se está procesando'
+        )
+
+    # Registro EN_PROCESO abandonado (la Lambda anterior terminó sin guardar respuesta)
+    return None
+
+
+def idempotent(operacion: str):
+    """
+    Decorador que hace idempotente un handler Lambda. La primera petición con
+    una Idempotency-Key se ejecuta y su respuesta se guarda; los reintentos con
+    la misma clave y el mismo cuerpo reciben la respuesta guardada con un solo
+    get_item. Las peticiones sin clave se ejecutan normalmente.
+
+    Args:
+        operacion: Nombre de la operación, separa claves iguales entre endpoints.
+            La clave del registro incluye además la identidad autenticada
+
+    Ejemplo:
+        >>> @idempotent('crear_pedido')
+        >>> def handler(event, context):
+        >>>     # Un reintento con la misma Idempotency-Key no crea otro pedido
+        >>>     pass
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(event, context):
+            idempotency_key = clave_idempotencia(event, operacion)
+
+            if not idempotency_key:
+                return func(event, context)
+
+            table = dynamodb.Table(TABLE_IDEMPOTENCIA)
+            clave = {'idempotency_key': idempotency_key}
+            body_hash = calcular_hash_body(event)
+
+            registro = table.get_item(Key=clave, ConsistentRead=True).get('Item')
+            if registro:
+                respuesta = _resolver_registro(registro, body_hash)
+                if respuesta is not None:
+                    print(f'Idempotencia: respuesta resuelta para {clave["idempotency_key"]}')
+                    return respuesta
+
+            # Reservar la clave; el bloqueo dura lo que le queda de vida a la Lambda
+            ahora = int(time.time())
+            restante = context.get_remaining_time_in_millis() // 1000 if context else 300
+
+            try:
+                table.put_item(
+                    Item={
+                        **clave,
+                        'estado': ESTADO_EN_PROCESO,
+                        'body_hash': body_hash,
+                        'bloqueo_hasta': ahora + restante + 5,
+                        'expira_en': ahora + IDEMPOTENCIA_TTL_SEGUNDOS
+                    },
+                    ConditionExpression='attribute_not_exists(idempotency_key) OR expira_en <= :ahora OR (estado = :en_proceso AND bloqueo_hasta <= :ahora)',
+                    ExpressionAttributeValues={
+                        ':ahora': ahora,
+                        ':en_proceso': ESTADO_EN_PROCESO
+                    }
+                )
+            except ClientError as e:
+                if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                    raise
+                # Otra petición con la misma clave ganó la carrera
+                registro = table.get_item(Key=clave, ConsistentRead=True).get('Item') or {}
+                return _resolver_registro(registro, body_hash) or _respuesta_error(
+                    409,
+                    'Petición en proceso',
+                    'Una petición con la misma clave de idempotencia se está procesando'
+                )
+
+            try:
+                respuesta = func(event, context)
+            except Exception:
+                table.delete_item(Key=clave)
+                raise
+
+            # Los errores del servidor no se guardan para permitir el reintento
+            if isinstance(respuesta, dict) and int(respuesta.get('statusCode', 200)) >= 500:
+                table.delete_item(Key=clave)
+                return respuesta
+
+            try:
+                table.update_item(
+                    Key=clave,
+                    UpdateExpression='SET estado = :completado, respuesta = :respuesta REMOVE bloqueo_hasta',
+                    ExpressionAttributeValues={
+                        ':completado': ESTADO_COMPLETADO,
+                        ':respuesta': json.dumps(respuesta, default=str)
+                    }
+                )
+            except Exception as e:
+                print(f'Error guardando respuesta idempotente: {str(e)}')
+
+            return respuesta
+
+        return wrapper
+    return decorator
@@ -0,0 +1,249 @@
+"""
+KPIs por local mantenidos de forma incremental
+Cada cambio de los streams aporta la diferencia entre la contribución de la
+imagen nueva y la de la anterior; así una transición de estado resta del
+contador viejo y suma al nuevo. Los deltas de un lote se agrupan por local y
+se aplican con un solo UpdateItem (ADD) por local, condicionado a la última
+SequenceNumber aplicada (ver stream_idempotencia)
+"""
+
+import boto3
+import os
+import time
+from decimal import Decimal
+from typing import Any, Dict, Iterable, List, Optional
+from .stream_idempotencia import actualizar_idempotente, sumar_aportes, es_atributo_secuencia
+
+dynamodb = boto3.resource('dynamodb')
+
+# Un item por local (PK local_id) con contadores y sumas
+TABLE_KPIS_LOCAL = os.environ.get('TABLE_KPIS_LOCAL', 'ChinaWok-KPIs-Local')
+
+# Mismos umbrales que la consulta de estadísticas en Athena
+STOCK_BAJO = 10
+RESENA_EXCELENTE = Decimal('4.5')
+RESENA_MALA = Decimal('3.0')
+
+# Datos descriptivos del local copiados del stream de Locales
+CAMPOS_LOCAL = ['direccion', 'telefono', 'hora_apertura', 'hora_finalizacion', 'gerente']
+
+# Contadores por estado y rol (guardados como pedidos_<estado> y
+# empleados_<rol>) con su nombre en la consulta de estadísticas
+NOMBRES_ESTADISTICAS = {
+    'pedidos_recibido': 'pedidos_completados',
+    'pedidos_enviando': 'pedidos_en_envio',
+    'pedidos_empacando': 'pedidos_empacando',
+    'pedidos_cocinando': 'pedidos_cocinando',
+    'pedidos_eligiendo': 'pedidos_eligiendo',
+    'empleados_cocinero': 'cocineros',
+    'empleados_despachador': 'despachadores',
+    'empleados_repartidor': 'repartidores',
+}
+
+# Atributos del item que no son KPIs
+CAMPOS_INTERNOS = ['local_id', 'actualizado_en', 'reconciliado_en', 'diferencias_pendientes'] + CAMPOS_LOCAL
+
+
+def _numero(valor) -> Decimal:
+    if valor is None:
+        return Decimal(0)
+    return valor if isinstance(valor, Decimal) else Decimal(str(valor))
+
+
+def contribucion(table_key: str, record: Optional[Dict[str, Any]]) -> Dict[str, Decimal]:
+    """Contadores y sumas que un registro aporta a los KPIs de su local"""
+    if not record:
+        return {}
+
+    if table_key == 'pedidos':
+        return {
+            'total_pedidos': Decimal(1),
+            'revenue_total': _numero(record.get('costo')),
+            f"pedidos_{record.get('estado') or 'sin_estado'}": Decimal(1),
+        }
+
+    if table_key == 'productos':
+        stock = _numero(record.get('stock'))
+        return {
+            'total_productos': Decimal(1),
+            'inventario_total': stock,
+            'productos_stock_bajo': Decimal(1 if 0 < stock < STOCK_BAJO else 0),
+            'productos_sin_stock': Decimal(1 if stock == 0 else 0),
+        }
+
+    if table_key == 'empleados':
+        return {
+            'total_empleados': Decimal(1),
+            f"empleados_{(record.get('role') or 'sin_rol').lower()}": Decimal(1),
+            'suma_calificacion_staff': _numero(record.get('calificacion_prom')),
+            'nomina_mensual': _numero(record.get('sueldo')),
+        }
+
+    if table_key == 'resenas':
+        calificacion = _numero(record.get('calificacion'))
+        return {
+            'total_resenas': Decimal(1),
+            'suma_calificacion_resenas': calificacion,
+            'resenas_excelentes': Decimal(1 if calificacion >= RESENA_EXCELENTE else 0),
+            'resenas_malas': Decimal(1 if calificacion < RESENA_MALA else 0),
+        }
+
+    if table_key == 'combos':
+        return {
+            'total_combos': Decimal(1),
+            'combos_disponibles': Decimal(1 if record.get('disponible') is True else 0),
+        }
+
+    return {}
+
+
+def calcular_aportes(cambios: Iterable[Dict[str, Any]]) -> Dict[tuple, List[tuple]]:
+    """
+    Aporte de cada cambio a los KPIs de su local: la diferencia de
+    contribuciones (nueva - anterior) y, para Locales, sus datos descriptivos
+
+    Args:
+        cambios: Dicts con 'table_key', 'secuencia', 'anterior' y 'nuevo' (imágenes deserializadas)
+
+    Returns:
+        dict: (local_id, table_key) -> [(secuencia, {'delta': {...}, 'info': {...} o None})]
+    """
+    aportes = {}
+
+    for cambio in cambios:
+        anterior = cambio.get('anterior') or {}
+        nuevo = cambio.get('nuevo') or {}
+        local_id = nuevo.get('local_id') or anterior.get('local_id')
+        if not local_id:
+            continue
+
+        if cambio['table_key'] == 'locales':
+            if not nuevo:
+                continue
+            aporte = {'delta': {}, 'info': {c: nuevo[c] for c in CAMPOS_LOCAL if c in nuevo}}
+        else:
+            delta = dict(contribucion(cambio['table_key'], nuevo))
+            for campo, valor in contribucion(cambio['table_key'], anterior).items():
+                delta[campo] = delta.get(campo, Decimal(0)) - valor
+            delta = {campo: valor for campo, valor in delta.items() if valor != 0}
+
+            # Los MODIFY que no tocan KPIs (ej: ocupado de un empleado) no generan escrituras
+            if not delta:
+                continue
+            aporte = {'delta': delta, 'info': None}
+
+        aportes.setdefault((local_id, cambio['table_key']), []).append((cambio['secuencia'], aporte))
+
+    return aportes
+
+
+def construir_update(aportes: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """UpdateItem con ADD atómico de los deltas (y SET de los datos descriptivos más recientes)"""
+    delta = sumar_aportes([aporte['delta'] for aporte in aportes])
+    info = next((aporte['info'] for aporte in reversed(aportes) if aporte['info']), None)
+    if not delta and info is None:
+        return None
+
+    nombres = {}
+    valores = {':ahora': int(time.time())}
+    adds = []
+    sets = ['actualizado_en = :ahora']
+
+    for i, (campo, valor) in enumerate(delta.items()):
+        nombres[f'#k{i}'] = campo
+        valores[f':k{i}'] = valor
+        adds.append(f'#k{i} :k{i}')
+
+    for i, (campo, valor) in enumerate((info or {}).items()):
+        nombres[f'#i{i}'] = campo
+        valores[f':i{i}'] = valor
+        sets.append(f'#i{i} = :i{i}')
+
+    expresion = 'SET ' + ', '.join(sets)
+    if adds:
+        expresion += ' ADD ' + ', '.join(adds)
+
+    kwargs = {
+        'UpdateExpression': expresion,
+        'ExpressionAttributeValues': valores
+    }
+    if nombres:
+        kwargs['ExpressionAttributeNames'] = nombres
+    return kwargs
+
+
+def aplicar_cambios(cambios: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Calcula y aplica los aportes de un lote del stream, un UpdateItem por
+    local y tabla de origen, condicionado a la última secuencia aplicada:
+    un lote reentregado no vuelve a sumar
+
+    Un fallo no detiene el resto del lote; se retorna la primera secuencia
+    de cada grupo fallido para reportarla como batchItemFailure y que Lambda
+    reintente desde ahí
+
+    Returns:
+        dict: {'locales': actualizados, 'duplicados': ya aplicados,
+               'fallidos': con error, 'secuencias_fallidas': [...]}
+    """
+    table = dynamodb.Table(TABLE_KPIS_LOCAL)
+    actualizados = 0
+    duplicados = 0
+    fallidas = []
+
+    for (local_id, table_key), aportes in calcular_aportes(cambios).items():
+        try:
+            respuesta = actualizar_idempotente(table, {'local_id': local_id}, table_key, aportes, construir_update)
+            if respuesta is None:
+                duplicados += 1
+            else:
+                actualizados += 1
+        except Exception as e:
+            fallidas.append(min(secuencia for secuencia, _ in aportes))
+            print(f'❌ Error aplicando KPIs del local {local_id} ({table_key}): {str(e)}')
+
+    return {
+        'locales': actualizados,
+        'duplicados': duplicados,
+        'fallidos': len(fallidas),
+        'secuencias_fallidas': fallidas
+    }
+
+
+def _dividir(numerador, denominador, factor=1):
+    denominador = _numero(denominador)
+    if denominador == 0:
+        return 0
+    return round(float(_numero(numerador) * factor / denominador), 2)
+
+
+def construir_dashboard(item: Dict[str, Any]) -> Dict[str, Any]:
+    """Dashboard del local con los mismos nombres de la consulta de estadísticas"""
+    kpis = {
+        NOMBRES_ESTADISTICAS.get(k, k): v for k, v in item.items()
+        if k not in CAMPOS_INTERNOS and not es_atributo_secuencia(k)
+    }
+    gerente = item.get('gerente') or {}
+
+    return {
+        # Los estados y roles sin registros también se reportan, en 0
+        **{nombre: Decimal(0) for nombre in NOMBRES_ESTADISTICAS.values()},
+        **kpis,
+        'local_id': item['local_id'],
+        'direccion': item.get('direccion'),
+        'telefono': item.get('telefono'),
+        'hora_apertura': item.get('hora_apertura'),
+        'hora_finalizacion': item.get('hora_finalizacion'),
+        'gerente_nombre': gerente.get('nombre'),
+        'gerente_correo': gerente.get('correo'),
+        'ticket_promedio': _dividir(item.get('revenue_total'), item.get('total_pedidos')),
+        'tasa_completado_pct': _dividir(item.get('pedidos_recibido'), item.get('total_pedidos'), 100),
+        'calificacion_staff': _dividir(item.get('suma_calificacion_staff'), item.get('total_empleados')),
+        'calificacion_cliente': _dividir(item.get('suma_calificacion_resenas'), item.get('total_resenas')),
+    }
+
+
+def obtener_kpis(local_id: str) -> Optional[Dict[str, Any]]:
+    """KPIs de un local con un solo GetItem (None si aún no hay agregados)"""
+    item = dynamodb.Table(TABLE_KPIS_LOCAL).get_item(Key={'local_id': local_id}).get('Item')
+    return construir_dashboard(item) if item else None
@@ -0,0 +1,277 @@
+"""
+Escritura del data lake en Parquet particionado
+
+Las tablas grandes (pedidos, reseñas) se guardan como Parquet comprimido con
+esquema tipado, un archivo por partición Hive:
+
+    {S3_LAKE_PREFIX}/pedidos/local_id={id}/mes={YYYY-MM}/data.parquet
+    {S3_LAKE_PREFIX}/resenas/local_id={id}/data.parquet
+
+Las tablas de Athena usan partition projection (ver analitica-consultas/ddl),
+así que un WHERE local_id = ... solo lee los archivos de ese local.
+
+pyarrow es opcional: se obtiene de una layer aparte (AWSSDKPandas) y solo lo
+necesita el lambda de compactación.
+"""
+import io
+import os
+from .delta_log import (
+    S3_BUCKET,
+    TABLE_NAME_BY_KEY,
+    s3_client,
+    get_record_key,
+    list_delta_files,
+    read_jsonl,
+    delete_delta_files,
+    snapshot_key,
+)
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - depende de la layer desplegada
+    pa = None
+    pq = None
+
+S3_LAKE_PREFIX = os.environ.get('S3_LAKE_PREFIX', 'data-lake')
+
+PARQUET_COMPRESSION = 'snappy'
+
+
+def _esquemas():
+    """Esquemas tipados de las tablas particionadas (sin columnas de partición)"""
+    empleado = pa.struct([
+        ('dni', pa.string()),
+        ('nombre_completo', pa.string()),
+        ('rol', pa.string()),
+        ('calificacion_prom', pa.float64()),
+    ])
+    estado = pa.struct([
+        ('estado', pa.string()),
+        ('hora_inicio', pa.string()),
+        ('hora_fin', pa.string()),
+        ('activo', pa.bool_()),
+        ('empleado', empleado),
+    ])
+    return {
+        'pedidos': pa.schema([
+            ('pedido_id', pa.string()),
+            ('fecha_creacion', pa.string()),
+            ('usuario_correo', pa.string()),
+            ('productos', pa.list_(pa.struct([('nombre', pa.string()), ('cantidad', pa.int32())]))),
+            ('combos', pa.list_(pa.struct([('combo_id', pa.string()), ('cantidad', pa.int32())]))),
+            ('costo', pa.float64()),
+            ('direccion', pa.string()),
+            ('fecha_entrega_aproximada', pa.string()),
+            ('estado', pa.string()),
+            ('historial_estados', pa.list_(estado)),
+        ]),
+        'resenas': pa.schema([
+            ('resena_id', pa.string()),
+            ('pedido_id', pa.string()),
+            ('cocinero_dni', pa.string()),
+            ('despachador_dni', pa.string()),
+            ('repartidor_dni', pa.string()),
+            ('resena', pa.string()),
+            ('calificacion', pa.float64()),
+        ]),
+    }
+
+
+def _mes_pedido(record):
+    fecha = record.get('fecha_creacion')
+    return fecha[:7] if fecha else None
+
+
+# Tabla -> columnas de partición y cómo obtener cada valor del registro
+PARTITIONED_TABLES = {
+    'pedidos': [('local_id', lambda r: r.get('local_id')), ('mes', _mes_pedido)],
+    # Las reseñas no tienen fecha: solo se particionan por local
+    'resenas': [('local_id', lambda r: r.get('local_id'))],
+}
+
+
+def is_partitioned(table_key):
+    """True si la tabla se escribe como Parquet particionado"""
+    return table_key in PARTITIONED_TABLES
+
+
+def _requiere_pyarrow():
+    if pa is None:
+        raise RuntimeError(
+            'pyarrow no está disponible: agrega la layer AWSSDKPandas (PYARROW_LAYER_ARN) '
+            'al lambda de compactación'
+        )
+
+
+def partition_values(table_key, record):
+    """Tupla con los valores de partición de un registro (None si falta alguno)"""
+    valores = tuple(extraer(record) for _, extraer in PARTITIONED_TABLES[table_key])
+    return None if None in valores else valores
+
+
+def partition_key(table_key, valores):
+    """Ruta S3 del archivo Parquet de una partición"""
+    ruta = '/'.join(
+        f'{columna}={valor}'
+        for (columna, _), valor in zip(PARTITIONED_TABLES[table_key], valores)
+    )
+    return f'{S3_LAKE_PREFIX}/{table_key}/{ruta}/data.parquet'
+
+
+def _conformar(valor, tipo):
+    """Adapta un valor JSON (floats, dicts) al tipo Arrow del esquema"""
+    if valor is None:
+        return None
+    if pa.types.is_struct(tipo):
+        if not isinstance(valor, dict):
+            return None
+        return {campo.name: _conformar(valor.get(campo.name), campo.type) for campo in tipo}
+    if pa.types.is_list(tipo):
+        if not isinstance(valor, list):
+            return None
+        return [_conformar(v, tipo.value_type) for v in valor]
+    if pa.types.is_integer(tipo):
+        return int(valor)
+    if pa.types.is_floating(tipo):
+        return float(valor)
+    if pa.types.is_boolean(tipo):
+        return bool(valor)
+    return str(valor)
+
+
+def _leer_particion(table_key, valores):
+    """Registros de una partición existente (con las columnas de partición)"""
+    try:
+        response = s3_client.get_object(Bucket=S3_BUCKET, Key=partition_key(table_key, valores))
+    except s3_client.exceptions.NoSuchKey:
+        return []
+
+    tabla = pq.read_table(io.BytesIO(response['Body'].read()))
+    columnas = dict(zip((c for c, _ in PARTITIONED_TABLES[table_key]), valores))
+    return [{**record, **columnas} for record in tabla.to_pylist()]
+
+
+def _escribir_particion(table_key, valores, records):
+    """Reescribe (o elimina si quedó vacía) el archivo Parquet de una partición"""
+    s3_key = partition_key(table_key, valores)
+
+    if not records:
+        s3_client.delete_object(Bucket=S3_BUCKET, Key=s3_key)
+        return
+
+    schema = _esquemas()[table_key]
+    filas = [
+        {campo.name: _conformar(record.get(campo.name), campo.type) for campo in schema}
+        for record in records
+    ]
+    buffer = io.BytesIO()
+    pq.write_table(pa.Table.from_pylist(filas, schema=schema), buffer, compression=PARQUET_COMPRESSION)
+
+    s3_client.put_object(
+        Bucket=S3_BUCKET,
+        Key=s3_key,
+        Body=buffer.getvalue(),
+        ContentType='application/vnd.apache.parquet'
+    )
+
+
+def _agrupar_por_particion(table_key, changes):
+    """Agrupa cambios {'op', 'data'} por partición, conservando el orden"""
+    particiones = {}
+    omitidos = 0
+    for change in changes:
+        valores = partition_values(table_key, change['data'])
+        if valores is None:
+            omitidos += 1
+            continue
+        particiones.setdefault(valores, []).append(change)
+    return particiones, omitidos
+
+
+def _aplicar_en_particiones(table_key, particiones, solo_nuevos=False):
+    """
+    Aplica los cambios de cada partición y la reescribe una sola vez.
+    Con solo_nuevos, los registros ya presentes en la partición se conservan
+    y solo se insertan las claves que faltan
+    """
+    table_name = TABLE_NAME_BY_KEY[table_key]
+    upserts = 0
+    deletes = 0
+
+    for valores, changes in particiones.items():
+        existentes = _leer_particion(table_key, valores)
+        records = {get_record_key(r, table_name): r for r in existentes}
+        antes = upserts
+
+        for change in changes:
+            key = get_record_key(change['data'], table_name)
+            if change['op'] == 'REMOVE':
+                if records.pop(key, None) is not None:
+                    deletes += 1
+            elif solo_nuevos and key in records:
+                continue
+            else:
+                records[key] = change['data']
+                upserts += 1
+
+        if solo_nuevos and upserts == antes:
+            continue
+        _escribir_particion(table_key, valores, list(records.values()))
+
+    return upserts, deletes
+
+
+def compact_partitioned_table(table_key, max_files=None):
+    """
+    Equivalente a delta_log.compact_table para tablas particionadas: solo lee
+    y reescribe las particiones tocadas por los deltas pendientes
+
+    Returns:
+        dict: Resumen de la compactación
+    """
+    _requiere_pyarrow()
+
+    delta_keys = list_delta_files(table_key, max_files)
+    if not delta_keys:
+        return {'table_key': table_key, 'deltas': 0, 'status': 'sin_cambios'}
+
+    changes = [change for delta_key in delta_keys for change in read_jsonl(delta_key)]
+    particiones, omitidos = _agrupar_por_particion(table_key, changes)
+    upserts, deletes = _aplicar_en_particiones(table_key, particiones)
+
+    delete_delta_files(delta_keys)
+
+    return {
+        'table_key': table_key,
+        'deltas': len(delta_keys),
+        'upserts': upserts,
+        'deletes': deletes,
+        'particiones': len(particiones),
+        'omitidos': omitidos,
+        's3_location': f's3://{S3_BUCKET}/{S3_LAKE_PREFIX}/{table_key}/',
+        'status': 'success'
+    }
+
+
+def backfill_partitioned_table(table_key):
+    """
+    Completa las particiones a partir del snapshot JSONL heredado
+    ({S3_INGESTION_PREFIX}/{tabla}/data.jsonl). Solo inserta las claves que
+    todavía no están en Parquet: lo que ya compactaron los deltas es más
+    reciente que el snapshot y no se pisa, así que es seguro correrlo con
+    el compactador ya desplegado
+    """
+    _requiere_pyarrow()
+
+    changes = [{'op': 'INSERT', 'data': record} for record in read_jsonl(snapshot_key(table_key))]
+    particiones, omitidos = _agrupar_por_particion(table_key, changes)
+    upserts, _ = _aplicar_en_particiones(table_key, particiones, solo_nuevos=True)
+
+    return {
+        'table_key': table_key,
+        'registros': upserts,
+        'particiones': len(particiones),
+        'omitidos': omitidos,
+        'status': 'success'
+    }
@@ -0,0 +1,145 @@
+"""
+Rollup diario de pedidos por local
+Un item por local y día de entrega (PK local_id, SK fecha YYYY-MM-DD) con
+contadores atómicos e idempotentes por secuencia del stream; el récord
+diario de un mes es un solo Query. reconciliarRollupDiario corrige la deriva
+de los últimos días contra Athena
+"""
+
+import boto3
+import os
+import time
+from decimal import Decimal
+from typing import Any, Dict, Iterable, List, Optional
+from boto3.dynamodb.conditions import Key
+from .stream_idempotencia import actualizar_idempotente, sumar_aportes
+
+dynamodb = boto3.resource('dynamodb')
+
+TABLE_ROLLUP_DIARIO = os.environ.get('TABLE_ROLLUP_DIARIO', 'ChinaWok-Rollup-Diario')
+
+
+def dia_pedido(pedido: Dict[str, Any]) -> Optional[str]:
+    """Día (YYYY-MM-DD) al que se atribuye un pedido: el de su entrega aproximada"""
+    fecha = pedido.get('fecha_entrega_aproximada')
+    return fecha[:10] if fecha else None
+
+
+def contribucion_diaria(pedido: Optional[Dict[str, Any]]) -> Dict[tuple, Dict[str, Decimal]]:
+    """(local_id, día) -> contadores que aporta un pedido"""
+    if not pedido or not pedido.get('local_id'):
+        return {}
+    dia = dia_pedido(pedido)
+    if not dia:
+        return {}
+
+    costo = pedido.get('costo')
+    return {
+        (pedido['local_id'], dia): {
+            'total_pedidos': Decimal(1),
+            'revenue_diario': costo if isinstance(costo, Decimal) else Decimal(str(costo or 0)),
+        }
+    }
+
+
+def calcular_aportes_diarios(cambios: Iterable[Dict[str, Any]]) -> Dict[tuple, List[tuple]]:
+    """
+    Diferencia de contribuciones (nueva - anterior) de cada cambio de
+    pedidos, agrupada por local y día. Un pedido cuya fecha de entrega
+    cambia de día resta del día anterior y suma al nuevo
+
+    Returns:
+        dict: (local_id, día) -> [(secuencia, {campo: delta})]
+    """
+    aportes = {}
+    for cambio in cambios:
+        if cambio['table_key'] != 'pedidos':
+            continue
+
+        deltas = {}
+        for signo, imagen in ((1, cambio.get('nuevo')), (-1, cambio.get('anterior'))):
+            for clave, contadores in contribucion_diaria(imagen).items():
+                delta = deltas.setdefault(clave, {})
+                for campo, valor in contadores.items():
+                    delta[campo] = delta.get(campo, Decimal(0)) + signo * valor
+
+        for clave, delta in deltas.items():
+            delta = {campo: valor for campo, valor in delta.items() if valor != 0}
+            if delta:
+                aportes.setdefault(clave, []).append((cambio['secuencia'], delta))
+
+    return aportes
+
+
+def construir_update(aportes: List[Dict[str, Decimal]]) -> Optional[Dict[str, Any]]:
+    """UpdateItem con ADD de pedidos y revenue del día"""
+    delta = sumar_aportes(aportes)
+    if not delta:
+        return None
+    return {
+        'UpdateExpression': 'SET actualizado_en = :ahora ADD total_pedidos :pedidos, revenue_diario :revenue',
+        'ExpressionAttributeValues': {
+            ':ahora': int(time.time()),
+            ':pedidos': delta.get('total_pedidos', Decimal(0)),
+            ':revenue': delta.get('revenue_diario', Decimal(0))
+        }
+    }
+
+
+def aplicar_cambios(cambios: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Aplica los aportes de un lote con un UpdateItem (ADD) por local y día,
+    condicionado a la última secuencia aplicada como en los KPIs por local.
+    Los grupos fallidos se retornan para reportarlos como batchItemFailures
+
+    Returns:
+        dict: {'dias': actualizados, 'duplicados': ya aplicados,
+               'fallidos': con error, 'secuencias_fallidas': [...]}
+    """
+    table = dynamodb.Table(TABLE_ROLLUP_DIARIO)
+    actualizados = 0
+    duplicados = 0
+    fallidas = []
+
+    for (local_id, dia), aportes in calcular_aportes_diarios(cambios).items():
+        try:
+            respuesta = actualizar_idempotente(
+                table, {'local_id': local_id, 'fecha': dia}, 'pedidos', aportes, construir_update
+            )
+            if respuesta is None:
+                duplicados += 1
+            else:
+                actualizados += 1
+        except Exception as e:
+            fallidas.append(min(secuencia for secuencia, _ in aportes))
+            print(f'❌ Error aplicando rollup diario {local_id} {dia}: {str(e)}')
+
+    return {
+        'dias': actualizados,
+        'duplicados': duplicados,
+        'fallidos': len(fallidas),
+        'secuencias_fallidas': fallidas
+    }
+
+
+def obtener_mes(local_id: str, year: int, month: int) -> List[Dict[str, Any]]:
+    """Días de un mes con pedidos, ordenados por fecha (un solo Query)"""
+    prefijo = f'{year:04d}-{month:02d}'
+    response = dynamodb.Table(TABLE_ROLLUP_DIARIO).query(
+        KeyConditionExpression=Key('local_id').eq(local_id) & Key('fecha').between(f'{prefijo}-01', f'{prefijo}-31')
+    )
+
+    dias = []
+    for item in response.get('Items', []):
+        total = item.get('total_pedidos', Decimal(0))
+        revenue = item.get('revenue_diario', Decimal(0))
+        if total <= 0:
+            continue
+        dias.append({
+            'local_id': local_id,
+            'fecha': item['fecha'],
+            'total_pedidos': int(total),
+            'revenue_diario': round(float(revenue), 2),
+            'ticket_promedio': round(float(revenue / total), 2)
+        })
+    return dias
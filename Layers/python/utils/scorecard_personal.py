@@ -0,0 +1,294 @@
+"""
+Scorecard del personal mantenido de forma incremental
+Un item por empleado (PK local_id, SK dni) con pedidos atendidos, revenue de
+esos pedidos, reseñas y suma de calificaciones, más los datos del empleado.
+El score se guarda como atributo para que el índice local-score-index
+(PK local_id, SK score) entregue el ranking de un local en un solo Query
+"""
+
+import boto3
+import os
+import time
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Any, Dict, Iterable, List, Optional
+from boto3.dynamodb.conditions import Key
+from botocore.exceptions import ClientError
+from .stream_idempotencia import actualizar_idempotente, sumar_aportes
+
+dynamodb = boto3.resource('dynamodb')
+
+TABLE_SCORECARD_PERSONAL = os.environ.get('TABLE_SCORECARD_PERSONAL', 'ChinaWok-Scorecard-Personal')
+INDICE_SCORE = 'local-score-index'
+
+# Columnas de reseñas con el DNI del empleado evaluado
+COLUMNAS_RESENA = ['cocinero_dni', 'despachador_dni', 'repartidor_dni']
+
+# Contadores mantenidos con ADD
+CONTADORES = ['pedidos_atendidos', 'revenue_generado', 'total_resenas', 'suma_calificacion_resenas']
+
+CENTIMOS = Decimal('0.01')
+
+
+def _numero(valor) -> Decimal:
+    if valor is None:
+        return Decimal(0)
+    return valor if isinstance(valor, Decimal) else Decimal(str(valor))
+
+
+def calcular_score(item: Dict[str, Any]) -> Decimal:
+    """Mismos pesos que el ranking en Athena: calificación 60%, pedidos 30%, reseñas 10%"""
+    calificacion = _numero(item.get('calificacion_prom'))
+    pedidos = min(_numero(item.get('pedidos_atendidos')) / 100, Decimal(1))
+    resenas = min(_numero(item.get('total_resenas')) / 20, Decimal(1))
+    score = calificacion * Decimal('0.6') + pedidos * 5 * Decimal('0.3') + resenas * 5 * Decimal('0.1')
+    return score.quantize(CENTIMOS, rounding=ROUND_HALF_UP)
+
+
+def contribucion(table_key: str, record: Optional[Dict[str, Any]]) -> Dict[str, Dict[str, Decimal]]:
+    """DNI -> contadores que un pedido o reseña aporta a cada empleado"""
+    if not record:
+        return {}
+
+    if table_key == 'pedidos':
+        # Un pedido cuenta una vez por empleado aunque lo atienda en varios estados
+        dnis = {
+            (estado.get('empleado') or {}).get('dni')
+            for estado in record.get('historial_estados') or []
+        }
+        return {
+            dni: {'pedidos_atendidos': Decimal(1), 'revenue_generado': _numero(record.get('costo'))}
+            for dni in dnis if dni
+        }
+
+    if table_key == 'resenas':
+        calificacion = _numero(record.get('calificacion'))
+        aportes = {}
+        for columna in COLUMNAS_RESENA:
+            dni = record.get(columna)
+            if dni:
+                aportes[dni] = {'total_resenas': Decimal(1), 'suma_calificacion_resenas': calificacion}
+        return aportes
+
+    return {}
+
+
+def datos_empleado(record: Dict[str, Any]) -> Dict[str, Any]:
+    """Datos descriptivos del empleado copiados del stream de Empleados"""
+    return {
+        'nombre_completo': f"{record.get('nombre', '')} {record.get('apellido', '')}".strip(),
+        'rol': record.get('role'),
+        'sueldo': _numero(record.get('sueldo')),
+        'calificacion_prom': _numero(record.get('calificacion_prom')),
+    }
+
+
+def calcular_aportes(cambios: Iterable[Dict[str, Any]]):
+    """
+    Aporte de cada cambio al scorecard de sus empleados: la diferencia de
+    contribuciones (nueva - anterior) de pedidos y reseñas, y los datos del
+    empleado para Empleados
+
+    Returns:
+        tuple: ((local_id, dni, table_key) -> [(secuencia, {'delta': {...}, 'info': {...} o None})],
+                (local_id, dni) eliminados -> secuencia del REMOVE)
+    """
+    aportes = {}
+    eliminados = {}
+
+    for cambio in cambios:
+        anterior = cambio.get('anterior') or {}
+        nuevo = cambio.get('nuevo') or {}
+        local_id = nuevo.get('local_id') or anterior.get('local_id')
+        if not local_id:
+            continue
+
+        if cambio['table_key'] == 'empleados':
+            if nuevo:
+                eliminados.pop((local_id, nuevo['dni']), None)
+                aportes.setdefault((local_id, nuevo['dni'], 'empleados'), []).append(
+                    (cambio['secuencia'], {'delta': {}, 'info': datos_empleado(nuevo)})
+                )
+            elif anterior.get('dni'):
+                eliminados[(local_id, anterior['dni'])] = cambio['secuencia']
+                aportes.pop((local_id, anterior['dni'], 'empleados'), None)
+            continue
+
+        deltas = {}
+        for signo, imagen in ((1, nuevo), (-1, anterior)):
+            for dni, contadores in contribucion(cambio['table_key'], imagen).items():
+                delta = deltas.setdefault(dni, {})
+                for campo, valor in contadores.items():
+                    delta[campo] = delta.get(campo, Decimal(0)) + signo * valor
+
+        # Las transiciones que no cambian de empleado ni de costo no generan escrituras
+        for dni, delta in deltas.items():
+            delta = {campo: valor for campo, valor in delta.items() if valor != 0}
+            if delta:
+                aportes.setdefault((local_id, dni, cambio['table_key']), []).append(
+                    (cambio['secuencia'], {'delta': delta, 'info': None})
+                )
+
+    return {clave: lista for clave, lista in aportes.items() if clave[:2] not in eliminados}, eliminados
+
+
+def construir_update(aportes: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """
+    UpdateItem con ADD de los contadores y de la revisión (y SET de los
+    datos del empleado más recientes), retornando la imagen resultante
+    """
+    delta = sumar_aportes([aporte['delta'] for aporte in aportes])
+    info = next((aporte['info'] for aporte in reversed(aportes) if aporte['info']), None)
+    if not delta and info is None:
+        return None
+
+    nombres = {}
+    valores = {':ahora': int(time.time()), ':uno': 1}
+    sets = ['actualizado_en = :ahora']
+    adds = ['revision :uno']
+
+    for i, (campo, valor) in enumerate(delta.items()):
+        nombres[f'#k{i}'] = campo
+        valores[f':k{i}'] = valor
+        adds.append(f'#k{i} :k{i}')
+
+    for i, (campo, valor) in enumerate((info or {}).items()):
+        nombres[f'#i{i}'] = campo
+        valores[f':i{i}'] = valor
+        sets.append(f'#i{i} = :i{i}')
+
+    kwargs = {
+        'UpdateExpression': 'SET ' + ', '.join(sets) + ' ADD ' + ', '.join(adds),
+        'ExpressionAttributeValues': valores,
+        'ReturnValues': 'ALL_NEW'
+    }
+    if nombres:
+        kwargs['ExpressionAttributeNames'] = nombres
+    return kwargs
+
+
+def fijar_score(table, item: Dict[str, Any]):
+    """
+    Fija el score calculado sobre la imagen resultante de un UpdateItem. Es
+    condicional a la revisión leída: si otra escritura llegó entre medio,
+    esa recalcula el score y esta se descarta
+    """
+    try:
+        table.update_item(
+            Key={'local_id': item['local_id'], 'dni': item['dni']},
+            UpdateExpression='SET score = :score',
+            ConditionExpression='revision = :revision',
+            ExpressionAttributeValues={':score': calcular_score(item), ':revision': item['revision']}
+        )
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise
+
+
+def recalcular_score(table, key: Dict[str, Any]):
+    """
+    Recalcula el score desde una lectura consistente del item. Se usa cuando
+    los contadores ya estaban aplicados: si fijar_score falló tras el
+    UpdateItem, el reintento del lote no vuelve a actualizar el item y el
+    score quedaría desfasado
+    """
+    item = table.get_item(Key=key, ConsistentRead=True).get('Item')
+    if not item or 'revision' not in item:
+        return
+    if item.get('score') != calcular_score(item):
+        fijar_score(table, item)
+
+
+def aplicar_cambios(cambios: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Calcula y aplica los aportes de un lote del stream: transiciones del
+    workflow (historial_estados de Pedidos), reseñas y cambios de empleados.
+    Como en los KPIs por local, cada UpdateItem es condicional a la última
+    secuencia aplicada por tabla de origen (un lote reentregado no vuelve a
+    sumar, pero sí recalcula el score) y los grupos fallidos se retornan para reportarlos como
+    batchItemFailures
+
+    Returns:
+        dict: {'empleados': actualizados, 'duplicados': ya aplicados,
+               'fallidos': con error, 'secuencias_fallidas': [...]}
+    """
+    aportes_por_empleado, eliminados = calcular_aportes(cambios)
+    table = dynamodb.Table(TABLE_SCORECARD_PERSONAL)
+
+    actualizados = 0
+    duplicados = 0
+    fallidas = []
+    for (local_id, dni, table_key), aportes in aportes_por_empleado.items():
+        try:
+            key = {'local_id': local_id, 'dni': dni}
+            respuesta = actualizar_idempotente(table, key, table_key, aportes, construir_update)
+            if respuesta is None:
+                recalcular_score(table, key)
+                duplicados += 1
+                continue
+            fijar_score(table, respuesta['Attributes'])
+            actualizados += 1
+        except Exception as e:
+            fallidas.append(min(secuencia for secuencia, _ in aportes))
+            print(f'❌ Error aplicando scorecard de {dni} ({local_id}): {str(e)}')
+
+    # Borrar es idempotente: un lote reentregado vuelve a borrar el mismo item
+    for (local_id, dni), secuencia in eliminados.items():
+        try:
+            table.delete_item(Key={'local_id': local_id, 'dni': dni})
+            actualizados += 1
+        except Exception as e:
+            fallidas.append(secuencia)
+            print(f'❌ Error eliminando scorecard de {dni} ({local_id}): {str(e)}')
+
+    return {
+        'empleados': actualizados,
+        'duplicados': duplicados,
+        'fallidos': len(fallidas),
+        'secuencias_fallidas': fallidas
+    }
+
+
+def obtener_ranking(local_id: str) -> List[Dict[str, Any]]:
+    """
+    Ranking del personal de un local ordenado por score con un Query sobre
+    local-score-index. Los empates se ordenan por pedidos y calificación
+    """
+    table = dynamodb.Table(TABLE_SCORECARD_PERSONAL)
+    kwargs = {
+        'IndexName': INDICE_SCORE,
+        'KeyConditionExpression': Key('local_id').eq(local_id),
+        'ScanIndexForward': False
+    }
+
+    items = []
+    while True:
+        response = table.query(**kwargs)
+        items.extend(response.get('Items', []))
+        if 'LastEvaluatedKey' not in response:
+            break
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    ranking = []
+    for item in items:
+        # Solo empleados registrados (los contadores pueden llegar antes que el empleado)
+        if 'nombre_completo' not in item:
+            continue
+        ranking.append({
+            'local_id': local_id,
+            'dni': item['dni'],
+            'nombre_completo': item['nombre_completo'],
+            'rol': item.get('rol'),
+            'sueldo_mensual': round(float(_numero(item.get('sueldo'))), 2),
+            'calificacion_promedio': round(float(_numero(item.get('calificacion_prom'))), 2),
+            'total_resenas': int(_numero(item.get('total_resenas'))),
+            'calificacion_resenas': round(float(_numero(item.get('suma_calificacion_resenas')) / _numero(item['total_resenas'])), 2) if _numero(item.get('total_resenas')) else 0,
+            'pedidos_atendidos': int(_numero(item.get('pedidos_atendidos'))),
+            'revenue_generado': round(float(_numero(item.get('revenue_generado'))), 2),
+            'score_performance': float(_numero(item.get('score')))
+        })
+
+    ranking.sort(
+        key=lambda e: (e['score_performance'], e['pedidos_atendidos'], e['calificacion_promedio']),
+        reverse=True
+    )
+    return ranking
@@ -0,0 +1,111 @@
+"""
+Aplicación idempotente de agregados desde DynamoDB Streams
+Lambda reentrega registros ya procesados (reintentos, lotes divididos con
+bisectBatchOnFunctionError, ReportBatchItemFailures), así que un ADD directo
+contaría dos veces. Cada item agregado guarda, por tabla de origen, la última
+SequenceNumber aplicada (seq_<tabla>) y la actualización es condicional a
+ella. Todas las tablas de origen tienen local_id como PK, así que los
+registros de un local llegan en orden por la misma partición del stream
+"""
+
+from decimal import Decimal
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from botocore.exceptions import ClientError
+
+# Las SequenceNumber son strings numéricos de largo variable; con ceros a la
+# izquierda se comparan como strings en la ConditionExpression
+ANCHO_SECUENCIA = 40
+
+PREFIJO_SECUENCIA = 'seq_'
+
+
+def normalizar_secuencia(secuencia: str) -> str:
+    return str(secuencia).zfill(ANCHO_SECUENCIA)
+
+
+def atributo_secuencia(table_key: str) -> str:
+    """Atributo con la última secuencia aplicada de una tabla de origen"""
+    return f'{PREFIJO_SECUENCIA}{table_key}'
+
+
+def es_atributo_secuencia(campo: str) -> bool:
+    return campo.startswith(PREFIJO_SECUENCIA)
+
+
+def sumar_aportes(aportes: List[Dict[str, Decimal]]) -> Dict[str, Decimal]:
+    """Suma campo a campo, sin los campos que quedan en cero"""
+    total = {}
+    for aporte in aportes:
+        for campo, valor in aporte.items():
+            total[campo] = total.get(campo, Decimal(0)) + valor
+    return {campo: valor for campo, valor in total.items() if valor != 0}
+
+
+def secuencia_aplicada(table, key: Dict[str, Any], table_key: str) -> str:
+    """Última secuencia aplicada al item ('' si nunca se aplicó ninguna)"""
+    atributo = atributo_secuencia(table_key)
+    item = table.get_item(
+        Key=key,
+        ConsistentRead=True,
+        ProjectionExpression='#seq',
+        ExpressionAttributeNames={'#seq': atributo}
+    ).get('Item') or {}
+    return item.get(atributo, '')
+
+
+def actualizar_idempotente(
+    table,
+    key: Dict[str, Any],
+    table_key: str,
+    aportes: List[Tuple[str, Any]],
+    construir: Callable[[List[Any]], Optional[Dict[str, Any]]]
+) -> Optional[Dict[str, Any]]:
+    """
+    Aplica con un UpdateItem los aportes cuya secuencia es posterior a la
+    última aplicada al item, y registra la mayor como aplicada
+
+    Si la condición falla (el lote ya se aplicó total o parcialmente), relee
+    la secuencia del item y reintenta solo con los aportes posteriores
+
+    Args:
+        table: Tabla DynamoDB del agregado
+        key: Clave del item
+        table_key: Tabla de origen de los registros
+        aportes: [(secuencia normalizada, aporte)] de los registros del lote
+        construir: Recibe los aportes pendientes y retorna los kwargs de
+            update_item (sin Key) con una UpdateExpression que empieza con
+            'SET', o None si no hay nada que escribir
+
+    Returns:
+        dict: Respuesta de update_item, o None si todo ya estaba aplicado
+    """
+    pendientes = sorted(aportes, key=lambda aporte: aporte[0])
+
+    while pendientes:
+        kwargs = construir([aporte for _, aporte in pendientes])
+        if kwargs is None:
+            return None
+
+        expresion = kwargs['UpdateExpression']
+        if not expresion.startswith('SET '):
+            raise ValueError('La UpdateExpression debe empezar con SET')
+
+        kwargs['UpdateExpression'] = 'SET #seq = :seq_ultima, ' + expresion[len('SET '):]
+        kwargs['ConditionExpression'] = 'attribute_not_exists(#seq) OR #seq < :seq_primera'
+        kwargs['ExpressionAttributeNames'] = {**kwargs.get('ExpressionAttributeNames', {}), '#seq': atributo_secuencia(table_key)}
+        kwargs['ExpressionAttributeValues'] = {
+            **kwargs.get('ExpressionAttributeValues', {}),
+            ':seq_primera': pendientes[0][0],
+            ':seq_ultima': pendientes[-1][0]
+        }
+
+        try:
+            return table.update_item(Key=key, **kwargs)
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                raise
+
+        aplicada = secuencia_aplicada(table, key, table_key)
+        pendientes = [(secuencia, aporte) for secuencia, aporte in pendientes if secuencia > aplicada]
+
+    return None
@@ -0,0 +1,289 @@
+"""
+Productos más vendidos por local con un sketch Space-Saving
+Un item por local y ventana (PK local_id, SK ventana: 'total', 'dia#YYYY-MM-DD',
+'semana#YYYY-Www', 'mes#YYYY-MM') con a lo más CAPACIDAD contadores. Con la
+tabla llena, un producto nuevo reemplaza al contador mínimo y hereda su valor
+como error: las unidades de un contador sobreestiman a lo más en 'error', y
+todo producto con más de total_unidades / CAPACIDAD unidades está presente
+"""
+
+import boto3
+import os
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import Any, Dict, Iterable, List, Optional
+from botocore.exceptions import ClientError
+from .stream_idempotencia import atributo_secuencia
+
+dynamodb = boto3.resource('dynamodb')
+
+TABLE_TOP_PRODUCTOS = os.environ.get('TABLE_TOP_PRODUCTOS', 'ChinaWok-Top-Productos')
+
+# Contadores por item (~100 bytes cada uno, lejos del límite de 400KB)
+CAPACIDAD = int(os.environ.get('TOP_PRODUCTOS_CAPACIDAD', 100))
+
+# Reintentos de la escritura condicional cuando otro lote actualizó el item
+MAX_REINTENTOS = 5
+
+# Ventanas soportadas y cuánto se conservan (TTL); None = sin expiración
+VENTANAS = {
+    'total': None,
+    'dia': 60 * 24 * 3600,
+    'semana': 370 * 24 * 3600,
+    'mes': None,
+}
+
+ESTADO_VENTA = 'recibido'
+
+
+def fecha_venta(pedido: Dict[str, Any]) -> datetime:
+    """
+    Momento en que el pedido llegó a 'recibido': el cierre del último estado
+    del historial, o la entrega aproximada para pedidos sin historial
+    """
+    historial = pedido.get('historial_estados') or []
+    for fecha in (historial[-1].get('hora_fin') if historial else None, pedido.get('fecha_entrega_aproximada')):
+        if fecha:
+            try:
+                return datetime.fromisoformat(fecha.replace('Z', '+00:00')).replace(tzinfo=None)
+            except ValueError:
+                continue
+    return datetime.utcnow()
+
+
+def clave_ventana(tipo: str, fecha: datetime) -> str:
+    """SK del item de una ventana para una fecha"""
+    if tipo == 'total':
+        return 'total'
+    if tipo == 'dia':
+        return f'dia#{fecha:%Y-%m-%d}'
+    if tipo == 'semana':
+        year, week, _ = fecha.isocalendar()
+        return f'semana#{year:04d}-W{week:02d}'
+    if tipo == 'mes':
+        return f'mes#{fecha:%Y-%m}'
+    raise ValueError(f'Ventana no soportada: {tipo}')
+
+
+def expiracion_ventana(tipo: str, fecha: datetime) -> Optional[int]:
+    """Epoch en que expira el item de la ventana (TTL), None si se conserva"""
+    retencion = VENTANAS[tipo]
+    if retencion is None:
+        return None
+    return int((fecha + timedelta(seconds=retencion)).timestamp())
+
+
+def lineas_vendidas(pedido: Dict[str, Any]) -> Dict[str, Dict[str, Decimal]]:
+    """
+    Producto -> {unidades, revenue} de un pedido. El revenue sale de las líneas
+    cotizadas (detalle_precios, con descuentos); los pedidos anteriores a la
+    cotización en servidor aportan solo unidades
+    """
+    subtotales = {}
+    for linea in (pedido.get('detalle_precios') or {}).get('lineas', []):
+        if linea.get('tipo') == 'producto':
+            subtotales[linea['id']] = subtotales.get(linea['id'], Decimal(0)) + Decimal(str(linea.get('subtotal') or 0))
+
+    vendidos = {}
+    for producto in pedido.get('productos') or []:
+        nombre = producto.get('nombre')
+        if not nombre:
+            continue
+        actual = vendidos.setdefault(nombre, {'unidades': Decimal(0), 'revenue': Decimal(0)})
+        actual['unidades'] += Decimal(str(producto.get('cantidad') or 0))
+
+    for nombre, vendido in vendidos.items():
+        vendido['revenue'] = subtotales.get(nombre, Decimal(0))
+    return vendidos
+
+
+def es_venta(cambio: Dict[str, Any]) -> bool:
+    """Cambio de Pedidos en el que el pedido pasa a 'recibido'"""
+    anterior = cambio.get('anterior') or {}
+    nuevo = cambio.get('nuevo') or {}
+    return (
+        cambio['table_key'] == 'pedidos'
+        and nuevo.get('estado') == ESTADO_VENTA
+        and anterior.get('estado') != ESTADO_VENTA
+    )
+
+
+def agregar(contadores: Dict[str, Dict[str, Decimal]], nombre: str, unidades: Decimal, revenue: Decimal):
+    """Actualización Space-Saving de un producto sobre el mapa de contadores"""
+    if nombre in contadores:
+        contador = contadores[nombre]
+        contador['unidades'] += unidades
+        contador['revenue'] += revenue
+        contador['pedidos'] += 1
+        return
+
+    if len(contadores) < CAPACIDAD:
+        contadores[nombre] = {'unidades': unidades, 'error': Decimal(0), 'revenue': revenue, 'pedidos': Decimal(1)}
+        return
+
+    # Reemplaza al mínimo: sus unidades pasan a ser el error del nuevo contador.
+    # El revenue y los pedidos solo cuentan desde que el producto entró al sketch
+    minimo = min(contadores, key=lambda n: contadores[n]['unidades'])
+    piso = contadores.pop(minimo)['unidades']
+    contadores[nombre] = {'unidades': piso + unidades, 'error': piso, 'revenue': revenue, 'pedidos': Decimal(1)}
+
+
+def agrupar_ventas(cambios: Iterable[Dict[str, Any]]) -> Dict[tuple, Dict[str, Any]]:
+    """
+    (local_id, ventana) -> ventas del lote: lista de (secuencia, {producto:
+    {unidades, revenue}}) por pedido y la expiración del item
+    """
+    ventas = {}
+    for cambio in cambios:
+        if not es_venta(cambio):
+            continue
+        pedido = cambio['nuevo']
+        if not pedido.get('local_id'):
+            continue
+
+        vendidos = lineas_vendidas(pedido)
+        if not vendidos:
+            continue
+
+        fecha = fecha_venta(pedido)
+        for tipo in VENTANAS:
+            venta = ventas.setdefault(
+                (pedido['local_id'], clave_ventana(tipo, fecha)),
+                {'pedidos': [], 'expira_en': expiracion_ventana(tipo, fecha)}
+            )
+            venta['pedidos'].append((cambio['secuencia'], vendidos))
+    return ventas
+
+
+def actualizar_ventana(local_id: str, ventana: str, pedidos: List[tuple], expira_en: Optional[int]) -> bool:
+    """
+    Lee el item, aplica las ventas con secuencia posterior a la última
+    aplicada (seq_pedidos, así un lote reentregado no cuenta dos veces la
+    misma venta) y lo escribe con control optimista por 'version'; si otro
+    lote lo modificó entre medio, vuelve a leer y reintenta
+
+    Returns:
+        bool: False si todas las ventas ya estaban aplicadas
+    """
+    table = dynamodb.Table(TABLE_TOP_PRODUCTOS)
+    atributo = atributo_secuencia('pedidos')
+
+    for _ in range(MAX_REINTENTOS):
+        item = table.get_item(Key={'local_id': local_id, 'ventana': ventana}, ConsistentRead=True).get('Item')
+        aplicada = (item or {}).get(atributo, '')
+        pendientes = sorted((venta for venta in pedidos if venta[0] > aplicada), key=lambda venta: venta[0])
+        if not pendientes:
+            return False
+
+        version = item['version'] if item else None
+        contadores = (item or {}).get('contadores') or {}
+        total_unidades = (item or {}).get('total_unidades', Decimal(0))
+        total_pedidos = (item or {}).get('total_pedidos', Decimal(0))
+
+        for _, vendidos in pendientes:
+            total_pedidos += 1
+            for nombre, vendido in vendidos.items():
+                total_unidades += vendido['unidades']
+                agregar(contadores, nombre, vendido['unidades'], vendido['revenue'])
+
+        nuevo = {
+            'local_id': local_id,
+            'ventana': ventana,
+            'contadores': contadores,
+            'total_unidades': total_unidades,
+            'total_pedidos': total_pedidos,
+            'version': (version or 0) + 1,
+            'actualizado_en': int(time.time()),
+            atributo: pendientes[-1][0]
+        }
+        if expira_en:
+            nuevo['expira_en'] = expira_en
+
+        if version is None:
+            condicion = {'ConditionExpression': 'attribute_not_exists(local_id)'}
+        else:
+            condicion = {
+                'ConditionExpression': 'version = :version',
+                'ExpressionAttributeValues': {':version': version}
+            }
+
+        try:
+            table.put_item(Item=nuevo, **condicion)
+            return True
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                raise
+
+    raise Exception(f'No se pudo actualizar {local_id} {ventana} tras {MAX_REINTENTOS} intentos')
+
+
+def aplicar_cambios(cambios: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Aplica las ventas de un lote del stream (pedidos que pasan a 'recibido')
+    a las ventanas de su local. Las ventanas fallidas se retornan para
+    reportarlas como batchItemFailures. Un pedido que sale de 'recibido' no
+    se descuenta: Space-Saving no admite restas
+
+    Returns:
+        dict: {'ventanas': actualizadas, 'duplicados': ya aplicadas,
+               'fallidos': con error, 'secuencias_fallidas': [...]}
+    """
+    actualizadas = 0
+    duplicados = 0
+    fallidas = []
+
+    for (local_id, ventana), venta in agrupar_ventas(cambios).items():
+        try:
+            if actualizar_ventana(local_id, ventana, venta['pedidos'], venta['expira_en']):
+                actualizadas += 1
+            else:
+                duplicados += 1
+        except Exception as e:
+            fallidas.append(min(secuencia for secuencia, _ in venta['pedidos']))
+            print(f'❌ Error actualizando top productos {local_id} {ventana}: {str(e)}')
+
+    return {
+        'ventanas': actualizadas,
+        'duplicados': duplicados,
+        'fallidos': len(fallidas),
+        'secuencias_fallidas': fallidas
+    }
+
+
+def obtener_top(local_id: str, tipo: str = 'total', fecha: Optional[datetime] = None, limite: int = 20) -> Dict[str, Any]:
+    """
+    Top de productos de una ventana con un solo GetItem. fecha elige el día,
+    semana o mes (por defecto el actual)
+    """
+    ventana = clave_ventana(tipo, fecha or datetime.utcnow())
+    item = dynamodb.Table(TABLE_TOP_PRODUCTOS).get_item(Key={'local_id': local_id, 'ventana': ventana}).get('Item') or {}
+
+    contadores = item.get('contadores') or {}
+    total_unidades = item.get('total_unidades', Decimal(0))
+
+    ranking = sorted(
+        contadores.items(),
+        key=lambda par: (par[1]['unidades'], par[1]['revenue']),
+        reverse=True
+    )[:limite]
+
+    productos = [
+        {
+            'local_id': local_id,
+            'producto_nombre': nombre,
+            'pedidos_que_lo_incluyen': int(contador['pedidos']),
+            'unidades_vendidas': int(contador['unidades']),
+            'error_maximo': int(contador['error']),
+            'revenue_total': round(float(contador['revenue']), 2),
+            'porcentaje_ventas': round(float(contador['unidades'] * 100 / total_unidades), 2) if total_unidades else 0
+        }
+        for nombre, contador in ranking
+    ]
+
+    return {
+        'ventana': ventana,
+        'total_unidades': int(total_unidades),
+        'total_pedidos': int(item.get('total_pedidos', 0)),
+        'productos': productos
+    }
@@ -2,6 +2,7 @@ import boto3, json, os, re
 from decimal import Decimal
 from botocore.exceptions import ClientError
 from utils.cors_utils import get_cors_headers  # <-- agregado
+from utils.dynamodb_helper import clave_disponibilidad
 
 dynamodb = boto3.resource('dynamodb')
 table = dynamodb.Table(os.environ['TABLE_EMPLEADOS'])
@@ -85,7 +86,9 @@ def lambda_handler(event, context):
         'role': body['role'],
         'calificacion_prom': Decimal('0'),
         'sueldo': sueldo,
-        'ocupado': False
+        'ocupado': False,
+        # Publica al empleado en el índice disperso de disponibles
+        'disponible_key': clave_disponibilidad(body['local_id'], body['role'])
     }
 
     table.put_item(Item=item)
@@ -1,6 +1,8 @@
 import boto3, json, os
 from decimal import Decimal
+from botocore.exceptions import ClientError
 from utils.cors_utils import get_cors_headers  # <-- importado
+from utils.dynamodb_helper import clave_disponibilidad
 
 dynamodb = boto3.resource('dynamodb')
 table = dynamodb.Table(os.environ['TABLE_EMPLEADOS'])
@@ -48,7 +50,7 @@ def lambda_handler(event, context):
                     'headers': cors_headers,  # <-- reemplazado
                     'body': json.dumps({'error': 'El sueldo no puede ser negativo'})
                 }
-        update_expr.append(f"{key} = :{key}")
+        update_expr.append(f"#{key} = :{key}")
         expr_attr_vals[f":{key}"] = value
 
     if not update_expr:
@@ -58,13 +60,32 @@ def lambda_handler(event, context):
             'body': json.dumps({'error': 'No hay campos válidos para actualizar'})
         }
 
+    # "role" es palabra reservada en DynamoDB, se usan alias para todos los campos
     response = table.update_item(
         Key={'local_id': local_id, 'dni': dni},
         UpdateExpression="SET " + ", ".join(update_expr),
+        ExpressionAttributeNames={f"#{k[1:]}": k[1:] for k in expr_attr_vals},
         ExpressionAttributeValues=expr_attr_vals,
         ReturnValues='ALL_NEW'
     )
 
+    # Si cambió el rol de un empleado libre, moverlo a la partición correcta del índice de disponibles
+    empleado = response['Attributes']
+    if 'role' in body and not empleado.get('ocupado'):
+        try:
+            table.update_item(
+                Key={'local_id': local_id, 'dni': dni},
+                UpdateExpression='SET disponible_key = :disponible',
+                ConditionExpression='ocupado = :libre',
+                ExpressionAttributeValues={
+                    ':disponible': clave_disponibilidad(local_id, empleado['role']),
+                    ':libre': False
+                }
+            )
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                raise
+
     return {
         'statusCode': 200,
         'headers': cors_headers,  # <-- reemplazado
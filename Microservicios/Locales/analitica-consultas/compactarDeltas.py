@@ -0,0 +1,69 @@
+import json
+import os
+from datetime import datetime
+from utils.logger import get_logger
+from utils.delta_log import TABLE_MAPPING, compact_table
+from utils.parquet_writer import is_partitioned, compact_partitioned_table, backfill_partitioned_table
+from utils.athena_cache import incrementar_version
+
+logger = get_logger(__name__)
+
+# Deltas aplicados por tabla y ejecución (el resto queda para la siguiente)
+COMPACTACION_MAX_ARCHIVOS = int(os.environ.get('COMPACTACION_MAX_ARCHIVOS', 2000))
+
+
+def handler(event, context):
+    """
+    Compacta los deltas escritos por streamProcessor sobre el snapshot de
+    cada tabla: data.jsonl para las tablas pequeñas y Parquet particionado
+    (solo las particiones tocadas) para pedidos y reseñas
+
+    Se ejecuta de forma programada con concurrencia 1: es el único escritor
+    de los snapshots. Acepta {"tables": ["pedidos", ...]} para compactar
+    solo algunas tablas y {"backfill": ["pedidos", ...]} para generar el
+    Parquet desde el data.jsonl heredado
+    """
+    logger.info(f'🗜️  Compactando deltas: {json.dumps(event)}')
+
+    event = event or {}
+
+    for table_key in event.get('backfill') or []:
+        result = backfill_partitioned_table(table_key)
+        incrementar_version(table_key)
+        logger.info(f"✅ Backfill {table_key}: {result['registros']} registros en {result['particiones']} particiones")
+
+    table_keys = event.get('tables') or list(TABLE_MAPPING.values())
+
+    results = []
+    for table_key in table_keys:
+        try:
+            if is_partitioned(table_key):
+                result = compact_partitioned_table(table_key, COMPACTACION_MAX_ARCHIVOS)
+            else:
+                result = compact_table(table_key, COMPACTACION_MAX_ARCHIVOS)
+            results.append(result)
+
+            if result['status'] == 'success':
+                # Athena ya ve los cambios: invalidar resultados cacheados de la tabla
+                incrementar_version(table_key)
+                logger.info(
+                    f"✅ {table_key}: {result['deltas']} deltas | "
+                    f"~{result['upserts']} -{result['deletes']} | {result['s3_location']}"
+                )
+        except Exception as e:
+            logger.error(f'❌ Error compactando {table_key}: {str(e)}', exc_info=True)
+            results.append({
+                'table_key': table_key,
+                'status': 'failed',
+                'error': str(e)
+            })
+
+    failed_count = len([r for r in results if r['status'] == 'failed'])
+    logger.info(f'📊 Compactación terminada: {len(results) - failed_count} OK, {failed_count} FAIL')
+
+    return {
+        'compacted_tables': len([r for r in results if r['status'] == 'success']),
+        'failed': failed_count,
+        'timestamp': datetime.utcnow().isoformat() + 'Z',
+        'results': results
+    }
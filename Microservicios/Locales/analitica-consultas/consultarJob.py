@@ -0,0 +1,71 @@
+import json
+from utils.athena_client import RESULTS_PAGE_SIZE
+from utils.athena_cache import consultar_job, ESTADOS_EN_CURSO
+from utils.json_encoder import json_dumps
+
+def handler(event, context):
+    """
+    Lambda para consultar un job asíncrono de analítica: estado mientras
+    Athena lo ejecuta y, al terminar, los resultados paginados
+    (query string: next_token, max_resultados)
+    """
+    # Headers CORS
+    headers = {
+        'Access-Control-Allow-Origin': '*',
+        'Access-Control-Allow-Headers': 'Content-Type,Authorization',
+        'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS',
+        'Content-Type': 'application/json'
+    }
+    
+    # Manejar preflight request
+    if event.get('httpMethod') == 'OPTIONS':
+        return {
+            'statusCode': 200,
+            'headers': headers,
+            'body': json.dumps({'message': 'CORS preflight successful'})
+        }
+    
+    try:
+        job_id = (event.get('pathParameters') or {}).get('job_id')
+        query_params = event.get('queryStringParameters') or {}
+        
+        if not job_id:
+            return {
+                'statusCode': 400,
+                'headers': headers,
+                'body': json.dumps({'error': 'job_id es requerido'})
+            }
+        
+        try:
+            max_resultados = int(query_params.get('max_resultados', RESULTS_PAGE_SIZE))
+        except ValueError:
+            max_resultados = 0
+        if not 1 <= max_resultados <= RESULTS_PAGE_SIZE:
+            return {
+                'statusCode': 400,
+                'headers': headers,
+                'body': json.dumps({'error': f'max_resultados debe estar entre 1 y {RESULTS_PAGE_SIZE}'})
+            }
+        
+        job = consultar_job(job_id, query_params.get('next_token'), max_resultados)
+        
+        if job is None:
+            return {
+                'statusCode': 404,
+                'headers': headers,
+                'body': json.dumps({'error': f'Job {job_id} no encontrado o vencido'})
+            }
+        
+        return {
+            'statusCode': 202 if job['estado'] in ESTADOS_EN_CURSO else 200,
+            'headers': headers,
+            'body': json_dumps(job)
+        }
+        
+    except Exception as e:
+        print(f"Error: {str(e)}")
+        return {
+            'statusCode': 500,
+            'headers': headers,
+            'body': json.dumps({'error': str(e)})
+        }
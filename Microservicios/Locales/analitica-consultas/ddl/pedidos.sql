@@ -0,0 +1,34 @@
+-- Pedidos en Parquet particionado por local y mes de creación
+-- {{S3_BUCKET_NAME}} y {{S3_LAKE_PREFIX}} los reemplaza setup_and_deploy.sh
+CREATE EXTERNAL TABLE IF NOT EXISTS pedidos (
+    pedido_id string,
+    fecha_creacion string,
+    usuario_correo string,
+    productos array<struct<nombre:string,cantidad:int>>,
+    combos array<struct<combo_id:string,cantidad:int>>,
+    costo double,
+    direccion string,
+    fecha_entrega_aproximada string,
+    estado string,
+    historial_estados array<struct<
+        estado:string,
+        hora_inicio:string,
+        hora_fin:string,
+        activo:boolean,
+        empleado:struct<dni:string,nombre_completo:string,rol:string,calificacion_prom:double>
+    >>
+)
+PARTITIONED BY (local_id string, mes string)
+STORED AS PARQUET
+LOCATION 's3://{{S3_BUCKET_NAME}}/{{S3_LAKE_PREFIX}}/pedidos/'
+TBLPROPERTIES (
+    'parquet.compression' = 'SNAPPY',
+    'projection.enabled' = 'true',
+    'projection.local_id.type' = 'injected',
+    'projection.mes.type' = 'date',
+    'projection.mes.format' = 'yyyy-MM',
+    'projection.mes.range' = '2024-01,NOW',
+    'projection.mes.interval' = '1',
+    'projection.mes.interval.unit' = 'MONTHS',
+    'storage.location.template' = 's3://{{S3_BUCKET_NAME}}/{{S3_LAKE_PREFIX}}/pedidos/local_id=${local_id}/mes=${mes}/'
+)
@@ -0,0 +1,20 @@
+-- Reseñas en Parquet particionado por local (no tienen fecha)
+-- {{S3_BUCKET_NAME}} y {{S3_LAKE_PREFIX}} los reemplaza setup_and_deploy.sh
+CREATE EXTERNAL TABLE IF NOT EXISTS resenas (
+    resena_id string,
+    pedido_id string,
+    cocinero_dni string,
+    despachador_dni string,
+    repartidor_dni string,
+    resena string,
+    calificacion double
+)
+PARTITIONED BY (local_id string)
+STORED AS PARQUET
+LOCATION 's3://{{S3_BUCKET_NAME}}/{{S3_LAKE_PREFIX}}/resenas/'
+TBLPROPERTIES (
+    'parquet.compression' = 'SNAPPY',
+    'projection.enabled' = 'true',
+    'projection.local_id.type' = 'injected',
+    'storage.location.template' = 's3://{{S3_BUCKET_NAME}}/{{S3_LAKE_PREFIX}}/resenas/local_id=${local_id}/'
+)
@@ -1,9 +1,164 @@
 import json
 import os
-from utils.athena_client import AthenaQueryExecutor
+import boto3
+from utils.athena_cache import (
+    ejecutar_query_cacheada,
+    enviar_query_cacheada,
+    ejecutar_query_por_local,
+    enviar_query_por_local,
+    consulta_local,
+    parametros_local
+)
+
+# Una fila por local; {filtro} se reemplaza en cada predicado sobre local_id
+# ("= ?" para un local, "IN (?, ...)" para varios) y los valores van como
+# parámetros de ejecución de Athena
+CONSULTA_ESTADISTICAS = """
+    WITH stats_pedidos AS (
+        SELECT 
+            local_id,
+            COUNT(*) AS total_pedidos,
+            COUNT(DISTINCT usuario_correo) AS clientes_unicos,
+            SUM(costo) AS revenue_total,
+            MIN(costo) AS pedido_minimo,
+            MAX(costo) AS pedido_maximo,
+            AVG(costo) AS ticket_promedio,
+            SUM(CASE WHEN estado = 'recibido' THEN 1 ELSE 0 END) AS pedidos_completados,
+            SUM(CASE WHEN estado = 'enviando' THEN 1 ELSE 0 END) AS pedidos_en_envio,
+            SUM(CASE WHEN estado = 'empacando' THEN 1 ELSE 0 END) AS pedidos_empacando,
+            SUM(CASE WHEN estado = 'cocinando' THEN 1 ELSE 0 END) AS pedidos_cocinando,
+            SUM(CASE WHEN estado = 'eligiendo' THEN 1 ELSE 0 END) AS pedidos_eligiendo
+        FROM pedidos
+        WHERE local_id {filtro}
+        GROUP BY local_id
+    ),
+    stats_productos AS (
+        SELECT 
+            local_id,
+            COUNT(*) AS total_productos,
+            SUM(stock) AS inventario_total,
+            SUM(CASE WHEN stock > 0 AND stock < 10 THEN 1 ELSE 0 END) AS productos_stock_bajo,
+            SUM(CASE WHEN stock = 0 THEN 1 ELSE 0 END) AS productos_sin_stock
+        FROM productos
+        WHERE local_id {filtro}
+        GROUP BY local_id
+    ),
+    stats_empleados AS (
+        SELECT 
+            local_id,
+            COUNT(*) AS total_empleados,
+            SUM(CASE WHEN role = 'Cocinero' THEN 1 ELSE 0 END) AS cocineros,
+            SUM(CASE WHEN role = 'Despachador' THEN 1 ELSE 0 END) AS despachadores,
+            SUM(CASE WHEN role = 'Repartidor' THEN 1 ELSE 0 END) AS repartidores,
+            AVG(calificacion_prom) AS calificacion_promedio_staff,
+            SUM(sueldo) AS nomina_mensual
+        FROM empleados
+        WHERE local_id {filtro}
+        GROUP BY local_id
+    ),
+    stats_ofertas AS (
+        SELECT 
+            local_id,
+            COUNT(*) AS ofertas_activas,
+            AVG(porcentaje_descuento) AS descuento_promedio
+        FROM ofertas
+        WHERE local_id {filtro}
+            AND from_iso8601_timestamp(fecha_limite) > CURRENT_TIMESTAMP
+        GROUP BY local_id
+    ),
+    stats_resenas AS (
+        SELECT 
+            local_id,
+            COUNT(*) AS total_resenas,
+            AVG(calificacion) AS calificacion_promedio_cliente,
+            SUM(CASE WHEN calificacion >= 4.5 THEN 1 ELSE 0 END) AS resenas_excelentes,
+            SUM(CASE WHEN calificacion < 3.0 THEN 1 ELSE 0 END) AS resenas_malas
+        FROM resenas
+        WHERE local_id {filtro}
+        GROUP BY local_id
+    ),
+    stats_combos AS (
+        SELECT 
+            local_id,
+            COUNT(*) AS total_combos,
+            SUM(CASE WHEN disponible = true THEN 1 ELSE 0 END) AS combos_disponibles
+        FROM combos
+        WHERE local_id {filtro}
+        GROUP BY local_id
+    )
+    SELECT 
+        l.local_id,
+        l.direccion,
+        l.telefono,
+        l.hora_apertura,
+        l.hora_finalizacion,
+        l.gerente.nombre AS gerente_nombre,
+        l.gerente.correo AS gerente_correo,
+        COALESCE(sp.total_pedidos, 0) AS total_pedidos,
+        COALESCE(sp.clientes_unicos, 0) AS clientes_unicos,
+        ROUND(COALESCE(sp.revenue_total, 0), 2) AS revenue_total,
+        ROUND(COALESCE(sp.ticket_promedio, 0), 2) AS ticket_promedio,
+        ROUND(COALESCE(sp.pedido_minimo, 0), 2) AS pedido_minimo,
+        ROUND(COALESCE(sp.pedido_maximo, 0), 2) AS pedido_maximo,
+        COALESCE(sp.pedidos_completados, 0) AS pedidos_completados,
+        COALESCE(sp.pedidos_en_envio, 0) AS pedidos_en_envio,
+        COALESCE(sp.pedidos_empacando, 0) AS pedidos_empacando,
+        COALESCE(sp.pedidos_cocinando, 0) AS pedidos_cocinando,
+        COALESCE(sp.pedidos_eligiendo, 0) AS pedidos_eligiendo,
+        ROUND(COALESCE(sp.pedidos_completados, 0) * 100.0 / NULLIF(sp.total_pedidos, 0), 2) AS tasa_completado_pct,
+        COALESCE(spr.total_productos, 0) AS total_productos,
+        CAST(COALESCE(spr.inventario_total, 0) AS INTEGER) AS inventario_total,
+        COALESCE(spr.productos_stock_bajo, 0) AS productos_stock_bajo,
+        COALESCE(spr.productos_sin_stock, 0) AS productos_sin_stock,
+        COALESCE(se.total_empleados, 0) AS total_empleados,
+        COALESCE(se.cocineros, 0) AS cocineros,
+        COALESCE(se.despachadores, 0) AS despachadores,
+        COALESCE(se.repartidores, 0) AS repartidores,
+        ROUND(COALESCE(se.calificacion_promedio_staff, 0), 2) AS calificacion_staff,
+        ROUND(COALESCE(se.nomina_mensual, 0), 2) AS nomina_mensual,
+        COALESCE(so.ofertas_activas, 0) AS ofertas_activas,
+        ROUND(COALESCE(so.descuento_promedio, 0), 2) AS descuento_promedio_pct,
+        COALESCE(sc.total_combos, 0) AS total_combos,
+        COALESCE(sc.combos_disponibles, 0) AS combos_disponibles,
+        COALESCE(sr.total_resenas, 0) AS total_resenas,
+        ROUND(COALESCE(sr.calificacion_promedio_cliente, 0), 2) AS calificacion_cliente,
+        COALESCE(sr.resenas_excelentes, 0) AS resenas_excelentes,
+        COALESCE(sr.resenas_malas, 0) AS resenas_malas
+    FROM locales l
+    LEFT JOIN stats_pedidos sp ON l.local_id = sp.local_id
+    LEFT JOIN stats_productos spr ON l.local_id = spr.local_id
+    LEFT JOIN stats_empleados se ON l.local_id = se.local_id
+    LEFT JOIN stats_ofertas so ON l.local_id = so.local_id
+    LEFT JOIN stats_resenas sr ON l.local_id = sr.local_id
+    LEFT JOIN stats_combos sc ON l.local_id = sc.local_id
+    WHERE l.local_id {filtro};
+"""
+
+dynamodb = boto3.resource('dynamodb')
+
+
+def locales_registrados():
+    """local_id de todos los locales (scan paginado de la tabla Locales)"""
+    table = dynamodb.Table(os.environ['TABLE_LOCALES'])
+    kwargs = {'ProjectionExpression': 'local_id'}
+    locales = []
+    while True:
+        response = table.scan(**kwargs)
+        locales.extend(item['local_id'] for item in response.get('Items', []))
+        if 'LastEvaluatedKey' not in response:
+            return sorted(locales)
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
 
 def handler(event, context):
-    """Lambda para consultar estadísticas generales del local (dashboard completo)"""
+    """
+    Lambda para consultar estadísticas generales del local (dashboard completo)
+
+    Por defecto es asíncrona: si el resultado no está en caché retorna 202
+    con un job_id para consultar en GET /analitica/jobs/{job_id}. Con
+    {"modo": "sync"} espera el resultado (solo para consultas pequeñas:
+    API Gateway corta a los 29 s)
+    """
     # Headers CORS
     headers = {
         'Access-Control-Allow-Origin': '*',
@@ -22,6 +177,54 @@ def handler(event, context):
     
     try:
         body = json.loads(event.get('body', '{}'))
+        locales = body.get('locales')
+        
+        # Modo multi-local (Admin): lista de locales o "todos", queries agrupadas
+        if locales is not None:
+            if locales != 'todos' and (
+                not isinstance(locales, list) or not locales
+                or not all(isinstance(l, str) and l for l in locales)
+            ):
+                return {
+                    'statusCode': 400,
+                    'headers': headers,
+                    'body': json.dumps({'error': 'locales debe ser una lista de local_id o "todos"'})
+                }
+            
+            # local_id es partición inyectada de pedidos y resenas: "todos"
+            # se resuelve a los locales registrados y se consulta con IN (?, ...)
+            if locales == 'todos':
+                locales = locales_registrados()
+            
+            jobs = []
+            if body.get('modo', 'async') == 'sync':
+                por_local = ejecutar_query_por_local(CONSULTA_ESTADISTICAS, locales)
+            else:
+                # Los grupos sin caché quedan como jobs (uno por query agrupada)
+                envio = enviar_query_por_local(
+                    CONSULTA_ESTADISTICAS,
+                    locales,
+                    parametros={'consulta': 'estadisticas'}
+                )
+                por_local = envio['resultados']
+                jobs = envio['jobs']
+            
+            respuesta = {
+                'total_locales': len(por_local),
+                'estadisticas': {
+                    local_id: filas[0] if filas else {}
+                    for local_id, filas in sorted(por_local.items())
+                }
+            }
+            if jobs:
+                respuesta['jobs'] = jobs
+            
+            return {
+                'statusCode': 202 if jobs else 200,
+                'headers': headers,
+                'body': json.dumps(respuesta)
+            }
+        
         local_id = body.get('local_id', 'LOCAL-0001')
         
         if not local_id:
@@ -31,129 +234,29 @@ def handler(event, context):
                 'body': json.dumps({'error': 'local_id es requerido'})
             }
         
-        query = f"""
-        WITH stats_pedidos AS (
-            SELECT 
-                local_id,
-                COUNT(*) AS total_pedidos,
-                COUNT(DISTINCT usuario_correo) AS clientes_unicos,
-                SUM(costo) AS revenue_total,
-                MIN(costo) AS pedido_minimo,
-                MAX(costo) AS pedido_maximo,
-                AVG(costo) AS ticket_promedio,
-                SUM(CASE WHEN estado = 'recibido' THEN 1 ELSE 0 END) AS pedidos_completados,
-                SUM(CASE WHEN estado = 'enviando' THEN 1 ELSE 0 END) AS pedidos_en_envio,
-                SUM(CASE WHEN estado = 'empacando' THEN 1 ELSE 0 END) AS pedidos_empacando,
-                SUM(CASE WHEN estado = 'cocinando' THEN 1 ELSE 0 END) AS pedidos_cocinando,
-                SUM(CASE WHEN estado = 'eligiendo' THEN 1 ELSE 0 END) AS pedidos_eligiendo
-            FROM pedidos
-            WHERE local_id = '{local_id}'
-            GROUP BY local_id
-        ),
-        stats_productos AS (
-            SELECT 
-                local_id,
-                COUNT(*) AS total_productos,
-                SUM(stock) AS inventario_total,
-                SUM(CASE WHEN stock > 0 AND stock < 10 THEN 1 ELSE 0 END) AS productos_stock_bajo,
-                SUM(CASE WHEN stock = 0 THEN 1 ELSE 0 END) AS productos_sin_stock
-            FROM productos
-            WHERE local_id = '{local_id}'
-            GROUP BY local_id
-        ),
-        stats_empleados AS (
-            SELECT 
-                local_id,
-                COUNT(*) AS total_empleados,
-                SUM(CASE WHEN role = 'Cocinero' THEN 1 ELSE 0 END) AS cocineros,
-                SUM(CASE WHEN role = 'Despachador' THEN 1 ELSE 0 END) AS despachadores,
-                SUM(CASE WHEN role = 'Repartidor' THEN 1 ELSE 0 END) AS repartidores,
-                AVG(calificacion_prom) AS calificacion_promedio_staff,
-                SUM(sueldo) AS nomina_mensual
-            FROM empleados
-            WHERE local_id = '{local_id}'
-            GROUP BY local_id
-        ),
-        stats_ofertas AS (
-            SELECT 
-                local_id,
-                COUNT(*) AS ofertas_activas,
-                AVG(porcentaje_descuento) AS descuento_promedio
-            FROM ofertas
-            WHERE local_id = '{local_id}'
-                AND from_iso8601_timestamp(fecha_limite) > CURRENT_TIMESTAMP
-            GROUP BY local_id
-        ),
-        stats_resenas AS (
-            SELECT 
-                local_id,
-                COUNT(*) AS total_resenas,
-                AVG(calificacion) AS calificacion_promedio_cliente,
-                SUM(CASE WHEN calificacion >= 4.5 THEN 1 ELSE 0 END) AS resenas_excelentes,
-                SUM(CASE WHEN calificacion < 3.0 THEN 1 ELSE 0 END) AS resenas_malas
-            FROM resenas
-            WHERE local_id = '{local_id}'
-            GROUP BY local_id
-        ),
-        stats_combos AS (
-            SELECT 
-                local_id,
-                COUNT(*) AS total_combos,
-                SUM(CASE WHEN disponible = true THEN 1 ELSE 0 END) AS combos_disponibles
-            FROM combos
-            WHERE local_id = '{local_id}'
-            GROUP BY local_id
-        )
-        SELECT 
-            l.local_id,
-            l.direccion,
-            l.telefono,
-            l.hora_apertura,
-            l.hora_finalizacion,
-            l.gerente.nombre AS gerente_nombre,
-            l.gerente.correo AS gerente_correo,
-            COALESCE(sp.total_pedidos, 0) AS total_pedidos,
-            COALESCE(sp.clientes_unicos, 0) AS clientes_unicos,
-            ROUND(COALESCE(sp.revenue_total, 0), 2) AS revenue_total,
-            ROUND(COALESCE(sp.ticket_promedio, 0), 2) AS ticket_promedio,
-            ROUND(COALESCE(sp.pedido_minimo, 0), 2) AS pedido_minimo,
-            ROUND(COALESCE(sp.pedido_maximo, 0), 2) AS pedido_maximo,
-            COALESCE(sp.pedidos_completados, 0) AS pedidos_completados,
-            COALESCE(sp.pedidos_en_envio, 0) AS pedidos_en_envio,
-            COALESCE(sp.pedidos_empacando, 0) AS pedidos_empacando,
-            COALESCE(sp.pedidos_cocinando, 0) AS pedidos_cocinando,
-            COALESCE(sp.pedidos_eligiendo, 0) AS pedidos_eligiendo,
-            ROUND(COALESCE(sp.pedidos_completados, 0) * 100.0 / NULLIF(sp.total_pedidos, 0), 2) AS tasa_completado_pct,
-            COALESCE(spr.total_productos, 0) AS total_productos,
-            CAST(COALESCE(spr.inventario_total, 0) AS INTEGER) AS inventario_total,
-            COALESCE(spr.productos_stock_bajo, 0) AS productos_stock_bajo,
-            COALESCE(spr.productos_sin_stock, 0) AS productos_sin_stock,
-            COALESCE(se.total_empleados, 0) AS total_empleados,
-            COALESCE(se.cocineros, 0) AS cocineros,
-            COALESCE(se.despachadores, 0) AS despachadores,
-            COALESCE(se.repartidores, 0) AS repartidores,
-            ROUND(COALESCE(se.calificacion_promedio_staff, 0), 2) AS calificacion_staff,
-            ROUND(COALESCE(se.nomina_mensual, 0), 2) AS nomina_mensual,
-            COALESCE(so.ofertas_activas, 0) AS ofertas_activas,
-            ROUND(COALESCE(so.descuento_promedio, 0), 2) AS descuento_promedio_pct,
-            COALESCE(sc.total_combos, 0) AS total_combos,
-            COALESCE(sc.combos_disponibles, 0) AS combos_disponibles,
-            COALESCE(sr.total_resenas, 0) AS total_resenas,
-            ROUND(COALESCE(sr.calificacion_promedio_cliente, 0), 2) AS calificacion_cliente,
-            COALESCE(sr.resenas_excelentes, 0) AS resenas_excelentes,
-            COALESCE(sr.resenas_malas, 0) AS resenas_malas
-        FROM locales l
-        LEFT JOIN stats_pedidos sp ON l.local_id = sp.local_id
-        LEFT JOIN stats_productos spr ON l.local_id = spr.local_id
-        LEFT JOIN stats_empleados se ON l.local_id = se.local_id
-        LEFT JOIN stats_ofertas so ON l.local_id = so.local_id
-        LEFT JOIN stats_resenas sr ON l.local_id = sr.local_id
-        LEFT JOIN stats_combos sc ON l.local_id = sc.local_id
-        WHERE l.local_id = '{local_id}';
-        """
+        # Misma query individual (y clave de caché) que llenan las consultas multi-local
+        query = consulta_local(CONSULTA_ESTADISTICAS)
+        parametros_sql = parametros_local(CONSULTA_ESTADISTICAS, local_id)
         
-        executor = AthenaQueryExecutor()
-        results = executor.execute_query(query)
+        if body.get('modo', 'async') == 'sync':
+            results = ejecutar_query_cacheada(query, parametros_sql=parametros_sql)
+        else:
+            envio = enviar_query_cacheada(
+                query,
+                parametros={'consulta': 'estadisticas', 'local_id': local_id},
+                parametros_sql=parametros_sql
+            )
+            if envio['estado'] != 'SUCCEEDED':
+                return {
+                    'statusCode': 202,
+                    'headers': headers,
+                    'body': json.dumps({
+                        'local_id': local_id,
+                        'job_id': envio['job_id'],
+                        'estado': envio['estado']
+                    })
+                }
+            results = envio['resultado']
         
         return {
             'statusCode': 200,
@@ -0,0 +1,57 @@
+import json
+from utils.cors_utils import get_cors_headers
+from utils.json_encoder import json_dumps
+from utils.kpis_local import obtener_kpis
+
+def handler(event, context):
+    """
+    Lambda para consultar el dashboard de un local desde los KPIs agregados
+    (un solo GetItem, sin Athena). Para métricas no incrementales (clientes
+    únicos, mínimos/máximos, ofertas vigentes) usar /analitica/estadisticas
+    """
+    headers = get_cors_headers()
+
+    # Manejar preflight request
+    if event.get('httpMethod') == 'OPTIONS':
+        return {
+            'statusCode': 200,
+            'headers': headers,
+            'body': json.dumps({'message': 'CORS preflight successful'})
+        }
+
+    try:
+        body = json.loads(event.get('body') or '{}')
+        local_id = body.get('local_id')
+
+        if not local_id:
+            return {
+                'statusCode': 400,
+                'headers': headers,
+                'body': json.dumps({'error': 'local_id es requerido'})
+            }
+
+        kpis = obtener_kpis(local_id)
+
+        if kpis is None:
+            return {
+                'statusCode': 404,
+                'headers': headers,
+                'body': json.dumps({'error': f'No hay KPIs agregados para el local {local_id}'})
+            }
+
+        return {
+            'statusCode': 200,
+            'headers': headers,
+            'body': json_dumps({
+                'local_id': local_id,
+                'estadisticas': kpis
+            })
+        }
+
+    except Exception as e:
+        print(f"Error: {str(e)}")
+        return {
+            'statusCode': 500,
+            'headers': headers,
+            'body': json.dumps({'error': str(e)})
+        }
@@ -1,9 +1,14 @@
 import json
-import os
-from utils.athena_client import AthenaQueryExecutor
+from datetime import datetime
+from utils.top_productos import obtener_top, VENTANAS
 
 def handler(event, context):
-    """Lambda para consultar los productos más vendidos por local"""
+    """
+    Lambda para consultar los productos más vendidos por local desde el
+    sketch Space-Saving que mantiene streamProcessor (un solo GetItem).
+    Body: local_id, ventana ('total', 'dia', 'semana' o 'mes') y fecha
+    opcional (YYYY-MM-DD) para elegir el periodo; por defecto el actual
+    """
     # Headers CORS
     headers = {
         'Access-Control-Allow-Origin': '*',
@@ -31,51 +36,36 @@ def handler(event, context):
                 'body': json.dumps({'error': 'local_id es requerido'})
             }
         
-        query = f"""
-        WITH productos_expandidos AS (
-            SELECT 
-                local_id,
-                pedido_id,
-                producto.nombre AS producto_nombre,
-                producto.cantidad AS cantidad
-            FROM pedidos
-            CROSS JOIN UNNEST(productos) AS t(producto)
-            WHERE local_id = '{local_id}'
-        )
-        SELECT 
-            pe.local_id,
-            pe.producto_nombre,
-            COUNT(DISTINCT pe.pedido_id) AS pedidos_que_lo_incluyen,
-            CAST(SUM(pe.cantidad) AS INTEGER) AS unidades_vendidas,
-            p.categoria,
-            ROUND(p.precio, 2) AS precio_unitario_actual,
-            ROUND(SUM(pe.cantidad) * p.precio, 2) AS revenue_total,
-            CAST(p.stock AS INTEGER) AS stock_disponible,
-            ROUND(SUM(pe.cantidad) * 100.0 / SUM(SUM(pe.cantidad)) OVER (), 2) AS porcentaje_ventas
-        FROM productos_expandidos pe
-        LEFT JOIN productos p 
-            ON pe.local_id = p.local_id 
-            AND pe.producto_nombre = p.nombre
-        GROUP BY 
-            pe.local_id, 
-            pe.producto_nombre, 
-            p.categoria, 
-            p.precio,
-            p.stock
-        ORDER BY unidades_vendidas DESC, revenue_total DESC
-        LIMIT 20;
-        """
+        ventana = body.get('ventana', 'total')
+        if ventana not in VENTANAS:
+            return {
+                'statusCode': 400,
+                'headers': headers,
+                'body': json.dumps({'error': f"ventana debe ser una de: {', '.join(VENTANAS)}"})
+            }
+        
+        fecha = None
+        if body.get('fecha'):
+            try:
+                fecha = datetime.strptime(body['fecha'], '%Y-%m-%d')
+            except ValueError:
+                return {
+                    'statusCode': 400,
+                    'headers': headers,
+                    'body': json.dumps({'error': 'fecha debe tener formato YYYY-MM-DD'})
+                }
         
-        executor = AthenaQueryExecutor()
-        results = executor.execute_query(query)
+        top = obtener_top(local_id, ventana, fecha)
         
         return {
             'statusCode': 200,
             'headers': headers,
             'body': json.dumps({
                 'local_id': local_id,
-                'total_productos': len(results),
-                'productos': results
+                'ventana': top['ventana'],
+                'total_unidades': top['total_unidades'],
+                'total_productos': len(top['productos']),
+                'productos': top['productos']
             })
         }
         
@@ -0,0 +1,203 @@
+import json
+import os
+import time
+from decimal import Decimal
+from utils.logger import get_logger
+from utils.athena_client import AthenaQueryExecutor
+from utils.kpis_local import dynamodb, TABLE_KPIS_LOCAL, CAMPOS_INTERNOS
+from utils.stream_idempotencia import es_atributo_secuencia
+
+logger = get_logger(__name__)
+
+# Locales por consulta (IN sobre la columna de partición local_id)
+LOCALES_POR_CONSULTA = int(os.environ.get('RECONCILIAR_LOCALES_POR_CONSULTA', 50))
+
+# Diferencias menores se consideran redondeo de floats en Athena
+TOLERANCIA = Decimal('0.01')
+
+# Consultas por tabla: una fila por local (o por local y bucket)
+CONSULTAS = {
+    'pedidos': """
+        SELECT local_id, estado, COUNT(*) AS n, SUM(costo) AS revenue
+        FROM pedidos WHERE local_id IN ({locales})
+        GROUP BY local_id, estado
+    """,
+    'productos': """
+        SELECT local_id,
+            COUNT(*) AS total_productos,
+            SUM(stock) AS inventario_total,
+            SUM(CASE WHEN stock > 0 AND stock < 10 THEN 1 ELSE 0 END) AS productos_stock_bajo,
+            SUM(CASE WHEN stock = 0 THEN 1 ELSE 0 END) AS productos_sin_stock
+        FROM productos WHERE local_id IN ({locales})
+        GROUP BY local_id
+    """,
+    'empleados': """
+        SELECT local_id, role, COUNT(*) AS n,
+            SUM(calificacion_prom) AS suma_calificacion, SUM(sueldo) AS nomina
+        FROM empleados WHERE local_id IN ({locales})
+        GROUP BY local_id, role
+    """,
+    'resenas': """
+        SELECT local_id,
+            COUNT(*) AS total_resenas,
+            SUM(calificacion) AS suma_calificacion_resenas,
+            SUM(CASE WHEN calificacion >= 4.5 THEN 1 ELSE 0 END) AS resenas_excelentes,
+            SUM(CASE WHEN calificacion < 3.0 THEN 1 ELSE 0 END) AS resenas_malas
+        FROM resenas WHERE local_id IN ({locales})
+        GROUP BY local_id
+    """,
+    'combos': """
+        SELECT local_id,
+            COUNT(*) AS total_combos,
+            SUM(CASE WHEN disponible = true THEN 1 ELSE 0 END) AS combos_disponibles
+        FROM combos WHERE local_id IN ({locales})
+        GROUP BY local_id
+    """,
+}
+
+
+def _decimal(valor):
+    return Decimal(str(valor)) if valor is not None else Decimal(0)
+
+
+def _sumar(esperado, local_id, campo, valor):
+    kpis = esperado.setdefault(local_id, {})
+    kpis[campo] = kpis.get(campo, Decimal(0)) + _decimal(valor)
+
+
+def kpis_desde_athena(executor, locales):
+    """Mismos contadores que mantiene el stream, calculados en Athena"""
+    lista = ', '.join("'" + local_id.replace("'", "''") + "'" for local_id in locales)
+    esperado = {local_id: {} for local_id in locales}
+
+    for tabla, consulta in CONSULTAS.items():
+        for fila in executor.execute_query(consulta.format(locales=lista)):
+            local_id = fila['local_id']
+
+            if tabla == 'pedidos':
+                _sumar(esperado, local_id, 'total_pedidos', fila['n'])
+                _sumar(esperado, local_id, 'revenue_total', fila['revenue'])
+                _sumar(esperado, local_id, f"pedidos_{fila['estado'] or 'sin_estado'}", fila['n'])
+            elif tabla == 'empleados':
+                _sumar(esperado, local_id, 'total_empleados', fila['n'])
+                _sumar(esperado, local_id, f"empleados_{(fila['role'] or 'sin_rol').lower()}", fila['n'])
+                _sumar(esperado, local_id, 'suma_calificacion_staff', fila['suma_calificacion'])
+                _sumar(esperado, local_id, 'nomina_mensual', fila['nomina'])
+            else:
+                for campo, valor in fila.items():
+                    if campo != 'local_id':
+                        _sumar(esperado, local_id, campo, valor)
+
+    return esperado
+
+
+def diferencias(item, esperado):
+    """Campo -> (valor Athena - valor agregado) para los que no coinciden"""
+    campos = set(esperado) | {k for k in item if k not in CAMPOS_INTERNOS and not es_atributo_secuencia(k)}
+    resultado = {}
+    for campo in campos:
+        diferencia = esperado.get(campo, Decimal(0)) - _decimal(item.get(campo))
+        if abs(diferencia) > TOLERANCIA:
+            resultado[campo] = diferencia
+    return resultado
+
+
+def reconciliar_local(table, item, esperado, corregir):
+    """
+    Corrige con ADD solo las diferencias que se repiten igual que en la
+    ejecución anterior: una diferencia nueva puede ser solo el retraso de la
+    compactación y se guarda como pendiente
+    """
+    actuales = diferencias(item, esperado)
+    pendientes = item.get('diferencias_pendientes') or {}
+
+    correcciones = {
+        campo: diferencia for campo, diferencia in actuales.items()
+        if corregir and campo in pendientes and abs(_decimal(pendientes[campo]) - diferencia) <= TOLERANCIA
+    }
+    nuevas_pendientes = {c: d for c, d in actuales.items() if c not in correcciones}
+
+    nombres = {}
+    valores = {':pendientes': nuevas_pendientes, ':ahora': int(time.time())}
+    adds = []
+    for i, (campo, diferencia) in enumerate(correcciones.items()):
+        nombres[f'#k{i}'] = campo
+        valores[f':k{i}'] = diferencia
+        adds.append(f'#k{i} :k{i}')
+
+    expresion = 'SET diferencias_pendientes = :pendientes, reconciliado_en = :ahora'
+    if adds:
+        expresion += ' ADD ' + ', '.join(adds)
+
+    kwargs = {
+        'Key': {'local_id': item['local_id']},
+        'UpdateExpression': expresion,
+        'ExpressionAttributeValues': valores
+    }
+    if nombres:
+        kwargs['ExpressionAttributeNames'] = nombres
+    table.update_item(**kwargs)
+
+    return actuales, correcciones
+
+
+def escanear(table, projection=None):
+    """Recorre una tabla completa"""
+    kwargs = {'ProjectionExpression': projection} if projection else {}
+    while True:
+        response = table.scan(**kwargs)
+        yield from response.get('Items', [])
+        if 'LastEvaluatedKey' not in response:
+            return
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def handler(event, context):
+    """
+    Compara los KPIs agregados por el stream con el resultado de Athena y
+    corrige la deriva persistente (lotes reintentados, fallos parciales).
+    También inicializa los KPIs de locales con datos anteriores al agregador
+
+    Acepta {"corregir": false} para solo reportar
+    """
+    logger.info(f'🔎 Reconciliando KPIs por local: {json.dumps(event)}')
+
+    corregir = (event or {}).get('corregir', True)
+    table = dynamodb.Table(TABLE_KPIS_LOCAL)
+
+    items = {item['local_id']: item for item in escanear(table)}
+
+    # Los locales sin item aún (sin cambios desde el despliegue) se crean al reconciliar
+    for local in escanear(dynamodb.Table(os.environ['TABLE_LOCALES']), 'local_id'):
+        items.setdefault(local['local_id'], {'local_id': local['local_id']})
+    items = list(items.values())
+
+    executor = AthenaQueryExecutor()
+    con_diferencias = 0
+    corregidos = 0
+
+    for i in range(0, len(items), LOCALES_POR_CONSULTA):
+        grupo = items[i:i + LOCALES_POR_CONSULTA]
+        esperado = kpis_desde_athena(executor, [item['local_id'] for item in grupo])
+
+        for item in grupo:
+            try:
+                actuales, correcciones = reconciliar_local(table, item, esperado[item['local_id']], corregir)
+            except Exception as e:
+                logger.error(f"❌ Error reconciliando {item['local_id']}: {str(e)}")
+                continue
+
+            if actuales:
+                con_diferencias += 1
+                logger.warning(f"⚠️  {item['local_id']}: diferencias {json.dumps({k: str(v) for k, v in actuales.items()})}")
+            if correcciones:
+                corregidos += 1
+                logger.info(f"🛠️  {item['local_id']}: corregidos {sorted(correcciones)}")
+
+    logger.info(f'📊 Locales revisados: {len(items)}, con diferencias: {con_diferencias}, corregidos: {corregidos}')
+
+    return {
+        'revisados': len(items),
+        'con_diferencias': con_diferencias,
+        'corregidos': corregidos
+    }
@@ -0,0 +1,171 @@
+import json
+import os
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+from boto3.dynamodb.conditions import Key
+from utils.logger import get_logger
+from utils.athena_client import AthenaQueryExecutor, string_parameter
+from utils.rollup_diario import dynamodb, TABLE_ROLLUP_DIARIO
+
+logger = get_logger(__name__)
+
+# Locales por consulta (IN sobre la columna de partición local_id)
+LOCALES_POR_CONSULTA = int(os.environ.get('RECONCILIAR_LOCALES_POR_CONSULTA', 50))
+
+# Días hacia atrás que se revisan (el récord diario consulta el mes actual y anteriores)
+DIAS_A_REVISAR = int(os.environ.get('RECONCILIAR_ROLLUP_DIAS', 35))
+
+# Diferencias menores se consideran redondeo de floats en Athena
+TOLERANCIA = Decimal('0.01')
+
+CAMPOS = ['total_pedidos', 'revenue_diario']
+
+# Día de entrega = mismo criterio que rollup_diario.dia_pedido. Los pedidos se
+# crean antes de su entrega, así que basta con los meses desde el día anterior
+CONSULTA = """
+    SELECT local_id,
+        substr(fecha_entrega_aproximada, 1, 10) AS fecha,
+        COUNT(*) AS total_pedidos,
+        SUM(costo) AS revenue_diario
+    FROM pedidos
+    WHERE local_id IN ({locales})
+        AND mes >= ?
+        AND substr(fecha_entrega_aproximada, 1, 10) BETWEEN ? AND ?
+    GROUP BY local_id, substr(fecha_entrega_aproximada, 1, 10)
+"""
+
+
+def _decimal(valor):
+    return Decimal(str(valor)) if valor is not None else Decimal(0)
+
+
+def rollup_desde_athena(executor, locales, desde, hasta):
+    """(local_id, día) -> contadores calculados en Athena"""
+    mes_desde = (datetime.strptime(desde, '%Y-%m-%d') - timedelta(days=1)).strftime('%Y-%m')
+    query = CONSULTA.format(locales=', '.join('?' for _ in locales))
+    parametros = [string_parameter(local_id) for local_id in locales] + [
+        string_parameter(mes_desde), string_parameter(desde), string_parameter(hasta)
+    ]
+
+    esperado = {}
+    for fila in executor.execute_query(query, execution_parameters=parametros):
+        esperado[(fila['local_id'], fila['fecha'])] = {campo: _decimal(fila[campo]) for campo in CAMPOS}
+    return esperado
+
+
+def rollup_actual(table, local_id, desde, hasta):
+    """día -> item del rollup de un local en el rango"""
+    kwargs = {'KeyConditionExpression': Key('local_id').eq(local_id) & Key('fecha').between(desde, hasta)}
+    items = {}
+    while True:
+        response = table.query(**kwargs)
+        for item in response.get('Items', []):
+            items[item['fecha']] = item
+        if 'LastEvaluatedKey' not in response:
+            return items
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def reconciliar_dia(table, local_id, dia, item, esperado, corregir):
+    """
+    Igual que la reconciliación de KPIs: corrige con ADD solo las diferencias
+    que se repiten en dos ejecuciones seguidas (una diferencia nueva puede
+    ser solo el retraso de la compactación)
+    """
+    actuales = {}
+    for campo in CAMPOS:
+        diferencia = esperado.get(campo, Decimal(0)) - _decimal(item.get(campo))
+        if abs(diferencia) > TOLERANCIA:
+            actuales[campo] = diferencia
+
+    pendientes = item.get('diferencias_pendientes') or {}
+    if not actuales and not pendientes:
+        return actuales, {}
+
+    correcciones = {
+        campo: diferencia for campo, diferencia in actuales.items()
+        if corregir and campo in pendientes and abs(_decimal(pendientes[campo]) - diferencia) <= TOLERANCIA
+    }
+    nuevas_pendientes = {c: d for c, d in actuales.items() if c not in correcciones}
+
+    expresion = 'SET diferencias_pendientes = :pendientes, reconciliado_en = :ahora'
+    valores = {':pendientes': nuevas_pendientes, ':ahora': int(time.time())}
+    if correcciones:
+        expresion += ' ADD ' + ', '.join(f'{campo} :{campo}' for campo in correcciones)
+        valores.update({f':{campo}': diferencia for campo, diferencia in correcciones.items()})
+
+    table.update_item(
+        Key={'local_id': local_id, 'fecha': dia},
+        UpdateExpression=expresion,
+        ExpressionAttributeValues=valores
+    )
+    return actuales, correcciones
+
+
+def escanear(table, projection=None):
+    """Recorre una tabla completa"""
+    kwargs = {'ProjectionExpression': projection} if projection else {}
+    while True:
+        response = table.scan(**kwargs)
+        yield from response.get('Items', [])
+        if 'LastEvaluatedKey' not in response:
+            return
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def handler(event, context):
+    """
+    Compara el rollup diario de los últimos RECONCILIAR_ROLLUP_DIAS días con
+    Athena y corrige la deriva persistente (fallos del stream, pedidos
+    anteriores al rollup). Para reconstruirlo completo usar
+    DataMigrator.py rollup-diario
+
+    Acepta {"corregir": false} para solo reportar
+    """
+    logger.info(f'🔎 Reconciliando rollup diario: {json.dumps(event)}')
+
+    corregir = (event or {}).get('corregir', True)
+    table = dynamodb.Table(TABLE_ROLLUP_DIARIO)
+
+    hoy = datetime.utcnow()
+    desde = (hoy - timedelta(days=DIAS_A_REVISAR)).strftime('%Y-%m-%d')
+    hasta = hoy.strftime('%Y-%m-%d')
+
+    locales = [local['local_id'] for local in escanear(dynamodb.Table(os.environ['TABLE_LOCALES']), 'local_id')]
+
+    executor = AthenaQueryExecutor()
+    con_diferencias = 0
+    corregidos = 0
+
+    for i in range(0, len(locales), LOCALES_POR_CONSULTA):
+        grupo = locales[i:i + LOCALES_POR_CONSULTA]
+        esperado = rollup_desde_athena(executor, grupo, desde, hasta)
+
+        for local_id in grupo:
+            actual = rollup_actual(table, local_id, desde, hasta)
+            dias = set(actual) | {dia for (local, dia) in esperado if local == local_id}
+
+            for dia in sorted(dias):
+                try:
+                    actuales, correcciones = reconciliar_dia(
+                        table, local_id, dia, actual.get(dia, {}), esperado.get((local_id, dia), {}), corregir
+                    )
+                except Exception as e:
+                    logger.error(f'❌ Error reconciliando {local_id} {dia}: {str(e)}')
+                    continue
+
+                if actuales:
+                    con_diferencias += 1
+                    logger.warning(f"⚠️  {local_id} {dia}: diferencias {json.dumps({k: str(v) for k, v in actuales.items()})}")
+                if correcciones:
+                    corregidos += 1
+                    logger.info(f'🛠️  {local_id} {dia}: corregidos {sorted(correcciones)}')
+
+    logger.info(f'📊 Locales revisados: {len(locales)}, días con diferencias: {con_diferencias}, corregidos: {corregidos}')
+
+    return {
+        'revisados': len(locales),
+        'con_diferencias': con_diferencias,
+        'corregidos': corregidos
+    }
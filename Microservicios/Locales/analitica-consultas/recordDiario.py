@@ -1,7 +1,8 @@
 import json
 import os
 from datetime import datetime
-from utils.athena_client import AthenaQueryExecutor
+from utils.json_encoder import json_dumps
+from utils.rollup_diario import obtener_mes
 
 def handler(event, context):
     """Lambda para consultar el récord diario de pedidos y revenue por mes"""
@@ -34,30 +35,13 @@ def handler(event, context):
                 'body': json.dumps({'error': 'local_id es requerido'})
             }
         
-        query = f"""
-        SELECT 
-            local_id,
-            DATE(from_iso8601_timestamp(fecha_entrega_aproximada)) AS fecha,
-            COUNT(*) AS total_pedidos,
-            ROUND(SUM(costo), 2) AS revenue_diario,
-            ROUND(AVG(costo), 2) AS ticket_promedio
-        FROM pedidos
-        WHERE local_id = '{local_id}'
-            AND YEAR(from_iso8601_timestamp(fecha_entrega_aproximada)) = {year}
-            AND MONTH(from_iso8601_timestamp(fecha_entrega_aproximada)) = {month}
-        GROUP BY 
-            local_id,
-            DATE(from_iso8601_timestamp(fecha_entrega_aproximada))
-        ORDER BY fecha ASC;
-        """
-        
-        executor = AthenaQueryExecutor()
-        results = executor.execute_query(query)
+        # Un solo Query sobre el rollup diario (local_id, fecha)
+        results = obtener_mes(local_id, int(year), int(month))
         
         return {
             'statusCode': 200,
             'headers': headers,
-            'body': json.dumps({
+            'body': json_dumps({
                 'local_id': local_id,
                 'year': year,
                 'month': month,
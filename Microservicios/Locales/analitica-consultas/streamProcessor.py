@@ -1,41 +1,16 @@
-import json
-import os
-import boto3
-from decimal import Decimal
 from datetime import datetime
+from boto3.dynamodb.types import TypeDeserializer
 from utils.logger import get_logger
+from utils.delta_log import TABLE_MAPPING, write_delta_file
+from utils.kpis_local import aplicar_cambios as aplicar_kpis
+from utils.rollup_diario import aplicar_cambios as aplicar_rollup_diario
+from utils.top_productos import aplicar_cambios as aplicar_top_productos
+from utils.scorecard_personal import aplicar_cambios as aplicar_scorecard
+from utils.stream_idempotencia import normalizar_secuencia
 
 logger = get_logger(__name__)
 
-s3_client = boto3.client('s3')
-dynamodb = boto3.resource('dynamodb')
-
-# Mapeo de ARN de tabla a nombre de tabla y clave S3
-TABLE_MAPPING = {
-    'ChinaWok-Locales': 'locales',
-    'ChinaWok-Usuarios': 'usuarios',
-    'ChinaWok-Productos': 'productos',
-    'ChinaWok-Empleados': 'empleados',
-    'ChinaWok-Combos': 'combos',
-    'ChinaWok-Pedidos': 'pedidos',
-    'ChinaWok-Ofertas': 'ofertas',
-    'ChinaWok-Resenas': 'resenas',
-}
-
-S3_BUCKET = os.environ.get('S3_BUCKET_NAME')
-S3_PREFIX = os.environ.get('S3_INGESTION_PREFIX', 'data-ingestion')
-
-# Mapeo de tabla a su clave primaria
-PRIMARY_KEYS = {
-    'ChinaWok-Locales': 'local_id',
-    'ChinaWok-Usuarios': 'correo',
-    'ChinaWok-Productos': ['local_id', 'nombre'],
-    'ChinaWok-Empleados': ['local_id', 'dni'],
-    'ChinaWok-Combos': ['local_id', 'combo_id'],
-    'ChinaWok-Pedidos': ['local_id', 'pedido_id'],
-    'ChinaWok-Ofertas': ['local_id', 'oferta_id'],
-    'ChinaWok-Resenas': ['local_id', 'resena_id'],
-}
+deserializer = TypeDeserializer()
 
 def extract_table_name_from_arn(event_source_arn):
     """
@@ -57,92 +32,24 @@ def get_table_key(table_name):
     """
     return TABLE_MAPPING.get(table_name)
 
-def decimal_to_float(obj):
-    """Convierte Decimal a float para JSON"""
-    if isinstance(obj, Decimal):
-        return float(obj)
-    raise TypeError
-
-
-def get_record_key(record, table_name):
-    """Genera una clave única para identificar el registro"""
-    pk = PRIMARY_KEYS.get(table_name)
-    
-    if isinstance(pk, list):
-        # Composite key
-        return tuple(record.get(k) for k in pk)
-    else:
-        # Single key
-        return record.get(pk)
-
-
-def load_existing_data(table_key):
-    """Carga el archivo JSONL existente de S3 y lo convierte a dict"""
-    s3_key = f'{S3_PREFIX}/{table_key}/data.jsonl'
-    
-    try:
-        response = s3_client.get_object(Bucket=S3_BUCKET, Key=s3_key)
-        content = response['Body'].read().decode('utf-8')
-        
-        # Convertir JSONL a dict indexado por clave primaria
-        records = {}
-        for line in content.strip().split('\n'):
-            if line:
-                record = json.loads(line)
-                # Usar el nombre de tabla original, no table_key
-                table_name = None
-                for tn, tk in TABLE_MAPPING.items():
-                    if tk == table_key:
-                        table_name = tn
-                        break
-                
-                if table_name:
-                    key = get_record_key(record, table_name)
-                    records[key] = record
-        
-        logger.info(f'📖 Cargados {len(records)} registros existentes de {table_key}')
-        return records
-        
-    except s3_client.exceptions.NoSuchKey:
-        logger.info(f'📄 Archivo no existe aún: {s3_key}. Creando nuevo.')
-        return {}
-    except Exception as e:
-        logger.error(f'Error cargando datos existentes: {str(e)}')
-        return {}
-
-
-def save_data_to_s3(table_key, records):
-    """Guarda el dict de registros como JSONL en S3"""
-    s3_key = f'{S3_PREFIX}/{table_key}/data.jsonl'
-    
-    # Convertir dict a JSONL
-    jsonl_lines = [json.dumps(record, default=decimal_to_float) for record in records.values()]
-    jsonl_content = '\n'.join(jsonl_lines)
-    
-    s3_client.put_object(
-        Bucket=S3_BUCKET,
-        Key=s3_key,
-        Body=jsonl_content.encode('utf-8'),
-        ContentType='application/x-ndjson'
-    )
-    
-    return f's3://{S3_BUCKET}/{s3_key}'
-
 def handler(event, context):
     """
-    Procesa eventos de DynamoDB Streams de forma INCREMENTAL y OPTIMIZADA
-    
-    Estrategia: INCREMENTAL UPDATE (solo procesa cambios del stream)
-    - Lee el archivo JSONL existente de S3 UNA SOLA VEZ
-    - Aplica SOLO los cambios detectados (INSERT/MODIFY/REMOVE)
-    - Sobrescribe el archivo con los datos actualizados
-    - Agrupa cambios por tabla para minimizar operaciones S3
+    Procesa eventos de DynamoDB Streams de forma INCREMENTAL (append-only)
     
-    Optimizaciones para AWS Academy:
-    - reservedConcurrency: 2 (máximo 2 Lambdas simultáneas)
-    - batchSize reducido (50-100 vs 750)
-    - maximumBatchingWindow aumentado (5-10s) para agrupar eventos
-    - parallelizationFactor: 1 para tablas grandes
+    Estrategia: CHANGE-LOG (el costo depende del lote, no del tamaño de la tabla)
+    - Agrupa los cambios del lote por tabla
+    - Escribe un archivo delta NUEVO por tabla, particionado por fecha
+    - Nunca lee ni reescribe el snapshot data.jsonl: eso lo hace
+      compactarDeltas de forma programada
+    - Los nombres de los deltas son únicos por invocación, así que varias
+      Lambdas concurrentes no compiten por el mismo objeto
+    - Actualiza los KPIs por local (ChinaWok-KPIs-Local), el rollup diario
+      de pedidos (ChinaWok-Rollup-Diario), los productos más vendidos
+      (ChinaWok-Top-Productos) y el scorecard del personal
+      (ChinaWok-Scorecard-Personal) con las imágenes anterior y nueva, sin
+      agregar otro consumidor a los streams
+    - Si falla un delta o un agregado, reporta batchItemFailures desde el
+      primer registro afectado para que Lambda reintente (no se descarta)
     """
     try:
         # Agrupar cambios por tabla
@@ -150,10 +57,16 @@ def handler(event, context):
         
         logger.info(f'📥 Recibidos {len(event["Records"])} eventos de DynamoDB Streams')
         
-        # Deserializar TODOS los registros del batch
-        from boto3.dynamodb.types import TypeDeserializer
-        deserializer = TypeDeserializer()
+        # Cambios con ambas imágenes para los agregados (KPIs, rollup diario, top productos, scorecard)
+        image_changes = []
+        
+        # SequenceNumber normalizada -> original, para reportar batchItemFailures
+        secuencias = {}
+        
+        # Primera secuencia de cada tabla, para reintentar su delta si falla la escritura
+        primera_por_tabla = {}
         
+        # Deserializar TODOS los registros del batch
         for record in event['Records']:
             event_name = record['eventName']  # INSERT, MODIFY, REMOVE
             event_source_arn = record['eventSourceARN']
@@ -165,23 +78,30 @@ def handler(event, context):
             if table_name not in changes_by_table:
                 changes_by_table[table_name] = []
             
-            if event_name in ['INSERT', 'MODIFY']:
-                changed_record = record['dynamodb'].get('NewImage')
-                if changed_record:
-                    normal_record = {k: deserializer.deserialize(v) for k, v in changed_record.items()}
-                    changes_by_table[table_name].append({
-                        'event_type': event_name,
-                        'data': normal_record
-                    })
+            old_record = {k: deserializer.deserialize(v) for k, v in record['dynamodb'].get('OldImage', {}).items()}
+            new_record = {k: deserializer.deserialize(v) for k, v in record['dynamodb'].get('NewImage', {}).items()}
             
-            elif event_name == 'REMOVE':
-                old_record = record['dynamodb'].get('OldImage')
-                if old_record:
-                    normal_record = {k: deserializer.deserialize(v) for k, v in old_record.items()}
-                    changes_by_table[table_name].append({
-                        'event_type': 'REMOVE',
-                        'data': normal_record
-                    })
+            if event_name in ['INSERT', 'MODIFY'] and new_record:
+                changes_by_table[table_name].append({
+                    'event_type': event_name,
+                    'data': new_record
+                })
+            elif event_name == 'REMOVE' and old_record:
+                changes_by_table[table_name].append({
+                    'event_type': 'REMOVE',
+                    'data': old_record
+                })
+            
+            if get_table_key(table_name):
+                secuencia = normalizar_secuencia(record['dynamodb']['SequenceNumber'])
+                secuencias[secuencia] = record['dynamodb']['SequenceNumber']
+                primera_por_tabla[table_name] = min(primera_por_tabla.get(table_name, secuencia), secuencia)
+                image_changes.append({
+                    'table_key': get_table_key(table_name),
+                    'secuencia': secuencia,
+                    'anterior': old_record,
+                    'nuevo': new_record if event_name != 'REMOVE' else {}
+                })
         
         # Procesar cada tabla modificada
         results = []
@@ -193,39 +113,21 @@ def handler(event, context):
                     logger.warning(f'⚠️  Tabla no mapeada: {table_name}')
                     continue
                 
-                logger.info(f'🔄 Procesando {len(changes)} cambios en {table_name}')
-                
-                # 1. Cargar datos existentes de S3 (UNA SOLA VEZ)
-                existing_records = load_existing_data(table_key)
+                if not changes:
+                    continue
                 
-                inserts = 0
-                updates = 0
-                deletes = 0
+                logger.info(f'🔄 Procesando {len(changes)} cambios en {table_name}')
                 
-                # 2. Aplicar TODOS los cambios incrementalmente
-                for change in changes:
-                    event_type = change['event_type']
-                    data = change['data']
-                    key = get_record_key(data, table_name)
-                    
-                    if event_type == 'INSERT':
-                        existing_records[key] = data
-                        inserts += 1
-                    elif event_type == 'MODIFY':
-                        existing_records[key] = data
-                        updates += 1
-                    elif event_type == 'REMOVE':
-                        if key in existing_records:
-                            del existing_records[key]
-                            deletes += 1
+                inserts = len([c for c in changes if c['event_type'] == 'INSERT'])
+                updates = len([c for c in changes if c['event_type'] == 'MODIFY'])
+                deletes = len([c for c in changes if c['event_type'] == 'REMOVE'])
                 
-                # 3. Guardar archivo actualizado en S3 (UNA SOLA VEZ)
-                s3_uri = save_data_to_s3(table_key, existing_records)
+                # Un solo PUT por tabla con los cambios del lote
+                s3_uri = write_delta_file(table_key, changes, context.aws_request_id)
                 
                 result = {
                     'table': table_name,
                     'table_key': table_key,
-                    'total_records': len(existing_records),
                     'inserts': inserts,
                     'updates': updates,
                     'deletes': deletes,
@@ -235,27 +137,62 @@ def handler(event, context):
                 }
                 
                 results.append(result)
-                logger.info(f'✅ {table_name} actualizado: +{inserts} -{deletes} ~{updates} | Total: {len(existing_records)}')
+                logger.info(f'✅ Delta de {table_name} escrito: +{inserts} -{deletes} ~{updates}')
                 
             except Exception as e:
                 logger.error(f'❌ Error procesando {table_name}: {str(e)}', exc_info=True)
                 results.append({
                     'table': table_name,
                     'status': 'failed',
-                    'error': str(e)
+                    'error': str(e),
+                    # El delta no llegó a S3: el lote se reintenta desde su primer registro
+                    'secuencia': primera_por_tabla.get(table_name)
                 })
         
+        # KPIs por local (ADD atómico e idempotente, un UpdateItem por local)
+        kpis = aplicar_kpis(image_changes)
+        logger.info(f"📈 KPIs actualizados: {kpis['locales']} locales, {kpis['duplicados']} ya aplicados, {kpis['fallidos']} con error")
+        
+        # Rollup diario de pedidos (récord diario sin Athena)
+        rollup = aplicar_rollup_diario(image_changes)
+        logger.info(f"📅 Rollup diario actualizado: {rollup['dias']} días, {rollup['duplicados']} ya aplicados, {rollup['fallidos']} con error")
+        
+        # Productos más vendidos (pedidos que pasan a recibido)
+        top = aplicar_top_productos(image_changes)
+        logger.info(f"🏆 Top productos actualizado: {top['ventanas']} ventanas, {top['duplicados']} ya aplicadas, {top['fallidos']} con error")
+        
+        # Scorecard del personal (transiciones del workflow, reseñas y empleados)
+        scorecard = aplicar_scorecard(image_changes)
+        logger.info(f"👥 Scorecard actualizado: {scorecard['empleados']} empleados, {scorecard['duplicados']} ya aplicados, {scorecard['fallidos']} con error")
+        
         # Resumen final
         success_count = len([r for r in results if r['status'] == 'success'])
         failed_count = len([r for r in results if r['status'] == 'failed'])
         
         logger.info(f'📊 Batch procesado: {success_count} OK, {failed_count} FAIL')
         
+        # Lambda reintenta desde la menor secuencia reportada; lo ya aplicado se omite por
+        # secuencia y reescribir un delta es inocuo (la compactación aplica upserts por clave)
+        fallidas = sorted({
+            secuencia
+            for agregado in (kpis, rollup, top, scorecard)
+            for secuencia in agregado.get('secuencias_fallidas', [])
+        } | {
+            r['secuencia'] for r in results if r['status'] == 'failed' and r.get('secuencia')
+        })
+        if fallidas:
+            logger.warning(f'⚠️  Reintentando desde la secuencia {secuencias[fallidas[0]]}')
+        
         return {
+            'batchItemFailures': [{'itemIdentifier': secuencias[fallidas[0]]}] if fallidas else [],
             'statusCode': 200,
             'processed_tables': len(changes_by_table),
             'successful': success_count,
             'failed': failed_count,
+            'kpis': kpis,
+            'rollup_diario': rollup,
+            'top_productos': top,
+            'scorecard_personal': scorecard,
             'results': results
         }
         
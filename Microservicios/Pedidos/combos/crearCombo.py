@@ -4,6 +4,7 @@ import os
 import uuid
 from decimal import Decimal
 from utils.cors_utils import get_cors_headers   # <-- se agrega igual que en login
+from utils.dynamodb_helper import incrementar_version_catalogo
 
 dynamodb = boto3.resource('dynamodb')
 table_name = os.environ.get('TABLE_COMBOS', 'ChinaWok-Combos')
@@ -49,6 +50,8 @@ def handler(event, context):
         # Guardar en DynamoDB
         table.put_item(Item=body)
 
+        incrementar_version_catalogo(body['local_id'])
+
         return {
             'statusCode': 201,
             'headers': get_cors_headers(),
@@ -3,6 +3,7 @@ import boto3
 import os
 from boto3.dynamodb.conditions import Attr
 from utils.cors_utils import get_cors_headers
+from utils.dynamodb_helper import incrementar_version_catalogo
 
 # Clientes DynamoDB
 dynamodb = boto3.resource('dynamodb')
@@ -108,6 +109,8 @@ def handler(event, context):
             }
         )
         
+        incrementar_version_catalogo(local_id)
+
         return {
             'statusCode': 200,
             'headers': get_cors_headers(),
@@ -4,6 +4,7 @@ import os
 import uuid
 from botocore.exceptions import ClientError
 from utils.cors_utils import get_cors_headers   # <<< CORS unificado
+from utils.dynamodb_helper import incrementar_version_catalogo
 
 # Cliente DynamoDB
 dynamodb = boto3.resource('dynamodb')
@@ -133,6 +134,8 @@ def handler(event, context):
         # Insertar en DynamoDB
         table.put_item(Item=body)
         
+        incrementar_version_catalogo(local_id)
+
         return {
             "statusCode": 201,
             "headers": get_cors_headers(),
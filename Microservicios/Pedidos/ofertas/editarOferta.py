@@ -3,6 +3,7 @@ import boto3
 import os
 from botocore.exceptions import ClientError
 from utils.cors_utils import get_cors_headers   # <<< CORS unificado
+from utils.dynamodb_helper import incrementar_version_catalogo
 
 # Cliente DynamoDB
 dynamodb = boto3.resource('dynamodb')
@@ -158,6 +159,8 @@ def handler(event, context):
             ReturnValues="ALL_NEW"
         )
 
+        incrementar_version_catalogo(local_id)
+
         return {
             "statusCode": 200,
             "headers": get_cors_headers(),
@@ -2,6 +2,7 @@ import json
 import boto3
 import os
 from utils.cors_utils import get_cors_headers
+from utils.dynamodb_helper import incrementar_version_catalogo
 
 # Cliente DynamoDB
 dynamodb = boto3.resource('dynamodb')
@@ -72,6 +73,8 @@ def handler(event, context):
             }
         )
         
+        incrementar_version_catalogo(local_id)
+
         return {
             'statusCode': 200,
             'headers': get_cors_headers(),
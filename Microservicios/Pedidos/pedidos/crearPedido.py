@@ -1,111 +1,85 @@
 import json
 import boto3
 import os
+import sys
 import uuid
 from datetime import datetime, timedelta
 from botocore.exceptions import ClientError
 from decimal import Decimal
 from utils.cors_utils import get_cors_headers
+from utils.dynamodb_client import batch_get_items
+from utils.dynamodb_helper import crear_pedido_con_reserva_stock
+from utils.idempotency_utils import clave_idempotencia, idempotent
 
-# Cliente DynamoDB
-dynamodb = boto3.resource('dynamodb')
-table_name = os.environ.get('TABLE_PEDIDOS', 'ChinaWok-Pedidos')
-table = dynamodb.Table(table_name)
-
-# Tabla de productos
-productos_table_name = os.environ.get('TABLE_PRODUCTOS', 'ChinaWok-Productos')
-productos_table = dynamodb.Table(productos_table_name)
-
-# Tabla de combos
-combos_table_name = os.environ.get('TABLE_COMBOS', 'ChinaWok-Combos')
-combos_table = dynamodb.Table(combos_table_name)
+sys.path.append(os.path.dirname(__file__))
+from precios import cotizar_carrito, ErrorPrecio
 
 # Tabla de locales
 locales_table_name = os.environ.get('TABLE_LOCALES', 'ChinaWok-Locales')
-locales_table = dynamodb.Table(locales_table_name)
 
 # Tabla de usuarios
 usuarios_table_name = os.environ.get('TABLE_USUARIOS', 'ChinaWok-Usuarios')
-usuarios_table = dynamodb.Table(usuarios_table_name)
 
 # EventBridge
 eventbridge = boto3.client('events')
 EVENT_BUS_NAME = os.environ.get('EVENT_BUS_NAME', 'chinawok-pedidos-events')
 
 
-def verificar_local_existe(local_id):
-    try:
-        response = locales_table.get_item(Key={'local_id': local_id})
-        if 'Item' not in response:
-            return False, f"El local '{local_id}' no existe"
-        return True, None
-    except ClientError as e:
-        return False, f"Error al verificar local: {str(e)}"
-
-
-def verificar_usuario_info_bancaria(usuario_correo):
-    try:
-        response = usuarios_table.get_item(Key={'correo': usuario_correo})
-        if 'Item' not in response:
-            return False, f"El usuario '{usuario_correo}' no existe"
-
-        usuario = response['Item']
-        info_bancaria = usuario.get('informacion_bancaria')
-
-        if not info_bancaria:
-            return False, f"El usuario '{usuario_correo}' no tiene información bancaria registrada"
-
-        campos_requeridos = ['numero_tarjeta', 'cvv', 'fecha_vencimiento', 'direccion_delivery']
-        for campo in campos_requeridos:
-            if not info_bancaria.get(campo):
-                return False, f"Información bancaria incompleta (falta: {campo})"
+def cargar_datos_validacion(body):
+    """
+    Obtiene en un solo BatchGetItem el local (con su versión de precios) y el
+    usuario. El catálogo se valida contra el índice de precios y el stock
+    dentro de la transacción de creación
+    """
+    items = batch_get_items({
+        locales_table_name: {
+            'Keys': [{'local_id': body['local_id']}],
+            'ProjectionExpression': 'local_id, precios_version'
+        },
+        usuarios_table_name: {
+            'Keys': [{'correo': body['usuario_correo']}],
+            'ProjectionExpression': 'correo, informacion_bancaria'
+        }
+    })
 
-        return True, None
+    locales = items.get(locales_table_name, [])
+    usuarios = items.get(usuarios_table_name, [])
 
-    except ClientError as e:
-        return False, f"Error al verificar usuario: {str(e)}"
+    return {
+        'local': locales[0] if locales else None,
+        'usuario': usuarios[0] if usuarios else None
+    }
 
 
-def verificar_productos_stock(local_id, productos):
-    for producto in productos:
-        nombre = producto['nombre']
-        cantidad = producto['cantidad']
+def verificar_local_existe(local_id, local):
+    if not local:
+        return False, f"El local '{local_id}' no existe"
+    return True, None
 
-        try:
-            response = productos_table.get_item(
-                Key={'local_id': local_id, 'nombre': nombre}
-            )
 
-            if 'Item' not in response:
-                return False, f"El producto '{nombre}' no existe en el local {local_id}"
+def verificar_usuario_info_bancaria(usuario_correo, usuario):
+    if not usuario:
+        return False, f"El usuario '{usuario_correo}' no existe"
 
-            stock_disponible = response['Item'].get('stock', 0)
+    info_bancaria = usuario.get('informacion_bancaria')
 
-            if stock_disponible < cantidad:
-                return False, f"Stock insuficiente para '{nombre}'"
+    if not info_bancaria:
+        return False, f"El usuario '{usuario_correo}' no tiene información bancaria registrada"
 
-        except ClientError as e:
-            return False, f"Error al verificar producto '{nombre}': {str(e)}"
+    campos_requeridos = ['numero_tarjeta', 'cvv', 'fecha_vencimiento', 'direccion_delivery']
+    for campo in campos_requeridos:
+        if not info_bancaria.get(campo):
+            return False, f"Información bancaria incompleta (falta: {campo})"
 
     return True, None
 
 
-def verificar_combos(local_id, combos):
-    for combo in combos:
-        combo_id = combo['combo_id']
-
-        try:
-            response = combos_table.get_item(
-                Key={'local_id': local_id, 'combo_id': combo_id}
-            )
-
-            if 'Item' not in response:
-                return False, f"El combo '{combo_id}' no existe en el local {local_id}"
-
-        except ClientError as e:
-            return False, f"Error al verificar combo '{combo_id}': {str(e)}"
-
-    return True, None
+def validar_cantidades(lineas):
+    for linea in lineas:
+        cantidad = linea.get('cantidad') if isinstance(linea, dict) else None
+        if not isinstance(cantidad, int) or isinstance(cantidad, bool) or cantidad <= 0:
+            return False
+    return True
 
 
 def convertir_floats_a_decimal(obj):
@@ -128,11 +102,12 @@ def convertir_decimal_a_float(obj):
     return obj
 
 
+@idempotent('crear_pedido')
 def handler(event, context):
     try:
         body = json.loads(event['body']) if isinstance(event.get('body'), str) else event.get('body', event)
 
-        campos_requeridos = ['local_id', 'usuario_correo', 'direccion', 'costo']
+        campos_requeridos = ['local_id', 'usuario_correo', 'direccion']
         for campo in campos_requeridos:
             if campo not in body:
                 return {
@@ -157,6 +132,13 @@ def handler(event, context):
                     'body': json.dumps({'error': 'productos debe ser un array no vacío'})
                 }
 
+            if not validar_cantidades(body['productos']):
+                return {
+                    'statusCode': 400,
+                    'headers': get_cors_headers(),
+                    'body': json.dumps({'error': 'Cada producto debe tener una cantidad entera positiva'})
+                }
+
         if 'combos' in body:
             if not isinstance(body['combos'], list) or len(body['combos']) == 0:
                 return {
@@ -165,15 +147,28 @@ def handler(event, context):
                     'body': json.dumps({'error': 'combos debe ser un array no vacío'})
                 }
 
-        if not isinstance(body['costo'], (int, float)) or body['costo'] < 0:
+            if not validar_cantidades(body['combos']):
+                return {
+                    'statusCode': 400,
+                    'headers': get_cors_headers(),
+                    'body': json.dumps({'error': 'Cada combo debe tener una cantidad entera positiva'})
+                }
+
+        # El costo lo calcula el servidor; el enviado por el cliente solo se valida
+        if 'costo' in body and (not isinstance(body['costo'], (int, float)) or body['costo'] < 0):
             return {
                 'statusCode': 400,
                 'headers': get_cors_headers(),
                 'body': json.dumps({'error': 'costo debe ser un número positivo'})
             }
 
-        # Identificadores y estado
-        body['pedido_id'] = str(uuid.uuid4())
+        # Identificadores y estado. Con Idempotency-Key el id es determinista:
+        # un reintento que se ejecute de nuevo choca con attribute_not_exists
+        clave = clave_idempotencia(event, 'crear_pedido')
+        if clave:
+            body['pedido_id'] = str(uuid.uuid5(uuid.NAMESPACE_URL, f"{clave}#{body['usuario_correo']}"))
+        else:
+            body['pedido_id'] = str(uuid.uuid4())
         hora_inicio = datetime.utcnow()
         hora_fin = hora_inicio + timedelta(seconds=2.5)
 
@@ -189,8 +184,17 @@ def handler(event, context):
             'empleado': None
         }]
 
-        # Validaciones externas
-        exito, err = verificar_local_existe(body['local_id'])
+        # Validaciones externas (una sola ronda de lecturas)
+        try:
+            datos = cargar_datos_validacion(body)
+        except ClientError as e:
+            return {
+                'statusCode': 400,
+                'headers': get_cors_headers(),
+                'body': json.dumps({'error': 'Error validación', 'message': f"Error al verificar datos del pedido: {str(e)}"})
+            }
+
+        exito, err = verificar_local_existe(body['local_id'], datos['local'])
         if not exito:
             return {
                 'statusCode': 400,
@@ -198,7 +202,7 @@ def handler(event, context):
                 'body': json.dumps({'error': 'Error validación local', 'message': err})
             }
 
-        exito, err = verificar_usuario_info_bancaria(body['usuario_correo'])
+        exito, err = verificar_usuario_info_bancaria(body['usuario_correo'], datos['usuario'])
         if not exito:
             return {
                 'statusCode': 400,
@@ -206,50 +210,33 @@ def handler(event, context):
                 'body': json.dumps({'error': 'Error validación usuario', 'message': err})
             }
 
-        if 'productos' in body:
-            exito, err = verificar_productos_stock(body['local_id'], body['productos'])
-            if not exito:
-                return {
-                    'statusCode': 400,
-                    'headers': get_cors_headers(),
-                    'body': json.dumps({'error': 'Error validación productos', 'message': err})
-                }
+        # Cotizar el carrito con el índice de precios del local (ofertas incluidas)
+        try:
+            cotizacion = cotizar_carrito(
+                body['local_id'],
+                datos['local'].get('precios_version', 0),
+                body.get('productos'),
+                body.get('combos')
+            )
+        except ErrorPrecio as e:
+            return {
+                'statusCode': 400,
+                'headers': get_cors_headers(),
+                'body': json.dumps({'error': 'Error validación productos', 'message': str(e)})
+            }
 
-        if 'combos' in body:
-            exito, err = verificar_combos(body['local_id'], body['combos'])
-            if not exito:
-                return {
-                    'statusCode': 400,
-                    'headers': get_cors_headers(),
-                    'body': json.dumps({'error': 'Error validación combos', 'message': err})
-                }
+        body['detalle_precios'] = cotizacion
+        body['costo'] = cotizacion['total']
 
-        # Guardar pedido
+        # Guardar pedido, reservar stock y enlazar al usuario en una sola transacción
         body = convertir_floats_a_decimal(body)
-        table.put_item(Item=body)
-        
-        # Actualizar historial_pedidos del usuario con {pedido_id, local_id}
-        try:
-            usuario_correo = body['usuario_correo']
-            pedido_id = body['pedido_id']
-            local_id = body['local_id']
-
-            nuevo_registro = {
-                'pedido_id': pedido_id,
-                'local_id': local_id
+        exito, err = crear_pedido_con_reserva_stock(body)
+        if not exito:
+            return {
+                'statusCode': 409,
+                'headers': get_cors_headers(),
+                'body': json.dumps({'error': 'No se pudo crear el pedido', 'message': err})
             }
-            
-            usuarios_table.update_item(
-                Key={'correo': usuario_correo},
-                UpdateExpression='SET historial_pedidos = list_append(if_not_exists(historial_pedidos, :empty_list), :pedido)',
-                ExpressionAttributeValues={
-                    ':pedido': [nuevo_registro],
-                    ':empty_list': []
-                }
-            )
-        except Exception as e:
-            # Log error pero no fallar la creación del pedido
-            print(f"Warning: No se pudo actualizar historial de usuario: {str(e)}")
 
         try:
             eventbridge.put_events(Entries=[{
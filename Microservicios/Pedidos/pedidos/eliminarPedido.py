@@ -2,16 +2,13 @@ import json
 import boto3
 import os
 from utils.cors_utils import get_cors_headers  # <-- agregado
+from utils.dynamodb_helper import eliminar_pedido
 
 # Cliente DynamoDB
 dynamodb = boto3.resource('dynamodb')
 table_name = os.environ.get('TABLE_PEDIDOS', 'ChinaWok-Pedidos')
 table = dynamodb.Table(table_name)
 
-# Tabla de usuarios
-usuarios_table_name = os.environ.get('TABLE_USUARIOS', 'ChinaWok-Usuarios')
-usuarios_table = dynamodb.Table(usuarios_table_name)
-
 
 def handler(event, context):
     """
@@ -70,40 +67,10 @@ def handler(event, context):
                 })
             }
         
-        # Obtener datos del pedido antes de eliminar
-        pedido = response['Item']
-        usuario_correo = pedido.get('usuario_correo')
-
-        # Eliminar el pedido
-        table.delete_item(
-            Key={
-                'local_id': local_id,
-                'pedido_id': pedido_id
-            }
-        )
-        
-        # Eliminar del historial del usuario
-        if usuario_correo:
-            try:
-                # Obtener usuario actual
-                user_response = usuarios_table.get_item(Key={'correo': usuario_correo})
-                if 'Item' in user_response:
-                    usuario = user_response['Item']
-                    historial = usuario.get('historial_pedidos', [])
-                    
-                    # Remover pedido_id del historial
-                    if pedido_id in historial:
-                        historial.remove(pedido_id)
-                        
-                        # Actualizar usuario
-                        usuarios_table.update_item(
-                            Key={'correo': usuario_correo},
-                            UpdateExpression='SET historial_pedidos = :historial',
-                            ExpressionAttributeValues={':historial': historial}
-                        )
-            except Exception as e:
-                # Log error pero no fallar la eliminación del pedido
-                print(f"Warning: No se pudo actualizar historial de usuario: {str(e)}")
+        # Eliminar el pedido (el historial del usuario es el índice
+        # usuario-fecha-index de Pedidos, no hay que actualizar Usuarios)
+        # devolviendo en la misma transacción el stock que aún tenía reservado
+        stock_repuesto = eliminar_pedido(response['Item'])
 
         return {
             'statusCode': 200,
@@ -112,7 +79,8 @@ def handler(event, context):
                 'message': 'Pedido eliminado exitosamente',
                 'data': {
                     'local_id': local_id,
-                    'pedido_id': pedido_id
+                    'pedido_id': pedido_id,
+                    'stock_repuesto': stock_repuesto
                 }
             })
         }
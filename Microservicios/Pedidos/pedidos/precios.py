@@ -0,0 +1,199 @@
+import boto3
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from decimal import Decimal, ROUND_HALF_UP
+from boto3.dynamodb.conditions import Key
+
+# Cliente DynamoDB
+dynamodb = boto3.resource('dynamodb')
+productos_table = dynamodb.Table(os.environ.get('TABLE_PRODUCTOS', 'ChinaWok-Productos'))
+combos_table = dynamodb.Table(os.environ.get('TABLE_COMBOS', 'ChinaWok-Combos'))
+ofertas_table = dynamodb.Table(os.environ.get('TABLE_OFERTAS', 'ChinaWok-Ofertas'))
+
+# Red de seguridad por si se pierde un incremento de precios_version
+INDICE_TTL_SEGUNDOS = int(os.environ.get('PRECIOS_INDICE_TTL_SEGUNDOS', 300))
+
+CENTIMOS = Decimal('0.01')
+CIEN = Decimal(100)
+
+# Índices por local cacheados en el contenedor Lambda: local_id -> índice
+_indices = {}
+
+
+class ErrorPrecio(Exception):
+    """Un ítem del carrito no se puede cotizar (no existe, sin precio o no disponible)"""
+
+
+def _query_completa(table, local_id, proyeccion):
+    """Query por local_id siguiendo la paginación"""
+    items = []
+    kwargs = {
+        'KeyConditionExpression': Key('local_id').eq(local_id),
+        'ProjectionExpression': proyeccion
+    }
+    while True:
+        response = table.query(**kwargs)
+        items.extend(response.get('Items', []))
+        if 'LastEvaluatedKey' not in response:
+            return items
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def _parsear_fecha(valor):
+    """Convierte fechas ISO (con o sin 'Z') a datetime naive en UTC"""
+    if not valor:
+        return None
+    try:
+        return datetime.fromisoformat(str(valor).replace('Z', '+00:00')).replace(tzinfo=None)
+    except ValueError:
+        return None
+
+
+def construir_indice(local_id, version):
+    """
+    Construye el índice de precios de un local con tres queries en paralelo:
+    precio por producto, precio/disponibilidad por combo y ofertas vigentes
+    o futuras por producto y por combo (ordenadas por mayor descuento)
+    """
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        f_productos = executor.submit(_query_completa, productos_table, local_id, 'nombre, precio')
+        f_combos = executor.submit(_query_completa, combos_table, local_id, 'combo_id, precio, disponible')
+        f_ofertas = executor.submit(
+            _query_completa, ofertas_table, local_id,
+            'oferta_id, producto_nombre, combo_id, porcentaje_descuento, fecha_inicio, fecha_limite'
+        )
+        productos, combos, ofertas = f_productos.result(), f_combos.result(), f_ofertas.result()
+
+    ahora = datetime.utcnow()
+    ofertas_producto = {}
+    ofertas_combo = {}
+
+    for oferta in ofertas:
+        fecha_limite = _parsear_fecha(oferta.get('fecha_limite'))
+        if not fecha_limite or fecha_limite < ahora:
+            continue
+
+        entrada = (
+            Decimal(str(oferta.get('porcentaje_descuento', 0))),
+            _parsear_fecha(oferta.get('fecha_inicio')),
+            fecha_limite,
+            oferta.get('oferta_id')
+        )
+
+        if oferta.get('producto_nombre'):
+            ofertas_producto.setdefault(oferta['producto_nombre'], []).append(entrada)
+        if oferta.get('combo_id'):
+            ofertas_combo.setdefault(oferta['combo_id'], []).append(entrada)
+
+    for lista in list(ofertas_producto.values()) + list(ofertas_combo.values()):
+        lista.sort(key=lambda o: o[0], reverse=True)
+
+    indice = {
+        'version': version,
+        'cargado_en': time.time(),
+        'productos': {p['nombre']: p.get('precio') for p in productos},
+        'combos': {c['combo_id']: (c.get('precio'), c.get('disponible', True)) for c in combos},
+        'ofertas_producto': ofertas_producto,
+        'ofertas_combo': ofertas_combo
+    }
+
+    print(f'Índice de precios del local {local_id} (versión {version}): '
+          f'{len(productos)} productos, {len(combos)} combos, {len(ofertas)} ofertas')
+    return indice
+
+
+def obtener_indice(local_id, version):
+    """Retorna el índice cacheado si la versión coincide y no expiró; si no, lo reconstruye"""
+    indice = _indices.get(local_id)
+
+    if indice and indice['version'] == version and time.time() - indice['cargado_en'] < INDICE_TTL_SEGUNDOS:
+        return indice
+
+    indice = construir_indice(local_id, version)
+    _indices[local_id] = indice
+    return indice
+
+
+def _mejor_oferta(ofertas, ahora):
+    """Primera oferta activa (la lista viene ordenada por mayor descuento)"""
+    for porcentaje, fecha_inicio, fecha_limite, oferta_id in ofertas or []:
+        if (fecha_inicio is None or fecha_inicio <= ahora) and ahora <= fecha_limite:
+            return porcentaje, oferta_id
+    return Decimal(0), None
+
+
+def _cotizar_linea(tipo, clave, cantidad, precio, ofertas, ahora):
+    precio_unitario = Decimal(str(precio))
+    porcentaje, oferta_id = _mejor_oferta(ofertas, ahora)
+    precio_final = (precio_unitario * (CIEN - porcentaje) / CIEN).quantize(CENTIMOS, rounding=ROUND_HALF_UP)
+
+    return {
+        'tipo': tipo,
+        'id': clave,
+        'cantidad': cantidad,
+        'precio_unitario': precio_unitario,
+        'porcentaje_descuento': porcentaje,
+        'oferta_id': oferta_id,
+        'precio_final_unitario': precio_final,
+        'subtotal': (precio_final * cantidad).quantize(CENTIMOS, rounding=ROUND_HALF_UP)
+    }
+
+
+def cotizar_carrito(local_id, version, productos=None, combos=None):
+    """
+    Cotiza el carrito completo en una sola pasada sobre el índice del local,
+    sin lecturas a DynamoDB por línea. Aplica la oferta activa de mayor
+    descuento a cada producto o combo.
+
+    Returns:
+        dict: detalle con lineas, subtotal, descuento y total (Decimal)
+
+    Raises:
+        ErrorPrecio: si un producto/combo no existe, no tiene precio o no está disponible
+    """
+    indice = obtener_indice(local_id, version)
+    ahora = datetime.utcnow()
+    lineas = []
+
+    for producto in productos or []:
+        nombre = producto['nombre']
+        if nombre not in indice['productos']:
+            raise ErrorPrecio(f"El producto '{nombre}' no existe en el local {local_id}")
+
+        precio = indice['productos'][nombre]
+        if precio is None:
+            raise ErrorPrecio(f"El producto '{nombre}' no tiene precio registrado")
+
+        lineas.append(_cotizar_linea(
+            'producto', nombre, producto['cantidad'], precio,
+            indice['ofertas_producto'].get(nombre), ahora
+        ))
+
+    for combo in combos or []:
+        combo_id = combo['combo_id']
+        if combo_id not in indice['combos']:
+            raise ErrorPrecio(f"El combo '{combo_id}' no existe en el local {local_id}")
+
+        precio, disponible = indice['combos'][combo_id]
+        if not disponible:
+            raise ErrorPrecio(f"El combo '{combo_id}' no está disponible")
+        if precio is None:
+            raise ErrorPrecio(f"El combo '{combo_id}' no tiene precio registrado")
+
+        lineas.append(_cotizar_linea(
+            'combo', combo_id, combo.get('cantidad', 1), precio,
+            indice['ofertas_combo'].get(combo_id), ahora
+        ))
+
+    subtotal = sum((l['precio_unitario'] * l['cantidad'] for l in lineas), Decimal(0)).quantize(CENTIMOS, rounding=ROUND_HALF_UP)
+    total = sum((l['subtotal'] for l in lineas), Decimal(0))
+
+    return {
+        'lineas': lineas,
+        'subtotal': subtotal,
+        'descuento': subtotal - total,
+        'total': total,
+        'version_precios': version
+    }
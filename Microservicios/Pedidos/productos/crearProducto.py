@@ -4,6 +4,7 @@ import os
 from decimal import Decimal
 from botocore.exceptions import ClientError
 from utils.cors_utils import get_cors_headers  # <-- agregado
+from utils.dynamodb_helper import incrementar_version_catalogo
 
 # Cliente DynamoDB
 dynamodb = boto3.resource('dynamodb')
@@ -86,6 +87,8 @@ def handler(event, context):
         body_decimal = convertir_floats_a_decimal(body)
         table.put_item(Item=body_decimal)
         
+        incrementar_version_catalogo(local_id)
+
         return {
             'statusCode': 201,
             'headers': cors_headers,  # <-- reemplazado
@@ -3,6 +3,7 @@ import boto3
 import os
 from decimal import Decimal
 from utils.cors_utils import get_cors_headers  # <-- agregado
+from utils.dynamodb_helper import incrementar_version_catalogo
 
 # Cliente DynamoDB
 dynamodb = boto3.resource('dynamodb')
@@ -103,6 +104,10 @@ def handler(event, context):
             ReturnValues="ALL_NEW"
         )
         
+        # El stock no afecta a los precios cacheados
+        if set(update_data) - {'stock'}:
+            incrementar_version_catalogo(local_id)
+
         return {
             'statusCode': 200,
             'headers': cors_headers,  # <-- reemplazado
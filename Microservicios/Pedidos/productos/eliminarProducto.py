@@ -3,6 +3,7 @@ import boto3
 import os
 from boto3.dynamodb.conditions import Attr
 from utils.cors_utils import get_cors_headers
+from utils.dynamodb_helper import incrementar_version_catalogo
 
 # Clientes DynamoDB
 dynamodb = boto3.resource('dynamodb')
@@ -117,6 +118,8 @@ def handler(event, context):
         # 3. Eliminar el producto
         table_productos.delete_item(Key={'local_id': local_id, 'nombre': nombre})
         
+        incrementar_version_catalogo(local_id)
+
         return {
             'statusCode': 200,
             'headers': cors_headers,
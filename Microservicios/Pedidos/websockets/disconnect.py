@@ -1,6 +1,7 @@
 import json
 import boto3
 import os
+from websockets.notificador import obtener_suscripciones
 
 dynamodb = boto3.resource('dynamodb')
 conexiones_table = dynamodb.Table(os.environ.get('TABLE_CONEXIONES', 'ChinaWok-WebSocket-Conexiones'))
@@ -15,23 +16,19 @@ def handler(event, context):
     connection_id = event['requestContext']['connectionId']
     
     try:
-        # Buscar y eliminar todas las conexiones con este connection_id
-        response = conexiones_table.scan(
-            FilterExpression='connection_id = :cid',
-            ExpressionAttributeValues={':cid': connection_id}
-        )
+        # Una query al índice inverso en lugar de escanear la tabla completa
+        claves = obtener_suscripciones(connection_id)
         
-        for item in response.get('Items', []):
-            conexiones_table.delete_item(
-                Key={
-                    'usuario_correo': item['usuario_correo'],
-                    'pedido_id': item['pedido_id']
-                }
-            )
-            print(f'✅ Conexión eliminada: {item["usuario_correo"]} - {item["pedido_id"]}')
+        # Borrado en lotes (BatchWriteItem de 25, reintenta los no procesados)
+        with conexiones_table.batch_writer() as batch:
+            for clave in claves:
+                batch.delete_item(Key=clave)
+        
+        for clave in claves:
+            print(f'✅ Conexión eliminada: {clave["usuario_correo"]} - {clave["pedido_id"]}')
         
         return {'statusCode': 200}
         
     except Exception as e:
         print(f'❌ Error al eliminar conexión: {str(e)}')
-        return {'statusCode': 500}
\ No newline at end of file
+        return {'statusCode': 500}
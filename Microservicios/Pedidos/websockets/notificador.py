@@ -1,55 +1,158 @@
-import json
 import boto3
 import os
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from boto3.dynamodb.conditions import Key
+from utils.json_encoder import json_dumps
 
 # Clientes AWS
 dynamodb = boto3.resource('dynamodb')
-apigateway = boto3.client('apigatewaymanagementapi')
 
 # Tablas
 conexiones_table = dynamodb.Table(os.environ.get('TABLE_CONEXIONES', 'ChinaWok-WebSocket-Conexiones'))
 
+# Índice inverso connection_id -> (usuario_correo, pedido_id)
+CONEXIONES_INDEX = 'connection-index'
+
+# Envíos simultáneos por notificación
+NOTIFICACION_MAX_WORKERS = int(os.environ.get('NOTIFICACION_MAX_WORKERS', 16))
+
+# Clientes de API Gateway Management cacheados por endpoint (viven lo que el contenedor)
+_clientes_gestion = {}
+
+
+def clave_suscripcion(pedido_id, connection_id):
+    """
+    Valor de la clave de ordenamiento (atributo pedido_id) de una suscripción.
+    Incluir el connection_id permite varios dispositivos por usuario y pedido
+    """
+    return f'{pedido_id}#{connection_id}'
+
+
+def obtener_cliente_gestion(endpoint=None):
+    """Cliente apigatewaymanagementapi reutilizado entre invocaciones"""
+    endpoint = endpoint or os.environ.get('WEBSOCKET_API_ENDPOINT')
+    if not endpoint:
+        return None
+
+    if endpoint not in _clientes_gestion:
+        _clientes_gestion[endpoint] = boto3.client('apigatewaymanagementapi', endpoint_url=endpoint)
+    return _clientes_gestion[endpoint]
+
+
+def obtener_conexiones(usuario_correo, pedido_id=None):
+    """
+    Conexiones activas de un usuario, o solo las suscritas a un pedido. Los
+    registros antiguos (clave = pedido_id sin connection_id) también coinciden
+    """
+    condicion = Key('usuario_correo').eq(usuario_correo)
+    if pedido_id:
+        condicion = condicion & Key('pedido_id').begins_with(pedido_id)
+
+    conexiones = []
+    kwargs = {
+        'KeyConditionExpression': condicion,
+        'ProjectionExpression': 'usuario_correo, pedido_id, connection_id'
+    }
+    while True:
+        response = conexiones_table.query(**kwargs)
+        conexiones.extend(response.get('Items', []))
+        if 'LastEvaluatedKey' not in response:
+            return conexiones
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def obtener_suscripciones(connection_id):
+    """Claves de todas las suscripciones registradas para una conexión"""
+    claves = []
+    kwargs = {
+        'IndexName': CONEXIONES_INDEX,
+        'KeyConditionExpression': Key('connection_id').eq(connection_id)
+    }
+    while True:
+        response = conexiones_table.query(**kwargs)
+        claves.extend(
+            {'usuario_correo': item['usuario_correo'], 'pedido_id': item['pedido_id']}
+            for item in response.get('Items', [])
+        )
+        if 'LastEvaluatedKey' not in response:
+            return claves
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def enviar_a_conexiones(conexiones, mensaje, cliente=None):
+    """
+    Envía el mismo mensaje a varias conexiones en paralelo y elimina en lote
+    las que API Gateway reporta como cerradas (GoneException)
+
+    Args:
+        conexiones: Items de la tabla de conexiones (con connection_id)
+        mensaje: Diccionario a enviar como JSON
+        cliente: Cliente apigatewaymanagementapi (por defecto el del endpoint configurado)
+
+    Returns:
+        int: Cantidad de conexiones que recibieron el mensaje
+    """
+    cliente = cliente or obtener_cliente_gestion()
+    if not cliente:
+        print('❌ WEBSOCKET_API_ENDPOINT no configurado')
+        return 0
+
+    if not conexiones:
+        return 0
+
+    data = json_dumps(mensaje).encode('utf-8')
+
+    def enviar(conexion):
+        try:
+            cliente.post_to_connection(ConnectionId=conexion['connection_id'], Data=data)
+            return 'enviado'
+        except cliente.exceptions.GoneException:
+            return 'cerrada'
+        except Exception as e:
+            print(f'❌ Error enviando a {conexion["connection_id"]}: {str(e)}')
+            return 'error'
+
+    with ThreadPoolExecutor(max_workers=min(NOTIFICACION_MAX_WORKERS, len(conexiones))) as executor:
+        resultados = list(executor.map(enviar, conexiones))
+
+    cerradas = [c for c, r in zip(conexiones, resultados) if r == 'cerrada']
+    if cerradas:
+        print(f'⚠️  {len(cerradas)} conexiones cerradas, eliminando registros')
+        try:
+            with conexiones_table.batch_writer() as batch:
+                for conexion in cerradas:
+                    batch.delete_item(Key={
+                        'usuario_correo': conexion['usuario_correo'],
+                        'pedido_id': conexion['pedido_id']
+                    })
+        except Exception as e:
+            print(f'❌ Error eliminando conexiones cerradas: {str(e)}')
+
+    return resultados.count('enviado')
+
+
 def enviar_notificacion_pedido(pedido_id, usuario_correo, tipo_evento, datos):
     """
-    Envía notificación WebSocket a un usuario específico sobre un pedido
-    
+    Envía notificación WebSocket a todos los dispositivos de un usuario
+    conectados a un pedido
+
     Args:
         pedido_id: ID del pedido
         usuario_correo: Email del usuario
         tipo_evento: Tipo de evento (ej: 'ESTADO_CAMBIADO', 'PEDIDO_LISTO')
         datos: Diccionario con datos del evento
-    
+
     Returns:
-        bool: True si se envió exitosamente, False si no
+        bool: True si al menos un dispositivo recibió la notificación
     """
     try:
-        # Buscar conexión activa del usuario para este pedido
-        response = conexiones_table.get_item(
-            Key={
-                'usuario_correo': usuario_correo,
-                'pedido_id': pedido_id
-            }
-        )
-        
-        if 'Item' not in response:
+        conexiones = obtener_conexiones(usuario_correo, pedido_id)
+
+        if not conexiones:
             print(f'⚠️  Usuario {usuario_correo} no está conectado al pedido {pedido_id}')
             return False
-        
-        connection_id = response['Item']['connection_id']
-        
-        # Obtener WebSocket API endpoint desde variable de entorno
-        websocket_url = os.environ.get('WEBSOCKET_API_ENDPOINT')
-        if not websocket_url:
-            print('❌ WEBSOCKET_API_ENDPOINT no configurado')
-            return False
-        
-        # Configurar cliente de API Gateway Management con el endpoint correcto
-        apigateway_client = boto3.client(
-            'apigatewaymanagementapi',
-            endpoint_url=websocket_url
-        )
-        
+
         # Preparar mensaje
         mensaje = {
             'tipo': tipo_evento,
@@ -57,33 +160,36 @@ def enviar_notificacion_pedido(pedido_id, usuario_correo, tipo_evento, datos):
             'timestamp': datetime.now().isoformat(),
             'datos': datos
         }
-        
-        # Enviar mensaje
-        apigateway_client.post_to_connection(
-            ConnectionId=connection_id,
-            Data=json.dumps(mensaje).encode('utf-8')
-        )
-        
+
+        enviados = enviar_a_conexiones(conexiones, mensaje)
+
         print(f'✅ Notificación enviada a {usuario_correo}:')
         print(f'   - Tipo: {tipo_evento}')
-        print(f'   - Connection ID: {connection_id}')
-        
-        return True
-        
-    except apigateway_client.exceptions.GoneException:
-        # Conexión cerrada, eliminar de la tabla
-        print(f'⚠️  Conexión cerrada, eliminando registro')
-        try:
-            conexiones_table.delete_item(
-                Key={
-                    'usuario_correo': usuario_correo,
-                    'pedido_id': pedido_id
-                }
-            )
-        except:
-            pass
-        return False
-        
+        print(f'   - Dispositivos: {enviados}/{len(conexiones)}')
+
+        return enviados > 0
+
     except Exception as e:
         print(f'❌ Error al enviar notificación WebSocket: {str(e)}')
         return False
+
+
+def enviar_notificacion_usuario(usuario_correo, tipo_evento, datos):
+    """
+    Envía notificación WebSocket a todas las conexiones de un usuario, sin
+    importar el pedido al que estén suscritas
+
+    Returns:
+        int: Cantidad de conexiones que recibieron la notificación
+    """
+    try:
+        mensaje = {
+            'tipo': tipo_evento,
+            'timestamp': datetime.now().isoformat(),
+            'datos': datos
+        }
+        return enviar_a_conexiones(obtener_conexiones(usuario_correo), mensaje)
+
+    except Exception as e:
+        print(f'❌ Error al enviar notificación WebSocket: {str(e)}')
+        return 0
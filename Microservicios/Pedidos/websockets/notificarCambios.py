@@ -0,0 +1,163 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from boto3.dynamodb.types import TypeDeserializer
+from websockets.notificador import enviar_notificacion_pedido
+from websockets.tablero import aplicar_cambios, publicar_deltas
+
+# Consumidor del stream de Pedidos: las notificaciones de cambio de estado y
+# los deltas de los tableros por local se envían aquí, fuera del camino
+# crítico de los steps del workflow
+
+deserializer = TypeDeserializer()
+
+# Pedidos notificados en paralelo por lote
+NOTIFICACION_PEDIDOS_WORKERS = int(os.environ.get('NOTIFICACION_PEDIDOS_WORKERS', 8))
+
+# Tipo de evento y mensaje por estado (mismo formato que enviaban los steps)
+NOTIFICACIONES_ESTADO = {
+    'cocinando': ('ESTADO_ACTUALIZADO', 'Cocinero', 'Tu pedido está siendo preparado por {nombre}', 'un cocinero'),
+    'empacando': ('ESTADO_CAMBIADO', 'Despachador', 'Tu pedido está siendo empacado por {nombre}', 'un despachador'),
+    'enviando': ('ESTADO_CAMBIADO', 'Repartidor', '¡Tu pedido está en camino! {nombre} lo está entregando', 'un repartidor'),
+}
+
+
+def deserializar(imagen):
+    """Convierte una imagen del stream (formato DynamoDB) a dict de Python"""
+    return {k: deserializer.deserialize(v) for k, v in (imagen or {}).items()}
+
+
+def empleado_activo(pedido):
+    """Empleado de la entrada activa del historial, si la hay"""
+    for estado in reversed(pedido.get('historial_estados') or []):
+        if estado.get('activo'):
+            return estado.get('empleado')
+    return None
+
+
+def agrupar_cambios(records):
+    """
+    Agrupa los registros del lote por pedido: conserva la imagen anterior del
+    primer registro y la nueva del último, así varios cambios del mismo pedido
+    en un lote se notifican una sola vez con su estado final
+    """
+    cambios = {}
+    for record in records:
+        dynamodb_data = record.get('dynamodb', {})
+        anterior = deserializar(dynamodb_data.get('OldImage'))
+        nuevo = deserializar(dynamodb_data.get('NewImage'))
+        eliminado = record.get('eventName') == 'REMOVE'
+
+        pedido = anterior if eliminado else nuevo
+        if not pedido.get('pedido_id'):
+            continue
+
+        clave = (pedido.get('local_id'), pedido['pedido_id'])
+        if clave in cambios:
+            cambios[clave]['nuevo'] = nuevo
+            cambios[clave]['eliminado'] = eliminado
+        else:
+            cambios[clave] = {
+                'anterior': anterior,
+                'nuevo': nuevo,
+                'eliminado': eliminado
+            }
+    return cambios
+
+
+def cambio_visible(anterior, nuevo):
+    """True si cambió el estado o el historial (no task_token u otros atributos internos)"""
+    return (
+        nuevo.get('estado') != anterior.get('estado')
+        or len(nuevo.get('historial_estados') or []) != len(anterior.get('historial_estados') or [])
+    )
+
+
+def construir_notificacion(anterior, nuevo):
+    """
+    Compara las imágenes de un pedido y devuelve (tipo_evento, datos) si hubo
+    un cambio visible para el usuario, o None
+    """
+    if not cambio_visible(anterior, nuevo):
+        return None
+
+    estado = nuevo.get('estado')
+
+    if estado in NOTIFICACIONES_ESTADO:
+        tipo_evento, role, plantilla, generico = NOTIFICACIONES_ESTADO[estado]
+        empleado = empleado_activo(nuevo) or {}
+        nombre = (empleado.get('nombre_completo') or '').split(' ')[0] or generico
+        return tipo_evento, {
+            'estado': estado,
+            'empleado': {
+                'dni': empleado.get('dni'),
+                'nombre': nombre if empleado else '',
+                'role': role
+            },
+            'mensaje': plantilla.format(nombre=nombre)
+        }
+
+    if estado == 'recibido':
+        return 'PEDIDO_COMPLETADO', {
+            'estado': 'recibido',
+            'mensaje': '¡Gracias por confirmar! Disfruta tu pedido 🥡'
+        }
+
+    if estado == 'cancelado':
+        return 'PEDIDO_CANCELADO', {
+            'estado': 'cancelado',
+            'mensaje': 'Tu pedido fue cancelado'
+        }
+
+    return None
+
+
+def handler(event, context):
+    """
+    Procesa un lote del stream de Pedidos y envía por WebSocket los cambios de
+    estado, coalescidos por pedido y en paralelo
+    """
+    records = event.get('Records', [])
+    print(f'📡 Procesando {len(records)} registros del stream de Pedidos')
+
+    cambios = agrupar_cambios(records)
+
+    # Tableros de los locales: vista de pedidos activos + deltas por local
+    tableros = 0
+    try:
+        deltas = aplicar_cambios([
+            {
+                'pedido': cambio['anterior'] if cambio['eliminado'] else cambio['nuevo'],
+                'eliminado': cambio['eliminado']
+            }
+            for cambio in cambios.values()
+            if cambio['eliminado'] or cambio_visible(cambio['anterior'], cambio['nuevo'])
+        ])
+        tableros = publicar_deltas(deltas)
+    except Exception as e:
+        print(f'❌ Error actualizando tableros de locales: {str(e)}')
+
+    notificaciones = []
+    for cambio in cambios.values():
+        if cambio['eliminado']:
+            continue
+        notificacion = construir_notificacion(cambio['anterior'], cambio['nuevo'])
+        if notificacion and cambio['nuevo'].get('usuario_correo'):
+            notificaciones.append((cambio['nuevo'], notificacion))
+
+    if not notificaciones:
+        return {'notificados': 0, 'tableros': tableros}
+
+    def notificar(item):
+        pedido, (tipo_evento, datos) = item
+        return enviar_notificacion_pedido(
+            pedido_id=pedido['pedido_id'],
+            usuario_correo=pedido['usuario_correo'],
+            tipo_evento=tipo_evento,
+            datos=datos
+        )
+
+    with ThreadPoolExecutor(max_workers=min(NOTIFICACION_PEDIDOS_WORKERS, len(notificaciones))) as executor:
+        enviados = sum(1 for ok in executor.map(notificar, notificaciones) if ok)
+
+    print(f'✅ Pedidos notificados: {enviados}/{len(notificaciones)}')
+    return {'notificados': enviados, 'tableros': tableros}
@@ -3,21 +3,88 @@ import boto3
 import os
 from datetime import datetime
 from utils.cors_utils import get_cors_headers
+from utils.jwt_utils import validar_token
+from utils.authentication_utils import validar_acceso_local
+from websockets.notificador import clave_suscripcion
+from websockets.tablero import canal_local
 
 dynamodb = boto3.resource('dynamodb')
 conexiones_table = dynamodb.Table(os.environ.get('TABLE_CONEXIONES', 'ChinaWok-WebSocket-Conexiones'))
 
+def conectar_tablero(connection_id, query_params):
+    """
+    Registra la conexión en el canal LOCAL#<local_id>. El navegador no puede
+    enviar headers en el handshake, por eso el JWT llega como query param token
+    """
+    local_id = query_params['local_id']
+    
+    resultado = validar_token(query_params.get('token'))
+    if not resultado.get('valido'):
+        print(f"❌ Token inválido para tablero del local {local_id}: {resultado.get('error')}")
+        return {
+            'statusCode': 401,
+            'body': json.dumps({'error': resultado.get('error', 'Token inválido')})
+        }
+    
+    usuario = {'correo': resultado.get('correo'), 'role': resultado.get('role')}
+    tiene_acceso, error = validar_acceso_local(usuario, local_id)
+    if not tiene_acceso:
+        print(f"❌ {usuario['correo']} sin acceso al tablero del local {local_id}")
+        return {
+            'statusCode': 403,
+            'body': json.dumps({'error': error})
+        }
+    
+    try:
+        ttl = int(datetime.now().timestamp()) + 86400  # 24 horas
+        
+        conexiones_table.put_item(
+            Item={
+                'usuario_correo': canal_local(local_id),
+                'pedido_id': connection_id,
+                'connection_id': connection_id,
+                'suscriptor': usuario['correo'],
+                'connected_at': datetime.now().isoformat(),
+                'ttl': ttl
+            }
+        )
+        
+        print(f'✅ Tablero del local {local_id} conectado por {usuario["correo"]} ({connection_id})')
+        
+        return {
+            'statusCode': 200,
+            'body': json.dumps({
+                'message': 'Conectado al tablero en vivo',
+                'local_id': local_id
+            })
+        }
+        
+    except Exception as e:
+        print(f'❌ Error al registrar conexión de tablero: {str(e)}')
+        return {
+            'statusCode': 500,
+            'body': json.dumps({'error': str(e)})
+        }
+
 def handler(event, context):
     """
     Handler para conexión inicial de WebSocket
     Registra la conexión en DynamoDB
     """
-    print(f'📡 WebSocket Connect Event: {json.dumps(event)}')
-    
     connection_id = event['requestContext']['connectionId']
     
     # Obtener parámetros de query string
     query_params = event.get('queryStringParameters') or {}
+    
+    # No se registra el evento completo: el JWT del tablero llega en ?token=
+    # (también en multiValueQueryStringParameters)
+    parametros_log = {k: v for k, v in query_params.items() if k != 'token'}
+    print(f'📡 WebSocket Connect: {connection_id} {json.dumps(parametros_log)}')
+    
+    # Modo tablero: un gerente (o admin) se suscribe a todos los pedidos de su local
+    if query_params.get('local_id'):
+        return conectar_tablero(connection_id, query_params)
+    
     usuario_correo = query_params.get('usuario_correo')
     pedido_id = query_params.get('pedido_id')
     
@@ -29,13 +96,14 @@ def handler(event, context):
         }
     
     try:
-        # Guardar conexión en DynamoDB
+        # Guardar conexión en DynamoDB (una fila por dispositivo: la clave
+        # incluye el connection_id para no pisar otras conexiones del usuario)
         ttl = int(datetime.now().timestamp()) + 86400  # 24 horas
         
         conexiones_table.put_item(
             Item={
                 'usuario_correo': usuario_correo,
-                'pedido_id': pedido_id,
+                'pedido_id': clave_suscripcion(pedido_id, connection_id),
                 'connection_id': connection_id,
                 'connected_at': datetime.now().isoformat(),
                 'ttl': ttl
@@ -0,0 +1,45 @@
+import json
+from websockets.notificador import obtener_suscripciones, enviar_a_conexiones
+from websockets.tablero import obtener_snapshot
+
+def handler(event, context):
+    """
+    Handler de la ruta WebSocket 'snapshot'
+    Envía al tablero los pedidos activos de su local; luego recibe solo deltas
+    """
+    print(f'📡 WebSocket Snapshot Event: {json.dumps(event)}')
+
+    connection_id = event['requestContext']['connectionId']
+
+    try:
+        # El local sale de la suscripción registrada (ya autorizada en $connect)
+        canales = [
+            s['usuario_correo'] for s in obtener_suscripciones(connection_id)
+            if s['usuario_correo'].startswith('LOCAL#')
+        ]
+
+        if not canales:
+            print(f'❌ La conexión {connection_id} no está suscrita a un tablero')
+            return {
+                'statusCode': 403,
+                'body': json.dumps({'error': 'La conexión no está suscrita a un tablero de local'})
+            }
+
+        local_id = canales[0].split('#', 1)[1]
+        pedidos = obtener_snapshot(local_id)
+
+        enviar_a_conexiones(
+            [{'usuario_correo': canales[0], 'pedido_id': connection_id, 'connection_id': connection_id}],
+            {
+                'tipo': 'TABLERO_SNAPSHOT',
+                'local_id': local_id,
+                'pedidos': pedidos
+            }
+        )
+
+        print(f'✅ Snapshot del local {local_id} enviado: {len(pedidos)} pedidos activos')
+        return {'statusCode': 200}
+
+    except Exception as e:
+        print(f'❌ Error al enviar snapshot: {str(e)}')
+        return {'statusCode': 500}
@@ -0,0 +1,104 @@
+import boto3
+import os
+from datetime import datetime
+from boto3.dynamodb.conditions import Key
+from websockets.notificador import obtener_conexiones, enviar_a_conexiones
+
+# Tablero en vivo por local: los gerentes se suscriben al canal LOCAL#<local_id>
+# y reciben deltas de los pedidos activos en lugar de consultar Pedidos
+
+dynamodb = boto3.resource('dynamodb')
+
+# Vista compacta de los pedidos en curso (PK local_id, SK pedido_id)
+pedidos_activos_table = dynamodb.Table(os.environ.get('TABLE_PEDIDOS_ACTIVOS', 'ChinaWok-Pedidos-Activos'))
+
+ESTADOS_FINALES = ['recibido', 'cancelado']
+
+
+def canal_local(local_id):
+    """Clave de partición (atributo usuario_correo) de las suscripciones de un local"""
+    return f'LOCAL#{local_id}'
+
+
+def resumen_pedido(pedido):
+    """Representación compacta de un pedido para el tablero"""
+    empleado = None
+    for estado in reversed(pedido.get('historial_estados') or []):
+        if estado.get('activo'):
+            if estado.get('empleado'):
+                empleado = {
+                    'dni': estado['empleado'].get('dni'),
+                    'nombre': estado['empleado'].get('nombre_completo'),
+                    'rol': estado['empleado'].get('rol')
+                }
+            break
+
+    return {
+        'local_id': pedido['local_id'],
+        'pedido_id': pedido['pedido_id'],
+        'estado': pedido.get('estado'),
+        'fecha_creacion': pedido.get('fecha_creacion'),
+        'costo': pedido.get('costo'),
+        'empleado': empleado,
+        'actualizado_en': datetime.utcnow().isoformat() + 'Z'
+    }
+
+
+def aplicar_cambios(cambios):
+    """
+    Actualiza la tabla de pedidos activos con los cambios de un lote del stream
+    y devuelve los deltas agrupados por local
+
+    Args:
+        cambios: Lista de dicts con 'pedido' (última imagen) y 'eliminado' (bool)
+
+    Returns:
+        dict: local_id -> lista de deltas ({pedido_id, eliminado, ...resumen})
+    """
+    deltas = {}
+
+    with pedidos_activos_table.batch_writer() as batch:
+        for cambio in cambios:
+            pedido = cambio['pedido']
+            clave = {'local_id': pedido['local_id'], 'pedido_id': pedido['pedido_id']}
+
+            if cambio['eliminado'] or pedido.get('estado') in ESTADOS_FINALES:
+                batch.delete_item(Key=clave)
+                delta = {**clave, 'estado': pedido.get('estado'), 'eliminado': True}
+            else:
+                resumen = resumen_pedido(pedido)
+                batch.put_item(Item=resumen)
+                delta = {**resumen, 'eliminado': False}
+
+            deltas.setdefault(pedido['local_id'], []).append(delta)
+
+    return deltas
+
+
+def publicar_deltas(deltas):
+    """Envía a cada tablero suscrito los deltas de su local en un solo mensaje"""
+    enviados = 0
+    for local_id, cambios in deltas.items():
+        conexiones = obtener_conexiones(canal_local(local_id))
+        if not conexiones:
+            continue
+
+        enviados += enviar_a_conexiones(conexiones, {
+            'tipo': 'TABLERO_DELTA',
+            'local_id': local_id,
+            'timestamp': datetime.now().isoformat(),
+            'cambios': cambios
+        })
+    return enviados
+
+
+def obtener_snapshot(local_id):
+    """Pedidos activos de un local, leídos de la vista compacta"""
+    pedidos = []
+    kwargs = {'KeyConditionExpression': Key('local_id').eq(local_id)}
+    while True:
+        response = pedidos_activos_table.query(**kwargs)
+        pedidos.extend(response.get('Items', []))
+        if 'LastEvaluatedKey' not in response:
+            return pedidos
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
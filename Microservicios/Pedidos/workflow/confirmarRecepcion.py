@@ -7,7 +7,6 @@ from utils.dynamodb_helper import (
     finalizar_pedido
 )
 from utils.cors_utils import get_cors_headers
-from websockets.notificador import enviar_notificacion_pedido
 
 dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
 stepfunctions = boto3.client('stepfunctions', region_name='us-east-1')
@@ -46,7 +45,7 @@ def lambda_handler(event, context):
             if estado.get('activo') and estado.get('empleado'):
                 empleado = estado['empleado']
                 try:
-                    marcar_empleado_libre(local_id, empleado['dni'])
+                    marcar_empleado_libre(local_id, empleado['dni'], empleado.get('rol'), pedido_id)
                     empleados_liberados.append(empleado['dni'])
                 except Exception as e:
                     print(f'Error liberando empleado {empleado["dni"]}: {str(e)}')
@@ -54,12 +53,12 @@ def lambda_handler(event, context):
         # Liberar repartidor adicional si aplica
         if repartidor_dni and repartidor_dni not in empleados_liberados:
             try:
-                marcar_empleado_libre(local_id, repartidor_dni)
+                marcar_empleado_libre(local_id, repartidor_dni, 'Repartidor', pedido_id)
             except Exception as e:
                 print(f'Error liberando repartidor adicional {repartidor_dni}: {str(e)}')
         
         # Finalizar pedido y liberar empleados
-        pedido_actualizado = finalizar_pedido(local_id, pedido_id)
+        pedido_actualizado = finalizar_pedido(local_id, pedido_id, pedido=pedido)
 
         # Enviar éxito a Step Functions si había taskToken
         task_token = pedido.get('task_token')
@@ -74,17 +73,6 @@ def lambda_handler(event, context):
                 UpdateExpression='REMOVE task_token, esperando_confirmacion'
             )
 
-        # Enviar notificación WebSocket
-        enviar_notificacion_pedido(
-            pedido_id=pedido_id,
-            usuario_correo=pedido.get('usuario_correo'),
-            tipo_evento='PEDIDO_COMPLETADO',
-            datos={
-                'estado': 'recibido',
-                'mensaje': '¡Gracias por confirmar! Disfruta tu pedido 🥡'
-            }
-        )
-
         # Response simple con CORS
         return {
             'statusCode': 200,
@@ -0,0 +1,45 @@
+import json
+from utils.dynamodb_helper import obtener_pedido, buscar_empleado_disponible
+from utils.cola_trabajo import encolar_pedido, despertar_siguiente_en_cola
+
+# Este lambda se invoca con waitForTaskToken cuando un paso no encontró
+# empleado libre: deja el pedido en la cola de su rol y la ejecución queda
+# suspendida hasta que marcar_empleado_libre la reanude
+
+def lambda_handler(event, context):
+    """Lambda para encolar un pedido a la espera de un empleado del rol"""
+    print(f'Encolando pedido: {json.dumps(event)}')
+
+    local_id = event.get('local_id')
+    pedido_id = event.get('pedido_id')
+    role = event.get('role')
+    task_token = event.get('taskToken')
+
+    if not local_id or not pedido_id or not role or not task_token:
+        raise ValueError('Faltan parámetros requeridos: local_id, pedido_id, role o taskToken')
+
+    try:
+        pedido = obtener_pedido(local_id, pedido_id)
+
+        encolar_pedido(
+            local_id,
+            role,
+            pedido_id,
+            pedido.get('fecha_creacion', ''),
+            task_token
+        )
+
+        # Un empleado pudo liberarse entre el intento fallido y el encolado:
+        # en ese caso nadie despertaría la cola, así que se revisa aquí
+        if buscar_empleado_disponible(local_id, role, limite=1):
+            despertar_siguiente_en_cola(local_id, role)
+
+        return {
+            'pedido_id': pedido_id,
+            'role': role,
+            'message': f'Pedido en cola esperando {role}'
+        }
+
+    except Exception as e:
+        print(f'Error al encolar pedido: {str(e)}')
+        raise
@@ -2,13 +2,19 @@ import json
 import boto3
 import os
 import sys
-from datetime import datetime
+from utils.dynamodb_helper import obtener_pedido, registrar_ejecucion_pedido, revertir_ejecucion_pedido
+from utils.idempotency_utils import idempotent
 
 sys.path.append(os.path.dirname(__file__))
 
 stepfunctions = boto3.client('stepfunctions', region_name='us-east-1')
 lambda_client = boto3.client('lambda', region_name='us-east-1')
 
+def construir_execution_arn(state_machine_arn, execution_name):
+    """ARN de una ejecución a partir del ARN de la máquina de estados y su nombre"""
+    return f"{state_machine_arn.replace(':stateMachine:', ':execution:', 1)}:{execution_name}"
+
+@idempotent('iniciar_workflow')
 def lambda_handler(event, context):
     """Lambda para iniciar el workflow de Step Functions"""
     print(f'Iniciando workflow: {json.dumps(event)}')
@@ -37,77 +43,94 @@ def lambda_handler(event, context):
         
         print(f'State Machine ARN: {state_machine_arn}')
         
-        # Verificar si hay ejecuciones en curso para este pedido
-        ejecucion_existente = None
+        # La ejecución en curso se guarda en el pedido (execution_arn), no
+        # hace falta listar las ejecuciones de la máquina de estados
         try:
-            response = stepfunctions.list_executions(
-                stateMachineArn=state_machine_arn,
-                statusFilter='RUNNING',
-                maxResults=100
-            )
-            
-            for execution in response.get('executions', []):
-                if pedido_id in execution['name']:
-                    ejecucion_existente = execution
-                    print(f'Ejecución en curso encontrada: {execution["name"]}')
-                    break
+            pedido = obtener_pedido(local_id, pedido_id)
         except Exception as e:
-            print(f'Error verificando ejecuciones existentes: {str(e)}')
+            return {
+                'statusCode': 404,
+                'body': json.dumps({'error': str(e)}),
+                'headers': {'Content-Type': 'application/json'}
+            }
+        
+        ejecucion_existente = pedido.get('execution_arn')
+        intento_anterior = int(pedido.get('workflow_intento', 0))
         
-        # Si hay una ejecución en curso, detenerla y limpiar empleados
+        # Nombre determinístico por intento: el ARN se conoce antes de iniciar
+        execution_name = f'pedido-{pedido_id}-{intento_anterior + 1}'
+        execution_arn = construir_execution_arn(state_machine_arn, execution_name)
+        
+        # Reservar el intento; si otro reinicio ganó la carrera no se inicia nada
+        if not registrar_ejecucion_pedido(local_id, pedido_id, execution_arn, intento_anterior):
+            return {
+                'statusCode': 409,
+                'body': json.dumps({
+                    'error': f'El workflow del pedido {pedido_id} se está reiniciando desde otra petición',
+                    'pedido_id': pedido_id,
+                    'solucion': 'Por favor, intenta nuevamente en unos segundos'
+                }),
+                'headers': {'Content-Type': 'application/json'}
+            }
+        
+        # Si hay una ejecución anterior, detenerla y limpiar empleados
         if ejecucion_existente:
-            execution_arn = ejecucion_existente['executionArn']
-            
             try:
-                # Detener la ejecución anterior
-                print(f'Deteniendo ejecución anterior: {execution_arn}')
+                # Detener la ejecución anterior (si ya terminó no tiene efecto)
+                print(f'Deteniendo ejecución anterior: {ejecucion_existente}')
                 stepfunctions.stop_execution(
-                    executionArn=execution_arn,
+                    executionArn=ejecucion_existente,
                     error='Reintento',
                     cause='Se solicitó reiniciar el workflow para este pedido'
                 )
                 print('Ejecución anterior detenida')
+            except Exception as e:
+                print(f'Error al detener ejecución: {str(e)}')
+            
+            # Liberar empleados y resetear el pedido aunque stop_execution haya fallado
+            try:
+                print('Liberando empleados y reseteando pedido...')
+                lambda_response = lambda_client.invoke(
+                    FunctionName=f'{os.environ.get("AWS_LAMBDA_FUNCTION_NAME", "").rsplit("-", 2)[0]}-workflow-liberar-pedido',
+                    InvocationType='RequestResponse',
+                    Payload=json.dumps({
+                        'local_id': local_id,
+                        'pedido_id': pedido_id,
+                        'motivo': 'reintento_workflow',
+                        'resetear_estado': True
+                    })
+                )
                 
-                # Invocar lambda para liberar empleados y resetear estado del pedido
-                try:
-                    print('Liberando empleados y reseteando pedido...')
-                    lambda_response = lambda_client.invoke(
-                        FunctionName=f'{os.environ.get("AWS_LAMBDA_FUNCTION_NAME", "").rsplit("-", 2)[0]}-workflow-liberar-pedido',
-                        InvocationType='RequestResponse',
-                        Payload=json.dumps({
-                            'local_id': local_id,
-                            'pedido_id': pedido_id,
-                            'motivo': 'reintento_workflow',
-                            'resetear_estado': True
-                        })
-                    )
-                    
-                    result = json.loads(lambda_response['Payload'].read())
-                    print(f'Empleados liberados: {result.get("liberados", 0)}')
-                    print(f'Pedido reseteado: {result.get("pedido_reseteado", False)}')
-                    
-                except Exception as e:
-                    print(f'Error al liberar pedido: {str(e)}')
-                    # Continuar de todos modos, el error no es crítico
+                result = json.loads(lambda_response['Payload'].read())
+                print(f'Empleados liberados: {result.get("liberados", 0)}')
+                print(f'Pedido reseteado: {result.get("pedido_reseteado", False)}')
                 
             except Exception as e:
-                print(f'Error al detener ejecución: {str(e)}')
-        
-        # Nombre de ejecución único que incluye timestamp
-        timestamp = datetime.now().strftime('%Y%m%d-%H%M%S')
-        execution_name = f'pedido-{pedido_id}-{timestamp}'
+                print(f'Error al liberar pedido: {str(e)}')
+                # Continuar de todos modos, el error no es crítico
         
         # Iniciar la ejecución del Step Function
-        response = stepfunctions.start_execution(
-            stateMachineArn=state_machine_arn,
-            name=execution_name,
-            input=json.dumps({
-                'local_id': local_id,
-                'pedido_id': pedido_id
-            })
-        )
+        try:
+            response = stepfunctions.start_execution(
+                stateMachineArn=state_machine_arn,
+                name=execution_name,
+                input=json.dumps({
+                    # Mismo formato que el evento PedidoCreado de EventBridge
+                    'detail': {
+                        'local_id': local_id,
+                        'pedido_id': pedido_id,
+                        'usuario_correo': pedido.get('usuario_correo')
+                    }
+                })
+            )
+        except stepfunctions.exceptions.ExecutionAlreadyExists:
+            # La ejecución registrada existe: el ARN guardado es correcto
+            raise
+        except Exception:
+            # No quedó ninguna ejecución con ese nombre: el pedido no debe apuntar a ella
+            revertir_ejecucion_pedido(local_id, pedido_id, execution_arn, ejecucion_existente)
+            raise
         
-        execution_arn = response['executionArn']
         start_date = response['startDate'].isoformat()
         
         mensaje = 'Workflow iniciado exitosamente'
@@ -125,14 +148,14 @@ def lambda_handler(event, context):
                 'pedido_id': pedido_id,
                 'local_id': local_id,
                 'start_date': start_date,
-                'reiniciado': ejecucion_existente is not None,
+                'reiniciado': bool(ejecucion_existente),
                 'console_url': f'https://console.aws.amazon.com/states/home?region=us-east-1#/executions/details/{execution_arn}'
             }),
             'headers': {'Content-Type': 'application/json'}
         }
         
     except stepfunctions.exceptions.ExecutionAlreadyExists:
-        # Este caso es muy raro ahora, pero lo manejamos por si acaso
+        # El nombre incluye el intento reservado, solo ocurre si se reutiliza con otro input
         return {
             'statusCode': 409,
             'body': json.dumps({
@@ -0,0 +1,113 @@
+import json
+import boto3
+import os
+from datetime import datetime, timedelta
+from utils.dynamodb_client import batch_get_items
+from utils.dynamodb_helper import liberar_empleados_en_lote
+
+# Este lambda se ejecuta periódicamente y libera a los empleados que quedaron
+# ocupados sin un pedido activo (ejecuciones detenidas, fallos a mitad de un step)
+dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
+
+# Margen para no competir con un step que acaba de reclamar al empleado
+GRACIA_MINUTOS = int(os.environ.get('RECONCILIAR_GRACIA_MINUTOS', 10))
+
+# Empleados ocupados sin pedido_asignado (asignados antes de guardarlo)
+GRACIA_SIN_PEDIDO_HORAS = int(os.environ.get('RECONCILIAR_GRACIA_SIN_PEDIDO_HORAS', 2))
+
+ESTADOS_FINALES = ['recibido', 'cancelado']
+
+
+def listar_empleados_ocupados(table):
+    """Recorre Empleados devolviendo solo los ocupados"""
+    kwargs = {
+        'ProjectionExpression': 'local_id, dni, #role, ocupado_desde, pedido_asignado',
+        'FilterExpression': 'ocupado = :ocupado',
+        'ExpressionAttributeNames': {'#role': 'role'},
+        'ExpressionAttributeValues': {':ocupado': True}
+    }
+    while True:
+        response = table.scan(**kwargs)
+        for item in response.get('Items', []):
+            yield item
+        if 'LastEvaluatedKey' not in response:
+            return
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def ocupado_antes_de(empleado, limite):
+    """True si el empleado está ocupado desde antes del límite (o sin fecha)"""
+    ocupado_desde = empleado.get('ocupado_desde')
+    if not ocupado_desde:
+        return True
+    try:
+        return datetime.fromisoformat(ocupado_desde) < limite
+    except ValueError:
+        return True
+
+
+def tiene_pedido_activo(empleado, pedido):
+    """El pedido sigue en curso y su estado activo está a cargo del empleado"""
+    if not pedido or pedido.get('estado') in ESTADOS_FINALES:
+        return False
+    for estado in pedido.get('historial_estados', []):
+        if estado.get('activo') and (estado.get('empleado') or {}).get('dni') == empleado['dni']:
+            return True
+    return False
+
+
+def lambda_handler(event, context):
+    """Lambda para liberar empleados ocupados sin pedido activo"""
+    print(f'Reconciliando empleados ocupados: {json.dumps(event)}')
+
+    empleados_table = dynamodb.Table(os.environ['TABLE_EMPLEADOS'])
+    pedidos_table_name = os.environ['TABLE_PEDIDOS']
+
+    ahora = datetime.now()
+    limite = ahora - timedelta(minutes=GRACIA_MINUTOS)
+    limite_sin_pedido = ahora - timedelta(hours=GRACIA_SIN_PEDIDO_HORAS)
+
+    con_pedido = []
+    huerfanos = []
+
+    for empleado in listar_empleados_ocupados(empleados_table):
+        if empleado.get('pedido_asignado'):
+            if ocupado_antes_de(empleado, limite):
+                con_pedido.append(empleado)
+        elif ocupado_antes_de(empleado, limite_sin_pedido):
+            huerfanos.append(empleado)
+
+    # Un solo BatchGetItem para todos los pedidos asignados
+    pedidos = {}
+    if con_pedido:
+        items = batch_get_items({
+            pedidos_table_name: {
+                'Keys': [{'local_id': e['local_id'], 'pedido_id': e['pedido_asignado']} for e in con_pedido],
+                'ProjectionExpression': 'local_id, pedido_id, estado, historial_estados'
+            }
+        })
+        pedidos = {(p['local_id'], p['pedido_id']): p for p in items.get(pedidos_table_name, [])}
+
+    for empleado in con_pedido:
+        pedido = pedidos.get((empleado['local_id'], empleado['pedido_asignado']))
+        if not tiene_pedido_activo(empleado, pedido):
+            huerfanos.append(empleado)
+
+    print(f'Empleados ocupados revisados: {len(con_pedido)}, huérfanos: {len(huerfanos)}')
+
+    liberados = liberar_empleados_en_lote([
+        {
+            'local_id': e['local_id'],
+            'dni': e['dni'],
+            'rol': e['role'],
+            'pedido_asignado': e.get('pedido_asignado')
+        }
+        for e in huerfanos
+    ])
+
+    return {
+        'revisados': len(con_pedido),
+        'huerfanos': len(huerfanos),
+        'liberados': len(liberados),
+        'empleados': [{'local_id': e['local_id'], 'dni': e['dni']} for e in liberados]
+    }
@@ -1,12 +1,11 @@
 import json
 from utils.dynamodb_helper import (
     obtener_pedido,
-    buscar_empleado_disponible,
-    marcar_empleado_ocupado,
+    reclamar_empleado,
+    marcar_empleado_libre,
     actualizar_estado_pedido_con_empleado
 )
 from utils.json_encoder import json_dumps
-from websockets.notificador import enviar_notificacion_pedido
 
 def lambda_handler(event, context):
     """Lambda para asignar cocinero y comenzar a cocinar el pedido"""
@@ -32,42 +31,26 @@ def lambda_handler(event, context):
         if pedido.get('estado') != 'procesando':
             raise ValueError(f'El pedido debe estar en estado "procesando", actualmente está en "{pedido.get("estado")}"')
         
-        # Buscar e intentar asignar cocinero disponible con fallback
-        cocinero = None
-        cocineros_disponibles = buscar_empleado_disponible(local_id, 'Cocinero')
+        # Reclamar el cocinero libre mejor calificado (asignación condicional,
+        # dos ejecuciones concurrentes no pueden tomar al mismo empleado)
+        cocinero = reclamar_empleado(local_id, 'Cocinero', pedido_id)
         
-        if not cocineros_disponibles:
-            raise Exception('No hay cocineros disponibles en este momento')
-        
-        # Si buscar_empleado_disponible retorna un solo empleado, convertir a lista
-        if not isinstance(cocineros_disponibles, list):
-            cocineros_disponibles = [cocineros_disponibles]
-        
-        # Intentar asignar cada cocinero en orden de calificación
-        ultimo_error = None
-        for candidato in cocineros_disponibles:
-            try:
-                # Intentar marcar como ocupado
-                marcar_empleado_ocupado(local_id, candidato['dni'])
-                cocinero = candidato
-                print(f'Cocinero {candidato["dni"]} asignado exitosamente')
-                break
-            except Exception as e:
-                print(f'Error asignando cocinero {candidato["dni"]}: {str(e)}. Intentando con siguiente...')
-                ultimo_error = e
-                continue
-        
-        # Si ningún cocinero pudo ser asignado
         if not cocinero:
-            raise Exception(f'No se pudo asignar ningún cocinero disponible. Último error: {str(ultimo_error)}')
+            raise Exception('No hay cocineros disponibles en este momento')
         
         # Actualizar estado del pedido
-        pedido_actualizado = actualizar_estado_pedido_con_empleado(
-            local_id,
-            pedido_id,
-            'cocinando',
-            cocinero
-        )
+        try:
+            pedido_actualizado = actualizar_estado_pedido_con_empleado(
+                local_id,
+                pedido_id,
+                'cocinando',
+                cocinero,
+                pedido=pedido
+            )
+        except Exception:
+            # Devolver el cocinero al índice de disponibles si el pedido no avanzó
+            marcar_empleado_libre(local_id, cocinero['dni'], 'Cocinero', pedido_id)
+            raise
         
         print(f"Pedido asignado a cocinero {cocinero['dni']}")
         
@@ -79,22 +62,6 @@ def lambda_handler(event, context):
             'estado': 'cocinando',
             'historial_estados': pedido_actualizado.get('historial_estados', pedido.get('historial_estados', []))
         }
-
-        # Enviar notificación WebSocket
-        enviar_notificacion_pedido(
-            pedido_id=pedido_id,
-            usuario_correo=pedido.get('usuario_correo'),
-            tipo_evento='ESTADO_ACTUALIZADO',
-            datos={
-                'estado': 'cocinando',
-                'empleado': {
-                    'dni': cocinero['dni'],
-                    'nombre': cocinero.get('nombre', ''),
-                    'role': 'Cocinero'
-                },
-                'mensaje': f'Tu pedido está siendo preparado por {cocinero.get("nombre", "un cocinero")}'
-            }
-        )
         
         # Si fue invocado por HTTP, devolver respuesta HTTP
         if 'body' in event:
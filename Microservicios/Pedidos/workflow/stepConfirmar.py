@@ -43,7 +43,7 @@ def lambda_handler(event, context):
                 empleado_rol = empleado.get('rol', '').lower()
                 
                 try:
-                    marcar_empleado_libre(local_id, empleado_dni)
+                    marcar_empleado_libre(local_id, empleado_dni, empleado_rol, pedido_id)
                     empleados_liberados.append({
                         'dni': empleado_dni,
                         'rol': empleado_rol
@@ -55,7 +55,7 @@ def lambda_handler(event, context):
         # Si se proporcionó un repartidor_dni específico y no fue liberado arriba, liberarlo
         if repartidor_dni and not any(e['dni'] == repartidor_dni for e in empleados_liberados):
             try:
-                marcar_empleado_libre(local_id, repartidor_dni)
+                marcar_empleado_libre(local_id, repartidor_dni, 'Repartidor', pedido_id)
                 empleados_liberados.append({
                     'dni': repartidor_dni,
                     'rol': 'repartidor'
@@ -70,7 +70,7 @@ def lambda_handler(event, context):
             print(f'Total empleados liberados: {len(empleados_liberados)}')
         
         # Finalizar pedido (actualizar estado a recibido y cerrar historial)
-        pedido_actualizado = finalizar_pedido(local_id, pedido_id)
+        pedido_actualizado = finalizar_pedido(local_id, pedido_id, pedido=pedido)
 
         print(f'Pedido confirmado y completado: {pedido_id}')
         
@@ -1,13 +1,11 @@
 import json
 from utils.dynamodb_helper import (
     obtener_pedido,
-    buscar_empleado_disponible,
-    marcar_empleado_ocupado,
+    reclamar_empleado,
     marcar_empleado_libre,
     actualizar_estado_pedido_con_empleado
 )
 from utils.json_encoder import json_dumps
-from websockets.notificador import enviar_notificacion_pedido
 
 def lambda_handler(event, context):
     """Lambda para asignar despachador y empacar el pedido"""
@@ -34,47 +32,36 @@ def lambda_handler(event, context):
         if pedido.get('estado') != 'cocinando':
             raise ValueError(f'El pedido debe estar en estado "cocinando", actualmente está en "{pedido.get("estado")}"')
         
-        # Buscar e intentar asignar despachador disponible con fallback
-        despachador = None
-        despachadores_disponibles = buscar_empleado_disponible(local_id, 'Despachador')
+        # Reclamar el despachador libre mejor calificado (asignación condicional,
+        # dos ejecuciones concurrentes no pueden tomar al mismo empleado)
+        despachador = reclamar_empleado(local_id, 'Despachador', pedido_id)
         
-        if not despachadores_disponibles:
-            raise Exception('No hay despachadores disponibles en este momento')
-        
-        # Si buscar_empleado_disponible retorna un solo empleado, convertir a lista
-        if not isinstance(despachadores_disponibles, list):
-            despachadores_disponibles = [despachadores_disponibles]
-        
-        # Intentar asignar cada despachador en orden de calificación
-        ultimo_error = None
-        for candidato in despachadores_disponibles:
-            try:
-                # Intentar marcar como ocupado
-                marcar_empleado_ocupado(local_id, candidato['dni'])
-                despachador = candidato
-                print(f'Despachador {candidato["dni"]} asignado exitosamente')
-                break
-            except Exception as e:
-                print(f'Error asignando despachador {candidato["dni"]}: {str(e)}. Intentando con siguiente...')
-                ultimo_error = e
-                continue
-        
-        # Si ningún despachador pudo ser asignado
         if not despachador:
-            raise Exception(f'No se pudo asignar ningún despachador disponible. Último error: {str(ultimo_error)}')
+            raise Exception('No hay despachadores disponibles en este momento')
         
         # Actualizar estado del pedido (esto liberará automáticamente al cocinero)
-        pedido_actualizado = actualizar_estado_pedido_con_empleado(
-            local_id,
-            pedido_id,
-            'empacando',
-            despachador
-        )
+        try:
+            pedido_actualizado = actualizar_estado_pedido_con_empleado(
+                local_id,
+                pedido_id,
+                'empacando',
+                despachador,
+                pedido=pedido
+            )
+        except Exception:
+            # Devolver el despachador al índice de disponibles si el pedido no avanzó
+            marcar_empleado_libre(local_id, despachador['dni'], 'Despachador', pedido_id)
+            raise
         
         # Liberar al cocinero explícitamente si hay uno
         empleado_anterior_dni = pedido_actualizado.get('_empleado_anterior_dni')
         if empleado_anterior_dni:
-            marcar_empleado_libre(local_id, empleado_anterior_dni)
+            marcar_empleado_libre(
+                local_id,
+                empleado_anterior_dni,
+                pedido_actualizado.get('_empleado_anterior_rol') or 'Cocinero',
+                pedido_id
+            )
             print(f'Cocinero {empleado_anterior_dni} liberado')
         
         print(f"Pedido asignado a despachador {despachador['dni']}")
@@ -87,22 +74,6 @@ def lambda_handler(event, context):
             'estado': 'empacando',
             'historial_estados': pedido_actualizado.get('historial_estados', pedido.get('historial_estados', []))
         }
-
-        # Enviar notificación WebSocket
-        enviar_notificacion_pedido(
-            pedido_id=pedido_id,
-            usuario_correo=event.get('usuario_correo'),
-            tipo_evento='ESTADO_CAMBIADO',
-            datos={
-                'estado': 'empacando',
-                'empleado': {
-                    'dni': despachador['dni'],
-                    'nombre': despachador.get('nombre', ''),
-                    'role': 'Despachador'
-                },
-                'mensaje': f'Tu pedido está siendo empacado por {despachador.get("nombre", "un despachador")}'
-            }
-        )
         
         if 'body' in event:
             return {
@@ -61,7 +61,6 @@ def lambda_handler(event, context):
         "correo": correo,
         "contrasena": contrasena,
         "role": "Cliente",
-        "historial_pedidos": [],
         "informacion_bancaria": None
     }
 
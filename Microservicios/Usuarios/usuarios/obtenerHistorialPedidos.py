@@ -1,8 +1,11 @@
 import json
+import base64
 import boto3
 import os
 from decimal import Decimal
+from boto3.dynamodb.conditions import Key
 from utils.cors_utils import get_cors_headers
+from utils.dynamodb_client import batch_get_items
 
 # Tablas DynamoDB
 dynamodb = boto3.resource('dynamodb')
@@ -13,6 +16,14 @@ pedidos_table_name = os.environ.get('TABLE_PEDIDOS', 'ChinaWok-Pedidos')
 usuarios_table = dynamodb.Table(usuarios_table_name)
 pedidos_table = dynamodb.Table(pedidos_table_name)
 
+# Índice de Pedidos por usuario ordenado por fecha de creación
+HISTORIAL_INDEX = 'usuario-fecha-index'
+LIMITE_DEFAULT = 20
+LIMITE_MAXIMO = 100
+
+# Campos del pedido que muestra el historial detallado
+PROYECCION_DETALLE = 'pedido_id, local_id, fecha_creacion, estado, costo, productos, combos, direccion, fecha_entrega_aproximada'
+
 
 def decimal_to_float(obj):
     """Convierte Decimal a float/int para JSON"""
@@ -38,7 +49,7 @@ def parse_pedido_item(item):
         }
     elif isinstance(item, str):
         # Formato antiguo: solo pedido_id como string
-        # Retornar con local_id null (se debe buscar con scan)
+        # Sin local_id no se puede obtener el detalle (ver DataMigrator.py resolver-legados)
         return {
             "pedido_id": item,
             "local_id": None
@@ -46,6 +57,148 @@ def parse_pedido_item(item):
     return None
 
 
+def codificar_cursor(posicion):
+    """
+    Convierte la posición de la siguiente página en un cursor opaco para el
+    cliente: el LastEvaluatedKey del Query o {'legado': n} en la segunda fase
+    """
+    if not posicion:
+        return None
+    return base64.urlsafe_b64encode(json.dumps(posicion).encode('utf-8')).decode('utf-8')
+
+
+def decodificar_cursor(cursor):
+    """
+    Convierte el cursor recibido en (fase, posición): ('indice', ExclusiveStartKey)
+    o ('legado', n) con la posición en el historial legado (ValueError si es inválido)
+    """
+    try:
+        clave = json.loads(base64.urlsafe_b64decode(cursor.encode('utf-8')).decode('utf-8'))
+    except Exception:
+        raise ValueError('cursor inválido')
+
+    if isinstance(clave, dict) and set(clave) == {'legado'}:
+        posicion = clave['legado']
+        if isinstance(posicion, int) and not isinstance(posicion, bool) and posicion >= 0:
+            return 'legado', posicion
+        raise ValueError('cursor inválido')
+
+    if not isinstance(clave, dict) or set(clave) != {'usuario_correo', 'fecha_creacion', 'local_id', 'pedido_id'}:
+        raise ValueError('cursor inválido')
+    return 'indice', clave
+
+
+def consultar_historial(correo, limite, exclusive_start_key=None):
+    """
+    Obtiene una página del historial desde el índice usuario-fecha-index
+    (más recientes primero). Retorna (pedidos, LastEvaluatedKey)
+    """
+    kwargs = {
+        'IndexName': HISTORIAL_INDEX,
+        'KeyConditionExpression': Key('usuario_correo').eq(correo),
+        'ScanIndexForward': False,
+        'Limit': limite
+    }
+    if exclusive_start_key:
+        kwargs['ExclusiveStartKey'] = exclusive_start_key
+
+    response = pedidos_table.query(**kwargs)
+
+    pedidos = [
+        {
+            'pedido_id': item['pedido_id'],
+            'local_id': item['local_id'],
+            'fecha_creacion': item.get('fecha_creacion')
+        }
+        for item in response.get('Items', [])
+    ]
+
+    return pedidos, response.get('LastEvaluatedKey')
+
+
+def _filtrar_no_indexados(correo, entradas):
+    """Descarta las entradas legadas que el índice ya devuelve (un BatchGetItem)"""
+    con_local = [p for p in entradas if p.get('local_id')]
+    indexados = set()
+    if con_local:
+        items = batch_get_items({
+            pedidos_table_name: {
+                'Keys': [{'local_id': p['local_id'], 'pedido_id': p['pedido_id']} for p in con_local],
+                'ProjectionExpression': 'local_id, pedido_id, usuario_correo, fecha_creacion'
+            }
+        }).get(pedidos_table_name, [])
+        indexados = {
+            (i['local_id'], i['pedido_id']) for i in items
+            if i.get('usuario_correo') == correo and i.get('fecha_creacion')
+        }
+
+    return [p for p in entradas if (p['local_id'], p['pedido_id']) not in indexados]
+
+
+def obtener_historial_legado(correo, desde, limite):
+    """
+    Una página de la lista historial_pedidos del item de Usuarios con las
+    entradas que el índice no devuelve: las sin local_id y las de pedidos aún
+    sin usuario_correo o fecha_creacion. Mientras el usuario no tenga
+    historial_migrado (lo marca DataMigrator.py historial-pedidos) se sirven
+    después de las del índice, más recientes primero.
+    Cada BatchGetItem revisa como mucho limite entradas.
+    Retorna (entradas, posición siguiente o None si no quedan)
+    """
+    response = usuarios_table.get_item(
+        Key={'correo': correo},
+        ProjectionExpression='historial_pedidos, historial_migrado'
+    )
+    item = response.get('Item', {})
+    if item.get('historial_migrado'):
+        return [], None
+
+    # Parsear items a formato estandarizado
+    historial_pedidos = [parse_pedido_item(p) for p in reversed(item.get('historial_pedidos', []))]
+    historial_pedidos = [p for p in historial_pedidos if p is not None]  # Filtrar inválidos
+
+    entradas = []
+    posicion = desde
+    while posicion < len(historial_pedidos) and len(entradas) < limite:
+        bloque = historial_pedidos[posicion:posicion + limite - len(entradas)]
+        posicion += len(bloque)
+        entradas += _filtrar_no_indexados(correo, bloque)
+
+    return entradas, posicion if posicion < len(historial_pedidos) else None
+
+
+def obtener_detalle_pedidos(historial_pedidos):
+    """
+    Obtiene el detalle de los pedidos del historial con BatchGetItem (lotes de
+    100 claves en paralelo), proyectando solo los campos que muestra la app.
+    Conserva el orden del historial
+    """
+    claves = [p for p in historial_pedidos if p.get('local_id')]
+    pedidos_no_encontrados = [p for p in historial_pedidos if not p.get('local_id')]
+
+    if not claves:
+        return [], pedidos_no_encontrados
+
+    items = batch_get_items({
+        pedidos_table_name: {
+            'Keys': [{'local_id': p['local_id'], 'pedido_id': p['pedido_id']} for p in claves],
+            'ProjectionExpression': PROYECCION_DETALLE
+        }
+    }).get(pedidos_table_name, [])
+
+    por_clave = {(item['local_id'], item['pedido_id']): item for item in items}
+
+    pedidos_detallados = []
+    for pedido_info in claves:
+        pedido = por_clave.get((pedido_info['local_id'], pedido_info['pedido_id']))
+        if pedido:
+            pedidos_detallados.append(decimal_to_float(pedido))
+        else:
+            pedidos_no_encontrados.append(pedido_info)
+
+    return pedidos_detallados, pedidos_no_encontrados
+
+
 def lambda_handler(event, context):
     """
     Lambda para obtener el historial de pedidos del usuario autenticado
@@ -53,14 +206,17 @@ def lambda_handler(event, context):
     
     Parámetros query opcionales:
     - detallado=true: Expande los detalles completos de cada pedido
-    - limite=N: Limita el número de pedidos retornados (default: todos)
+    - limite=N: Tamaño de página (default: 20, máximo: 100)
+    - cursor: Valor de siguiente_cursor de la página anterior (primero se
+      recorre el índice y luego el historial legado de usuarios no migrados)
     
     Respuesta (modo simple):
     {
         "pedidos": [
-            {"pedido_id": "xxx", "local_id": "yyy"},
-            {"pedido_id": "zzz", "local_id": "www"}
-        ]
+            {"pedido_id": "xxx", "local_id": "yyy", "fecha_creacion": "..."},
+            {"pedido_id": "zzz", "local_id": "www", "fecha_creacion": "..."}
+        ],
+        "siguiente_cursor": "..." | null
     }
     """
     try:
@@ -78,28 +234,50 @@ def lambda_handler(event, context):
         # Obtener parámetros opcionales
         query_params = event.get('queryStringParameters') or {}
         detallado = query_params.get('detallado', 'false').lower() == 'true'
-        limite = int(query_params.get('limite', 0)) if query_params.get('limite') else None
+        cursor = query_params.get('cursor')
         
-        # Obtener usuario de DynamoDB
-        response = usuarios_table.get_item(Key={'correo': correo_autenticado})
+        try:
+            limite = int(query_params.get('limite', LIMITE_DEFAULT))
+            if limite <= 0:
+                raise ValueError
+        except ValueError:
+            return {
+                'statusCode': 400,
+                'headers': get_cors_headers(),
+                'body': json.dumps({'error': 'limite debe ser un entero positivo'})
+            }
+        limite = min(limite, LIMITE_MAXIMO)
         
-        if 'Item' not in response:
+        try:
+            fase, posicion = decodificar_cursor(cursor) if cursor else ('indice', None)
+        except ValueError as e:
             return {
-                'statusCode': 404,
+                'statusCode': 400,
                 'headers': get_cors_headers(),
-                'body': json.dumps({'error': 'Usuario no encontrado'})
+                'body': json.dumps({'error': str(e)})
             }
         
-        usuario = response['Item']
-        historial_pedidos_raw = usuario.get('historial_pedidos', [])
+        # Primera fase: el índice. Al agotarlo se pasa a la segunda fase, las
+        # entradas del item de Usuarios que el índice no devuelve (usuarios
+        # aún no migrados), paginadas con el mismo limite
+        historial_pedidos = []
+        siguiente_cursor = None
+        desde_legado = posicion if fase == 'legado' else None
         
-        # Parsear items a formato estandarizado
-        historial_pedidos = [parse_pedido_item(item) for item in historial_pedidos_raw]
-        historial_pedidos = [p for p in historial_pedidos if p is not None]  # Filtrar inválidos
+        if fase == 'indice':
+            historial_pedidos, siguiente_clave = consultar_historial(correo_autenticado, limite, posicion)
+            if siguiente_clave:
+                siguiente_cursor = codificar_cursor(siguiente_clave)
+            else:
+                desde_legado = 0
         
-        # Aplicar límite si se especificó
-        if limite and limite > 0:
-            historial_pedidos = historial_pedidos[-limite:]  # Últimos N pedidos
+        if desde_legado is not None:
+            legado, siguiente_legado = obtener_historial_legado(
+                correo_autenticado, desde_legado, limite - len(historial_pedidos)
+            )
+            historial_pedidos += legado
+            if siguiente_legado is not None:
+                siguiente_cursor = codificar_cursor({'legado': siguiente_legado})
         
         # Si no se pide detallado, retornar solo las tuplas {pedido_id, local_id}
         if not detallado:
@@ -110,56 +288,20 @@ def lambda_handler(event, context):
                     'message': 'Historial de pedidos obtenido',
                     'correo': correo_autenticado,
                     'total_pedidos': len(historial_pedidos),
-                    'pedidos': historial_pedidos  # Array de {pedido_id, local_id}
+                    'pedidos': historial_pedidos,
+                    'siguiente_cursor': siguiente_cursor
                 })
             }
         
         # Modo detallado: obtener información completa de cada pedido
-        pedidos_detallados = []
-        pedidos_no_encontrados = []
-        
-        for pedido_info in historial_pedidos:
-            pedido_id = pedido_info.get("pedido_id")
-            local_id = pedido_info.get("local_id")
-            
-            try:
-                # Si tenemos local_id, usar get_item (eficiente)
-                if local_id:
-                    get_response = pedidos_table.get_item(
-                        Key={'local_id': local_id, 'pedido_id': pedido_id}
-                    )
-                    
-                    if 'Item' in get_response:
-                        pedido = get_response['Item']
-                        pedido = decimal_to_float(pedido)
-                        pedidos_detallados.append(pedido)
-                    else:
-                        pedidos_no_encontrados.append(pedido_info)
-                
-                # Si no tenemos local_id, hacer scan (menos eficiente, retrocompatibilidad)
-                else:
-                    scan_response = pedidos_table.scan(
-                        FilterExpression='pedido_id = :pid',
-                        ExpressionAttributeValues={':pid': pedido_id},
-                        Limit=1
-                    )
-                    
-                    if scan_response.get('Items'):
-                        pedido = scan_response['Items'][0]
-                        pedido = decimal_to_float(pedido)
-                        pedidos_detallados.append(pedido)
-                    else:
-                        pedidos_no_encontrados.append(pedido_info)
-                        
-            except Exception as e:
-                print(f"Error obteniendo pedido {pedido_id}: {str(e)}")
-                pedidos_no_encontrados.append(pedido_info)
+        pedidos_detallados, pedidos_no_encontrados = obtener_detalle_pedidos(historial_pedidos)
         
         response_body = {
             'message': 'Historial de pedidos detallado obtenido',
             'correo': correo_autenticado,
             'total_pedidos': len(historial_pedidos),
-            'pedidos': pedidos_detallados
+            'pedidos': pedidos_detallados,
+            'siguiente_cursor': siguiente_cursor
         }
         
         if pedidos_no_encontrados:
@@ -0,0 +1,218 @@
+"""
+Simulación de un pico de almuerzo: tiempo de punta a punta de los pedidos con
+reintentos cada 30 s (antes) frente a la cola de trabajo con taskToken
+(después). Modela el workflow actual: el empleado de una etapa se libera
+cuando la siguiente reclama a su empleado, y el repartidor al confirmar la
+entrega.
+
+polling: sin empleado libre, Wait de 30 s y nuevo intento; la cocina cancela
+         el pedido tras 5 intentos fallidos (ServicioSaturado)
+cola:    sin empleado libre, el pedido espera en la cola de su rol y se
+         reanuda al liberarse un empleado; la espera en cocina vence a los
+         300 s (ServicioSaturado) y un pedido despertado que pierde la
+         carrera vuelve a la cola (hasta 10 intentos); empaque y reparto
+         reintentan al vencer la espera
+
+Uso: python benchmarks/bench_cola_trabajo.py [corridas]
+"""
+
+import heapq
+import random
+import sys
+from collections import deque
+
+import comun
+
+ROLES = ['Cocinero', 'Despachador', 'Repartidor']
+DURACION = {'Cocinero': 900, 'Despachador': 300, 'Repartidor': 1800}
+PERSONAL = {'Despachador': 2, 'Repartidor': 8}
+
+ESPERA_INICIAL = 5
+LATENCIA_PASO = 0.2       # Lambda del paso (reclamar y actualizar el pedido)
+LATENCIA_DESPERTAR = 0.3  # marcar_empleado_libre -> SendTaskSuccess -> paso
+ESPERA_POLLING = 30
+MAX_INTENTOS_POLLING = 5
+TIMEOUT_COLA = 300
+MAX_INTENTOS_COLA = 10
+
+# Pico de 2 h seguido de 2 h de valle a 6 pedidos/h. Con 12 cocineros ningún modo
+# cancela y el cuello de botella es el reparto (16 pedidos/h), así que ambos
+# atienden la misma carga; con 4 cocineros (16 pedidos/h) el pico de 18 pedidos/h
+# satura la cocina.
+ESCENARIOS = {
+    'pico 14/h, 12 cocineros': ([(2 * 3600, 14 / 3600), (2 * 3600, 6 / 3600)], 12),
+    'pico 18/h, 4 cocineros': ([(2 * 3600, 18 / 3600), (2 * 3600, 6 / 3600)], 4),
+}
+
+# Transiciones de Step Functions por intento fallido y por espera
+TRANSICIONES_POLLING = 4  # Intentar, Incrementar, Verificar, Wait
+TRANSICIONES_COLA = 2     # EsperarEnCola y su reanudación
+
+
+def llegadas(aleatorio, tramos):
+    tiempo, inicio = 0.0, 0.0
+    for duracion, tasa in tramos:
+        while True:
+            tiempo += aleatorio.expovariate(tasa)
+            if tiempo >= inicio + duracion:
+                tiempo = inicio + duracion
+                break
+            yield tiempo
+        inicio += duracion
+
+
+class Simulacion:
+    def __init__(self, modo, tramos, cocineros, semilla):
+        self.modo = modo
+        self.tramos = tramos
+        self.aleatorio = random.Random(semilla)
+        self.eventos = []
+        self.secuencia = 0
+        self.libres = dict(PERSONAL, Cocinero=cocineros)
+        self.esperando = dict.fromkeys(ROLES, 0)
+        self.ocioso = 0.0
+        self.ahora = 0.0
+        self.colas = {rol: deque() for rol in ROLES}
+        self.pedidos = {}
+        self.transiciones = 0
+
+    def programar(self, tiempo, tipo, pedido_id, etapa=None, token=None):
+        self.secuencia += 1
+        heapq.heappush(self.eventos, (tiempo, self.secuencia, tipo, pedido_id, etapa, token))
+
+    def correr(self):
+        for i, llegada in enumerate(llegadas(self.aleatorio, self.tramos)):
+            self.pedidos[i] = {'llegada': llegada, 'intentos': 0, 'token': 0, 'en_cola_desde': None}
+            self.programar(llegada + ESPERA_INICIAL, 'intentar', i, 0)
+
+        while self.eventos:
+            tiempo, _, tipo, pedido_id, etapa, token = heapq.heappop(self.eventos)
+            # Empleados libres mientras hay pedidos de su rol esperando
+            self.ocioso += sum(min(self.libres[r], self.esperando[r]) for r in ROLES) * (tiempo - self.ahora)
+            self.ahora = tiempo
+            getattr(self, tipo)(tiempo, pedido_id, etapa, token)
+        return self
+
+    def intentar(self, tiempo, pedido_id, etapa, _token=None):
+        pedido = self.pedidos[pedido_id]
+        rol = ROLES[etapa]
+        tiempo += LATENCIA_PASO
+
+        if self.libres[rol] > 0:
+            self.libres[rol] -= 1
+            if pedido['en_cola_desde'] is not None:
+                pedido['en_cola_desde'] = None
+                self.esperando[rol] -= 1
+            pedido['intentos'] = 0
+            if etapa > 0:
+                self.liberar(tiempo, ROLES[etapa - 1])
+            self.programar(tiempo + DURACION[rol], 'fin_etapa', pedido_id, etapa)
+            return
+
+        if pedido['en_cola_desde'] is None:
+            pedido['en_cola_desde'] = tiempo
+            self.esperando[rol] += 1
+        pedido['intentos'] += 1
+
+        if self.modo == 'polling':
+            self.transiciones += TRANSICIONES_POLLING
+            if etapa == 0 and pedido['intentos'] >= MAX_INTENTOS_POLLING:
+                self.cancelar(tiempo, pedido_id)
+                return
+            self.programar(tiempo + ESPERA_POLLING, 'intentar', pedido_id, etapa)
+            return
+
+        self.transiciones += TRANSICIONES_COLA
+        if etapa == 0 and pedido['intentos'] >= MAX_INTENTOS_COLA:
+            self.cancelar(tiempo, pedido_id)
+            return
+        pedido['token'] += 1
+        self.colas[rol].append((pedido['llegada'], pedido_id, pedido['token']))
+        # El turno es la fecha de creación: un pedido reencolado conserva su lugar
+        self.colas[rol] = deque(sorted(self.colas[rol]))
+        self.programar(tiempo + TIMEOUT_COLA, 'vencer', pedido_id, etapa, pedido['token'])
+
+    def vencer(self, tiempo, pedido_id, etapa, token):
+        rol = ROLES[etapa]
+        entrada = next((e for e in self.colas[rol] if e[1] == pedido_id and e[2] == token), None)
+        if entrada is None:
+            return
+        self.colas[rol].remove(entrada)
+        if etapa == 0:
+            self.cancelar(tiempo, pedido_id)
+        else:
+            self.programar(tiempo, 'intentar', pedido_id, etapa)
+
+    def liberar(self, tiempo, rol):
+        self.libres[rol] += 1
+        if self.modo == 'cola' and self.colas[rol]:
+            _, pedido_id, _ = self.colas[rol].popleft()
+            self.programar(tiempo + LATENCIA_DESPERTAR, 'intentar', pedido_id, ROLES.index(rol))
+
+    def fin_etapa(self, tiempo, pedido_id, etapa, _token=None):
+        if etapa + 1 < len(ROLES):
+            self.intentar(tiempo, pedido_id, etapa + 1)
+            return
+        self.liberar(tiempo, ROLES[etapa])
+        self.pedidos[pedido_id]['fin'] = tiempo
+
+    def cancelar(self, tiempo, pedido_id):
+        self.pedidos[pedido_id]['cancelado'] = tiempo
+        self.esperando['Cocinero'] -= 1
+
+
+def main():
+    corridas = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+
+    filas = []
+    for escenario, (tramos, cocineros) in ESCENARIOS.items():
+        simulaciones = {
+            modo: [Simulacion(modo, tramos, cocineros, semilla).correr() for semilla in range(corridas)]
+            for modo in ('polling', 'cola')
+        }
+        # Las llegadas dependen solo de la semilla: comparar los mismos pedidos
+        # evita el sesgo de que la cola complete pedidos que polling cancela
+        comunes = [
+            {i for i, p in polling.pedidos.items() if 'fin' in p} & {i for i, p in cola.pedidos.items() if 'fin' in p}
+            for polling, cola in zip(simulaciones['polling'], simulaciones['cola'])
+        ]
+        for modo, corridas_modo in simulaciones.items():
+            filas.append([escenario, modo] + resumir(corridas_modo, comunes))
+
+    print(f'{corridas} corridas por escenario; despachadores {PERSONAL["Despachador"]}, repartidores {PERSONAL["Repartidor"]}\n')
+    comun.tabla_markdown(
+        ['escenario', 'modo', 'pedidos', 'cancelados', 'punta a punta p50 / p95 / p99 (min)',
+         'mismos pedidos p50 / p95 / p99 (min)',
+         'empleado libre con pedidos esperando (min-empleado por corrida)',
+         'transiciones de espera por pedido'],
+        filas
+    )
+
+
+def resumir(simulaciones, comunes):
+    totales, mismos, cancelados, ocioso, transiciones, pedidos = [], [], 0, 0.0, 0, 0
+    for simulacion, ids_comunes in zip(simulaciones, comunes):
+        ocioso += simulacion.ocioso
+        transiciones += simulacion.transiciones
+        for pedido_id, pedido in simulacion.pedidos.items():
+            pedidos += 1
+            if 'cancelado' in pedido:
+                cancelados += 1
+                continue
+            total = (pedido['fin'] - pedido['llegada']) / 60
+            totales.append(total)
+            if pedido_id in ids_comunes:
+                mismos.append(total)
+
+    return [
+        pedidos,
+        f'{cancelados} ({cancelados * 100 / pedidos:.1f}%)',
+        ' / '.join(f'{comun.percentil(totales, p):.1f}' for p in (50, 95, 99)),
+        ' / '.join(f'{comun.percentil(mismos, p):.1f}' for p in (50, 95, 99)),
+        f'{ocioso / 60 / len(simulaciones):.1f}',
+        f'{transiciones / pedidos:.1f}',
+    ]
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,151 @@
+"""
+Latencia p50/p99 de crearPedido según el tamaño del carrito
+
+antes:   un GetItem por local, usuario, producto y combo, uno tras otro, y
+         luego put_item del pedido y list_append en Usuarios
+después: handler actual (un BatchGetItem de local y usuario, índice de
+         precios cacheado y un TransactWriteItems con la reserva de stock)
+
+Uso: python benchmarks/bench_crear_pedido.py [repeticiones]
+"""
+
+import json
+import os
+import sys
+import uuid
+from decimal import Decimal
+
+import comun
+
+import boto3
+from moto import mock_aws
+
+TABLAS = {
+    'TABLE_LOCALES': 'ChinaWok-Locales',
+    'TABLE_USUARIOS': 'ChinaWok-Usuarios',
+    'TABLE_PRODUCTOS': 'ChinaWok-Productos',
+    'TABLE_COMBOS': 'ChinaWok-Combos',
+    'TABLE_OFERTAS': 'ChinaWok-Ofertas',
+    'TABLE_PEDIDOS': 'ChinaWok-Pedidos',
+}
+os.environ.update(TABLAS)
+
+TAMANOS = [1, 3, 6, 12, 24]
+PRODUCTOS = 60
+
+
+def preparar(dynamodb):
+    comun.crear_tabla(dynamodb, TABLAS['TABLE_LOCALES'], 'local_id')
+    comun.crear_tabla(dynamodb, TABLAS['TABLE_USUARIOS'], 'correo')
+    comun.crear_tabla(dynamodb, TABLAS['TABLE_PRODUCTOS'], 'local_id', 'nombre')
+    comun.crear_tabla(dynamodb, TABLAS['TABLE_COMBOS'], 'local_id', 'combo_id')
+    comun.crear_tabla(dynamodb, TABLAS['TABLE_OFERTAS'], 'local_id', 'oferta_id')
+    comun.crear_tabla(
+        dynamodb, TABLAS['TABLE_PEDIDOS'], 'local_id', 'pedido_id',
+        gsis=[('usuario-fecha-index', 'usuario_correo', 'fecha_creacion')]
+    )
+
+    dynamodb.Table(TABLAS['TABLE_LOCALES']).put_item(Item={'local_id': 'L1', 'precios_version': 1})
+    dynamodb.Table(TABLAS['TABLE_USUARIOS']).put_item(Item={
+        'correo': 'cliente@chinawok.pe',
+        'informacion_bancaria': {
+            'numero_tarjeta': '4111111111111111', 'cvv': '123',
+            'fecha_vencimiento': '12/30', 'direccion_delivery': 'Av. Arequipa 123'
+        }
+    })
+    with dynamodb.Table(TABLAS['TABLE_PRODUCTOS']).batch_writer() as batch:
+        for i in range(PRODUCTOS):
+            batch.put_item(Item={
+                'local_id': 'L1', 'nombre': f'producto-{i:02d}',
+                'precio': Decimal('12.90'), 'stock': 10 ** 6
+            })
+
+
+def carrito(lineas):
+    return {
+        'local_id': 'L1',
+        'usuario_correo': 'cliente@chinawok.pe',
+        'direccion': 'Av. Arequipa 123',
+        'costo': 12.9 * lineas,
+        'productos': [{'nombre': f'producto-{i:02d}', 'cantidad': 1} for i in range(lineas)]
+    }
+
+
+def crear_antes(dynamodb, body):
+    """Flujo de validación y escritura previo, una llamada detrás de otra"""
+    locales = dynamodb.Table(TABLAS['TABLE_LOCALES'])
+    usuarios = dynamodb.Table(TABLAS['TABLE_USUARIOS'])
+    productos = dynamodb.Table(TABLAS['TABLE_PRODUCTOS'])
+    pedidos = dynamodb.Table(TABLAS['TABLE_PEDIDOS'])
+
+    assert 'Item' in locales.get_item(Key={'local_id': body['local_id']})
+    assert 'Item' in usuarios.get_item(Key={'correo': body['usuario_correo']})
+    for producto in body['productos']:
+        item = productos.get_item(Key={'local_id': body['local_id'], 'nombre': producto['nombre']})['Item']
+        assert item['stock'] >= producto['cantidad']
+
+    pedido = dict(body, pedido_id=str(uuid.uuid4()), costo=Decimal(str(body['costo'])), estado='procesando')
+    pedidos.put_item(Item=pedido)
+    usuarios.update_item(
+        Key={'correo': body['usuario_correo']},
+        UpdateExpression='SET historial_pedidos = list_append(if_not_exists(historial_pedidos, :vacia), :pedido)',
+        ExpressionAttributeValues={':pedido': [{'pedido_id': pedido['pedido_id'], 'local_id': 'L1'}], ':vacia': []}
+    )
+    return pedido['pedido_id']
+
+
+def limpiar(dynamodb, pedido_id):
+    """Borra el pedido y el historial (fuera de la medición)"""
+    dynamodb.Table(TABLAS['TABLE_PEDIDOS']).delete_item(Key={'local_id': 'L1', 'pedido_id': pedido_id})
+    dynamodb.Table(TABLAS['TABLE_USUARIOS']).update_item(
+        Key={'correo': 'cliente@chinawok.pe'}, UpdateExpression='REMOVE historial_pedidos'
+    )
+
+
+def main():
+    repeticiones = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+
+    with mock_aws():
+        dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
+        preparar(dynamodb)
+
+        comun.agregar_ruta('Microservicios', 'Pedidos', 'pedidos')
+        import crearPedido
+
+        def crear_despues(body):
+            respuesta = crearPedido.handler({'body': json.dumps(body)}, None)
+            assert respuesta['statusCode'] == 201, respuesta['body']
+            return json.loads(respuesta['body'])['data']['pedido_id']
+
+        def limpiar_pedido(pedido_id):
+            limpiar(dynamodb, pedido_id)
+
+        # Calienta el índice de precios del contenedor, como en Lambda
+        limpiar_pedido(crear_despues(carrito(1)))
+
+        filas = []
+        for lineas in TAMANOS:
+            body = carrito(lineas)
+            pedido_id, llamadas_antes = comun.contar_llamadas(lambda: crear_antes(dynamodb, body))
+            limpiar_pedido(pedido_id)
+            pedido_id, llamadas_despues = comun.contar_llamadas(lambda: crear_despues(body))
+            limpiar_pedido(pedido_id)
+            antes = comun.resumen(comun.medir(lambda: crear_antes(dynamodb, body), repeticiones, limpiar_pedido))
+            despues = comun.resumen(comun.medir(lambda: crear_despues(body), repeticiones, limpiar_pedido))
+            filas.append([
+                lineas,
+                sum(v for k, v in llamadas_antes.items() if k.startswith('dynamodb')),
+                f'{antes[0]:.1f} / {antes[1]:.1f}',
+                sum(v for k, v in llamadas_despues.items() if k.startswith('dynamodb')),
+                f'{despues[0]:.1f} / {despues[1]:.1f}',
+            ])
+
+    print(f'RTT simulado: {comun.RTT_SEGUNDOS * 1000:.0f} ms, {repeticiones} repeticiones\n')
+    comun.tabla_markdown(
+        ['líneas', 'llamadas DynamoDB antes', 'antes p50 / p99 (ms)', 'llamadas DynamoDB después', 'después p50 / p99 (ms)'],
+        filas
+    )
+
+
+if __name__ == '__main__':
+    main()
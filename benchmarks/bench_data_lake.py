@@ -0,0 +1,179 @@
+"""
+Bytes escaneados y latencia de las consultas por local del data lake, con
+pedidos generados
+
+antes:   un único data.jsonl por tabla; Athena lee el archivo completo en
+         cada consulta aunque filtre por local_id
+después: Parquet particionado por local y mes (parquet_writer, cargado con
+         backfill_partitioned_table desde el mismo JSONL); con partition
+         projection Athena solo abre las particiones del local y lee las
+         columnas de la consulta
+
+Los bytes escaneados se calculan como Athena: el objeto JSONL completo, o
+los column chunks comprimidos de las columnas usadas (más el footer) en las
+particiones que cumplen el filtro. La latencia es la de resolver la misma
+consulta en el proceso leyendo de S3 (moto): JSON línea por línea frente a
+pyarrow con proyección de columnas
+
+Requiere pyarrow además de tests/requirements.txt
+
+Uso: python benchmarks/bench_data_lake.py [pedidos] [repeticiones]
+"""
+
+import contextlib
+import io
+import json
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+
+import comun
+
+import boto3
+from moto import mock_aws
+
+os.environ.update({
+    'S3_BUCKET_NAME': 'chinawok-data-lake-bench',
+    'S3_INGESTION_PREFIX': 'data-ingestion',
+    'S3_LAKE_PREFIX': 'data-lake',
+})
+
+LOCALES = 20
+MESES = [f'2025-{m:02d}' for m in range(1, 13)]
+PRODUCTOS = [f'producto-{i:02d}' for i in range(40)]
+ESTADOS = ['pendiente', 'cocinando', 'empacando', 'enviando', 'recibido']
+
+# Consultas de analitica-consultas: columnas que leen y meses que filtran
+CONSULTAS = [
+    ('estadísticas de un local', ['usuario_correo', 'costo', 'estado'], None),
+    ('productos de un local en un mes', ['productos'], MESES[5]),
+]
+
+
+def generar_pedidos(cantidad, aleatorio):
+    pedidos = []
+    for i in range(cantidad):
+        local_id = f'local-{i % LOCALES:02d}'
+        creado = datetime(2025, 1, 1) + timedelta(seconds=aleatorio.randrange(365 * 24 * 3600))
+        historial = []
+        inicio = creado
+        for estado in ESTADOS:
+            fin = inicio + timedelta(minutes=aleatorio.randint(1, 20))
+            entrada = {'estado': estado, 'hora_inicio': inicio.isoformat(), 'hora_fin': fin.isoformat(), 'activo': False}
+            if estado != 'pendiente':
+                entrada['empleado'] = {
+                    'dni': f'{aleatorio.randrange(10 ** 8):08d}',
+                    'nombre_completo': 'Nombre Apellido',
+                    'rol': estado,
+                    'calificacion_prom': round(aleatorio.uniform(3, 5), 1)
+                }
+            historial.append(entrada)
+            inicio = fin
+        pedidos.append({
+            'local_id': local_id,
+            'pedido_id': f'{i:08d}-0000-4000-8000-000000000000',
+            'fecha_creacion': creado.isoformat(),
+            'usuario_correo': f'cliente-{aleatorio.randrange(5000)}@example.com',
+            'productos': [
+                {'nombre': aleatorio.choice(PRODUCTOS), 'cantidad': aleatorio.randint(1, 3)}
+                for _ in range(aleatorio.randint(1, 4))
+            ],
+            'combos': [],
+            'costo': round(aleatorio.uniform(15, 120), 2),
+            'direccion': f'Av. Siempre Viva {aleatorio.randrange(2000)}, Lima',
+            'fecha_entrega_aproximada': (creado + timedelta(minutes=60)).isoformat(),
+            'estado': 'recibido',
+            'historial_estados': historial,
+        })
+    return pedidos
+
+
+def resultado_consulta(filas, columnas):
+    """Agregado comparable entre formatos: cantidad y suma de la columna numérica o de las cantidades"""
+    if 'costo' in columnas:
+        return len(filas), round(sum(f['costo'] for f in filas), 2)
+    return len(filas), sum(p['cantidad'] for f in filas for p in f['productos'])
+
+
+def main():
+    cantidad = int(sys.argv[1]) if len(sys.argv) > 1 else 40000
+    repeticiones = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+
+    filas = []
+    # backfill y el cliente S3 imprimen cada subida
+    with mock_aws(), contextlib.redirect_stdout(io.StringIO()):
+        s3 = boto3.client('s3', region_name='us-east-1')
+        bucket = os.environ['S3_BUCKET_NAME']
+        s3.create_bucket(Bucket=bucket)
+
+        import pyarrow.parquet as pq
+        from utils import parquet_writer
+        from utils.delta_log import snapshot_key
+        from utils.s3_client import upload_to_s3
+
+        # Snapshot JSONL como lo escribe save_data_to_s3 y Parquet desde el mismo snapshot
+        upload_to_s3(bucket, snapshot_key('pedidos'), generar_pedidos(cantidad, random.Random(7)))
+        parquet_writer.backfill_partitioned_table('pedidos')
+
+        jsonl_bytes = s3.head_object(Bucket=bucket, Key=snapshot_key('pedidos'))['ContentLength']
+        objetos = s3.list_objects_v2(Bucket=bucket, Prefix=f'{parquet_writer.S3_LAKE_PREFIX}/pedidos/')
+        parquet_bytes = sum(o['Size'] for o in objetos['Contents'])
+        archivos = objetos['KeyCount']
+
+        local_id = 'local-03'
+
+        for nombre, columnas, mes in CONSULTAS:
+            meses = [mes] if mes else MESES
+            claves = [parquet_writer.partition_key('pedidos', (local_id, m)) for m in meses]
+
+            def antes():
+                cuerpo = s3.get_object(Bucket=bucket, Key=snapshot_key('pedidos'))['Body'].read()
+                seleccion = []
+                for linea in cuerpo.decode('utf-8').splitlines():
+                    pedido = json.loads(linea)
+                    if pedido['local_id'] == local_id and (mes is None or pedido['fecha_creacion'][:7] == mes):
+                        seleccion.append({c: pedido[c] for c in columnas})
+                return resultado_consulta(seleccion, columnas)
+
+            def despues():
+                seleccion = []
+                for clave in claves:
+                    cuerpo = s3.get_object(Bucket=bucket, Key=clave)['Body'].read()
+                    seleccion.extend(pq.read_table(io.BytesIO(cuerpo), columns=columnas).to_pylist())
+                return resultado_consulta(seleccion, columnas)
+
+            # Mismo resultado en ambos formatos
+            assert antes() == despues()
+
+            # Bytes que Athena escanea en Parquet: column chunks de las columnas leídas y footer
+            escaneados = 0
+            for clave in claves:
+                metadata = pq.ParquetFile(io.BytesIO(s3.get_object(Bucket=bucket, Key=clave)['Body'].read())).metadata
+                escaneados += metadata.serialized_size
+                for grupo in range(metadata.num_row_groups):
+                    for columna in range(metadata.num_columns):
+                        chunk = metadata.row_group(grupo).column(columna)
+                        if chunk.path_in_schema.split('.')[0] in columnas:
+                            escaneados += chunk.total_compressed_size
+
+            p50_antes, p99_antes = comun.resumen(comun.medir(antes, repeticiones))
+            p50_despues, p99_despues = comun.resumen(comun.medir(despues, repeticiones))
+            filas.append([
+                nombre, f'{jsonl_bytes / 2 ** 20:.1f} MB', f'{escaneados / 2 ** 10:.1f} KB',
+                f'{jsonl_bytes / escaneados:,.0f}x',
+                f'{p50_antes:.0f} / {p99_antes:.0f}', f'{p50_despues:.1f} / {p99_despues:.1f}'
+            ])
+
+    print(f'{cantidad:,} pedidos, {LOCALES} locales, 12 meses; JSONL {jsonl_bytes / 2 ** 20:.1f} MB, '
+          f'Parquet {parquet_bytes / 2 ** 20:.1f} MB en {archivos} particiones; RTT simulado '
+          f'{comun.RTT_SEGUNDOS * 1000:.0f} ms, {repeticiones} repeticiones\n')
+    comun.tabla_markdown(
+        ['consulta', 'escaneado antes', 'escaneado después', 'reducción',
+         'antes p50 / p99 (ms)', 'después p50 / p99 (ms)'],
+        filas
+    )
+
+
+if __name__ == '__main__':
+    main()
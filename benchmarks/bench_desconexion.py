@@ -0,0 +1,173 @@
+"""
+Costo de un $disconnect según la cantidad de suscripciones en la tabla de
+conexiones
+
+antes:          scan con FilterExpression connection_id = :cid (solo la
+                primera página) y un DeleteItem por suscripción encontrada
+scan paginado:  el mismo scan recorriendo todas las páginas (lo mínimo para
+                no perder suscripciones sin índice)
+después:        websockets/disconnect.handler, una Query al índice
+                connection-index y borrado en lotes
+
+Las unidades de lectura se estiman como DynamoDB con lectura eventual: 0.5
+RCU por cada 4 KB leídos, redondeado por página. moto resuelve las Query a
+un GSI recorriendo la tabla completa, así que su latencia crece con la tabla
+aunque DynamoDB solo lea las claves encontradas
+
+Uso: python benchmarks/bench_desconexion.py [repeticiones]
+"""
+
+import contextlib
+import io
+import os
+import sys
+from datetime import datetime
+
+import comun
+
+import boto3
+import botocore.handlers
+from moto import mock_aws
+
+os.environ['TABLE_CONEXIONES'] = 'ChinaWok-WebSocket-Conexiones'
+
+TAMANOS = [1000, 10000, 50000]
+# Cada conexión sigue dos pedidos (una fila por suscripción)
+SUSCRIPCIONES = 2
+
+# Ítems leídos (ScannedCount) y RCU estimadas por respuesta de Scan o Query
+leidos = []
+unidades = []
+
+
+def tamano_item(item):
+    """Tamaño aproximado de un ítem en DynamoDB (nombres más valores)"""
+    return sum(len(nombre) + len(next(iter(valor.values()))) for nombre, valor in item.items())
+
+
+def _contar_leidos(parsed=None, model=None, **kwargs):
+    if parsed and model.name in ('Scan', 'Query'):
+        leidos.append(parsed.get('ScannedCount', 0))
+        # Las Query del benchmark devuelven todo lo que leen (sin filtro)
+        bytes_leidos = parsed.get('ScannedCount', 0) * TAMANO_SUSCRIPCION
+        unidades.append(max(1, -(-bytes_leidos // 4096)) / 2)
+
+
+botocore.handlers.BUILTIN_HANDLERS.insert(0, ('after-call.dynamodb', _contar_leidos))
+
+
+def suscripciones(connection_id, n):
+    ahora = datetime.now().isoformat()
+    return [
+        {
+            'usuario_correo': f'cliente-{connection_id}@example.com',
+            'pedido_id': f'pedido-{connection_id}-{i}#{connection_id}',
+            'connection_id': connection_id,
+            'connected_at': ahora,
+            'ttl': 1900000000
+        }
+        for i in range(n)
+    ]
+
+
+TAMANO_SUSCRIPCION = tamano_item({
+    clave: {'S': str(valor)} for clave, valor in suscripciones('c9999', 1)[0].items()
+})
+
+
+def desconectar_antes(table, connection_id, paginar=False):
+    """$disconnect previo: scan filtrado (de la primera página, o de todas si paginar)"""
+    kwargs = {
+        'FilterExpression': 'connection_id = :cid',
+        'ExpressionAttributeValues': {':cid': connection_id}
+    }
+    while True:
+        response = table.scan(**kwargs)
+        for item in response.get('Items', []):
+            table.delete_item(Key={'usuario_correo': item['usuario_correo'], 'pedido_id': item['pedido_id']})
+        if not paginar or 'LastEvaluatedKey' not in response:
+            return connection_id
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def main():
+    repeticiones = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+
+    filas = []
+    # Los handlers imprimen cada evento y borrado
+    with mock_aws(), contextlib.redirect_stdout(io.StringIO()):
+        dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
+        table = comun.crear_tabla(
+            dynamodb, os.environ['TABLE_CONEXIONES'], 'usuario_correo', 'pedido_id',
+            gsis=[('connection-index', 'connection_id', None)]
+        )
+
+        comun.agregar_ruta('Microservicios', 'Pedidos')
+        from websockets import disconnect
+
+        def despues(connection_id):
+            evento = {'requestContext': {'connectionId': connection_id}}
+            assert disconnect.handler(evento, None)['statusCode'] == 200
+            return connection_id
+
+        def restaurar(connection_id):
+            with table.batch_writer() as batch:
+                for item in suscripciones(connection_id, SUSCRIPCIONES):
+                    batch.put_item(Item=item)
+
+        cargadas = 0
+        for tamano in TAMANOS:
+            # Completar la tabla hasta el tamaño (fuera de la medición)
+            with table.batch_writer() as batch:
+                while cargadas < tamano:
+                    for item in suscripciones(f'c{cargadas // SUSCRIPCIONES}', SUSCRIPCIONES):
+                        batch.put_item(Item=item)
+                    cargadas += SUSCRIPCIONES
+            conexiones = tamano // SUSCRIPCIONES
+            # Conexiones repartidas por la tabla: el scan solo encuentra las de su primera página
+            objetivos = [f'c{i * conexiones // repeticiones}' for i in range(repeticiones)]
+
+            for nombre, funcion in (
+                ('antes', lambda c: desconectar_antes(table, c)),
+                ('scan paginado', lambda c: desconectar_antes(table, c, paginar=True)),
+                ('después', despues),
+            ):
+                encontradas = 0
+                for connection_id in objetivos:
+                    antes = table.query(
+                        IndexName='connection-index',
+                        KeyConditionExpression='connection_id = :cid',
+                        ExpressionAttributeValues={':cid': connection_id}
+                    )['Count']
+                    funcion(connection_id)
+                    despues_borrado = table.query(
+                        IndexName='connection-index',
+                        KeyConditionExpression='connection_id = :cid',
+                        ExpressionAttributeValues={':cid': connection_id}
+                    )['Count']
+                    encontradas += antes - despues_borrado
+                    restaurar(connection_id)
+
+                del leidos[:], unidades[:]
+                _, llamadas = comun.contar_llamadas(lambda: funcion(objetivos[0]))
+                leidos_total, unidades_total = sum(leidos), sum(unidades)
+                restaurar(objetivos[0])
+
+                ids = iter(objetivos * 2)
+                p50, p99 = comun.resumen(comun.medir(lambda: funcion(next(ids)), repeticiones, limpiar=restaurar))
+                filas.append([
+                    f'{tamano:,}', nombre, sum(llamadas.values()), f'{leidos_total:,}', f'{unidades_total:g}',
+                    f'{encontradas}/{len(objetivos) * SUSCRIPCIONES}', f'{p50:.1f} / {p99:.1f}'
+                ])
+
+    print(f'RTT simulado: {comun.RTT_SEGUNDOS * 1000:.0f} ms, {repeticiones} desconexiones por tamaño, '
+          f'{SUSCRIPCIONES} suscripciones por conexión\n')
+    comun.tabla_markdown(
+        ['suscripciones en la tabla', 'modo', 'llamadas', 'ítems leídos', 'RCU estimadas',
+         'suscripciones borradas', 'p50 / p99 en moto (ms)'],
+        filas
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,166 @@
+"""
+Throughput del notificador WebSocket al enviar el mismo mensaje a 1,000 y
+2,000 conexiones, contra un sustituto local de la API de administración de
+API Gateway (servidor HTTP que responde post_to_connection con una latencia
+fija y 410 GoneException para las conexiones cerradas)
+
+antes:             un cliente apigatewaymanagementapi nuevo por notificación,
+                   envíos en serie y un DeleteItem por conexión cerrada
+cliente cacheado:  el cliente de obtener_cliente_gestion, envíos en serie
+después:           enviar_a_conexiones (cliente cacheado, envíos en paralelo y
+                   borrado en lote de las cerradas)
+
+La búsqueda de las conexiones no se mide: cuesta lo mismo en los tres casos
+
+Uso: python benchmarks/bench_notificador.py [repeticiones]
+"""
+
+import contextlib
+import io
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import comun
+
+import boto3
+from moto import mock_aws
+
+os.environ['TABLE_CONEXIONES'] = 'ChinaWok-WebSocket-Conexiones'
+
+TAMANOS = [1000, 2000]
+# Latencia de post_to_connection en API Gateway, además del RTT simulado
+LATENCIA_API = 0.015
+# Una de cada veinte conexiones ya se cerró
+CADA_CERRADA = 20
+
+MENSAJE = {'tipo': 'ESTADO_CAMBIADO', 'pedido_id': 'P1', 'datos': {'estado': 'empacando'}}
+
+
+class ApiGestion(BaseHTTPRequestHandler):
+    """POST /@connections/{id}: 200, o 410 si la conexión está cerrada"""
+    # Conexiones keep-alive como API Gateway
+    protocol_version = 'HTTP/1.1'
+    cerradas = set()
+    recibidos = 0
+    candado = threading.Lock()
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        time.sleep(LATENCIA_API)
+        connection_id = self.path.rsplit('/', 1)[-1]
+        if connection_id in self.cerradas:
+            cuerpo = b'{"message": "Gone"}'
+            self.send_response(410)
+            self.send_header('x-amzn-ErrorType', 'GoneException')
+        else:
+            with self.candado:
+                ApiGestion.recibidos += 1
+            cuerpo = b''
+            self.send_response(200)
+        self.send_header('Content-Length', str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def log_message(self, *args):
+        pass
+
+
+def conexion(i):
+    return {'usuario_correo': f'cliente-{i}@example.com', 'pedido_id': f'P{i}#c{i}', 'connection_id': f'c{i}'}
+
+
+def enviar_antes(table, endpoint, conexiones, data):
+    """Una notificación por conexión como el notificador previo (sin la búsqueda)"""
+    enviados = 0
+    for item in conexiones:
+        cliente = boto3.client('apigatewaymanagementapi', endpoint_url=endpoint)
+        try:
+            cliente.post_to_connection(ConnectionId=item['connection_id'], Data=data)
+            enviados += 1
+        except cliente.exceptions.GoneException:
+            table.delete_item(Key={'usuario_correo': item['usuario_correo'], 'pedido_id': item['pedido_id']})
+    return enviados
+
+
+def enviar_en_serie(table, cliente, conexiones, data):
+    enviados = 0
+    for item in conexiones:
+        try:
+            cliente.post_to_connection(ConnectionId=item['connection_id'], Data=data)
+            enviados += 1
+        except cliente.exceptions.GoneException:
+            table.delete_item(Key={'usuario_correo': item['usuario_correo'], 'pedido_id': item['pedido_id']})
+    return enviados
+
+
+def main():
+    repeticiones = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+
+    # Cola de conexiones entrantes amplia: la de socketserver (5) descarta
+    # conexiones cuando hay muchos envíos simultáneos
+    ThreadingHTTPServer.request_queue_size = 128
+    servidor = ThreadingHTTPServer(('127.0.0.1', 0), ApiGestion)
+    servidor.daemon_threads = True
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    endpoint = f'http://127.0.0.1:{servidor.server_address[1]}'
+
+    filas = []
+    # El sustituto local no pasa por moto; el notificador imprime cada error y borrado
+    config = {'core': {'passthrough': {'urls': [r'http://127\.0\.0\.1:\d+/.*']}}}
+    with mock_aws(config=config), contextlib.redirect_stdout(io.StringIO()):
+        dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
+        table = comun.crear_tabla(dynamodb, os.environ['TABLE_CONEXIONES'], 'usuario_correo', 'pedido_id')
+
+        comun.agregar_ruta('Microservicios', 'Pedidos')
+        from websockets import notificador
+        from utils.json_encoder import json_dumps
+
+        data = json_dumps(MENSAJE).encode('utf-8')
+        cliente = notificador.obtener_cliente_gestion(endpoint)
+
+        for tamano in TAMANOS:
+            conexiones = [conexion(i) for i in range(tamano)]
+            cerradas = [c for i, c in enumerate(conexiones) if i % CADA_CERRADA == 0]
+            ApiGestion.cerradas = {c['connection_id'] for c in cerradas}
+
+            def restaurar(_=None):
+                with table.batch_writer() as batch:
+                    for item in conexiones:
+                        batch.put_item(Item=item)
+
+            restaurar()
+            for nombre, funcion in (
+                ('antes', lambda: enviar_antes(table, endpoint, conexiones, data)),
+                ('cliente cacheado', lambda: enviar_en_serie(table, cliente, conexiones, data)),
+                ('después', lambda: notificador.enviar_a_conexiones(conexiones, MENSAJE, cliente)),
+            ):
+                ApiGestion.recibidos = 0
+                enviados, llamadas = comun.contar_llamadas(funcion)
+                assert enviados == ApiGestion.recibidos == tamano - len(cerradas)
+                # Las cerradas quedaron borradas de la tabla
+                assert table.scan(Select='COUNT')['Count'] == tamano - len(cerradas)
+                restaurar()
+                escrituras = llamadas.get('dynamodb.DeleteItem', 0) + llamadas.get('dynamodb.BatchWriteItem', 0)
+
+                duraciones = comun.medir(funcion, repeticiones, limpiar=restaurar)
+                segundos = comun.percentil(duraciones, 50) / 1000
+                filas.append([
+                    f'{tamano:,}', nombre, f'{segundos:.2f}', f'{tamano / segundos:,.0f}', escrituras
+                ])
+
+    servidor.shutdown()
+
+    print(f'RTT simulado: {comun.RTT_SEGUNDOS * 1000:.0f} ms más {LATENCIA_API * 1000:.0f} ms de API Gateway, '
+          f'{repeticiones} repeticiones, una de cada {CADA_CERRADA} conexiones cerrada, '
+          f'{notificador.NOTIFICACION_MAX_WORKERS} envíos simultáneos\n')
+    comun.tabla_markdown(
+        ['conexiones', 'modo', 'p50 (s)', 'mensajes/s', 'escrituras para borrar cerradas'],
+        filas
+    )
+
+
+if __name__ == '__main__':
+    main()
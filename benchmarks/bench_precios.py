@@ -0,0 +1,134 @@
+"""
+Cotización de carritos de 1 a 50 líneas
+
+por línea:        un GetItem del precio y un Query de las ofertas del local
+                  por cada línea (cotización directa contra DynamoDB)
+índice frío:      cotizar_carrito con el índice del local sin cachear
+                  (tres Query en paralelo y una pasada en memoria)
+índice caliente:  cotizar_carrito con el índice ya cacheado en el contenedor
+
+Uso: python benchmarks/bench_precios.py [repeticiones]
+"""
+
+import os
+import sys
+from datetime import datetime, timedelta
+from decimal import Decimal, ROUND_HALF_UP
+
+import comun
+
+import boto3
+from boto3.dynamodb.conditions import Attr, Key
+from moto import mock_aws
+
+TABLAS = {
+    'TABLE_PRODUCTOS': 'ChinaWok-Productos',
+    'TABLE_COMBOS': 'ChinaWok-Combos',
+    'TABLE_OFERTAS': 'ChinaWok-Ofertas',
+}
+os.environ.update(TABLAS)
+
+TAMANOS = [1, 5, 10, 25, 50]
+PRODUCTOS = 60
+COMBOS = 10
+OFERTAS = 20
+
+
+def preparar(dynamodb):
+    comun.crear_tabla(dynamodb, TABLAS['TABLE_PRODUCTOS'], 'local_id', 'nombre')
+    comun.crear_tabla(dynamodb, TABLAS['TABLE_COMBOS'], 'local_id', 'combo_id')
+    comun.crear_tabla(dynamodb, TABLAS['TABLE_OFERTAS'], 'local_id', 'oferta_id')
+
+    limite = (datetime.utcnow() + timedelta(days=7)).isoformat()
+    with dynamodb.Table(TABLAS['TABLE_PRODUCTOS']).batch_writer() as batch:
+        for i in range(PRODUCTOS):
+            batch.put_item(Item={'local_id': 'L1', 'nombre': f'producto-{i:02d}', 'precio': Decimal('12.90') + i})
+    with dynamodb.Table(TABLAS['TABLE_COMBOS']).batch_writer() as batch:
+        for i in range(COMBOS):
+            batch.put_item(Item={'local_id': 'L1', 'combo_id': f'combo-{i}', 'precio': Decimal('29.90'), 'disponible': True})
+    with dynamodb.Table(TABLAS['TABLE_OFERTAS']).batch_writer() as batch:
+        for i in range(OFERTAS):
+            batch.put_item(Item={
+                'local_id': 'L1', 'oferta_id': f'oferta-{i}', 'producto_nombre': f'producto-{i * 3:02d}',
+                'porcentaje_descuento': 10 + i, 'fecha_limite': limite
+            })
+
+
+def carrito(lineas):
+    combos = lineas // 5
+    productos = [{'nombre': f'producto-{i:02d}', 'cantidad': 2} for i in range(lineas - combos)]
+    return productos, [{'combo_id': f'combo-{i}', 'cantidad': 1} for i in range(combos)]
+
+
+def cotizar_por_linea(dynamodb, productos, combos):
+    """Precio y mejor oferta vigente de cada línea leídos de DynamoDB"""
+    productos_table = dynamodb.Table(TABLAS['TABLE_PRODUCTOS'])
+    combos_table = dynamodb.Table(TABLAS['TABLE_COMBOS'])
+    ofertas_table = dynamodb.Table(TABLAS['TABLE_OFERTAS'])
+    ahora = datetime.utcnow().isoformat()
+    total = Decimal(0)
+
+    lineas = [('producto_nombre', p['nombre'], p['cantidad']) for p in productos]
+    lineas += [('combo_id', c['combo_id'], c['cantidad']) for c in combos]
+    for campo, clave, cantidad in lineas:
+        if campo == 'producto_nombre':
+            precio = productos_table.get_item(Key={'local_id': 'L1', 'nombre': clave})['Item']['precio']
+        else:
+            precio = combos_table.get_item(Key={'local_id': 'L1', 'combo_id': clave})['Item']['precio']
+        ofertas = ofertas_table.query(
+            KeyConditionExpression=Key('local_id').eq('L1'),
+            FilterExpression=Attr(campo).eq(clave) & Attr('fecha_limite').gte(ahora)
+        )['Items']
+        descuento = max((Decimal(o['porcentaje_descuento']) for o in ofertas), default=Decimal(0))
+        unitario = (precio * (100 - descuento) / 100).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+        total += unitario * cantidad
+    return total
+
+
+def main():
+    repeticiones = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+
+    with mock_aws():
+        dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
+        preparar(dynamodb)
+
+        comun.agregar_ruta('Microservicios', 'Pedidos', 'pedidos')
+        import precios
+
+        def frio(productos, combos):
+            precios._indices.clear()
+            return precios.cotizar_carrito('L1', 1, productos, combos)['total']
+
+        def caliente(productos, combos):
+            return precios.cotizar_carrito('L1', 1, productos, combos)['total']
+
+        filas = []
+        for lineas in TAMANOS:
+            productos, combos = carrito(lineas)
+
+            # Las tres formas cotizan lo mismo
+            total, llamadas_linea = comun.contar_llamadas(lambda: cotizar_por_linea(dynamodb, productos, combos))
+            assert frio(productos, combos) == caliente(productos, combos) == total
+            _, llamadas_frio = comun.contar_llamadas(lambda: frio(productos, combos))
+            _, llamadas_caliente = comun.contar_llamadas(lambda: caliente(productos, combos))
+
+            fila = [lineas]
+            for funcion, llamadas in (
+                (lambda: cotizar_por_linea(dynamodb, productos, combos), llamadas_linea),
+                (lambda: frio(productos, combos), llamadas_frio),
+                (lambda: caliente(productos, combos), llamadas_caliente),
+            ):
+                p50, p99 = comun.resumen(comun.medir(funcion, repeticiones))
+                fila.append(f'{sum(llamadas.values())} · {p50:.2f} / {p99:.2f}')
+            filas.append(fila)
+
+    print(f'RTT simulado: {comun.RTT_SEGUNDOS * 1000:.0f} ms, {repeticiones} repeticiones, '
+          f'{PRODUCTOS} productos, {COMBOS} combos y {OFERTAS} ofertas en el local\n')
+    comun.tabla_markdown(
+        ['líneas', 'por línea: llamadas · p50 / p99 (ms)', 'índice frío', 'índice caliente'],
+        filas
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+"""
+Contención de stock: muchos carritos concurrentes sobre pocos productos
+
+antes:   se lee el stock de cada producto y se guarda el pedido sin
+         descontarlo (dos pedidos simultáneos pasan la misma validación)
+después: crear_pedido_con_reserva_stock, un TransactWriteItems con
+         stock >= :cantidad por producto
+
+Uso: python benchmarks/bench_reserva_stock.py [carritos] [hilos]
+"""
+
+import os
+import random
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+import comun
+
+import boto3
+from moto import mock_aws
+
+os.environ.update({
+    'TABLE_PEDIDOS': 'ChinaWok-Pedidos',
+    'TABLE_PRODUCTOS': 'ChinaWok-Productos',
+})
+
+PRODUCTOS_CALIENTES = 5
+STOCK_INICIAL = 100
+
+
+def preparar(dynamodb):
+    comun.crear_tabla(dynamodb, os.environ['TABLE_PEDIDOS'], 'local_id', 'pedido_id')
+    comun.crear_tabla(dynamodb, os.environ['TABLE_PRODUCTOS'], 'local_id', 'nombre')
+
+
+def reponer(dynamodb):
+    """Stock inicial y tabla de pedidos vacía antes de cada escenario"""
+    productos = dynamodb.Table(os.environ['TABLE_PRODUCTOS'])
+    for i in range(PRODUCTOS_CALIENTES):
+        productos.put_item(Item={'local_id': 'L1', 'nombre': f'caliente-{i}', 'stock': STOCK_INICIAL})
+
+    pedidos = dynamodb.Table(os.environ['TABLE_PEDIDOS'])
+    for item in pedidos.scan(ProjectionExpression='local_id, pedido_id')['Items']:
+        pedidos.delete_item(Key=item)
+
+
+def carritos(cantidad, semilla=7):
+    aleatorio = random.Random(semilla)
+    return [
+        {
+            'local_id': 'L1',
+            'usuario_correo': f'cliente{i}@chinawok.pe',
+            'estado': 'procesando',
+            'productos': [
+                {'nombre': nombre, 'cantidad': 1}
+                for nombre in aleatorio.sample([f'caliente-{j}' for j in range(PRODUCTOS_CALIENTES)], 2)
+            ]
+        }
+        for i in range(cantidad)
+    ]
+
+
+def crear_antes(dynamodb, pedido):
+    productos = dynamodb.Table(os.environ['TABLE_PRODUCTOS'])
+    for producto in pedido['productos']:
+        item = productos.get_item(Key={'local_id': 'L1', 'nombre': producto['nombre']})['Item']
+        if item['stock'] < producto['cantidad']:
+            return False
+    dynamodb.Table(os.environ['TABLE_PEDIDOS']).put_item(Item=pedido)
+    return True
+
+
+def ejecutar(escenario, pedidos, hilos):
+    latencias = []
+
+    def uno(pedido):
+        pedido = dict(pedido, pedido_id=str(uuid.uuid4()))
+        inicio = time.perf_counter()
+        aceptado = escenario(pedido)
+        latencias.append((time.perf_counter() - inicio) * 1000)
+        return aceptado
+
+    inicio = time.perf_counter()
+    with comun.llamadas_atomicas(), ThreadPoolExecutor(max_workers=hilos) as executor:
+        aceptados = list(executor.map(uno, pedidos))
+    duracion = time.perf_counter() - inicio
+    return aceptados, latencias, duracion
+
+
+def main():
+    cantidad = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    hilos = int(sys.argv[2]) if len(sys.argv) > 2 else 32
+    pedidos = carritos(cantidad)
+
+    with mock_aws():
+        dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
+        preparar(dynamodb)
+
+        from utils.dynamodb_helper import crear_pedido_con_reserva_stock
+
+        escenarios = [
+            ('antes', lambda pedido: crear_antes(dynamodb, pedido)),
+            ('después', lambda pedido: crear_pedido_con_reserva_stock(pedido)[0]),
+        ]
+
+        filas = []
+        for nombre, escenario in escenarios:
+            reponer(dynamodb)
+            aceptados, latencias, duracion = ejecutar(escenario, pedidos, hilos)
+
+            vendidos = sum(
+                producto['cantidad']
+                for pedido, aceptado in zip(pedidos, aceptados) if aceptado
+                for producto in pedido['productos']
+            )
+            disponible = PRODUCTOS_CALIENTES * STOCK_INICIAL
+            stock_final = sum(
+                item['stock'] for item in dynamodb.Table(os.environ['TABLE_PRODUCTOS']).scan()['Items']
+            )
+            p50, p99 = comun.resumen(latencias)
+            filas.append([
+                nombre,
+                sum(aceptados),
+                len(aceptados) - sum(aceptados),
+                f'{vendidos} / {disponible}',
+                max(0, vendidos - disponible),
+                stock_final,
+                f'{len(pedidos) / duracion:.0f}',
+                f'{p50:.1f} / {p99:.1f}',
+            ])
+
+    print(f'RTT simulado: {comun.RTT_SEGUNDOS * 1000:.0f} ms, {cantidad} carritos de 2 productos, '
+          f'{PRODUCTOS_CALIENTES} productos con stock {STOCK_INICIAL}, {hilos} hilos\n')
+    comun.tabla_markdown(
+        ['escenario', 'aceptados', 'rechazados', 'unidades vendidas / stock', 'sobreventa', 'stock final en tabla', 'pedidos/s', 'p50 / p99 (ms)'],
+        filas
+    )
+
+
+if __name__ == '__main__':
+    main()
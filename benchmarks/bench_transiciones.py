@@ -0,0 +1,168 @@
+"""
+Latencia de un paso del workflow (cocinando -> empacando) según el tamaño
+del historial del pedido, sin contar la reclamación ni la liberación de
+empleados
+
+antes:   el step lee el pedido, actualizar_estado_pedido_con_empleado lo
+         vuelve a leer y reescribe historial_estados completo
+después: el step lee el pedido y se lo pasa a
+         actualizar_estado_pedido_con_empleado, que cierra la entrada activa
+         por índice y agrega la nueva en un UpdateItem condicional
+
+Uso: python benchmarks/bench_transiciones.py [repeticiones]
+"""
+
+import contextlib
+import io
+import itertools
+import os
+import sys
+from datetime import datetime
+from decimal import Decimal
+
+import comun
+
+import boto3
+import botocore.handlers
+from moto import mock_aws
+
+os.environ.update({
+    'TABLE_PEDIDOS': 'ChinaWok-Pedidos',
+    'TABLE_EMPLEADOS': 'ChinaWok-Empleados',
+})
+
+ENTRADAS = [2, 4, 8]
+ESTADOS = ['pendiente', 'cocinando', 'empacando', 'enviando']
+
+EMPLEADO = {'dni': '70000001', 'nombre': 'Ana', 'apellido': 'Quispe', 'role': 'Despachador', 'calificacion_prom': 4.5}
+
+# Bytes del cuerpo de cada UpdateItem enviado
+bytes_update = []
+
+
+def _medir_cuerpo(event_name=None, request=None, **kwargs):
+    if event_name and event_name.endswith('.UpdateItem'):
+        bytes_update.append(len(request.body or b''))
+
+
+botocore.handlers.BUILTIN_HANDLERS.insert(0, ('before-send', _medir_cuerpo))
+
+
+def entrada(estado, dni, activo):
+    return {
+        'estado': estado,
+        'hora_inicio': '2025-01-01T12:00:00',
+        'hora_fin': '2025-01-01T12:05:00',
+        'activo': activo,
+        'empleado': {
+            'dni': dni, 'nombre_completo': 'Luis Ramos', 'rol': 'cocinero', 'calificacion_prom': Decimal('4.2')
+        }
+    }
+
+
+def pedido_cocinando(pedido_id, entradas):
+    """Pedido en "cocinando" con el historial de entradas dado, la última activa"""
+    historial = [entrada(ESTADOS[i % 2], f'6000000{i}', False) for i in range(entradas - 1)]
+    historial.append(entrada('cocinando', '60000099', True))
+    return {
+        'local_id': 'L1',
+        'pedido_id': pedido_id,
+        'usuario_correo': 'cliente@example.com',
+        'estado': 'cocinando',
+        'historial_estados': historial
+    }
+
+
+def actualizar_antes(helper, local_id, pedido_id, nuevo_estado, empleado):
+    """actualizar_estado_pedido_con_empleado previo: relectura y reescritura del historial"""
+    table = helper.dynamodb.Table(os.environ['TABLE_PEDIDOS'])
+    ahora = datetime.now().isoformat()
+
+    pedido = helper.obtener_pedido(local_id, pedido_id)
+    helper.validar_transicion_estado(pedido.get('estado'), nuevo_estado)
+
+    historial_actual = pedido.get('historial_estados', [])
+    for estado in historial_actual:
+        if estado.get('activo', False):
+            estado['activo'] = False
+            estado['hora_fin'] = ahora
+
+    historial_actual.append({
+        'estado': nuevo_estado,
+        'hora_inicio': ahora,
+        'hora_fin': ahora,
+        'activo': True,
+        'empleado': {
+            'dni': empleado['dni'],
+            'nombre_completo': f"{empleado['nombre']} {empleado['apellido']}",
+            'rol': empleado['role'].lower(),
+            'calificacion_prom': Decimal(str(empleado['calificacion_prom']))
+        }
+    })
+
+    return table.update_item(
+        Key={'local_id': local_id, 'pedido_id': pedido_id},
+        UpdateExpression='SET estado = :estado, historial_estados = :historial',
+        ExpressionAttributeValues={':estado': nuevo_estado, ':historial': historial_actual},
+        ReturnValues='ALL_NEW'
+    )['Attributes']
+
+
+def main():
+    repeticiones = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+
+    # Los helpers imprimen cada lectura y transición
+    with mock_aws(), contextlib.redirect_stdout(io.StringIO()):
+        dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
+        comun.crear_tabla(dynamodb, os.environ['TABLE_PEDIDOS'], 'local_id', 'pedido_id')
+        pedidos = dynamodb.Table(os.environ['TABLE_PEDIDOS'])
+
+        from utils import dynamodb_helper as helper
+
+        def paso_antes(pedido_id):
+            pedido = helper.obtener_pedido('L1', pedido_id)
+            if pedido.get('estado') != 'cocinando':
+                raise ValueError(pedido.get('estado'))
+            return actualizar_antes(helper, 'L1', pedido_id, 'empacando', EMPLEADO)
+
+        def paso_despues(pedido_id):
+            pedido = helper.obtener_pedido('L1', pedido_id)
+            if pedido.get('estado') != 'cocinando':
+                raise ValueError(pedido.get('estado'))
+            return helper.actualizar_estado_pedido_con_empleado('L1', pedido_id, 'empacando', EMPLEADO, pedido=pedido)
+
+        ids = itertools.count()
+        filas = []
+        for entradas in ENTRADAS:
+            fila = [entradas]
+            resultados = []
+            for paso in (paso_antes, paso_despues):
+                # Un pedido nuevo por ejecución, escrito fuera de la medición
+                pendientes = [f'P{next(ids)}' for _ in range(repeticiones + 1)]
+                with pedidos.batch_writer() as batch:
+                    for pedido_id in pendientes:
+                        batch.put_item(Item=pedido_cocinando(pedido_id, entradas))
+                cola = iter(pendientes)
+
+                del bytes_update[:]
+                resultado, llamadas = comun.contar_llamadas(lambda: paso(next(cola)))
+                cuerpo = bytes_update[-1]
+                resultados.append(resultado)
+
+                p50, p99 = comun.resumen(comun.medir(lambda: paso(next(cola)), repeticiones))
+                fila.append(f'{sum(llamadas.values())} · {cuerpo} B · {p50:.2f} / {p99:.2f}')
+
+            # Ambos caminos dejan el mismo historial
+            antes, despues = ([(e['estado'], e['activo']) for e in r['historial_estados']] for r in resultados)
+            assert antes == despues and len(antes) == entradas + 1
+            filas.append(fila)
+
+    print(f'RTT simulado: {comun.RTT_SEGUNDOS * 1000:.0f} ms, {repeticiones} repeticiones\n')
+    comun.tabla_markdown(
+        ['entradas en el historial', 'antes: llamadas · UpdateItem · p50 / p99 (ms)', 'después'],
+        filas
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+"""
+Utilidades comunes de los benchmarks
+Los servicios AWS se simulan con moto y cada llamada a la API espera una
+latencia de red fija (BENCH_RTT_MS, 5 ms por defecto, el orden de un
+GetItem dentro de la región). Así las mediciones reflejan el número de
+round trips y cuántos van en paralelo, no la velocidad de moto
+"""
+
+import contextlib
+import gc
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+import botocore.handlers
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(RAIZ, 'Layers', 'python'))
+
+os.environ.update({
+    'AWS_ACCESS_KEY_ID': 'testing',
+    'AWS_SECRET_ACCESS_KEY': 'testing',
+    'AWS_SECURITY_TOKEN': 'testing',
+    'AWS_SESSION_TOKEN': 'testing',
+    'AWS_DEFAULT_REGION': 'us-east-1',
+    'AWS_REGION': 'us-east-1',
+})
+
+RTT_SEGUNDOS = float(os.environ.get('BENCH_RTT_MS', 5)) / 1000
+
+# Llamadas a la API por operación ('dynamodb.Query', 's3.GetObject', ...)
+llamadas = Counter()
+_candado = threading.Lock()
+
+
+def _latencia_de_red(event_name=None, **kwargs):
+    operacion = '.'.join(event_name.split('.')[1:]) if event_name else 'desconocida'
+    with _candado:
+        llamadas[operacion] += 1
+    time.sleep(RTT_SEGUNDOS)
+
+
+# Antes del stubber de moto, para todas las sesiones que se creen después
+botocore.handlers.BUILTIN_HANDLERS.insert(0, ('before-send', _latencia_de_red))
+
+
+@contextlib.contextmanager
+def llamadas_atomicas():
+    """
+    moto no serializa las peticiones concurrentes: con un intervalo de cambio
+    de hilo amplio cada llamada se procesa sin interrupciones (como una
+    escritura condicional en DynamoDB). Los hilos siguen alternándose durante
+    la latencia simulada
+    """
+    intervalo = sys.getswitchinterval()
+    sys.setswitchinterval(1)
+    try:
+        yield
+    finally:
+        sys.setswitchinterval(intervalo)
+
+
+def agregar_ruta(*partes):
+    """Agrega un directorio del repo al sys.path (handlers de un microservicio)"""
+    sys.path.insert(0, os.path.join(RAIZ, *partes))
+
+
+def crear_tabla(dynamodb, nombre, pk, sk=None, gsis=(), tipos=None):
+    """
+    Crea una tabla PAY_PER_REQUEST. gsis: [(nombre, pk, sk o None)] con
+    proyección ALL; tipos: atributo -> tipo DynamoDB (por defecto 'S')
+    """
+    tipos = tipos or {}
+    atributos = {pk, sk} | {a for _, gpk, gsk in gsis for a in (gpk, gsk)}
+    atributos.discard(None)
+
+    def esquema(hash_key, range_key):
+        claves = [{'AttributeName': hash_key, 'KeyType': 'HASH'}]
+        if range_key:
+            claves.append({'AttributeName': range_key, 'KeyType': 'RANGE'})
+        return claves
+
+    kwargs = {
+        'TableName': nombre,
+        'KeySchema': esquema(pk, sk),
+        'AttributeDefinitions': [
+            {'AttributeName': a, 'AttributeType': tipos.get(a, 'S')} for a in sorted(atributos)
+        ],
+        'BillingMode': 'PAY_PER_REQUEST'
+    }
+    if gsis:
+        kwargs['GlobalSecondaryIndexes'] = [
+            {'IndexName': g, 'KeySchema': esquema(gpk, gsk), 'Projection': {'ProjectionType': 'ALL'}}
+            for g, gpk, gsk in gsis
+        ]
+    return dynamodb.create_table(**kwargs)
+
+
+def medir(funcion, repeticiones, limpiar=None):
+    """
+    Ejecuta la función y retorna las duraciones en milisegundos. limpiar
+    recibe el resultado y corre fuera de la medición (p. ej. borrar lo
+    escrito, porque moto copia las tablas completas en cada transacción)
+    """
+    duraciones = []
+    for _ in range(repeticiones):
+        # Como timeit: sin pausas del GC (moto genera mucha basura al copiar tablas)
+        gc.collect()
+        gc.disable()
+        try:
+            inicio = time.perf_counter()
+            resultado = funcion()
+            duraciones.append((time.perf_counter() - inicio) * 1000)
+        finally:
+            gc.enable()
+        if limpiar:
+            limpiar(resultado)
+    return duraciones
+
+
+def percentil(muestras, p):
+    ordenadas = sorted(muestras)
+    return ordenadas[min(len(ordenadas) - 1, int(round(p / 100 * (len(ordenadas) - 1))))]
+
+
+def resumen(muestras):
+    """p50 y p99 en ms"""
+    return percentil(muestras, 50), percentil(muestras, 99)
+
+
+def contar_llamadas(funcion):
+    """Ejecuta la función una vez y retorna (resultado, llamadas por operación)"""
+    with _candado:
+        llamadas.clear()
+    resultado = funcion()
+    with _candado:
+        return resultado, dict(llamadas)
+
+
+def tabla_markdown(encabezados, filas):
+    """Imprime una tabla Markdown (para copiar a benchmarks/README.md)"""
+    print('| ' + ' | '.join(encabezados) + ' |')
+    print('|' + '|'.join('---' for _ in encabezados) + '|')
+    for fila in filas:
+        print('| ' + ' | '.join(str(c) for c in fila) + ' |')
+
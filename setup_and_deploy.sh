@@ -515,6 +515,12 @@ configure_bucket() {
       "Status": "Enabled",
       "Filter": {"Prefix": "athena-results/"},
       "Expiration": {"Days": 30}
+    },
+    {
+      "Id": "DeleteOldAthenaCache",
+      "Status": "Enabled",
+      "Filter": {"Prefix": "athena-cache/"},
+      "Expiration": {"Days": 2}
     }
   ]
 }
@@ -554,6 +560,44 @@ ensure_event_bus() {
     fi
 }
 
+# Función para resolver el layer de pyarrow que necesita compactarDeltas
+ensure_pyarrow_layer() {
+    # Layer público de AWS SDK for pandas (incluye pyarrow)
+    local layer_name="arn:aws:lambda:us-east-1:336392948345:layer:AWSSDKPandas-Python312"
+    
+    source .env
+    
+    if [ -n "$PYARROW_LAYER_ARN" ]; then
+        log_success "✅ Layer de pyarrow configurado: ${PYARROW_LAYER_ARN}"
+        export PYARROW_LAYER_ARN
+        return 0
+    fi
+    
+    log "🔍 PYARROW_LAYER_ARN vacío, buscando la última versión de AWSSDKPandas-Python312..."
+    
+    layer_arn=$(aws lambda list-layer-versions \
+        --layer-name "$layer_name" \
+        --region us-east-1 \
+        --query 'LayerVersions[0].LayerVersionArn' \
+        --output text 2>/dev/null)
+    
+    if [ $? -ne 0 ] || [ -z "$layer_arn" ] || [ "$layer_arn" == "None" ]; then
+        log_error "❌ No se pudo resolver el layer de pyarrow"
+        log_info "Define PYARROW_LAYER_ARN en .env (${layer_name}:<versión>)"
+        return 1
+    fi
+    
+    # Guardar en .env para los siguientes despliegues
+    temp_env=$(mktemp)
+    grep -v '^PYARROW_LAYER_ARN=' .env > "$temp_env"
+    echo "PYARROW_LAYER_ARN=${layer_arn}" >> "$temp_env"
+    mv "$temp_env" .env
+    
+    export PYARROW_LAYER_ARN="$layer_arn"
+    log_success "✅ Layer de pyarrow: ${layer_arn}"
+    return 0
+}
+
 # Función para ejecutar crawler inicial y esperar completación
 initialize_glue_crawler() {
     log ""
@@ -566,8 +610,15 @@ initialize_glue_crawler() {
     local database_name="${ATHENA_DATABASE:-chinawok_analytics}"
     
     # Verificar si el crawler ya existe
+    # pedidos y resenas viven en el data lake Parquet (tablas con partition projection)
+    local crawler_targets="{\"S3Targets\":[{\"Path\":\"s3://${S3_BUCKET_NAME}/${S3_INGESTION_PREFIX}/\",\"Exclusions\":[\"pedidos/**\",\"resenas/**\"]}]}"
+    
     if aws glue get-crawler --name "$crawler_name" &>/dev/null; then
         log_info "Crawler '$crawler_name' ya existe"
+        aws glue update-crawler \
+            --name "$crawler_name" \
+            --targets "$crawler_targets" \
+            --region us-east-1 2>/dev/null
     else
         log "📝 Creando crawler '$crawler_name'..."
         
@@ -576,7 +627,7 @@ initialize_glue_crawler() {
             --name "$crawler_name" \
             --role "arn:aws:iam::${AWS_ACCOUNT_ID}:role/LabRole" \
             --database-name "$database_name" \
-            --targets "{\"S3Targets\":[{\"Path\":\"s3://${S3_BUCKET_NAME}/${S3_INGESTION_PREFIX}/\"}]}" \
+            --targets "$crawler_targets" \
             --description "Crawler para mapear schemas de datos DynamoDB" \
             --schema-change-policy '{"UpdateBehavior":"UPDATE_IN_DATABASE","DeleteBehavior":"DEPRECATE_IN_DATABASE"}' \
             --recrawl-policy '{"RecrawlBehavior":"CRAWL_EVERYTHING"}' \
@@ -644,6 +695,54 @@ initialize_glue_crawler() {
     fi
 }
 
+# Función para crear las tablas Parquet particionadas del data lake en Athena
+create_athena_lake_tables() {
+    log ""
+    log "🧱 Creando tablas Parquet particionadas en Athena..."
+    
+    source .env
+    
+    local database_name="${ATHENA_DATABASE:-chinawok_analytics}"
+    local lake_prefix="${S3_LAKE_PREFIX:-data-lake}"
+    local ddl_dir="Microservicios/Locales/analitica-consultas/ddl"
+    
+    for ddl_file in "$ddl_dir"/*.sql; do
+        local table_name=$(basename "$ddl_file" .sql)
+        
+        # La tabla JSONL creada antes por el crawler se reemplaza (DROP de una tabla externa no borra datos)
+        for query in \
+            "DROP TABLE IF EXISTS ${table_name}" \
+            "$(sed -e "s|{{S3_BUCKET_NAME}}|${S3_BUCKET_NAME}|g" -e "s|{{S3_LAKE_PREFIX}}|${lake_prefix}|g" "$ddl_file")"; do
+            
+            local execution_id=$(aws athena start-query-execution \
+                --query-string "$query" \
+                --query-execution-context "Database=${database_name}" \
+                --result-configuration "OutputLocation=s3://${S3_BUCKET_NAME}/${S3_ATHENA_PREFIX:-athena-results}/" \
+                --work-group primary \
+                --query 'QueryExecutionId' --output text --region us-east-1 2>/dev/null)
+            
+            if [ -z "$execution_id" ]; then
+                log_warning "⚠️  No se pudo ejecutar el DDL de '$table_name'"
+                continue 2
+            fi
+            
+            local state="RUNNING"
+            while [ "$state" == "RUNNING" ] || [ "$state" == "QUEUED" ]; do
+                sleep 2
+                state=$(aws athena get-query-execution --query-execution-id "$execution_id" \
+                    --query 'QueryExecution.Status.State' --output text --region us-east-1 2>/dev/null)
+            done
+            
+            if [ "$state" != "SUCCEEDED" ]; then
+                log_warning "⚠️  DDL de '$table_name' terminó en estado $state"
+                continue 2
+            fi
+        done
+        
+        log_success "✅ Tabla '$table_name' (Parquet + partition projection)"
+    done
+}
+
 # Menú de opciones
 echo ""
 echo "═══════════════════════════════════════════════════════"
@@ -718,6 +817,12 @@ case $opcion in
                 build_layer
             fi
             
+            # Resolver el layer de pyarrow para el compactador de Locales
+            if [ "$service_name" == "locales" ] && ! ensure_pyarrow_layer; then
+                deploy_failed=1
+                break
+            fi
+            
             # Crear EventBus si es el servicio de Pedidos
             if [ "$service_name" == "pedidos" ]; then
                 ensure_event_bus "chinawok-pedidos-events"
@@ -749,6 +854,7 @@ case $opcion in
             log "═══════════════════════════════════════════════════════"
             
             initialize_glue_crawler
+            create_athena_lake_tables
             
             # Mostrar endpoints
             show_endpoints
@@ -800,6 +906,7 @@ case $opcion in
         log "🔍 PASO 3/3: Inicializando Glue Crawler"
         log "═══════════════════════════════════════════════════════"
         initialize_glue_crawler
+        create_athena_lake_tables
         
         log_success "✨ Infraestructura de datos lista"
         log_info "📊 Datos poblados con Streams habilitados"
@@ -832,6 +939,12 @@ case $opcion in
                 build_layer
             fi
             
+            # Resolver el layer de pyarrow para el compactador de Locales
+            if [ "$service_name" == "locales" ] && ! ensure_pyarrow_layer; then
+                deploy_failed=1
+                break
+            fi
+            
             # Crear EventBus si es el servicio de Pedidos
             if [ "$service_name" == "pedidos" ]; then
                 ensure_event_bus "chinawok-pedidos-events"
@@ -0,0 +1,22 @@
+"""
+Configuración común de los tests: las utilidades del Layer se importan como
+en Lambda (utils.<modulo>) y las credenciales AWS son ficticias, así ningún
+test llega a una cuenta real
+"""
+
+import os
+import sys
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(RAIZ, 'Layers', 'python'))
+
+os.environ.update({
+    'AWS_ACCESS_KEY_ID': 'testing',
+    'AWS_SECRET_ACCESS_KEY': 'testing',
+    'AWS_SECURITY_TOKEN': 'testing',
+    'AWS_SESSION_TOKEN': 'testing',
+    'AWS_DEFAULT_REGION': 'us-east-1',
+    'AWS_REGION': 'us-east-1',
+})
+os.environ.setdefault('TABLE_EMPLEADOS', 'ChinaWok-Empleados')
+os.environ.setdefault('S3_BUCKET_NAME', 'chinawok-tests')
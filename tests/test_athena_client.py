@@ -0,0 +1,221 @@
+"""
+AthenaQueryExecutor con clientes de Athena y S3 sustituidos por Stubber:
+backoff del polling, paginación con NextToken, conversión de tipos y lectura
+del CSV de resultados desde S3
+"""
+
+import io
+
+import boto3
+import pytest
+from botocore.response import StreamingBody
+from botocore.stub import ANY, Stubber
+
+from utils import athena_client
+
+COLUMNAS = [
+    {'Name': 'producto', 'Type': 'varchar'},
+    {'Name': 'unidades', 'Type': 'bigint'},
+    {'Name': 'revenue', 'Type': 'double'},
+    {'Name': 'activo', 'Type': 'boolean'},
+]
+
+SALIDA = 's3://chinawok-tests/athena-results/q-1.csv'
+
+
+@pytest.fixture
+def clientes(monkeypatch):
+    athena = boto3.client('athena', region_name='us-east-1')
+    s3 = boto3.client('s3', region_name='us-east-1')
+    monkeypatch.setattr(athena_client, '_athena_client', athena)
+    monkeypatch.setattr(athena_client, '_s3_client', s3)
+
+    with Stubber(athena) as stub_athena, Stubber(s3) as stub_s3:
+        yield stub_athena, stub_s3
+        stub_athena.assert_no_pending_responses()
+        stub_s3.assert_no_pending_responses()
+
+
+@pytest.fixture
+def reloj(monkeypatch):
+    """Reloj simulado: time.sleep avanza time.monotonic y registra las esperas"""
+    estado = {'ahora': 0.0, 'esperas': []}
+
+    def sleep(segundos):
+        estado['esperas'].append(segundos)
+        estado['ahora'] += segundos
+
+    monkeypatch.setattr(athena_client.time, 'sleep', sleep)
+    monkeypatch.setattr(athena_client.time, 'monotonic', lambda: estado['ahora'])
+    return estado
+
+
+def ejecucion(estado, **extra):
+    return {
+        'QueryExecution': {
+            'QueryExecutionId': 'q-1',
+            'Status': {'State': estado, 'StateChangeReason': 'sintaxis'},
+            'ResultConfiguration': {'OutputLocation': SALIDA},
+            **extra
+        }
+    }
+
+
+def fila(*valores):
+    return {'Data': [{} if v is None else {'VarCharValue': v} for v in valores]}
+
+
+def pagina(filas, next_token=None, header=False):
+    rows = ([fila(*(c['Name'] for c in COLUMNAS))] if header else []) + filas
+    respuesta = {'ResultSet': {'Rows': rows, 'ResultSetMetadata': {'ColumnInfo': COLUMNAS}}}
+    if next_token:
+        respuesta['NextToken'] = next_token
+    return respuesta
+
+
+def test_backoff_exponencial_hasta_el_maximo(clientes, reloj):
+    stub_athena, _ = clientes
+    for _ in range(10):
+        stub_athena.add_response('get_query_execution', ejecucion('RUNNING'), {'QueryExecutionId': 'q-1'})
+    stub_athena.add_response('get_query_execution', ejecucion('SUCCEEDED'), {'QueryExecutionId': 'q-1'})
+
+    athena_client.AthenaQueryExecutor()._wait_for_query_completion('q-1')
+
+    esperado = []
+    delay = athena_client.POLL_INITIAL_DELAY
+    for _ in range(10):
+        esperado.append(delay)
+        delay = min(delay * athena_client.POLL_BACKOFF, athena_client.POLL_MAX_DELAY)
+    assert reloj['esperas'] == pytest.approx(esperado)
+    assert max(reloj['esperas']) == athena_client.POLL_MAX_DELAY
+
+
+def test_timeout_sin_pasarse_del_plazo(clientes, reloj):
+    stub_athena, _ = clientes
+    # Sondeos que caben en 5 s: uno inicial más uno tras cada espera
+    sondeos, transcurrido, delay = 1, 0.0, athena_client.POLL_INITIAL_DELAY
+    while transcurrido + delay <= 5:
+        transcurrido += delay
+        sondeos += 1
+        delay = min(delay * athena_client.POLL_BACKOFF, athena_client.POLL_MAX_DELAY)
+    for _ in range(sondeos):
+        stub_athena.add_response('get_query_execution', ejecucion('RUNNING'), {'QueryExecutionId': 'q-1'})
+
+    with pytest.raises(Exception, match='Timeout'):
+        athena_client.AthenaQueryExecutor()._wait_for_query_completion('q-1', timeout=5)
+
+    assert sum(reloj['esperas']) <= 5
+
+
+def test_query_fallida_propaga_la_razon(clientes, reloj):
+    stub_athena, _ = clientes
+    stub_athena.add_response('get_query_execution', ejecucion('FAILED'), {'QueryExecutionId': 'q-1'})
+
+    with pytest.raises(Exception, match='FAILED.*sintaxis'):
+        athena_client.AthenaQueryExecutor()._wait_for_query_completion('q-1')
+
+
+def test_pagina_con_next_token_mas_alla_de_1000_filas(clientes):
+    stub_athena, _ = clientes
+    primeras = [fila(f'p{i}', str(i), '1.5', 'true') for i in range(999)]
+    segundas = [fila(f'p{i}', str(i), '1.5', 'true') for i in range(999, 1999)]
+    ultimas = [fila('p1999', '1999', '1.5', 'false')]
+
+    stub_athena.add_response(
+        'get_query_results', pagina(primeras, 't1', header=True),
+        {'QueryExecutionId': 'q-1', 'MaxResults': 1000}
+    )
+    stub_athena.add_response(
+        'get_query_results', pagina(segundas, 't2'),
+        {'QueryExecutionId': 'q-1', 'MaxResults': 1000, 'NextToken': 't1'}
+    )
+    stub_athena.add_response(
+        'get_query_results', pagina(ultimas),
+        {'QueryExecutionId': 'q-1', 'MaxResults': 1000, 'NextToken': 't2'}
+    )
+
+    filas = list(athena_client.AthenaQueryExecutor().iter_query_results('q-1'))
+
+    # El header solo se descarta en la primera página
+    assert len(filas) == 2000
+    assert [f['unidades'] for f in filas] == list(range(2000))
+    assert filas[-1]['activo'] is False
+
+
+def test_conversion_de_tipos(clientes):
+    stub_athena, _ = clientes
+    stub_athena.add_response(
+        'get_query_results',
+        pagina([fila('wantan', '12', '35.9', 'true'), fila('chaufa', None, 'NaN?', 'FALSE')], header=True),
+        {'QueryExecutionId': 'q-1', 'MaxResults': 1000}
+    )
+
+    filas, next_token = athena_client.AthenaQueryExecutor().get_results_page('q-1')
+
+    assert next_token is None
+    assert filas[0] == {'producto': 'wantan', 'unidades': 12, 'revenue': 35.9, 'activo': True}
+    # NULL se conserva y un valor no numérico se retorna sin convertir
+    assert filas[1] == {'producto': 'chaufa', 'unidades': None, 'revenue': 'NaN?', 'activo': False}
+
+
+@pytest.mark.parametrize('valor,tipo,esperado', [
+    ('7', 'INTEGER', 7),
+    ('7', 'tinyint', 7),
+    ('2.50', 'decimal', 2.5),
+    ('true', 'boolean', True),
+    ('2024-03-15', 'date', '2024-03-15'),
+    (None, 'bigint', None),
+])
+def test_convert_value(valor, tipo, esperado):
+    assert athena_client.convert_value(valor, tipo) == esperado
+
+
+def test_lectura_del_csv_desde_s3(clientes):
+    stub_athena, stub_s3 = clientes
+    csv = (
+        '"producto","unidades","revenue","activo"\n'
+        '"wantan","12","35.9","true"\n'
+        '"arroz, chaufa","3","","false"\n'
+        '"con salto\nde línea","1","2.0","true"\n'
+    ).encode('utf-8')
+
+    stub_athena.add_response(
+        'get_query_results', pagina([], header=True),
+        {'QueryExecutionId': 'q-1', 'MaxResults': 1}
+    )
+    stub_s3.add_response(
+        'get_object',
+        {'Body': StreamingBody(io.BytesIO(csv), len(csv))},
+        {'Bucket': 'chinawok-tests', 'Key': 'athena-results/q-1.csv'}
+    )
+
+    filas = list(athena_client.AthenaQueryExecutor().iter_results_from_s3(ejecucion('SUCCEEDED')['QueryExecution']))
+
+    assert filas == [
+        {'producto': 'wantan', 'unidades': 12, 'revenue': 35.9, 'activo': True},
+        {'producto': 'arroz, chaufa', 'unidades': 3, 'revenue': None, 'activo': False},
+        {'producto': 'con salto\nde línea', 'unidades': 1, 'revenue': 2.0, 'activo': True},
+    ]
+
+
+def test_start_query_con_token_y_parametros(clientes):
+    stub_athena, _ = clientes
+    stub_athena.add_response(
+        'start_query_execution',
+        {'QueryExecutionId': 'q-1'},
+        {
+            'QueryString': 'SELECT * FROM pedidos WHERE local_id = ?',
+            'QueryExecutionContext': {'Database': ANY},
+            'ResultConfiguration': {'OutputLocation': 's3://chinawok-tests/athena-results/'},
+            'WorkGroup': 'primary',
+            'ClientRequestToken': 'token-1234567890123456789012345678',
+            'ExecutionParameters': ["'L''1'"]
+        }
+    )
+
+    query_id = athena_client.AthenaQueryExecutor().start_query(
+        'SELECT * FROM pedidos WHERE local_id = ?',
+        client_request_token='token-1234567890123456789012345678',
+        execution_parameters=[athena_client.string_parameter("L'1")]
+    )
+    assert query_id == 'q-1'
@@ -0,0 +1,150 @@
+"""
+Asignación concurrente de empleados con moto: varias ejecuciones que leen los
+mismos candidatos del índice disponibles-index y los reclaman a la vez nunca
+reciben al mismo empleado
+"""
+
+import sys
+import threading
+
+import boto3
+import pytest
+from moto import mock_aws
+
+TABLA = 'ChinaWok-Empleados'
+
+
+@pytest.fixture
+def helper():
+    with mock_aws():
+        dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
+        dynamodb.create_table(
+            TableName=TABLA,
+            KeySchema=[
+                {'AttributeName': 'local_id', 'KeyType': 'HASH'},
+                {'AttributeName': 'dni', 'KeyType': 'RANGE'}
+            ],
+            AttributeDefinitions=[
+                {'AttributeName': 'local_id', 'AttributeType': 'S'},
+                {'AttributeName': 'dni', 'AttributeType': 'S'},
+                {'AttributeName': 'disponible_key', 'AttributeType': 'S'},
+                {'AttributeName': 'calificacion_prom', 'AttributeType': 'N'}
+            ],
+            GlobalSecondaryIndexes=[{
+                'IndexName': 'disponibles-index',
+                'KeySchema': [
+                    {'AttributeName': 'disponible_key', 'KeyType': 'HASH'},
+                    {'AttributeName': 'calificacion_prom', 'KeyType': 'RANGE'}
+                ],
+                'Projection': {'ProjectionType': 'ALL'}
+            }],
+            BillingMode='PAY_PER_REQUEST'
+        )
+
+        from utils import dynamodb_helper
+        yield dynamodb_helper, dynamodb.Table(TABLA)
+
+
+def crear_empleados(table, cantidad, role='Cocinero'):
+    for i in range(cantidad):
+        table.put_item(Item={
+            'local_id': 'L1',
+            'dni': f'{i:08d}',
+            'nombre': f'Empleado {i}',
+            'role': role,
+            'calificacion_prom': 5 - i,
+            'ocupado': False,
+            'disponible_key': f'L1#{role}'
+        })
+
+
+def reclamar_en_paralelo(dynamodb_helper, monkeypatch, ejecuciones):
+    """
+    Lanza las ejecuciones en hilos; todas leen los candidatos antes de que
+    cualquiera escriba, así compiten por el mismo primer empleado
+    """
+    barrera = threading.Barrier(ejecuciones)
+    buscar = dynamodb_helper.buscar_empleado_disponible
+    hilo_actual = threading.local()
+
+    def buscar_y_esperar(*args, **kwargs):
+        candidatos = buscar(*args, **kwargs)
+        # Solo la primera lectura de cada ejecución espera a las demás
+        if not getattr(hilo_actual, 'leyo', False):
+            hilo_actual.leyo = True
+            barrera.wait(timeout=5)
+        return candidatos
+
+    monkeypatch.setattr(dynamodb_helper, 'buscar_empleado_disponible', buscar_y_esperar)
+
+    resultados = [None] * ejecuciones
+    errores = []
+
+    def ejecutar(i):
+        try:
+            resultados[i] = dynamodb_helper.reclamar_empleado('L1', 'Cocinero', f'pedido-{i}')
+        except Exception as e:
+            errores.append(e)
+
+    hilos = [threading.Thread(target=ejecutar, args=(i,)) for i in range(ejecuciones)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+
+    assert not errores
+    return resultados
+
+
+@pytest.fixture(autouse=True)
+def escrituras_atomicas():
+    """
+    moto no serializa las peticiones: con un intervalo de cambio de hilo
+    amplio cada llamada al backend se completa sin interrupciones, como la
+    escritura condicional en DynamoDB. La carrera entre hilos sigue ocurriendo
+    entre llamadas (lectura de candidatos y reclamo)
+    """
+    intervalo = sys.getswitchinterval()
+    sys.setswitchinterval(1)
+    yield
+    sys.setswitchinterval(intervalo)
+
+
+def test_dos_reclamos_simultaneos_un_solo_ganador(helper, monkeypatch):
+    dynamodb_helper, table = helper
+    crear_empleados(table, 1)
+
+    resultados = reclamar_en_paralelo(dynamodb_helper, monkeypatch, 2)
+
+    asignados = [r for r in resultados if r]
+    assert len(asignados) == 1
+    assert resultados.count(None) == 1
+
+    empleado = table.get_item(Key={'local_id': 'L1', 'dni': '00000000'})['Item']
+    assert empleado['ocupado'] is True
+    assert 'disponible_key' not in empleado
+    assert empleado['pedido_asignado'] == asignados[0]['pedido_asignado']
+
+
+def test_reclamos_simultaneos_reciben_empleados_distintos(helper, monkeypatch):
+    dynamodb_helper, table = helper
+    crear_empleados(table, 3)
+
+    resultados = reclamar_en_paralelo(dynamodb_helper, monkeypatch, 5)
+
+    dnis = [r['dni'] for r in resultados if r]
+    assert sorted(dnis) == ['00000000', '00000001', '00000002']
+    assert resultados.count(None) == 2
+
+
+def test_marcar_ocupado_falla_si_otro_lo_tomo(helper):
+    dynamodb_helper, table = helper
+    crear_empleados(table, 1)
+
+    dynamodb_helper.marcar_empleado_ocupado('L1', '00000000', 'pedido-1')
+
+    with pytest.raises(dynamodb_helper.dynamodb.meta.client.exceptions.ConditionalCheckFailedException):
+        dynamodb_helper.marcar_empleado_ocupado('L1', '00000000', 'pedido-2')
+
+    empleado = table.get_item(Key={'local_id': 'L1', 'dni': '00000000'})['Item']
+    assert empleado['pedido_asignado'] == 'pedido-1'
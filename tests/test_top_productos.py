@@ -0,0 +1,103 @@
+"""
+Precisión del sketch Space-Saving de top_productos contra un conteo exacto
+sobre pedidos generados con una distribución sesgada (pocos productos
+concentran las ventas, como en un local real)
+"""
+
+import random
+from decimal import Decimal
+
+import pytest
+
+from utils import top_productos
+
+
+def generar_cambios(cantidad_pedidos, productos, semilla):
+    """Cambios de stream de pedidos que pasan a 'recibido', con pesos tipo Zipf"""
+    aleatorio = random.Random(semilla)
+    pesos = [1 / (rango + 1) for rango in range(len(productos))]
+    cambios = []
+    for i in range(cantidad_pedidos):
+        lineas = {}
+        for nombre in aleatorio.choices(productos, weights=pesos, k=aleatorio.randint(1, 4)):
+            lineas[nombre] = lineas.get(nombre, 0) + aleatorio.randint(1, 3)
+        cambios.append({
+            'table_key': 'pedidos',
+            'secuencia': str(i + 1).zfill(40),
+            'anterior': {'local_id': 'L1', 'estado': 'enviando'},
+            'nuevo': {
+                'local_id': 'L1',
+                'pedido_id': f'p{i}',
+                'estado': 'recibido',
+                'fecha_entrega_aproximada': '2024-03-15T12:00:00Z',
+                'productos': [{'nombre': n, 'cantidad': c} for n, c in lineas.items()]
+            }
+        })
+    return cambios
+
+
+def aplicar_en_memoria(pedidos):
+    """Misma secuencia de agregar que actualizar_ventana, sin DynamoDB"""
+    contadores = {}
+    total = Decimal(0)
+    for _, vendidos in sorted(pedidos, key=lambda venta: venta[0]):
+        for nombre, vendido in vendidos.items():
+            total += vendido['unidades']
+            top_productos.agregar(contadores, nombre, vendido['unidades'], vendido['revenue'])
+    return contadores, total
+
+
+def conteo_exacto(cambios):
+    exacto = {}
+    for cambio in cambios:
+        for producto in cambio['nuevo']['productos']:
+            exacto[producto['nombre']] = exacto.get(producto['nombre'], 0) + producto['cantidad']
+    return exacto
+
+
+@pytest.mark.parametrize('semilla', [1, 7, 42])
+def test_sketch_dentro_de_la_cota_de_error(semilla):
+    productos = [f'producto-{i:03d}' for i in range(3 * top_productos.CAPACIDAD)]
+    cambios = generar_cambios(3000, productos, semilla)
+    exacto = conteo_exacto(cambios)
+
+    ventas = top_productos.agrupar_ventas(cambios)
+    contadores, total = aplicar_en_memoria(ventas[('L1', 'total')]['pedidos'])
+
+    assert total == sum(exacto.values())
+    assert len(contadores) == top_productos.CAPACIDAD
+
+    cota = total / top_productos.CAPACIDAD
+    for nombre, contador in contadores.items():
+        # Sobreestima a lo más en 'error', y el error nunca supera total / CAPACIDAD
+        assert exacto[nombre] <= contador['unidades'] <= exacto[nombre] + contador['error']
+        assert contador['error'] <= cota
+
+    # Todo producto con más de total / CAPACIDAD unidades está en el sketch
+    for nombre, unidades in exacto.items():
+        if unidades > cota:
+            assert nombre in contadores
+
+
+def test_top_coincide_con_el_exacto_en_los_primeros_puestos():
+    productos = [f'producto-{i:03d}' for i in range(3 * top_productos.CAPACIDAD)]
+    cambios = generar_cambios(3000, productos, 3)
+    exacto = conteo_exacto(cambios)
+
+    contadores, _ = aplicar_en_memoria(top_productos.agrupar_ventas(cambios)[('L1', 'total')]['pedidos'])
+
+    top_exacto = sorted(exacto, key=exacto.get, reverse=True)[:10]
+    top_sketch = sorted(contadores, key=lambda n: contadores[n]['unidades'], reverse=True)[:10]
+    assert top_sketch == top_exacto
+
+
+def test_ventanas_del_pedido():
+    cambios = generar_cambios(1, ['wantan'], 0)
+    ventanas = {ventana for _, ventana in top_productos.agrupar_ventas(cambios)}
+    assert ventanas == {'total', 'dia#2024-03-15', 'semana#2024-W11', 'mes#2024-03'}
+
+
+def test_solo_cuentan_las_transiciones_a_recibido():
+    cambio = generar_cambios(1, ['wantan'], 0)[0]
+    ya_recibido = dict(cambio, anterior={'local_id': 'L1', 'estado': 'recibido'})
+    assert top_productos.agrupar_ventas([ya_recibido]) == {}